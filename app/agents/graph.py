@@ -4,17 +4,72 @@ Agente de Triagem – ClinicAI
 Fluxo principal:
     llm_dialog → (se mensagem final) → llm_extract → extract → persist → END
 
+Encerramento antecipado (`app.services.triage_completeness`):
+    - Resumo completo confirmado pelo paciente → finalize → persist, sem a
+      resposta de encerramento nem a extração pelo LLM.
+    - Mensagem final do LLM após um resumo completo → finalize → persist.
+    - Orçamento de turnos (`TRIAGE_MAX_TURNS`) atingido → llm_extract → ...
+      → persist, sem novo turno de diálogo (a extração inclui a última
+      mensagem do paciente, que o resumo ainda não contempla).
+
 Objetivo:
     - Conduzir uma conversa natural com o paciente.
     - Só na mensagem final extrair e salvar a triagem.
+
+Estado:
+    O grafo é compilado com um checkpointer (`app.services.checkpointer`) e
+    usa o `conversation_id` como `thread_id`: cada turno parte do último
+    checkpoint da conversa, e os turnos se acumulam em `conversation_context`.
+    Turnos simultâneos da mesma conversa são executados um de cada vez
+    (`TriageAgent.thread_lock`), para que um não sobrescreva o outro.
 """
 
-import json
-from typing import Dict, Any, TypedDict
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypedDict
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, END
+from loguru import logger
+from app.services.checkpointer import MongoCheckpointSaver, build_checkpointer
 from app.services.llm import LLMService
 from app.schemas.triage import Triage
-from app.services.persistence import PersistenceService
+from app.services.persistence import AGENT, USER, PersistenceService, Turn
+from app.services.replies import CLOSING, REPLIES, is_closing_reply
+from app.services.triage_completeness import (
+    TRIAGE_FINALIZATION_TOTAL,
+    is_complete,
+    is_confirmation,
+    latest_recap,
+    parse_recap,
+    turn_budget_reached,
+)
+from app.services.triage_parser import TRIAGE_EXTRACTION_TOTAL, parse_triage
+from app.utils.metrics import GRAPH_NODE_SECONDS, current_node, timed
+
+
+# Falas mantidas no contexto da conversa (50 trocas, como a leitura do histórico).
+MAX_CONTEXT_TURNS = 100
+
+SPEAKERS = {USER: "Paciente", AGENT: "Agente"}
+
+
+def add_turns(current: Optional[List[Turn]], update: Optional[List[Turn]]) -> List[Turn]:
+    """
+    Reducer de `conversation_context`: acrescenta as falas recebidas,
+    mantendo as `MAX_CONTEXT_TURNS` mais recentes. `None` zera o contexto
+    (conversa encerrada).
+    """
+    if update is None:
+        return []
+    return [*(current or []), *update][-MAX_CONTEXT_TURNS:]
+
+
+def format_transcript(turns: List[Turn]) -> str:
+    """
+    Transcrição da conversa (uma fala por linha) para prompts de texto.
+    """
+    return "\n".join(f"{SPEAKERS.get(turn.role, turn.role)}: {turn.text}" for turn in turns)
 
 
 class TriageState(TypedDict, total=False):
@@ -22,22 +77,47 @@ class TriageState(TypedDict, total=False):
     Estado compartilhado do agente de triagem.
     """
     conversation_id: str
+    channel: str
     user_message: str
-    conversation_context: list[Dict[str, Any]] 
+    conversation_context: Annotated[List[Turn], add_turns]
     agent_message: str
     internal_reply: str
     triage: Dict[str, Any]
 
 
+def instrumented_node(name: str, node: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+    """
+    Envolve um nó do grafo medindo sua duração e expondo o nome do nó
+    (via `current_node`) às chamadas feitas dentro dele.
+    """
+    async def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        token = current_node.set(name)
+        try:
+            with timed(GRAPH_NODE_SECONDS, node=name):
+                return await node(state)
+        finally:
+            current_node.reset(token)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
 class TriageAgent:
     """
     Agente responsável por orquestrar a conversa com o paciente
     e conduzir a extração da triagem ao final.
     """
-    def __init__(self) -> None:
-        self.llm = LLMService()
-        self.persistence = PersistenceService()
+    def __init__(
+        self,
+        llm: Optional[LLMService] = None,
+        persistence: Optional[PersistenceService] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+    ) -> None:
+        self.llm = llm or LLMService()
+        self.persistence = persistence or PersistenceService()
+        self.checkpointer = checkpointer or build_checkpointer(self.persistence)
         self.graph = self._build_graph()
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
 
     def _build_graph(self) -> StateGraph:
         """
@@ -48,14 +128,16 @@ class TriageAgent:
 
         async def llm_dialog_node(state: Dict[str, Any]) -> Dict[str, Any]:
             """
-            Nó 1 – Conduz diálogo normal com o paciente.
+            Nó 1 – Conduz diálogo normal com o paciente e registra o turno
+            no contexto da conversa.
             """
             reply = await self.llm.get_reply(
                 state["user_message"],
                 state["conversation_id"],
-                state.get("conversation_context", "")
+                state.get("conversation_context"),
             )
-            return {**state, "agent_message": reply}
+            turns = [Turn(USER, state["user_message"]), Turn(AGENT, reply)]
+            return {"agent_message": reply, "conversation_context": turns}
 
         async def llm_extract_node(state: Dict[str, Any]) -> Dict[str, Any]:
             """
@@ -73,81 +155,192 @@ class TriageAgent:
                 '  "historico": "",\n'
                 '  "medidas_tomadas": ""\n'
                 "}\n\n"
-                f"Histórico:\n{state.get('conversation_context', '')}\n\n"
+                f"Histórico:\n{format_transcript(state.get('conversation_context') or [])}\n\n"
                 f"Última mensagem:\n{state['user_message']}"
             )
             reply = await self.llm.get_reply(prompt, state["conversation_id"])
-            return {**state, "internal_reply": reply}
+            return {"internal_reply": reply}
 
         async def extraction_node(state: Dict[str, Any]) -> Dict[str, Any]:
             """
-            Nó 3 – Valida e converte o JSON bruto em objeto estruturado.
+            Nó 3 – Converte o JSON bruto (mesmo imperfeito) em triagem estruturada.
             """
-            cleaned = (
-                state["internal_reply"]
-                .replace("```json", "")
-                .replace("```", "")
-                .strip()
-            )
             try:
-                triage = Triage.model_validate_json(cleaned)
-                state["triage"] = triage.dict(exclude_unset=True)
+                extraction = parse_triage(state.get("internal_reply", ""))
+                TRIAGE_EXTRACTION_TOTAL.inc(outcome=extraction.outcome)
+                if extraction.repairs:
+                    logger.warning(
+                        "Triagem de {} extraída com reparos {}; campos recuperados: {}",
+                        state["conversation_id"], extraction.repairs, extraction.recovered,
+                    )
+                triage = Triage.model_validate(extraction.triage)
+                data = triage.model_dump(include=set(extraction.triage)) if extraction.recovered else {}
             except Exception:
-                state["triage"] = {}
-            return state
+                logger.exception("Falha ao extrair a triagem de {}", state["conversation_id"])
+                data = {}
+            return {"triage": data}
 
-        async def persist_node(state: Dict[str, Any]) -> Dict[str, Any]:
+        async def finalize_node(state: Dict[str, Any]) -> Dict[str, Any]:
             """
-            Nó 4 – Persiste a triagem no banco e retorna mensagem final.
+            Nó 3b – Registra a triagem a partir do último resumo do agente,
+            sem chamar a LLM.
             """
-            final_message = (
-                "Obrigado por compartilhar todas essas informações. "
-                "Sua triagem foi registrada e será encaminhada para nossa equipe médica, "
-                "que dará continuidade ao seu atendimento. "
-                "Lembre-se: este é apenas um pré-atendimento e não substitui uma consulta "
-                "com um profissional de saúde."
-            )
+            recap = latest_recap(state.get("conversation_context") or []) or {}
+            try:
+                data = Triage.model_validate(recap).model_dump(include=set(recap))
+            except Exception:
+                data = {}
+            return {"triage": data}
 
+        async def persist_node(state: Dict[str, Any]) -> Dict[str, Any]:
+            """
+            Nó 4 – Persiste a triagem (com o uso de tokens da conversa)
+            no banco e retorna mensagem final, zerando o contexto da conversa.
+            """
             triage_data = state.get("triage", {})
+            usage = self.llm.usage.pop(state["conversation_id"])
             if triage_data:
-                await self.persistence.save_triage(state["conversation_id"], triage_data)
+                await self.persistence.save_triage(
+                    state["conversation_id"], triage_data, usage=usage, channel=state.get("channel")
+                )
 
             return {
-                "conversation_id": state["conversation_id"],
-                "agent_message": final_message,
+                "agent_message": REPLIES.get(CLOSING).text,
                 "triage": {},
                 "internal_reply": "",
                 "user_message": "",
-                "conversation_context": []
+                "conversation_context": None,
             }
 
+        def route_turn(state: Dict[str, Any]) -> str:
+            """
+            Decide, antes do diálogo, se o turno pode encerrar a triagem sem
+            chamar a LLM: confirmação de um resumo completo ou orçamento de
+            turnos esgotado.
+            """
+            context = state.get("conversation_context") or []
+            if turn_budget_reached(context):
+                TRIAGE_FINALIZATION_TOTAL.inc(reason="turn_budget")
+                return "llm_extract"
+            last = context[-1] if context else None
+            if (
+                last is not None
+                and last.role == AGENT
+                and is_confirmation(state.get("user_message", ""))
+                and is_complete(parse_recap(last.text))
+            ):
+                TRIAGE_FINALIZATION_TOTAL.inc(reason="confirmed")
+                return "finalize"
+            return "llm_dialog"
+
         def decide_next(state: Dict[str, Any]) -> str:
             """
-            Decide se deve iniciar extração ou encerrar após o diálogo.
+            Decide se deve iniciar extração ou encerrar após o diálogo; com
+            um resumo completo na conversa, a extração pela LLM é dispensada.
             """
-            final_phrase = "sua triagem foi registrada"
-            if final_phrase in state.get("agent_message", "").lower() and not state.get("triage"):
+            if is_closing_reply(state.get("agent_message", "")) and not state.get("triage"):
+                if is_complete(latest_recap(state.get("conversation_context") or [])):
+                    TRIAGE_FINALIZATION_TOTAL.inc(reason="closing_recap")
+                    return "finalize"
+                TRIAGE_FINALIZATION_TOTAL.inc(reason="closing_extract")
                 return "llm_extract"
             return END
 
-        graph.add_node("llm_dialog", llm_dialog_node)
-        graph.add_node("llm_extract", llm_extract_node)
-        graph.add_node("extract", extraction_node)
-        graph.add_node("persist", persist_node)
+        graph.add_node("llm_dialog", instrumented_node("llm_dialog", llm_dialog_node))
+        graph.add_node("llm_extract", instrumented_node("llm_extract", llm_extract_node))
+        graph.add_node("extract", instrumented_node("extract", extraction_node))
+        graph.add_node("finalize", instrumented_node("finalize", finalize_node))
+        graph.add_node("persist", instrumented_node("persist", persist_node))
 
-        graph.set_entry_point("llm_dialog")
+        graph.set_conditional_entry_point(route_turn, {
+            "llm_dialog": "llm_dialog",
+            "llm_extract": "llm_extract",
+            "finalize": "finalize",
+        })
         graph.add_conditional_edges("llm_dialog", decide_next, {
             "llm_extract": "llm_extract",
+            "finalize": "finalize",
             END: END,
         })
         graph.add_edge("llm_extract", "extract")
         graph.add_edge("extract", "persist")
+        graph.add_edge("finalize", "persist")
         graph.add_edge("persist", END)
 
-        return graph.compile()
+        return graph.compile(checkpointer=self.checkpointer)
 
     def get_graph(self) -> StateGraph:
         """
         Retorna o grafo de estados compilado.
         """
         return self.graph
+
+    @staticmethod
+    def thread_config(conversation_id: str) -> RunnableConfig:
+        """
+        Configuração de execução do grafo para a conversa (`thread_id`).
+        """
+        return {"configurable": {"thread_id": conversation_id}, "recursion_limit": 5}
+
+    def start_thread(self, conversation_id: str) -> None:
+        """
+        Registra uma conversa nova, que ainda não tem checkpoint, evitando a
+        consulta ao banco no primeiro turno.
+        """
+        if isinstance(self.checkpointer, MongoCheckpointSaver):
+            self.checkpointer.mark_new(conversation_id)
+
+    async def has_state(self, conversation_id: str) -> bool:
+        """
+        Indica se a conversa já tem estado salvo pelo checkpointer.
+        """
+        return await self.checkpointer.aget_tuple(self.thread_config(conversation_id)) is not None
+
+    @asynccontextmanager
+    async def thread_lock(self, conversation_id: str) -> AsyncIterator[None]:
+        """
+        Exclusão mútua por conversa: turnos simultâneos da mesma conversa
+        partiriam do mesmo checkpoint, e o último `flush` descartaria o
+        outro turno. O lock é removido quando nenhum turno o usa.
+        """
+        lock, users = self._locks.get(conversation_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[conversation_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[conversation_id]
+            if users == 1:
+                del self._locks[conversation_id]
+            else:
+                self._locks[conversation_id] = (lock, users - 1)
+
+    async def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Executa um turno a partir do último checkpoint da conversa, com a
+        conversa bloqueada até o checkpoint ser gravado.
+
+        Args:
+            state (Dict[str, Any]): Entrada do turno (`conversation_id`,
+                `channel`, `user_message` e, opcionalmente, turnos anteriores
+                em `conversation_context` para semear uma conversa sem estado).
+
+        Returns:
+            Dict[str, Any]: Estado final do grafo.
+        """
+        conversation_id = state["conversation_id"]
+        async with self.thread_lock(conversation_id):
+            try:
+                return await self.graph.ainvoke(state, config=self.thread_config(conversation_id))
+            finally:
+                if isinstance(self.checkpointer, MongoCheckpointSaver):
+                    await self.checkpointer.flush(conversation_id)
+
+    async def reset(self, conversation_id: str) -> None:
+        """
+        Descarta o estado da conversa (ex.: encerrada por emergência),
+        depois de um turno em andamento gravar o seu checkpoint.
+        """
+        async with self.thread_lock(conversation_id):
+            await self.checkpointer.adelete_thread(conversation_id)
@@ -0,0 +1,407 @@
+"""
+Modo de produção com múltiplos workers – ClinicAI
+-------------------------------------------------
+Sobe `WORKERS` processos uvicorn (`app.main:app`) em portas locais a partir
+de `WORKER_BASE_PORT` e, na frente deles, um proxy em `APP_HOST:APP_PORT`
+que encaminha cada conversa sempre ao mesmo worker (hash consistente).
+
+Assim o estado por conversa (locks, caches, janelas de agrupamento) pode
+ficar em memória no worker, enquanto a vazão escala por todos os núcleos.
+
+Chave de roteamento:
+- `POST /chat/`: `conversation_id` do corpo. Conversas novas recebem o
+  identificador já no proxy, para que o primeiro turno caia no mesmo
+  worker que atenderá os seguintes, e seguem marcadas como novas no
+  cabeçalho `NEW_CONVERSATION_HEADER` (assinado com `APP_SECRET`), para
+  que o worker dispense a busca pelo checkpoint no primeiro turno.
+- `POST /webhook/whatsapp`: telefone do remetente (`messages[0].from`),
+  do qual o worker deriva o hash da conversa. O corpo é repassado intacto.
+- `GET /metrics`: não é encaminhado; o proxy coleta as métricas de todos
+  os workers e as expõe juntas, cada série com o rótulo `worker` (cada
+  processo tem o próprio `REGISTRY`, e o rodízio faria cada coleta do
+  Prometheus ver um worker diferente).
+- Demais rotas (sem estado por conversa): rodízio entre os workers. O feed
+  `/triages/stream` pode cair em qualquer worker: todos acompanham as
+  mesmas triagens no MongoDB.
+
+O supervisor reinicia workers que encerrarem; o anel não muda, então as
+conversas continuam no mesmo worker (apenas o estado em memória é perdido).
+WebSockets não passam pelo proxy; use `/triages/stream` (SSE) em produção.
+
+Uso:
+    python -m app.cluster --workers 4
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from loguru import logger
+from starlette.background import BackgroundTask
+
+from app.settings import settings
+from app.utils.hash_ring import HashRing
+from app.utils.hashing import Hasher
+from app.utils.metrics import REGISTRY
+
+
+PROXY_REQUESTS_TOTAL = REGISTRY.counter(
+    "clinicai_proxy_requests_total", "Requisições encaminhadas pelo proxy.", ("worker", "routing")
+)
+WORKER_RESTARTS_TOTAL = REGISTRY.counter(
+    "clinicai_worker_restarts_total", "Workers reiniciados pelo supervisor.", ("worker",)
+)
+WORKER_UP = REGISTRY.gauge(
+    "clinicai_worker_up", "Workers que responderam (1) ou não (0) à última coleta de métricas.", ("worker",)
+)
+
+CHAT_PATHS = ("/chat", "/chat/")
+WEBHOOK_PATHS = ("/webhook/whatsapp", "/webhook/whatsapp/")
+NEW_CONVERSATION_HEADER = "x-clinicai-new-conversation"
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+    NEW_CONVERSATION_HEADER,
+}
+
+
+def new_conversation_token(conversation_id: str) -> str:
+    """
+    Valor do `NEW_CONVERSATION_HEADER` para a conversa: HMAC do
+    identificador com `APP_SECRET`, de modo que só o proxy pode marcar uma
+    conversa como nova (a marca faz o worker ignorar checkpoints salvos).
+    """
+    return Hasher(settings.APP_SECRET).hash_value(conversation_id)
+
+
+def is_new_conversation(conversation_id: Optional[str], token: Optional[str]) -> bool:
+    """Indica se o proxy marcou a conversa como criada por ele."""
+    if not conversation_id or not token:
+        return False
+    return Hasher(settings.APP_SECRET).verify_value(conversation_id, token)
+
+
+def _with_worker_label(sample: str, worker: str) -> str:
+    """Acrescenta `worker="..."` aos rótulos de uma linha de amostra."""
+    label = f'worker="{worker}"'
+    name_end = sample.find(" ")
+    brace = sample.find("{", 0, name_end)
+    if brace == -1:
+        return f"{sample[:name_end]}{{{label}}}{sample[name_end:]}"
+    return f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+
+
+def merge_metrics(expositions: Iterable[Tuple[Optional[str], str]]) -> str:
+    """
+    Junta as exposições do Prometheus de vários processos em uma só.
+
+    Cada métrica aparece uma vez (`# HELP`/`# TYPE` únicos, amostras
+    contíguas), com as séries de cada processo distinguidas pelo rótulo
+    `worker`.
+
+    Args:
+        expositions (Iterable[Tuple[Optional[str], str]]): Pares (worker,
+            texto de `/metrics`); com worker None, as amostras seguem sem o
+            rótulo (métricas do proxy, que já usam `worker` para o destino).
+    """
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for worker, text in expositions:
+        family = None
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) < 3 or parts[1] not in ("HELP", "TYPE"):
+                    continue
+                family = families.setdefault(parts[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+                continue
+            if family is None:
+                family = families.setdefault(line.split("{")[0].split(" ")[0], ([], []))
+            family[1].append(_with_worker_label(line, worker) if worker else line)
+    lines = [line for header, samples in families.values() for line in (*header, *samples)]
+    return "\n".join(lines) + "\n"
+
+
+class Route(NamedTuple):
+    """
+    Roteamento de uma requisição: chave de afinidade (None se a rota não
+    tem estado por conversa), corpo a encaminhar e o `conversation_id`
+    gerado pelo proxy, quando a conversa é nova.
+    """
+
+    key: Optional[str]
+    body: bytes
+    new_conversation_id: Optional[str] = None
+
+
+def routing_key(method: str, path: str, body: bytes) -> Route:
+    """
+    Extrai a chave de afinidade de uma requisição.
+
+    Args:
+        method (str): Método HTTP.
+        path (str): Caminho da requisição.
+        body (bytes): Corpo bruto.
+
+    Returns:
+        Route: Chave e corpo a encaminhar — em `/chat/` sem
+        `conversation_id`, o corpo recebe um identificador novo, também
+        informado em `new_conversation_id`.
+    """
+    if method != "POST" or path not in CHAT_PATHS + WEBHOOK_PATHS:
+        return Route(None, body)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return Route(None, body)
+    if not isinstance(payload, dict):
+        return Route(None, body)
+
+    if path in CHAT_PATHS:
+        conversation_id = payload.get("conversation_id")
+        if conversation_id:
+            return Route(f"conv:{conversation_id}", body)
+        conversation_id = str(uuid.uuid4())
+        payload["conversation_id"] = conversation_id
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return Route(f"conv:{conversation_id}", body, conversation_id)
+
+    try:
+        sender = payload["entry"][0]["changes"][0]["value"]["messages"][0]["from"]
+    except (KeyError, IndexError, TypeError):
+        return Route(None, body)
+    return Route(f"wa:{sender}", body)
+
+
+class StickyProxy:
+    """
+    Encaminha requisições aos workers, fixando cada conversa em um worker.
+    """
+
+    def __init__(
+        self,
+        workers: Iterable[str],
+        replicas: Optional[int] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.workers = list(workers)
+        self.ring = HashRing(self.workers, replicas=replicas or settings.HASH_RING_REPLICAS)
+        self.client = client or httpx.AsyncClient(timeout=None)
+        self._round_robin = itertools.cycle(self.workers)
+
+    def pick(self, key: Optional[str]) -> str:
+        """Worker responsável pela chave (rodízio quando não há chave)."""
+        if key is None:
+            return next(self._round_robin)
+        return self.ring.get(key)
+
+    async def forward(self, request: Request) -> StreamingResponse:
+        """
+        Repassa a requisição ao worker escolhido e devolve a resposta em
+        streaming (compatível com SSE e exportações longas).
+        """
+        route = routing_key(request.method, request.url.path, await request.body())
+        worker = self.pick(route.key)
+        PROXY_REQUESTS_TOTAL.inc(worker=worker, routing="sticky" if route.key else "round_robin")
+
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+        if route.new_conversation_id:
+            headers.append((NEW_CONVERSATION_HEADER, new_conversation_token(route.new_conversation_id)))
+        upstream_request = self.client.build_request(
+            request.method,
+            worker + request.url.path,
+            params=request.url.query,
+            headers=headers,
+            content=route.body,
+        )
+        try:
+            upstream = await self.client.send(upstream_request, stream=True)
+        except httpx.TransportError as e:
+            logger.error("Worker {} indisponível: {}", worker, e)
+            return JSONResponse(status_code=502, content={"detail": "Worker indisponível."})
+
+        response_headers = {
+            k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            background=BackgroundTask(upstream.aclose),
+        )
+
+    async def metrics(self, timeout: float = 5.0) -> str:
+        """
+        Coleta `/metrics` de todos os workers em paralelo e devolve a
+        exposição combinada, com as métricas do próprio proxy (sem o
+        rótulo `worker` de origem).
+        Workers que não respondem ficam com `clinicai_worker_up` 0.
+        """
+
+        async def scrape(worker: str) -> Tuple[str, str]:
+            try:
+                response = await self.client.get(worker + "/metrics", timeout=timeout)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning("Sem métricas do worker {}: {}", worker, e)
+                WORKER_UP.set(0, worker=worker)
+                return worker, ""
+            WORKER_UP.set(1, worker=worker)
+            return worker, response.text
+
+        scraped = await asyncio.gather(*(scrape(worker) for worker in self.workers))
+        return merge_metrics([(None, REGISTRY.render()), *scraped])
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class Supervisor:
+    """
+    Inicia e mantém os processos uvicorn dos workers.
+
+    Apenas o worker 0 executa a manutenção do histórico em segundo plano
+    (`RETENTION_ENABLED`), para que ela não rode em paralelo N vezes.
+    """
+
+    def __init__(self, workers: int, base_port: int, host: str = "127.0.0.1") -> None:
+        self.count = workers
+        self.base_port = base_port
+        self.host = host
+        self.processes: Dict[int, subprocess.Popen] = {}
+
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://{self.host}:{self.base_port + i}" for i in range(self.count)]
+
+    def command(self, index: int) -> List[str]:
+        return [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", self.host,
+            "--port", str(self.base_port + index),
+            "--no-access-log",
+        ]
+
+    def environment(self, index: int) -> Dict[str, str]:
+        env = dict(os.environ, WORKERS="1")
+        if index > 0:
+            env["RETENTION_ENABLED"] = "false"
+        return env
+
+    def spawn(self, index: int) -> None:
+        self.processes[index] = subprocess.Popen(self.command(index), env=self.environment(index))
+        logger.info("Worker {} iniciado na porta {}", index, self.base_port + index)
+
+    def start(self) -> None:
+        for index in range(self.count):
+            self.spawn(index)
+
+    def restart_dead(self) -> List[int]:
+        """
+        Reinicia os workers que encerraram.
+
+        Returns:
+            List[int]: Índices reiniciados.
+        """
+        restarted = []
+        for index, process in list(self.processes.items()):
+            if process.poll() is not None:
+                logger.warning("Worker {} encerrou (código {}); reiniciando.", index, process.returncode)
+                WORKER_RESTARTS_TOTAL.inc(worker=str(index))
+                self.spawn(index)
+                restarted.append(index)
+        return restarted
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Encerra os workers (SIGTERM e, após `timeout`, SIGKILL), bloqueando
+        até que terminem. No event loop, use `astop`.
+        """
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self.processes.clear()
+
+    async def astop(self, timeout: float = 10.0) -> None:
+        """Versão de `stop` que espera os workers em uma thread, sem bloquear o loop."""
+        await asyncio.to_thread(self.stop, timeout)
+
+
+def create_proxy_app(proxy: StickyProxy, supervisor: Optional[Supervisor] = None) -> FastAPI:
+    """
+    Cria a aplicação do proxy. Com `supervisor`, os workers são iniciados
+    junto com o proxy, monitorados a cada segundo e encerrados com ele.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        monitor = None
+        if supervisor is not None:
+            supervisor.start()
+            monitor = asyncio.create_task(_monitor(supervisor))
+        try:
+            yield
+        finally:
+            if monitor is not None:
+                monitor.cancel()
+            await proxy.aclose()
+            if supervisor is not None:
+                await supervisor.astop()
+
+    app = FastAPI(title="ClinicAI - Proxy", lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.get("/metrics")
+    async def metrics():
+        if not settings.METRICS_ENABLED:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Métricas desativadas.")
+        return PlainTextResponse(await proxy.metrics(), media_type="text/plain; version=0.0.4")
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"])
+    async def forward(request: Request):
+        return await proxy.forward(request)
+
+    return app
+
+
+async def _monitor(supervisor: Supervisor, interval: float = 1.0) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        supervisor.restart_dead()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sobe N workers da API com roteamento fixo por conversa.")
+    parser.add_argument("--workers", type=int, default=None, help="Número de workers (padrão: WORKERS ou nº de CPUs)")
+    parser.add_argument("--host", default=settings.APP_HOST)
+    parser.add_argument("--port", type=int, default=settings.APP_PORT)
+    parser.add_argument("--base-port", type=int, default=settings.WORKER_BASE_PORT)
+    args = parser.parse_args(argv)
+
+    workers = args.workers or (settings.WORKERS if settings.WORKERS > 1 else os.cpu_count() or 1)
+    supervisor = Supervisor(workers, args.base_port)
+    proxy = StickyProxy(supervisor.urls)
+    uvicorn.run(create_proxy_app(proxy, supervisor), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,5 +25,12 @@ EMERGENCY_KEYWORDS = [
 
 EMERGENCY_MESSAGE = (
     "Entendi. Seus sintomas podem indicar uma situação de emergência. "
-    "Por favor, procure o pronto-socorro mais próximo ou ligue para o 192 imediatamente."
+    "Por favor, procure imediatamente o pronto-socorro mais próximo ou ligue para o 192."
+)
+
+# Trechos que identificam a orientação de emergência em respostas do LLM e
+# no histórico; o segundo cobre a redação usada anteriormente.
+EMERGENCY_MARKERS = (
+    "procure imediatamente o pronto-socorro",
+    "procure o pronto-socorro mais próximo",
 )
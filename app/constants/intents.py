@@ -9,7 +9,8 @@ INTENTS = {
     "GREETING": ["olá", "oi", "boa tarde", "bom dia", "boa noite", "salve"],
     "FAREWELL": ["tchau", "até logo", "até mais", "adeus", "falou", "obrigado"],
     "AFFIRMATION": ["sim", "claro", "com certeza", "positivo"],
-    "NEGATION": ["não", "negativo", "nunca"],
+    "CONFIRMATION": ["sim", "ok", "certo", "positivo", "correto", "confirmo", "isso", "exato"],
+    "NEGATION": ["não", "nao", "negativo", "nunca"],
     "THANKS": ["valeu", "obrigado", "obrigada", "agradecido"],
     "HELP": ["ajuda", "socorro", "preciso de ajuda"],
     "TRIAGE": [
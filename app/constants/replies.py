@@ -0,0 +1,31 @@
+"""
+Respostas fixas do agente que não passam pelo LLM.
+
+A orientação de emergência fica em `app/constants/emergencies.py`, junto
+das palavras-chave que a disparam.
+"""
+
+
+CLOSING_MESSAGE = (
+    "Obrigado por compartilhar todas essas informações. "
+    "Sua triagem foi registrada e será encaminhada para nossa equipe médica, "
+    "que dará continuidade ao seu atendimento. "
+    "Lembre-se: este é apenas um pré-atendimento e não substitui uma consulta "
+    "com um profissional de saúde."
+)
+
+# Trecho que identifica o encerramento em respostas do LLM e no histórico.
+CLOSING_MARKER = "sua triagem foi registrada"
+
+ERROR_MESSAGE = (
+    "Desculpe, houve um erro ao processar sua triagem. "
+    "Pode reformular sua mensagem?"
+)
+
+WAITING_MESSAGE = "Ok, estou aguardando sua resposta."
+
+OVERLOAD_MESSAGE = (
+    "Olá! Estamos com alta demanda no momento e não conseguimos iniciar seu "
+    "atendimento agora. Por favor, envie sua mensagem novamente em alguns minutos. "
+    "Em caso de emergência, ligue para o 192."
+)
@@ -1,9 +1,57 @@
+import asyncio
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from loguru import logger
 from app.routes import chat
 from app.routes import health
+from app.routes import webhook
+from app.routes import metrics
+from app.routes import triages
+from app.routes import conversations
+from app.services.retention import RetentionService
+from app.settings import settings
+from app.utils import tracing
+from app.utils.logging import configure_logging
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicialização da aplicação: configura os logs estruturados, recusa
+    subir fora de `ENV=dev` sem o App Secret do webhook, avisa se as rotas
+    da equipe estão sem token, garante os índices do MongoDB usados pelo
+    histórico e pelas listagens paginadas e, com `RETENTION_ENABLED`,
+    inicia a manutenção do histórico em segundo plano. No encerramento,
+    interrompe a manutenção e o feed de triagens, se estiverem ativos, fecha
+    as conexões com a WhatsApp Cloud API e aguarda a escrita dos spans e
+    dos logs pendentes.
+    """
+    configure_logging()
+    webhook.check_signature_secret()
+    if not settings.STAFF_API_TOKEN:
+        logger.error("STAFF_API_TOKEN ausente: as rotas da equipe recusarão todas as chamadas.")
+    if settings.MONGO_ENSURE_INDEXES:
+        try:
+            await triages.get_persistence_service().ensure_indexes()
+        except Exception as e:
+            logger.warning("Não foi possível criar os índices do MongoDB: {}", e)
+    retention_task = None
+    if settings.RETENTION_ENABLED:
+        retention = RetentionService(triages.get_persistence_service())
+        retention_task = asyncio.create_task(retention.run_forever())
+    yield
+    if retention_task is not None:
+        retention_task.cancel()
+    if triages.get_triage_feed.cache_info().currsize:
+        await triages.get_triage_feed().stop()
+    if webhook.get_whatsapp_service.cache_info().currsize:
+        await webhook.get_whatsapp_service().aclose()
+    await asyncio.to_thread(tracing.shutdown_tracer)
+    await logger.complete()
+
+
 def create_app() -> FastAPI:
     """
     Cria e configura a aplicação FastAPI.
@@ -18,6 +66,8 @@ def create_app() -> FastAPI:
             "O agente é acolhedor, ético e não substitui avaliação médica."
         ),
         version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
     app.add_middleware(
         CORSMiddleware,
@@ -30,6 +80,10 @@ def create_app() -> FastAPI:
   
     app.include_router(health.router)
     app.include_router(chat.router)
+    app.include_router(webhook.router)
+    app.include_router(metrics.router)
+    app.include_router(triages.router)
+    app.include_router(conversations.router)
 
     return app
 
@@ -38,9 +92,14 @@ app = create_app()
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-    )
+    if settings.WORKERS > 1:
+        from app.cluster import main as run_cluster
+
+        run_cluster()
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=settings.APP_HOST,
+            port=settings.APP_PORT,
+            reload=settings.ENV == "dev",
+        )
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from app.services.persistence import PersistenceService
 from app.schemas.chat import ChatRequest, ChatResponse
 
@@ -36,3 +36,21 @@ class ChatRepository:
             List[Dict[str, Any]]: Lista de mensagens.
         """
         return await self.persistence.get_conversation(conversation_id)
+
+    async def get_conversation_page(
+        self, conversation_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Recupera uma página do histórico de uma conversa (mais recentes primeiro).
+
+        Args:
+            conversation_id (str): Identificador da conversa.
+            limit (int): Tamanho da página.
+            cursor (Optional[str]): Cursor devolvido pela página anterior.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Página e próximo cursor.
+        """
+        return await self.persistence.list_messages(
+            limit=limit, cursor=cursor, conversation_id=conversation_id
+        )
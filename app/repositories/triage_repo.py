@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from app.services.persistence import PersistenceService
 
 
@@ -35,3 +35,16 @@ class TriageRepository:
             Optional[Dict[str, Any]]: Documento da triagem, se existir.
         """
         return await self.persistence.get_triage(conversation_id)
+
+    async def list(self, **filters: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Lista triagens com paginação por cursor.
+
+        Args:
+            **filters: Parâmetros de `PersistenceService.list_triages`
+                       (limit, cursor, intensidade, datas, canal, campos).
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Página e próximo cursor.
+        """
+        return await self.persistence.list_triages(**filters)
@@ -0,0 +1,55 @@
+import hmac
+from typing import Optional
+from fastapi import HTTPException, WebSocketException, status
+from starlette.requests import HTTPConnection
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+STAFF_AUTH_REJECTED_TOTAL = REGISTRY.counter(
+    "clinicai_staff_auth_rejected_total",
+    "Chamadas às rotas da equipe recusadas na autenticação.",
+    ("reason",),
+)
+
+
+def _bearer_token(connection: HTTPConnection) -> Optional[str]:
+    """
+    Token enviado em `Authorization: Bearer <token>` ou, para clientes que
+    não definem cabeçalhos (EventSource e WebSocket no navegador), no
+    parâmetro `access_token`.
+    """
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+    return connection.query_params.get("access_token") or None
+
+
+async def require_staff(connection: HTTPConnection) -> None:
+    """
+    Autentica as rotas da equipe médica (triagens, fila, feed e histórico),
+    que expõem dados de saúde dos pacientes, com o token `STAFF_API_TOKEN`.
+
+    Sem `STAFF_API_TOKEN` configurado, todas as chamadas são recusadas.
+
+    Raises:
+        HTTPException: 401 se o token estiver ausente ou não conferir.
+        WebSocketException: 1008 (violação de política) no WebSocket.
+    """
+    expected = settings.STAFF_API_TOKEN
+    token = _bearer_token(connection)
+    if not expected:
+        reason = "unconfigured"
+    elif token is None:
+        reason = "missing"
+    elif not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        reason = "invalid"
+    else:
+        return
+    STAFF_AUTH_REJECTED_TOTAL.inc(reason=reason)
+    if connection.scope["type"] == "websocket":
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Não autenticado.")
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Não autenticado.",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from functools import lru_cache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from app.cluster import NEW_CONVERSATION_HEADER, is_new_conversation
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.services.chat_service import ChatService
+from app.services.replies import REPLIES
+from app.utils.tracing import start_trace
 
 router = APIRouter(prefix="/chat", tags=["chat"])
+
+
+@lru_cache
 def get_chat_service() -> ChatService:
+    """Retorna a instância compartilhada do serviço de chat."""
     return ChatService()
 
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_200_OK)
 async def chat_endpoint(
     payload: ChatRequest,
+    request: Request,
     service: ChatService = Depends(get_chat_service)
 ):
     """
@@ -21,13 +30,37 @@ async def chat_endpoint(
       mensagem do usuário, canal e identificador do usuário).
     - **Response body**: ChatResponse (contendo identificador da conversa,
       mensagem de resposta do agente e timestamp).
+    - **Serialização**: a resposta é serializada direto pelo Pydantic
+      (`model_dump_json`), sem a revalidação do `response_model`; respostas
+      fixas (emergência, encerramento, alta demanda) usam o corpo pré-renderizado.
+    - **Rastreamento**: abre o trace raiz do turno, continuando o
+      cabeçalho `traceparent` quando enviado.
+    - **Multi-worker**: conversas criadas pelo proxy (`app.cluster`) chegam
+      com `conversation_id` e a marca de conversa nova, e são tratadas
+      como novas.
     - **Erros possíveis**:
         - 500: Erro interno no processamento da mensagem.
     """
     try:
-        return await service.process_message(payload)
+        with start_trace(
+            "POST /chat/",
+            traceparent=request.headers.get("traceparent"),
+            channel=payload.channel or "web",
+        ):
+            new_conversation = is_new_conversation(
+                payload.conversation_id, request.headers.get(NEW_CONVERSATION_HEADER)
+            )
+            result = await service.process_message(payload, new_conversation=new_conversation)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro interno no processamento da mensagem: {str(e)}"
         )
+
+    canned = REPLIES.match(result.response)
+    if canned is not None:
+        return Response(
+            content=canned.web_payload(result.conversation_id, result.timestamp),
+            media_type="application/json",
+        )
+    return Response(content=result.model_dump_json(), media_type="application/json")
@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.routes.auth import require_staff
+from app.routes.triages import get_persistence_service, parse_fields
+from app.schemas.pagination import Page
+from app.services.persistence import PersistenceService
+from app.utils.pagination import serialize_document
+
+router = APIRouter(prefix="/conversations", tags=["conversations"], dependencies=[Depends(require_staff)])
+
+
+async def _message_page(persistence: PersistenceService, **kwargs) -> Page:
+    try:
+        docs, next_cursor = await persistence.list_messages(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Page(items=[serialize_document(d) for d in docs], next_cursor=next_cursor)
+
+
+@router.get("", response_model=Page)
+async def list_messages(
+    cursor: Optional[str] = Query(None, description="Cursor devolvido pela página anterior"),
+    limit: int = Query(50, ge=1, le=500, description="Tamanho da página"),
+    since: Optional[datetime] = Query(None, description="Mensagens a partir desta data"),
+    until: Optional[datetime] = Query(None, description="Mensagens até esta data"),
+    channel: Optional[Literal["whatsapp", "web"]] = Query(None, description="Canal de origem"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    persistence: PersistenceService = Depends(get_persistence_service),
+) -> Page:
+    """
+    Listagem das interações de todas as conversas, com paginação por cursor
+    sobre `(timestamp, _id)` (mais recentes primeiro).
+
+    - **Erros possíveis**:
+        - 400: Cursor ou campo de projeção inválido.
+    """
+    return await _message_page(
+        persistence, limit=limit, cursor=cursor, since=since, until=until,
+        channel=channel, fields=parse_fields(fields),
+    )
+
+
+@router.get("/{conversation_id}/messages", response_model=Page)
+async def list_conversation_messages(
+    conversation_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor devolvido pela página anterior"),
+    limit: int = Query(50, ge=1, le=500, description="Tamanho da página"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    persistence: PersistenceService = Depends(get_persistence_service),
+) -> Page:
+    """
+    Histórico de uma conversa, paginado por cursor (mais recentes primeiro).
+
+    - **Erros possíveis**:
+        - 400: Cursor ou campo de projeção inválido.
+    """
+    return await _message_page(
+        persistence, limit=limit, cursor=cursor, conversation_id=conversation_id,
+        fields=parse_fields(fields),
+    )
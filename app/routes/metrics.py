@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Exposição das métricas no formato texto do Prometheus.
+
+    Inclui histogramas de latência por nó do grafo, operação no MongoDB,
+    chamada ao LLM, envio ao WhatsApp, carga de histórico e turno completo.
+
+    - **Erros possíveis**:
+        - 404: Métricas desativadas (`METRICS_ENABLED=False`).
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Métricas desativadas.")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,245 @@
+import asyncio
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from typing import IO, Iterator, List, Literal, Optional
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from app.routes.auth import require_staff
+from app.schemas.pagination import Page
+from app.schemas.triage import QueueAction
+from app.services.export import TriageExporter
+from app.services.persistence import PersistenceService
+from app.services.triage_feed import TriageFeed, sse_events
+from app.services.triage_queue import TriageQueue
+from app.settings import settings
+from app.utils.pagination import serialize_document
+
+router = APIRouter(prefix="/triages", tags=["triages"], dependencies=[Depends(require_staff)])
+
+
+@lru_cache
+def get_persistence_service() -> PersistenceService:
+    """Retorna a instância compartilhada do serviço de persistência."""
+    return PersistenceService()
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Converte `?fields=a,b` em lista de campos (None = documento inteiro)."""
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
+@lru_cache
+def get_triage_feed() -> TriageFeed:
+    """Retorna o feed compartilhado de novas triagens (um observador por processo)."""
+    return TriageFeed(get_persistence_service())
+
+
+@router.get("", response_model=Page)
+async def list_triages(
+    cursor: Optional[str] = Query(None, description="Cursor devolvido pela página anterior"),
+    limit: int = Query(50, ge=1, le=500, description="Tamanho da página"),
+    min_intensity: Optional[int] = Query(None, ge=0, le=10, description="Intensidade mínima"),
+    max_intensity: Optional[int] = Query(None, ge=0, le=10, description="Intensidade máxima"),
+    since: Optional[datetime] = Query(None, description="Criadas a partir desta data"),
+    until: Optional[datetime] = Query(None, description="Criadas até esta data"),
+    channel: Optional[Literal["whatsapp", "web"]] = Query(None, description="Canal de origem"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+    persistence: PersistenceService = Depends(get_persistence_service),
+) -> Page:
+    """
+    Listagem de triagens com paginação por cursor (mais recentes primeiro).
+
+    A paginação usa a chave `(created_at, _id)`: o custo de cada página não
+    depende da sua profundidade. Envie `next_cursor` como `cursor` para
+    obter a página seguinte.
+
+    - **Erros possíveis**:
+        - 400: Cursor ou campo de projeção inválido.
+    """
+    try:
+        docs, next_cursor = await persistence.list_triages(
+            limit=limit,
+            cursor=cursor,
+            min_intensity=min_intensity,
+            max_intensity=max_intensity,
+            since=since,
+            until=until,
+            channel=channel,
+            fields=parse_fields(fields),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Page(items=[serialize_document(d) for d in docs], next_cursor=next_cursor)
+
+
+def _read_chunks(output: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Lê um arquivo temporário em blocos e o fecha ao final."""
+    try:
+        while chunk := output.read(chunk_size):
+            yield chunk
+    finally:
+        output.close()
+
+
+@router.get("/export")
+async def export_triages(
+    since: Optional[datetime] = Query(None, description="Exporta triagens criadas a partir desta data"),
+    after_id: Optional[str] = Query(
+        None, description="`id` da última linha recebida; com `since`, exporta só as posteriores a ela"
+    ),
+    format: Literal["ndjson", "parquet"] = Query("ndjson", description="Formato da exportação"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10_000, description="Tamanho do lote do cursor"),
+    persistence: PersistenceService = Depends(get_persistence_service),
+) -> StreamingResponse:
+    """
+    Exportação das triagens em NDJSON (streaming) ou Parquet.
+
+    As triagens são lidas em lotes por um cursor do MongoDB, em ordem de
+    `(created_at, id)`. Em NDJSON, são enviadas à medida que chegam, com
+    memória constante no servidor; em Parquet, o arquivo é montado em disco
+    temporário e enviado ao final. Para exportações incrementais, repasse
+    o `created_at` e o `id` da última linha recebida como `since` e
+    `after_id`: a próxima chamada começa logo depois dela, sem repetir nem
+    pular linhas. Só com `since`, o limite é inclusivo (linhas com o mesmo
+    `created_at` podem se repetir). Triagens com menos de
+    `EXPORT_SETTLE_SECONDS` ficam para a chamada seguinte.
+
+    - **Response body**: uma triagem por linha (`application/x-ndjson`) ou
+      arquivo Parquet (`application/vnd.apache.parquet`).
+    - **Erros possíveis**:
+        - 400: `after_id` inválido ou sem `since`.
+        - 501: Parquet sem o pacote `pyarrow` instalado.
+    """
+    if after_id is not None and (since is None or not ObjectId.is_valid(after_id)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after_id deve ser o id da última linha exportada, junto com since.",
+        )
+    cursor_id = ObjectId(after_id) if after_id else None
+    exporter = TriageExporter(persistence, batch_size=batch_size)
+    if format == "ndjson":
+        return StreamingResponse(exporter.stream_ndjson(since, cursor_id), media_type="application/x-ndjson")
+
+    output = tempfile.TemporaryFile()
+    try:
+        await exporter.write_parquet(output, since, cursor_id)
+    except RuntimeError as e:
+        output.close()
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    output.seek(0)
+    return StreamingResponse(
+        _read_chunks(output),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": 'attachment; filename="triagens.parquet"'},
+    )
+
+
+def get_triage_queue(
+    persistence: PersistenceService = Depends(get_persistence_service),
+) -> TriageQueue:
+    """Fila de urgência sobre a persistência compartilhada."""
+    return TriageQueue(persistence)
+
+
+@router.get("/queue", response_model=Page)
+async def list_queue(
+    limit: int = Query(20, ge=1, le=200, description="Quantidade de triagens"),
+    queue: TriageQueue = Depends(get_triage_queue),
+) -> Page:
+    """
+    Próximas triagens pendentes, da mais urgente à menos urgente.
+
+    Cada item traz `urgency_score` (intensidade e sinais de emergência) e
+    `effective_priority` (score acrescido do tempo de espera).
+    """
+    docs = await queue.pending(limit)
+    return Page(items=[serialize_document(d) for d in docs])
+
+
+@router.post("/queue/claim")
+async def claim_triage(payload: QueueAction, queue: TriageQueue = Depends(get_triage_queue)):
+    """
+    Assume atomicamente a triagem pendente mais urgente.
+
+    - **Response body**: triagem assumida.
+    - **204**: fila vazia.
+    """
+    doc = await queue.claim(payload.staff_id)
+    if doc is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return serialize_document(doc)
+
+
+@router.post("/queue/{triage_id}/complete")
+async def complete_triage(
+    triage_id: str, payload: QueueAction, queue: TriageQueue = Depends(get_triage_queue)
+) -> dict:
+    """
+    Conclui uma triagem assumida pelo profissional.
+
+    - **Erros possíveis**:
+        - 404: Triagem inexistente ou não assumida por este profissional.
+    """
+    if not await queue.complete(triage_id, payload.staff_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Triagem não assumida.")
+    return {"status": "done"}
+
+
+@router.post("/queue/{triage_id}/release")
+async def release_triage(
+    triage_id: str, payload: QueueAction, queue: TriageQueue = Depends(get_triage_queue)
+) -> dict:
+    """
+    Devolve à fila uma triagem assumida, mantendo sua prioridade.
+
+    - **Erros possíveis**:
+        - 404: Triagem inexistente ou não assumida por este profissional.
+    """
+    if not await queue.release(triage_id, payload.staff_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Triagem não assumida.")
+    return {"status": "pending"}
+
+
+@router.get("/stream")
+async def stream_triages(feed: TriageFeed = Depends(get_triage_feed)) -> StreamingResponse:
+    """
+    Feed de novas triagens via Server-Sent Events.
+
+    - **Eventos**: `triage` (resumo da triagem em JSON) e `dropped` (cliente
+      desconectado por não acompanhar o ritmo do feed; reconecte).
+    """
+    subscription = await feed.subscribe()
+    return StreamingResponse(
+        sse_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def triages_websocket(websocket: WebSocket, feed: TriageFeed = Depends(get_triage_feed)) -> None:
+    """
+    Feed de novas triagens via WebSocket (uma mensagem JSON por triagem).
+
+    Clientes que não acompanham o feed são desconectados com o código 1013.
+    """
+    await websocket.accept()
+    subscription = await feed.subscribe()
+    async with subscription:
+        try:
+            while True:
+                try:
+                    event = await subscription.get(timeout=settings.FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    await websocket.send_text('{"type": "keep-alive"}')
+                    continue
+                if event is None:
+                    await websocket.close(code=1013 if subscription.dropped else 1000)
+                    return
+                await websocket.send_text(event)
+        except WebSocketDisconnect:
+            return
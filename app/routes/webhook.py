@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Request, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
-from app.schemas.whatsapp import WhatsAppWebhookPayload, WhatsAppSendMessage
+from functools import lru_cache
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from loguru import logger
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
+from app.routes.chat import get_chat_service
+from app.schemas.chat import ChatRequest
+from app.schemas.whatsapp import WEBHOOK_PAYLOAD_ADAPTER, WhatsAppSendMessage, WhatsAppWebhookPayload
+from app.services.chat_service import ChatService
+from app.services.pseudonymizer import Pseudonymizer, get_pseudonymizer
+from app.services.replies import REPLIES
 from app.services.whatsapp import WhatsAppService
-from app.services.triage_guard import TriageGuard
-from app.services.llm import LLMService
-from app.services.persistence import PersistenceService
 from app.settings import settings
-import hashlib
+from app.utils.hashing import Hasher
+from app.utils.metrics import REGISTRY
+from app.utils.tracing import start_trace
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
@@ -30,62 +39,156 @@ async def verify_webhook(
     raise HTTPException(status_code=403, detail="Token inválido para verificação.")
 
 
-@router.post("/whatsapp")
-async def receive_webhook(payload: WhatsAppWebhookPayload, request: Request):
+WEBHOOK_SIGNATURE_REJECTED_TOTAL = REGISTRY.counter(
+    "clinicai_webhook_signature_rejected_total",
+    "Chamadas ao webhook recusadas na verificação da assinatura.",
+    ("reason",),
+)
+
+
+def check_signature_secret() -> None:
+    """
+    Valida, na inicialização, a configuração da assinatura do webhook.
+
+    Fora de `ENV=dev`, o App Secret é obrigatório: sem ele o webhook
+    aceitaria chamadas forjadas.
+
+    Raises:
+        RuntimeError: Se `WHATSAPP_APP_SECRET` faltar fora do desenvolvimento.
+    """
+    if settings.WHATSAPP_APP_SECRET:
+        return
+    if settings.ENV != "dev":
+        raise RuntimeError(
+            f"WHATSAPP_APP_SECRET é obrigatório com ENV={settings.ENV}: "
+            "sem ele a assinatura do webhook não é verificada."
+        )
+    logger.warning("WHATSAPP_APP_SECRET ausente: assinatura do webhook não será verificada (ENV=dev).")
+
+
+@lru_cache
+def get_signature_hasher() -> Optional[Hasher]:
+    """
+    Retorna o HMAC do webhook, com o App Secret do Meta como chave.
+
+    Sem `WHATSAPP_APP_SECRET`, a verificação fica desativada; isso só é
+    permitido com `ENV=dev` (ver `check_signature_secret`).
+    """
+    if not settings.WHATSAPP_APP_SECRET:
+        return None
+    return Hasher(settings.WHATSAPP_APP_SECRET)
+
+
+async def verified_body(
+    request: Request,
+    hasher: Optional[Hasher] = Depends(get_signature_hasher),
+) -> bytes:
+    """
+    Lê o corpo bruto uma única vez e verifica `X-Hub-Signature-256`.
+
+    Os mesmos bytes são devolvidos para a validação do payload, de modo que
+    chamadas não assinadas são recusadas antes de qualquer parse.
+
+    Raises:
+        HTTPException: 401 se a assinatura estiver ausente ou não conferir.
+    """
+    body = await request.body()
+    if hasher is None:
+        return body
+    signature = request.headers.get("x-hub-signature-256")
+    if not signature:
+        WEBHOOK_SIGNATURE_REJECTED_TOTAL.inc(reason="missing")
+        raise HTTPException(status_code=401, detail="Assinatura ausente.")
+    if not hasher.verify_signature(body, signature):
+        WEBHOOK_SIGNATURE_REJECTED_TOTAL.inc(reason="invalid")
+        raise HTTPException(status_code=401, detail="Assinatura inválida.")
+    return body
+
+
+@lru_cache
+def get_whatsapp_service() -> WhatsAppService:
+    """Retorna o cliente compartilhado da WhatsApp Cloud API."""
+    return WhatsAppService()
+
+
+@router.post(
+    "/whatsapp",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": f"Evento do Meta no formato `{WhatsAppWebhookPayload.__name__}`.",
+            "content": {"application/json": {"schema": {"type": "object"}}},
+        }
+    },
+)
+async def receive_webhook(
+    request: Request,
+    body: bytes = Depends(verified_body),
+    chat_service: ChatService = Depends(get_chat_service),
+    whatsapp_service: WhatsAppService = Depends(get_whatsapp_service),
+    pseudonymizer: Pseudonymizer = Depends(get_pseudonymizer),
+):
     """
     Endpoint POST para recepção de mensagens do WhatsApp.
 
     Fluxo:
-    1. Recebe payload no formato `WhatsAppWebhookPayload`.
+    1. Verifica a assinatura `X-Hub-Signature-256` sobre o corpo bruto
+       (com `WHATSAPP_APP_SECRET`) e valida, a partir dos mesmos bytes,
+       apenas os campos lidos do `WhatsAppWebhookPayload` (`WhatsAppInboundPayload`).
     2. Extrai mensagem e número do usuário.
-    3. Aplica guard de triagem (detecção de emergências).
-    4. Encaminha para o LLM para condução da triagem.
-    5. Salva conversa no banco de dados.
-    6. Responde ao usuário via WhatsApp API.
+    3. Encaminha ao `ChatService` (guard de emergência, grafo de triagem
+       e persistência), usando o pseudônimo do telefone (`Pseudonymizer`)
+       como conversa.
+    4. Responde ao usuário via WhatsApp API (respostas fixas usam o corpo
+       pré-renderizado do registro de respostas).
+
+    Eventos sem mensagens (ex.: status de entrega) são ignorados.
+    Cada mensagem abre o trace raiz propagado até o envio da resposta.
 
     Regras:
     - Nunca gera diagnóstico ou tratamento.
     - Interrompe triagem em caso de emergência e orienta procurar ajuda imediata.
     """
-    whatsapp_service = WhatsAppService()
-    llm_service = LLMService()
-    persistence = PersistenceService()
-    guard = TriageGuard()
-
     try:
+        payload = WEBHOOK_PAYLOAD_ADAPTER.validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
 
+    try:
         change = payload.entry[0].changes[0].value
+        if not change.messages:
+            return ORJSONResponse(content={"status": "ignored"})
+
         msg = change.messages[0]
         user_number = msg.from_
         user_text = msg.text.body if msg.text else ""
 
-        phone_hash = hashlib.sha256(
-            f"{user_number}{settings.HASH_SALT}".encode()
-        ).hexdigest()
-
-        if guard.is_emergency(user_text):
-            emergency_reply = (
-                "Entendi. Seus sintomas podem indicar uma situação de emergência. "
-                "Por favor, procure o pronto-socorro mais próximo ou ligue 192 imediatamente."
-            )
-            await whatsapp_service.send_message(
-                WhatsAppSendMessage(to=user_number, text={"body": emergency_reply})
+        phone_hash = pseudonymizer.pseudonymize(user_number)
+
+        with start_trace(
+            "POST /webhook/whatsapp",
+            traceparent=request.headers.get("traceparent"),
+            channel="whatsapp",
+            conversation_id=phone_hash,
+        ):
+            result = await chat_service.process_message(
+                ChatRequest(
+                    conversation_id=phone_hash,
+                    user_id=phone_hash,
+                    channel="whatsapp",
+                    message=user_text,
+                )
             )
-            persistence.save_message(phone_hash, user_text, emergency_reply)
-            return JSONResponse(content={"status": "emergency_handled"})
 
-       
-        agent_reply = await llm_service.get_reply(user_text, session_id=phone_hash)
-
-       
-        persistence.save_message(phone_hash, user_text, agent_reply)
-
-   
-        await whatsapp_service.send_message(
-            WhatsAppSendMessage(to=user_number, text={"body": agent_reply})
-        )
+            canned = REPLIES.match(result.response)
+            if canned is not None:
+                await whatsapp_service.send_raw(canned.whatsapp_payload(user_number))
+            else:
+                await whatsapp_service.send_message(
+                    WhatsAppSendMessage(to=user_number, text={"body": result.response})
+                )
 
-        return JSONResponse(content={"status": "ok"})
+        return ORJSONResponse(content={"status": "ok", "last_response": result.response})
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no processamento: {str(e)}")
@@ -0,0 +1,19 @@
+"""
+Schemas de resposta das listagens paginadas por cursor.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Page(BaseModel):
+    """Página de resultados de uma listagem com paginação por cursor."""
+
+    items: List[Dict[str, Any]] = Field(
+        default_factory=list, description="Documentos da página (mais recentes primeiro)."
+    )
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Cursor opaco para a próxima página (None quando não há mais resultados).",
+    )
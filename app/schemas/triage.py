@@ -47,3 +47,9 @@ class Triage(BaseModel):
                 "medidas_tomadas": "Tomou analgésico, sem melhora.",
             }
         }
+
+
+class QueueAction(BaseModel):
+    """Identificação do profissional que opera a fila de triagens."""
+
+    staff_id: str = Field(..., description="Identificador do profissional da equipe médica.")
@@ -1,5 +1,5 @@
-from typing import Optional, List, Dict
-from pydantic import BaseModel, Field, root_validator
+from typing import Optional, List, Dict, Literal
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
 
 
 class WhatsAppProfile(BaseModel):
@@ -53,19 +53,57 @@ class WhatsAppWebhookPayload(BaseModel):
     entry: List[WhatsAppEntry]
 
 
+class WhatsAppInboundText(BaseModel):
+    """Corpo de texto de uma mensagem recebida."""
+    body: str = ""
+
+
+class WhatsAppInboundMessage(BaseModel):
+    """Mensagem recebida, apenas com os campos lidos pelo webhook."""
+    from_: str = Field(..., alias="from")
+    text: Optional[WhatsAppInboundText] = None
+
+
+class WhatsAppInboundValue(BaseModel):
+    """Valor de uma mudança; eventos de status chegam sem `messages`."""
+    messages: Optional[List[WhatsAppInboundMessage]] = None
+
+
+class WhatsAppInboundChange(BaseModel):
+    value: WhatsAppInboundValue
+
+
+class WhatsAppInboundEntry(BaseModel):
+    changes: List[WhatsAppInboundChange]
+
+
+class WhatsAppInboundPayload(BaseModel):
+    """
+    Visão enxuta de `WhatsAppWebhookPayload` usada no recebimento.
+
+    Campos não lidos pelo webhook (`contacts`, `metadata`, `statuses`, ids e
+    timestamps) são ignorados sem construir modelos, o que reduz o custo de
+    validação de lotes grandes enviados pelo Meta.
+    """
+    entry: List[WhatsAppInboundEntry]
+
+
+WEBHOOK_PAYLOAD_ADAPTER = TypeAdapter(WhatsAppInboundPayload)
+
+
 class WhatsAppSendMessage(BaseModel):
     """
     Estrutura para envio de mensagens ao WhatsApp.
     Usada pelo cliente WhatsAppService.
     """
-    messaging_product: str = Field("whatsapp", const=True)
+    messaging_product: Literal["whatsapp"] = "whatsapp"
     to: str
-    type: str = Field("text", const=True)
+    type: Literal["text"] = "text"
     text: WhatsAppText
 
-    @root_validator
-    def ensure_text_when_type_text(cls, values):
+    @model_validator(mode="after")
+    def ensure_text_when_type_text(self) -> "WhatsAppSendMessage":
         """Valida que mensagens de texto contenham corpo obrigatório."""
-        if values.get("type") == "text" and not values.get("text"):
+        if self.type == "text" and not self.text:
             raise ValueError("Mensagens de texto precisam de campo 'text.body'")
-        return values
+        return self
@@ -0,0 +1,142 @@
+"""
+Controle de admissão de turnos – ClinicAI
+-----------------------------------------
+Protege o processo quando o LLM ou o MongoDB ficam lentos:
+
+- No máximo `ADMISSION_MAX_IN_FLIGHT` turnos são processados ao mesmo tempo.
+- Conversas em andamento nunca são recusadas: acima do limite, aguardam
+  uma vaga (o tempo de espera é medido).
+- Conversas novas são recusadas enquanto o processo estiver saturado (sem
+  vaga livre ou com espera média acima de `ADMISSION_MAX_WAIT_SECONDS`) e
+  recebem a resposta de alta demanda.
+- A detecção de emergência (`TriageGuard`) acontece antes da admissão e,
+  portanto, é sempre honrada.
+
+"Em andamento" significa que a conversa teve um turno admitido neste processo
+nos últimos `ADMISSION_SESSION_IDLE_SECONDS`; com vários workers, o roteamento
+fixo por conversa (`app.cluster`) garante que ela volte ao mesmo processo.
+Fora desse registro (processo reiniciado, pausa longa, sessão descartada
+pelo limite), a conversa ainda conta como em andamento se tiver estado
+salvo: quem chama informa `has_state` (o checkpoint do grafo), consultado
+apenas antes de uma recusa.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "clinicai_admission_in_flight", "Turnos em processamento."
+)
+ADMISSION_SHED_TOTAL = REGISTRY.counter(
+    "clinicai_admission_shed_total", "Conversas novas recusadas por sobrecarga.", ("channel",)
+)
+ADMISSION_DEFERRED_TOTAL = REGISTRY.counter(
+    "clinicai_admission_deferred_total", "Turnos de conversas em andamento que aguardaram vaga.", ("channel",)
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "clinicai_admission_wait_seconds", "Espera por vaga antes do processamento do turno.", ("channel",)
+)
+
+WAIT_SMOOTHING = 0.2
+
+
+class AdmissionController:
+    """
+    Limita os turnos simultâneos e decide quais conversas novas admitir.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        session_idle: Optional[float] = None,
+        max_sessions: int = 100_000,
+    ) -> None:
+        self.max_in_flight = max_in_flight or settings.ADMISSION_MAX_IN_FLIGHT
+        self.max_wait = settings.ADMISSION_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        self.session_idle = session_idle or settings.ADMISSION_SESSION_IDLE_SECONDS
+        self.max_sessions = max_sessions
+        self.in_flight = 0
+        self.recent_wait = 0.0
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._sessions: "OrderedDict[str, float]" = OrderedDict()
+
+    @property
+    def overloaded(self) -> bool:
+        """Sem vaga livre ou, com turnos em andamento, espera recente acima do limite."""
+        return self._slots.locked() or (self.in_flight > 0 and self.recent_wait > self.max_wait)
+
+    def is_active(self, conversation_id: Optional[str]) -> bool:
+        """Se a conversa teve um turno admitido recentemente neste processo."""
+        if conversation_id is None:
+            return False
+        seen = self._sessions.get(conversation_id)
+        return seen is not None and time.monotonic() - seen <= self.session_idle
+
+    def touch(self, conversation_id: str) -> None:
+        """Marca a conversa como em andamento."""
+        self._sessions[conversation_id] = time.monotonic()
+        self._sessions.move_to_end(conversation_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def forget(self, conversation_id: str) -> None:
+        """Remove a conversa encerrada; um novo contato será uma conversa nova."""
+        self._sessions.pop(conversation_id, None)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        conversation_id: Optional[str],
+        channel: str = "web",
+        has_state: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[bool]:
+        """
+        Reserva uma vaga para o turno.
+
+        Args:
+            conversation_id (Optional[str]): Conversa informada na requisição
+                (None para conversas novas no chat web).
+            channel (str): Canal, usado como rótulo das métricas.
+            has_state (Optional[Callable[[], Awaitable[bool]]]): Se a
+                conversa já tem estado salvo; consultado sob sobrecarga
+                para conversas fora do registro deste processo.
+
+        Yields:
+            bool: True se o turno foi admitido; False se deve receber a
+            resposta de alta demanda.
+        """
+        if (
+            not self.is_active(conversation_id)
+            and self.overloaded
+            and not (has_state is not None and await has_state())
+        ):
+            ADMISSION_SHED_TOTAL.inc(channel=channel)
+            yield False
+            return
+
+        started = time.perf_counter()
+        if self._slots.locked():
+            ADMISSION_DEFERRED_TOTAL.inc(channel=channel)
+        await self._slots.acquire()
+        waited = time.perf_counter() - started
+        ADMISSION_WAIT_SECONDS.observe(waited, channel=channel)
+        self.recent_wait += WAIT_SMOOTHING * (waited - self.recent_wait)
+
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        if conversation_id is not None:
+            self.touch(conversation_id)
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.set(self.in_flight)
+            self._slots.release()
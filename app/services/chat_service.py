@@ -1,12 +1,44 @@
+import asyncio
+import time
 from datetime import datetime
+from bson import ObjectId
+from loguru import logger
+from typing import Any, List, Optional
 from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.admission import AdmissionController
 from app.services.llm import LLMService
-from app.services.persistence import PersistenceService
+from app.services.persistence import AGENT, PersistenceService, Turn
+from app.services.replies import (
+    CLOSING,
+    EMERGENCY,
+    ERROR,
+    OVERLOAD,
+    REPLIES,
+    WAITING,
+    is_closing_reply,
+    is_emergency_reply,
+)
 from app.services.triage_guard import TriageGuard
 from app.agents.graph import TriageAgent
+from app.utils.logging import SAMPLED, conversation_tag, sample_turn
+from app.utils.metrics import HISTORY_LOAD_SECONDS, TURN_PREPARE_SECONDS, TURN_SECONDS, timed
+from app.utils.tracing import current_span, start_span
 import uuid
 
 
+def _discard(task: Optional["asyncio.Task[Any]"]) -> None:
+    """
+    Descarta uma leitura antecipada não aproveitada (emergência, recusa por
+    sobrecarga ou erro), cancelando-a ou consumindo o seu erro.
+    """
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
 class ChatService:
     """
     Serviço responsável por orquestrar o fluxo do chat de triagem.
@@ -16,133 +48,236 @@ class ChatService:
     - Detectar situações de emergência via TriageGuard.
     - Acionar o grafo de triagem (TriageAgent) para conduzir a coleta estruturada.
     - Controlar o momento de persistência final da triagem no banco de dados.
+    - Recusar conversas novas sob sobrecarga (AdmissionController), sem
+      nunca deixar de responder a emergências.
     """
 
     def __init__(
         self,
-        llm_client: LLMService = LLMService(),
-        persistence: PersistenceService = PersistenceService(),
-        guard: TriageGuard = TriageGuard(),
-        triage_agent: TriageAgent = TriageAgent(),
+        llm_client: Optional[LLMService] = None,
+        persistence: Optional[PersistenceService] = None,
+        guard: Optional[TriageGuard] = None,
+        triage_agent: Optional[TriageAgent] = None,
+        admission: Optional[AdmissionController] = None,
     ):
-        self.llm_client = llm_client
-        self.persistence = persistence
-        self.guard = guard
-        self.triage_agent = triage_agent
-    async def _get_relevant_history(self, conversation_id: str):
-        history = await self.persistence.get_conversation(conversation_id, limit=50)
+        self.llm_client = llm_client or LLMService()
+        self.persistence = persistence or PersistenceService()
+        self.guard = guard or TriageGuard()
+        self.triage_agent = triage_agent or TriageAgent(
+            llm=self.llm_client, persistence=self.persistence
+        )
+        self.admission = admission or AdmissionController()
 
-        cutoff_index = None
-        for i, msg in reversed(list(enumerate(history))):
+    async def _get_relevant_history(
+        self, conversation_id: str, exclude_id: Any = None
+    ) -> List[Turn]:
+        """
+        Turnos da sessão atual da conversa: os posteriores à última resposta
+        que encerrou uma sessão (emergência ou triagem registrada).
 
-            if any(keyword in msg["agent_message"].lower() for keyword in [
-                "procure imediatamente o pronto-socorro",
-                "Sua triagem foi registrada e será encaminhada para nossa equipe médica"
-            ]):
-                return []
+        Args:
+            conversation_id (str): Identificador da conversa.
+            exclude_id (Any): `_id` do turno atual, que fica de fora do histórico.
+        """
+        with timed(HISTORY_LOAD_SECONDS):
+            history = await self.persistence.get_turns(conversation_id, limit=50, exclude_id=exclude_id)
+
+        cutoff_index = None
+        for i in range(len(history) - 1, -1, -1):
+            turn = history[i]
+            if turn.role == AGENT and (is_emergency_reply(turn.text) or is_closing_reply(turn.text)):
+                cutoff_index = i
+                break
 
         if cutoff_index is not None:
             return history[cutoff_index + 1 :]
         return history
 
-    async def process_message(self, payload: ChatRequest) -> ChatResponse:
+    async def _load_context(self, conversation_id: str, message_id: Any) -> Optional[List[Turn]]:
+        """
+        Carrega o que o grafo precisa para retomar a conversa: nada se ela já
+        tem checkpoint (None), ou os turnos anteriores para semeá-la.
+
+        Args:
+            conversation_id (str): Identificador da conversa.
+            message_id (Any): `_id` reservado para o turno atual.
+        """
+        if await self.triage_agent.has_state(conversation_id):
+            return None
+        return await self._get_relevant_history(conversation_id, message_id)
+
+    async def process_message(self, payload: ChatRequest, new_conversation: bool = False) -> ChatResponse:
+        """
+        Processa um turno da conversa, medindo sua duração total.
+
+        Gera um conversation_id interno se vier None (conversa nova, sem
+        estado no checkpointer do grafo). `new_conversation` marca como nova
+        uma conversa cujo identificador já foi gerado antes (pelo proxy do
+        modo multi-worker). Os logs emitidos durante o turno
+        levam a conversa (hash curto) e o canal; o turno termina com um
+        registro de sucesso (amostrado, ver `LOG_SAMPLE_RATE`) ou de erro,
+        com a duração em `duration_ms`.
+        """
+        new_conversation = new_conversation or payload.conversation_id is None
+        if payload.conversation_id is None:
+            payload = payload.model_copy(update={"conversation_id": str(uuid.uuid4())})
+        channel = payload.channel or "web"
+        sampled = sample_turn()
+        start = time.perf_counter()
+        with logger.contextualize(
+            conversation=conversation_tag(payload.conversation_id),
+            channel=channel,
+            **{SAMPLED: sampled},
+        ):
+            try:
+                with timed(TURN_SECONDS, channel=channel):
+                    response = await self._process_turn(payload, new_conversation)
+            except Exception:
+                logger.exception(
+                    "Falha no turno", duration_ms=round((time.perf_counter() - start) * 1000, 2)
+                )
+                raise
+            if sampled:
+                logger.info(
+                    "Turno concluído",
+                    duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                    closed=response.conversation_id is None,
+                )
+        return response
+
+    async def _process_turn(self, payload: ChatRequest, new_conversation: bool = False) -> ChatResponse:
         """
         Processa uma mensagem recebida do usuário:
-        - Gera um conversation_id interno se vier None.
-        - Salva a mensagem no histórico.
-        - Verifica emergência via guard (encerra sem passar pelo grafo).
+        - Reserva o `_id` do turno.
+        - Em conversas existentes, dispara de imediato a leitura do estado
+          (checkpoint ou histórico), que corre durante o guard e a espera
+          por vaga.
+        - Verifica emergência via guard (encerra sem passar pelo grafo e
+          descarta o uso de tokens acumulado na sessão).
+        - Sob sobrecarga, responde conversas novas com a mensagem de alta
+          demanda, sem registrar o turno (conversas com checkpoint seguem
+          em andamento, mesmo fora do registro da admissão).
+        - Abre o registro do turno com a mensagem do usuário.
         - Chama o grafo de triagem.
         - Se a IA sinalizar emergência, força resposta fixa.
-        - Persiste a resposta.
+        - Grava a resposta no mesmo registro do turno.
         - Retorna conversation_id=None ao front quando a conversa encerrar.
         """
-        conv_id = payload.conversation_id or str(uuid.uuid4())
-        payload = payload.model_copy(update={"conversation_id": conv_id})
+        conv_id = payload.conversation_id
+        if new_conversation:
+            self.triage_agent.start_thread(conv_id)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("conversation_id", conv_id)
 
-        user_response = ChatResponse(
-            conversation_id=conv_id,
-            response=payload.message,
-            timestamp=datetime.utcnow(),
+        message_id = ObjectId()
+        prefetch = (
+            None if new_conversation else asyncio.create_task(self._load_context(conv_id, message_id))
         )
-        await self.persistence.save_message(payload, user_response)
+        try:
+            with start_span("guard.check"):
+                is_emergency = self.guard.is_emergency(payload.message)
 
-        if self.guard.is_emergency(payload.message):
-            response_text = (
-                "Entendi. Seus sintomas podem indicar uma situação de emergência. "
-                "Por favor, procure imediatamente o pronto-socorro mais próximo ou ligue para o 192."
-            )
-            persisted = ChatResponse(
-                conversation_id=conv_id,
-                response=response_text,
-                timestamp=datetime.utcnow(),
-            )
-            await self.persistence.save_message(payload, persisted)
+            if is_emergency:
+                _discard(prefetch)
+                self.admission.forget(conv_id)
+                self.triage_agent.llm.usage.pop(conv_id)
+                await asyncio.gather(
+                    self.persistence.save_user_message(payload, message_id),
+                    self.triage_agent.reset(conv_id),
+                )
+                return await self._reply_canned(message_id, conv_id, EMERGENCY)
 
-            return ChatResponse(
-                conversation_id=None,
-                response=response_text,
-                timestamp=persisted.timestamp,
-            )
+            async def has_checkpoint() -> bool:
+                # A leitura antecipada devolve None quando a conversa tem checkpoint.
+                return prefetch is not None and await prefetch is None
+
+            async with self.admission.slot(
+                conv_id, channel=payload.channel or "web", has_state=has_checkpoint
+            ) as admitted:
+                if not admitted:
+                    return REPLIES.get(OVERLOAD).chat_response(None)
+                response = await self._run_triage(payload, message_id, prefetch)
+        finally:
+            _discard(prefetch)
+        if response.conversation_id is None:
+            self.admission.forget(conv_id)
+        return response
+
+    async def _run_triage(
+        self,
+        payload: ChatRequest,
+        message_id: Any,
+        prefetch: Optional["asyncio.Task[Optional[List[Turn]]]"] = None,
+    ) -> ChatResponse:
+        """
+        Processa um turno admitido: registra a mensagem, conduz o grafo de
+        triagem a partir do último checkpoint da conversa e grava a resposta.
 
-        history_docs = await self._get_relevant_history(conv_id)
+        A gravação da mensagem do usuário e a leitura do estado da conversa
+        (`prefetch`, já em andamento) correm em paralelo: o turno espera pela
+        mais lenta, não pela soma das duas. Ambas terminam antes do grafo,
+        que precisa do contexto, e antes de `save_agent_reply`, que atualiza
+        o documento aberto pela gravação.
+
+        Conversas existentes sem checkpoint (ex.: anteriores ao checkpointer
+        ou após reiniciar com `GRAPH_CHECKPOINTER=memory`) são semeadas uma
+        única vez com o histórico de `messages`.
+        """
+        conv_id = payload.conversation_id
+        state = {
+            "conversation_id": conv_id,
+            "channel": payload.channel,
+            "user_message": payload.message,
+        }
+        with timed(TURN_PREPARE_SECONDS):
+            if prefetch is None:
+                await self.persistence.save_user_message(payload, message_id)
+                seed = None
+            else:
+                _, seed = await asyncio.gather(
+                    self.persistence.save_user_message(payload, message_id), prefetch
+                )
+        if seed is not None:
+            state["conversation_context"] = seed
 
-        graph = self.triage_agent.get_graph()
         try:
-            result_state = await graph.ainvoke(
-                {
-                    "conversation_id": conv_id,
-                    "user_message": payload.message,
-                    "conversation_context": history_docs,
-                },
-                config={"recursion_limit": 5},
-            )
+            result_state = await self.triage_agent.run(state)
             response_text = (
                 result_state.get("agent_message")
                 or result_state.get("agent_reply")
-                or "Ok, estou aguardando sua resposta."
+                or REPLIES.get(WAITING).text
             )
         except Exception as e:
             if str(e) == "__end__":
                 response_text = (
                     (locals().get("result_state") or {}).get("agent_message")
                     or (locals().get("result_state") or {}).get("agent_reply")
-                    or "Ok, estou aguardando sua resposta."
+                    or REPLIES.get(WAITING).text
                 )
             else:
-                print(f"Erro no grafo de triagem: {str(e)}")
-                response_text = (
-                    "Desculpe, houve um erro ao processar sua triagem. "
-                    "Pode reformular sua mensagem?"
-                )
+                logger.exception("Erro no grafo de triagem: {}", e)
+                return await self._reply_canned(message_id, conv_id, ERROR)
 
-        if "procure imediatamente o pronto-socorro" in response_text.lower():
-            response_text = (
-                "Entendi. Seus sintomas podem indicar uma situação de emergência. "
-                "Por favor, procure imediatamente o pronto-socorro mais próximo ou ligue para o 192."
-            )
-            persisted_agent = ChatResponse(
-                conversation_id=conv_id,
-                response=response_text,
-                timestamp=datetime.utcnow(),
-            )
-            await self.persistence.save_message(payload, persisted_agent)
+        if is_emergency_reply(response_text):
+            self.triage_agent.llm.usage.pop(conv_id)
+            await self.triage_agent.reset(conv_id)
+            return await self._reply_canned(message_id, conv_id, EMERGENCY)
 
-            return ChatResponse(
-                conversation_id=None,
-                response=response_text,
-                timestamp=persisted_agent.timestamp,
-            )
+        if response_text == REPLIES.get(CLOSING).text:
+            return await self._reply_canned(message_id, conv_id, CLOSING)
 
-        is_close = "sua triagem foi registrada" in response_text.lower()
+        is_close = is_closing_reply(response_text)
 
         persisted_agent = ChatResponse(
             conversation_id=conv_id,
             response=response_text,
             timestamp=datetime.utcnow(),
         )
-        await self.persistence.save_message(payload, persisted_agent)
+        await self.persistence.save_agent_reply(message_id, persisted_agent, closes_session=is_close)
 
         if is_close:
+            await self.triage_agent.reset(conv_id)
             return ChatResponse(
                 conversation_id=None,
                 response=response_text,
@@ -154,3 +289,17 @@ class ChatService:
             response=response_text,
             timestamp=persisted_agent.timestamp,
         )
+
+    async def _reply_canned(self, message_id: Any, conv_id: str, name: str) -> ChatResponse:
+        """
+        Grava e devolve uma resposta fixa do registro (`app.services.replies`).
+
+        Respostas que encerram a conversa (emergência, triagem registrada)
+        marcam o turno para compactação e devolvem conversation_id=None.
+        """
+        reply = REPLIES.get(name)
+        persisted = reply.chat_response(conv_id)
+        await self.persistence.save_agent_reply(message_id, persisted, closes_session=reply.closes_session)
+        if reply.closes_session:
+            return reply.chat_response(None, persisted.timestamp)
+        return persisted
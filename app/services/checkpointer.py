@@ -0,0 +1,271 @@
+"""
+Checkpoints do grafo de triagem – ClinicAI
+------------------------------------------
+Estado da conversa (`TriageState`) salvo pelo LangGraph entre os turnos,
+com o `conversation_id` como `thread_id`. Cada turno carrega apenas o
+último checkpoint da conversa, em vez de reler e converter o histórico de
+`messages`.
+
+- `MongoCheckpointSaver`: um documento por conversa em `graph_checkpoints`
+  (apenas o checkpoint mais recente), com cache LRU em processo. Os
+  checkpoints intermediários de um turno ficam em memória e só o último é
+  gravado, em `flush`, ao fim da execução do grafo. O roteamento fixo por
+  conversa (modo cluster) mantém o cache coerente entre workers.
+- `MemorySaver` (LangGraph): estado apenas em memória, para testes e
+  desenvolvimento (`GRAPH_CHECKPOINTER=memory`).
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.services.persistence import PersistenceService
+from app.settings import settings
+from app.utils.metrics import MONGO_OPERATION_SECONDS, REGISTRY, timed
+
+
+CHECKPOINT_COLLECTION = "graph_checkpoints"
+
+CHECKPOINT_CACHE_TOTAL = REGISTRY.counter(
+    "clinicai_graph_checkpoint_cache_total", "Leituras de checkpoints do grafo.", ("result",)
+)
+
+
+def _thread_key(config: RunnableConfig) -> Tuple[str, str]:
+    configurable = config["configurable"]
+    return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+
+def _document_id(thread_id: str, checkpoint_ns: str) -> str:
+    return f"{thread_id}:{checkpoint_ns}" if checkpoint_ns else thread_id
+
+
+def _checkpoint_config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer do LangGraph sobre o MongoDB, guardando só o último
+    checkpoint de cada conversa.
+
+    O cache guarda o último `CheckpointTuple` de cada conversa (ou `None`
+    para conversas sabidamente sem estado), de modo que turnos seguidos da
+    mesma conversa não leem o banco. Checkpoints ainda não gravados (turno
+    em andamento) nunca são descartados pelo LRU: o cache pode passar de
+    `maxsize` até o `flush` desses turnos.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        maxsize: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.collection = collection
+        self.maxsize = maxsize or settings.GRAPH_CHECKPOINT_CACHE_SIZE
+        self._cache: "OrderedDict[Tuple[str, str], Optional[CheckpointTuple]]" = OrderedDict()
+        self._dirty: set = set()
+
+    def _remember(self, key: Tuple[str, str], value: Optional[CheckpointTuple]) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Descarta as entradas mais antigas acima de `maxsize`, exceto as não gravadas."""
+        while len(self._cache) > self.maxsize:
+            evicted = next((key for key in self._cache if key not in self._dirty), None)
+            if evicted is None:
+                return
+            del self._cache[evicted]
+
+    def mark_new(self, thread_id: str) -> None:
+        """
+        Registra uma conversa recém-criada (sem checkpoint), evitando a
+        consulta ao banco no primeiro turno.
+        """
+        self._remember((thread_id, ""), None)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Retorna o último checkpoint da conversa (do cache ou do banco).
+
+        Checkpoints anteriores não são mantidos: pedidos por um
+        `checkpoint_id` diferente do último retornam None.
+        """
+        key = _thread_key(config)
+        if key in self._cache:
+            CHECKPOINT_CACHE_TOTAL.inc(result="hit")
+            self._cache.move_to_end(key)
+            saved = self._cache[key]
+        else:
+            CHECKPOINT_CACHE_TOTAL.inc(result="miss")
+            with timed(MONGO_OPERATION_SECONDS, collection=CHECKPOINT_COLLECTION, operation="find_one"):
+                doc = await self.collection.find_one({"_id": _document_id(*key)})
+            if key in self._cache:
+                # Outro turno da conversa atualizou o cache durante a leitura
+                # (ex.: leitura antecipada): o cache é mais recente que o banco.
+                saved = self._cache[key]
+            else:
+                saved = self._load(key, doc) if doc else None
+                self._remember(key, saved)
+
+        checkpoint_id = get_checkpoint_id(config)
+        if saved is None or (checkpoint_id and checkpoint_id != saved.config["configurable"]["checkpoint_id"]):
+            return None
+        return saved
+
+    def _load(self, key: Tuple[str, str], doc: Dict[str, Any]) -> CheckpointTuple:
+        thread_id, checkpoint_ns = key
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config=_checkpoint_config(thread_id, checkpoint_ns, doc["checkpoint_id"]),
+            checkpoint=self.serde.loads_typed((doc["type"], doc["checkpoint"])),
+            metadata=self.serde.loads_typed((doc["metadata_type"], doc["metadata"])),
+            parent_config=_checkpoint_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[],
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Lista o último checkpoint da conversa (o único mantido)."""
+        if config is None or limit == 0:
+            return
+        saved = await self.aget_tuple(config)
+        if saved is None:
+            return
+        if before is not None and get_checkpoint_id(before) <= saved.config["configurable"]["checkpoint_id"]:
+            return
+        if filter and any(saved.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield saved
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Registra o checkpoint no cache; a gravação no banco fica para `flush`.
+        """
+        thread_id, checkpoint_ns = key = _thread_key(config)
+        saved = CheckpointTuple(
+            config=_checkpoint_config(thread_id, checkpoint_ns, checkpoint["id"]),
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=config if get_checkpoint_id(config) else None,
+            pending_writes=[],
+        )
+        self._dirty.add(key)
+        self._remember(key, saved)
+        return saved.config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Guarda em memória as escritas pendentes do checkpoint atual (usadas
+        apenas para retomar um passo interrompido no mesmo processo).
+        """
+        saved = self._cache.get(_thread_key(config))
+        if saved is None or saved.config["configurable"]["checkpoint_id"] != get_checkpoint_id(config):
+            return
+        pending = {(w[0], i): w for i, w in enumerate(saved.pending_writes)}
+        for idx, (channel, value) in enumerate(writes):
+            pending[(task_id, WRITES_IDX_MAP.get(channel, idx))] = (task_id, channel, value)
+        saved.pending_writes[:] = list(pending.values())
+
+    async def flush(self, thread_id: str, checkpoint_ns: str = "") -> None:
+        """
+        Grava no banco o último checkpoint da conversa, se houver alteração.
+
+        Chamado ao fim de cada execução do grafo: um turno gera uma única
+        escrita, qualquer que seja o número de passos percorridos.
+        """
+        key = (thread_id, checkpoint_ns)
+        if key not in self._dirty:
+            return
+        self._dirty.discard(key)
+        saved = self._cache.get(key)
+        if saved is None:
+            return
+        checkpoint_type, checkpoint = self.serde.dumps_typed(saved.checkpoint)
+        metadata_type, metadata = self.serde.dumps_typed(saved.metadata)
+        now = datetime.utcnow()
+        doc = {
+            "_id": _document_id(thread_id, checkpoint_ns),
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": saved.config["configurable"]["checkpoint_id"],
+            "parent_checkpoint_id": get_checkpoint_id(saved.parent_config) if saved.parent_config else None,
+            "type": checkpoint_type,
+            "checkpoint": checkpoint,
+            "metadata_type": metadata_type,
+            "metadata": metadata,
+            "updated_at": now,
+            "expires_at": now + timedelta(
+                days=min(settings.RETENTION_DAYS_WHATSAPP, settings.RETENTION_DAYS_WEB)
+            ),
+        }
+        with timed(MONGO_OPERATION_SECONDS, collection=CHECKPOINT_COLLECTION, operation="replace_one"):
+            await self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        self._evict()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """
+        Descarta o estado da conversa (ex.: após uma emergência).
+        """
+        key = (thread_id, "")
+        known_empty = key in self._cache and self._cache[key] is None
+        self._dirty.discard(key)
+        self._remember(key, None)
+        if known_empty:
+            return
+        with timed(MONGO_OPERATION_SECONDS, collection=CHECKPOINT_COLLECTION, operation="delete_one"):
+            await self.collection.delete_one({"_id": _document_id(*key)})
+
+
+def build_checkpointer(persistence: PersistenceService, kind: Optional[str] = None) -> BaseCheckpointSaver:
+    """
+    Cria o checkpointer configurado em `GRAPH_CHECKPOINTER`.
+
+    Args:
+        persistence (PersistenceService): Acesso ao MongoDB (saver `mongo`).
+        kind (Optional[str]): "mongo" ou "memory" (padrão: `GRAPH_CHECKPOINTER`).
+    """
+    kind = kind or settings.GRAPH_CHECKPOINTER
+    if kind == "memory":
+        return MemorySaver()
+    return MongoCheckpointSaver(persistence.db[CHECKPOINT_COLLECTION])
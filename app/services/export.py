@@ -0,0 +1,283 @@
+"""
+Exportação em lote das triagens – ClinicAI
+------------------------------------------
+Percorre a collection `triages` com um cursor do servidor (`batch_size`),
+ordenado por `created_at`, e emite as linhas em NDJSON ou Parquet sem
+carregar a collection em memória: apenas um lote fica residente por vez.
+
+Exportações incrementais usam `(created_at, _id)` como marca d'água: cada
+execução exporta as triagens posteriores à marca anterior e informa a nova.
+A leitura é feita no primário (uma secundária atrasada faria a marca passar
+por triagens ainda não replicadas), e triagens com menos de
+`EXPORT_SETTLE_SECONDS` ficam para a próxima execução: a marca não
+ultrapassa gravações que ainda podem estar em andamento.
+
+Uso:
+    python -m app.services.export --format ndjson --output triagens.ndjson
+    python -m app.services.export --format parquet --output triagens.parquet \\
+        --watermark-file exports/.watermark
+
+O formato Parquet depende do `pyarrow` (opcional: `pip install pyarrow`).
+"""
+
+import argparse
+import asyncio
+import json
+import pathlib
+import sys
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.services.persistence import PersistenceService
+from app.services.triage_parser import TRIAGE_FIELDS
+from app.settings import settings
+
+
+EXPORT_COLUMNS = (
+    "id",
+    "conversation_id",
+    "created_at",
+    *TRIAGE_FIELDS,
+    "input_tokens",
+    "output_tokens",
+    "cost_usd",
+)
+
+_PROJECTION = {"_id": 1, "conversation_id": 1, "created_at": 1, "data": 1, "usage": 1}
+
+
+def flatten_triage(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte um documento de `triages` em uma linha plana de exportação.
+
+    Args:
+        doc (Dict[str, Any]): Documento como salvo por `PersistenceService.save_triage`.
+
+    Returns:
+        Dict[str, Any]: Linha com as colunas de `EXPORT_COLUMNS` (`id` é o
+        `_id` da triagem, usado como `after_id` na exportação seguinte).
+    """
+    data = doc.get("data") or {}
+    usage = doc.get("usage") or {}
+    row: Dict[str, Any] = {
+        "id": str(doc["_id"]) if "_id" in doc else None,
+        "conversation_id": doc.get("conversation_id"),
+        "created_at": doc.get("created_at"),
+    }
+    for name in TRIAGE_FIELDS:
+        row[name] = data.get(name, 0 if name == "intensidade" else "")
+    row["input_tokens"] = usage.get("input_tokens", 0)
+    row["output_tokens"] = usage.get("output_tokens", 0)
+    row["cost_usd"] = usage.get("cost_usd", 0.0)
+    return row
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class TriageExporter:
+    """
+    Exporta triagens em lotes a partir de um cursor do MongoDB.
+
+    Após cada exportação, `watermark` e `watermark_id` contêm o
+    `created_at` e o `_id` da última triagem emitida (ou a marca recebida,
+    se nada novo foi encontrado).
+    """
+
+    def __init__(
+        self,
+        persistence: Optional[PersistenceService] = None,
+        batch_size: Optional[int] = None,
+        settle_seconds: Optional[float] = None,
+    ) -> None:
+        self.persistence = persistence or PersistenceService()
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+        self.settle_seconds = settings.EXPORT_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.watermark: Optional[datetime] = None
+        self.watermark_id: Optional[ObjectId] = None
+
+    def _query(self, since: Optional[datetime], after_id: Optional[ObjectId]) -> Dict[str, Any]:
+        created: Dict[str, Any] = {"$lte": datetime.utcnow() - timedelta(seconds=self.settle_seconds)}
+        if since is None:
+            return {"created_at": created}
+        if after_id is None:
+            return {"created_at": {**created, "$gte": since}}
+        return {
+            "created_at": created,
+            "$or": [
+                {"created_at": {"$gt": since}},
+                {"created_at": since, "_id": {"$gt": after_id}},
+            ],
+        }
+
+    async def iter_batches(
+        self, since: Optional[datetime] = None, after_id: Optional[ObjectId] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Itera as triagens posteriores à marca d'água, em ordem de
+        `(created_at, _id)` e em lotes de `batch_size` linhas.
+
+        Args:
+            since (Optional[datetime]): `created_at` da marca (None = tudo).
+            after_id (Optional[ObjectId]): `_id` da última triagem exportada
+                em `since`. Sem ele, `since` é inclusivo: triagens com o
+                mesmo `created_at` podem se repetir, mas nunca são puladas.
+
+        Yields:
+            List[Dict[str, Any]]: Lote de linhas achatadas.
+        """
+        self.watermark, self.watermark_id = since, after_id
+        cursor = (
+            self.persistence.triages.find(self._query(since, after_id), _PROJECTION)
+            .sort([("created_at", 1), ("_id", 1)])
+            .batch_size(self.batch_size)
+        )
+        batch: List[Dict[str, Any]] = []
+        last: Optional[Dict[str, Any]] = None
+        async for doc in cursor:
+            batch.append(flatten_triage(doc))
+            last = doc
+            if len(batch) >= self.batch_size:
+                self.watermark, self.watermark_id = last["created_at"], last["_id"]
+                yield batch
+                batch = []
+        if batch:
+            self.watermark, self.watermark_id = last["created_at"], last["_id"]
+            yield batch
+
+    async def stream_ndjson(
+        self, since: Optional[datetime] = None, after_id: Optional[ObjectId] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Emite as triagens em NDJSON, um bloco de bytes por lote.
+
+        Yields:
+            bytes: Linhas JSON (terminadas em `\\n`) de um lote.
+        """
+        async for batch in self.iter_batches(since, after_id):
+            yield "".join(
+                json.dumps(row, ensure_ascii=False, default=_json_default) + "\n"
+                for row in batch
+            ).encode("utf-8")
+
+    async def write_ndjson(
+        self, output, since: Optional[datetime] = None, after_id: Optional[ObjectId] = None
+    ) -> int:
+        """
+        Grava a exportação NDJSON em um arquivo binário aberto.
+
+        Returns:
+            int: Número de triagens exportadas.
+        """
+        total = 0
+        async for chunk in self.stream_ndjson(since, after_id):
+            output.write(chunk)
+            total += chunk.count(b"\n")
+        return total
+
+    async def write_parquet(
+        self, path: Any, since: Optional[datetime] = None, after_id: Optional[ObjectId] = None
+    ) -> int:
+        """
+        Grava a exportação em Parquet, um row group por lote.
+
+        Args:
+            path (Any): Caminho do arquivo ou arquivo binário aberto.
+
+        Raises:
+            RuntimeError: Se o `pyarrow` não estiver instalado.
+
+        Returns:
+            int: Número de triagens exportadas.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Exportação Parquet requer o pacote `pyarrow`.") from exc
+
+        schema = pa.schema([
+            ("id", pa.string()),
+            ("conversation_id", pa.string()),
+            ("created_at", pa.timestamp("ms")),
+            *[(name, pa.int8() if name == "intensidade" else pa.string()) for name in TRIAGE_FIELDS],
+            ("input_tokens", pa.int64()),
+            ("output_tokens", pa.int64()),
+            ("cost_usd", pa.float64()),
+        ])
+        total = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            async for batch in self.iter_batches(since, after_id):
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                total += len(batch)
+        return total
+
+
+def read_watermark(path: Optional[pathlib.Path]) -> Tuple[Optional[datetime], Optional[ObjectId]]:
+    """
+    Lê a marca d'água de um arquivo, se existir: `created_at` em ISO 8601
+    e, separado por espaço, o `_id` da última triagem (ausente nos
+    arquivos antigos, que guardavam só a data).
+    """
+    if path is None or not path.exists():
+        return None, None
+    content = path.read_text(encoding="utf-8").split()
+    if not content:
+        return None, None
+    after_id = ObjectId(content[1]) if len(content) > 1 else None
+    return datetime.fromisoformat(content[0]), after_id
+
+
+def write_watermark(
+    path: Optional[pathlib.Path], watermark: Optional[datetime], watermark_id: Optional[ObjectId] = None
+) -> None:
+    """Grava a nova marca d'água, se houver."""
+    if path is None or watermark is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = watermark.isoformat() if watermark_id is None else f"{watermark.isoformat()} {watermark_id}"
+    path.write_text(content, encoding="utf-8")
+
+
+async def run_export(args: argparse.Namespace) -> int:
+    if args.since:
+        since, after_id = datetime.fromisoformat(args.since), None
+    else:
+        since, after_id = read_watermark(args.watermark_file)
+    exporter = TriageExporter(batch_size=args.batch_size)
+
+    if args.format == "parquet":
+        if not args.output:
+            raise SystemExit("--output é obrigatório no formato parquet.")
+        total = await exporter.write_parquet(str(args.output), since, after_id)
+    elif args.output:
+        with open(args.output, "wb") as f:
+            total = await exporter.write_ndjson(f, since, after_id)
+    else:
+        total = await exporter.write_ndjson(sys.stdout.buffer, since, after_id)
+
+    write_watermark(args.watermark_file, exporter.watermark, exporter.watermark_id)
+    print(f"{total} triagens exportadas (marca d'água: {exporter.watermark})", file=sys.stderr)
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Exporta as triagens em NDJSON ou Parquet.")
+    parser.add_argument("--format", choices=("ndjson", "parquet"), default="ndjson")
+    parser.add_argument("--output", type=pathlib.Path, help="Arquivo de saída (padrão NDJSON: stdout)")
+    parser.add_argument("--since", help="Exporta apenas triagens criadas a partir desta data (ISO 8601)")
+    parser.add_argument(
+        "--watermark-file", type=pathlib.Path,
+        help="Arquivo com a marca d'água; lido antes e atualizado após a exportação",
+    )
+    parser.add_argument("--batch-size", type=int, default=None)
+    asyncio.run(run_export(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,28 @@ Responsável por:
 - Carregar prompts do sistema.
 - Construir mensagens de emergência.
 - Fornecer schema esperado da triagem.
-- Instanciar e chamar o modelo de linguagem (Gemini).
+- Instanciar e chamar o modelo de linguagem (Gemini ou simulador local).
 - Montar o prompt completo com histórico e mensagem do usuário.
+- Manter um prefixo fixo (sistema + regras + schema), calculado uma vez,
+  antes da parte variável (conversa), para o cache de contexto do provedor.
 - Retornar respostas em JSON padronizado.
+- Contabilizar tokens e custo de cada chamada (ver `app.services.usage`).
 """
 
 import pathlib
+import hashlib
 import json
-from typing import Any, Dict, Optional
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence
 
 from app.constants import emergencies
 from app.schemas.triage import Triage
+from app.services.llm_backends import ChatBackend, GeminiContextCache, build_fake_backend
+from app.services.persistence import USER, Turn
+from app.services.usage import UsageTracker, extract_cached_tokens, extract_token_usage
 from app.settings import settings
+from app.utils.metrics import LLM_CALL_SECONDS, current_node, timed
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
@@ -24,11 +34,15 @@ from langchain.schema import SystemMessage, HumanMessage, AIMessage
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
 
 
-def load_system_prompt() -> str:
+def load_system_prompt(prompt_path: Optional[pathlib.Path] = None) -> str:
     """
     Carrega o prompt principal do sistema a partir do arquivo.
+
+    Args:
+        prompt_path (Optional[pathlib.Path]): Arquivo alternativo (padrão:
+            `prompts/system_triage.txt`).
     """
-    prompt_path = BASE_DIR / "prompts" / "system_triage.txt"
+    prompt_path = prompt_path or BASE_DIR / "prompts" / "system_triage.txt"
     with open(prompt_path, encoding="utf-8") as f:
         return f.read().strip()
 
@@ -43,8 +57,7 @@ def build_emergency_prompt() -> str:
         "Regras de Emergência:\n"
         "Se a mensagem do usuário contiver sinais de urgência médica, como "
         f"{keywords}, interrompa a triagem imediatamente e responda:\n"
-        "\"Entendi. Seus sintomas podem indicar uma situação de emergência. "
-        "Por favor, procure o pronto-socorro mais próximo ou ligue para o 192 imediatamente.\""
+        f"\"{emergencies.EMERGENCY_MESSAGE}\""
     )
 
 
@@ -55,17 +68,90 @@ def get_triage_schema() -> Dict[str, Any]:
     return Triage.model_json_schema()
 
 
-def get_llm() -> ChatGoogleGenerativeAI:
+def get_llm() -> ChatBackend:
     """
-    Instancia o modelo de linguagem Gemini via LangChain.
+    Instancia o backend de LLM configurado em `settings.LLM_BACKEND`.
+
+    - `gemini`: modelo Gemini via LangChain.
+    - `fake`: simulador local (ver `app.services.llm_backends.FakeChatModel`).
+
+    Raises:
+        ValueError: Se o backend Gemini for escolhido sem `GOOGLE_API_KEY`.
     """
+    if settings.LLM_BACKEND == "fake":
+        return build_fake_backend()
+
+    if not settings.GOOGLE_API_KEY:
+        raise ValueError("Configuração do LLM incompleta: verifique GOOGLE_API_KEY.")
+
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.3,
+        model=settings.LLM_MODEL,
+        temperature=settings.LLM_TEMPERATURE,
         google_api_key=settings.GOOGLE_API_KEY,
     )
 
 
+@dataclass(frozen=True)
+class PromptPrefix:
+    """
+    Prefixo fixo das chamadas ao LLM: prompt do sistema, regras de
+    emergência e schema da triagem.
+
+    Attributes:
+        text (str): Conteúdo da mensagem de sistema.
+        version (str): Hash curto do conteúdo (versão do prompt).
+        message (SystemMessage): Mensagem reutilizada em todas as chamadas.
+    """
+    text: str
+    version: str = field(init=False)
+    message: SystemMessage = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "version", hashlib.sha256(self.text.encode("utf-8")).hexdigest()[:12])
+        object.__setattr__(self, "message", SystemMessage(content=self.text))
+
+
+def build_prompt_prefix(system_prompt: Optional[str] = None) -> PromptPrefix:
+    """
+    Monta o prefixo fixo a partir do prompt do sistema, das regras de
+    emergência e do schema da triagem.
+
+    Args:
+        system_prompt (Optional[str]): Prompt do sistema alternativo (ex.:
+            uma nova versão avaliada pelo replay); padrão: `load_system_prompt()`.
+    """
+    triage_schema = json.dumps(get_triage_schema(), indent=2, ensure_ascii=False)
+    system_prompt = load_system_prompt() if system_prompt is None else system_prompt
+    return PromptPrefix(
+        f"{system_prompt}\n\n"
+        f"{build_emergency_prompt()}\n\n"
+        "IMPORTANTE:\n"
+        "- Sempre retorne JSON usando EXATAMENTE estes campos em português (iguais ao schema).\n"
+        "- Nunca use null. Se não houver informação, use string vazia ('') para textos e 0 para intensidade.\n\n"
+        f"{triage_schema}"
+    )
+
+
+@lru_cache
+def get_prompt_prefix() -> PromptPrefix:
+    """
+    Retorna o prefixo fixo do processo, calculado uma única vez: o mesmo
+    conteúdo (byte a byte) abre todas as chamadas, o que permite o cache de
+    contexto do provedor.
+    """
+    return build_prompt_prefix()
+
+
+def build_context_cache() -> Optional[GeminiContextCache]:
+    """
+    Cria o cache explícito de contexto do Gemini, se habilitado
+    (`LLM_CONTEXT_CACHE_ENABLED` com `LLM_BACKEND=gemini`).
+    """
+    if settings.LLM_BACKEND == "gemini" and settings.LLM_CONTEXT_CACHE_ENABLED:
+        return GeminiContextCache()
+    return None
+
+
 def build_full_prompt(user_message: str, conversation_context: str = "") -> str:
     """
     Monta o prompt completo enviado à LLM,
@@ -96,46 +182,60 @@ class LLMService:
     Serviço que encapsula a interação com o modelo LLM,
     cuidando do histórico e do formato da resposta.
     """
-    def __init__(self) -> None:
-        self.client = get_llm()
+    def __init__(
+        self,
+        client: Optional[ChatBackend] = None,
+        context_cache: Optional[GeminiContextCache] = None,
+        prompt_prefix: Optional[PromptPrefix] = None,
+    ) -> None:
+        self.client = client or get_llm()
+        self.context_cache = context_cache or build_context_cache()
+        self.prompt_prefix = prompt_prefix or get_prompt_prefix()
+        self.usage = UsageTracker()
 
     async def get_reply(
         self,
         user_message: str,
         session_id: Optional[str] = None,
-        history_docs: Optional[list] = None,
+        history: Optional[Sequence[Turn]] = None,
     ) -> str:
         """
         Retorna a resposta da LLM para uma mensagem do usuário,
-        incluindo contexto anterior se disponível.
+        incluindo contexto anterior (falas `Turn`) se disponível.
+
+        A requisição começa sempre pelo mesmo prefixo fixo (`prompt_prefix`,
+        por padrão o do processo, `get_prompt_prefix`),
+        seguido da parte variável (histórico e mensagem atual). Com o cache
+        explícito habilitado, o prefixo é referenciado por `cached_content`
+        em vez de reenviado.
         """
-        system_prompt = load_system_prompt()
-        emergency_prompt = build_emergency_prompt()
-        triage_schema = json.dumps(get_triage_schema(), indent=2, ensure_ascii=False)
-
-        messages = [
-            SystemMessage(
-                content=(
-                    f"{system_prompt}\n\n"
-                    f"{emergency_prompt}\n\n"
-                    "IMPORTANTE:\n"
-                    "- Sempre retorne JSON usando EXATAMENTE estes campos em português (iguais ao schema).\n"
-                    "- Nunca use null. Se não houver informação, use string vazia ('') para textos e 0 para intensidade.\n\n"
-                    f"{triage_schema}"
-                )
-            )
-        ]
-
-        if history_docs:
-            for doc in history_docs:
-                if "user_message" in doc:
-                    messages.append(HumanMessage(content=doc["user_message"]))
-                if "agent_message" in doc:
-                    messages.append(AIMessage(content=doc["agent_message"]))
+        prefix = self.prompt_prefix
+        messages = []
+
+        for turn in history or ():
+            if turn.role == USER:
+                messages.append(HumanMessage(content=turn.text))
+            else:
+                messages.append(AIMessage(content=turn.text))
 
         messages.append(HumanMessage(content=user_message))
 
-        response = await self.client.ainvoke(messages)
+        node = current_node.get() or "direct"
+        cached_content = (
+            await self.context_cache.name_for(prefix.text, prefix.version) if self.context_cache else None
+        )
+        with timed(LLM_CALL_SECONDS, node=node):
+            if cached_content:
+                response = await self.client.ainvoke(messages, cached_content=cached_content)
+            else:
+                response = await self.client.ainvoke([prefix.message, *messages])
+
+        input_tokens, output_tokens = extract_token_usage(response)
+        self.usage.record(
+            session_id, node, prefix.version, input_tokens, output_tokens,
+            cached_tokens=extract_cached_tokens(response),
+        )
+
         reply = response.content.strip()
 
         if reply.lower().startswith("agente:"):
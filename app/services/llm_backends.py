@@ -0,0 +1,297 @@
+"""
+Backends de LLM – ClinicAI
+--------------------------
+Define os backends de modelo de linguagem selecionáveis via `Settings.LLM_BACKEND`:
+
+- `gemini`: modelo real (Gemini via LangChain).
+- `fake`: simulador local determinístico, usado em testes de carga e benchmarks.
+
+Todo backend expõe `ainvoke(messages)` e devolve uma `AIMessage`,
+mesma interface usada por `LLMService`.
+
+O prefixo fixo do prompt (sistema + regras + schema) pode ficar no cache
+explícito de contexto do Gemini (`GeminiContextCache`); o simulador emula o
+cache implícito de prefixo e conta acertos, o que permite verificar que o
+prefixo não muda entre chamadas.
+"""
+
+import asyncio
+import json
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from loguru import logger
+
+from app.settings import settings
+
+
+EXTRACTION_MARKER = "Responda SOMENTE em JSON"
+
+DEFAULT_DIALOG_SCRIPT: List[str] = [
+    "Olá! Eu sou o assistente virtual da ClinicAI. Estou aqui para acolher você e registrar "
+    "suas informações para uma triagem inicial. Qual é o principal motivo do seu contato?",
+    "Entendi. Pode me descrever melhor o que está sentindo?",
+    "Desde quando isso começou e com que frequência acontece?",
+    "Numa escala de 0 a 10, qual a intensidade do incômodo?",
+    "Você tem alguma doença, alergia ou já teve episódios parecidos antes?",
+    "Já tomou alguma medida ou medicamento para aliviar?",
+    "Entendi. Queixa principal: dor de cabeça; sintomas: enjoo; início/duração: desde ontem; "
+    "intensidade: 7/10; histórico: nenhum; medidas já tomadas: nenhuma.\n"
+    "Responda apenas com SIM para confirmar ou NÃO para corrigir.",
+    "Obrigado por compartilhar todas essas informações. Sua triagem foi registrada e será "
+    "encaminhada para nossa equipe médica, que dará continuidade ao seu atendimento. "
+    "Lembre-se: este é apenas um pré-atendimento e não substitui uma consulta com um "
+    "profissional de saúde.",
+]
+
+DEFAULT_EXTRACTION_REPLY: Dict[str, Any] = {
+    "queixa_principal": "Dor de cabeça",
+    "sintomas": "Enjoo",
+    "duracao_frequencia": "Desde ontem",
+    "intensidade": 7,
+    "historico": "",
+    "medidas_tomadas": "",
+}
+
+
+class ChatBackend(Protocol):
+    """Interface mínima esperada de um backend de LLM."""
+
+    async def ainvoke(self, messages: Sequence[BaseMessage], **kwargs: Any) -> AIMessage:
+        ...
+
+
+class FakeLLMError(RuntimeError):
+    """Falha injetada pelo simulador de LLM."""
+
+
+class FakeChatModel:
+    """
+    Simulador local de LLM para testes de carga.
+
+    - Respostas roteirizadas: a resposta de cada turno é escolhida pelo número
+      de respostas do roteiro já presentes no histórico, o que a torna
+      determinística por conversa mesmo sob concorrência.
+    - Pedidos de extração (prompt com `EXTRACTION_MARKER`) recebem o JSON
+      de triagem configurado.
+    - Latência configurável (fixa, uniforme, normal ou exponencial).
+    - Injeção de falhas com probabilidade `failure_rate`.
+    - Uso de tokens estimado (~4 caracteres por token) em `usage_metadata`.
+    - Cache de prefixo: uma mensagem de sistema já vista conta como acerto
+      (`prefix_hits`) e seus tokens são devolvidos como lidos do cache
+      (`input_token_details.cache_read`); cada prefixo novo conta como
+      falha (`prefix_misses`). Um prefixo estável gera uma única falha.
+    """
+
+    def __init__(
+        self,
+        script: Optional[List[str]] = None,
+        extraction_reply: Optional[Dict[str, Any]] = None,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        latency_distribution: str = "fixed",
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.script = list(script or DEFAULT_DIALOG_SCRIPT)
+        if not self.script:
+            raise ValueError("O roteiro do LLM simulado não pode ser vazio.")
+        self.extraction_reply = json.dumps(
+            extraction_reply or DEFAULT_EXTRACTION_REPLY, ensure_ascii=False
+        )
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self._prefixes: set = set()
+        self._script_set = frozenset(self.script)
+        self._rng = random.Random(seed)
+
+    def _sample_latency(self) -> float:
+        """Sorteia a latência (em segundos) da próxima chamada."""
+        mean = self.latency_ms
+        jitter = self.latency_jitter_ms
+        if self.latency_distribution == "uniform":
+            value = self._rng.uniform(mean - jitter, mean + jitter)
+        elif self.latency_distribution == "normal":
+            value = self._rng.gauss(mean, jitter)
+        elif self.latency_distribution == "exponential":
+            value = self._rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        else:
+            value = mean
+        return max(value, 0.0) / 1000.0
+
+    def _reply_for(self, messages: Sequence[BaseMessage]) -> str:
+        """Escolhe a resposta roteirizada para a lista de mensagens recebida."""
+        if messages and EXTRACTION_MARKER in str(messages[-1].content):
+            return self.extraction_reply
+        turn = sum(
+            1 for m in messages
+            if isinstance(m, AIMessage) and m.content in self._script_set
+        )
+        return self.script[min(turn, len(self.script) - 1)]
+
+    def _cached_prefix_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        """Tokens do prefixo (mensagem de sistema inicial) já presentes no cache."""
+        if not messages or not isinstance(messages[0], SystemMessage):
+            return 0
+        prefix = str(messages[0].content)
+        if prefix in self._prefixes:
+            self.prefix_hits += 1
+            return len(prefix) // 4
+        self.prefix_misses += 1
+        self._prefixes.add(prefix)
+        return 0
+
+    async def ainvoke(self, messages: Sequence[BaseMessage], **kwargs: Any) -> AIMessage:
+        """
+        Simula uma chamada ao modelo (parâmetros extras, como
+        `cached_content`, são aceitos e ignorados).
+
+        Raises:
+            FakeLLMError: Quando a falha injetada é sorteada.
+        """
+        self.calls += 1
+        delay = self._sample_latency()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            self.failures += 1
+            raise FakeLLMError("Falha simulada do LLM.")
+        reply = self._reply_for(messages)
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(reply) // 4
+        cached_tokens = self._cached_prefix_tokens(messages)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cached_tokens += cached_tokens
+        return AIMessage(
+            content=reply,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached_tokens},
+            },
+        )
+
+
+class GeminiContextCache:
+    """
+    Cache explícito de contexto do Gemini (`cachedContents`) para o prefixo
+    fixo do prompt.
+
+    Cria o conteúdo em cache uma vez por versão do prefixo, com o texto como
+    instrução de sistema, e o recria antes de expirar. As chamadas passam a
+    enviar só a conversa, com `cached_content` apontando para o prefixo.
+
+    Se a criação falhar (ex.: prefixo abaixo do mínimo de tokens do modelo),
+    o cache fica desativado por `retry_after` segundos e as chamadas seguem
+    com o prefixo no corpo da requisição.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        ttl_seconds: Optional[int] = None,
+        client: Any = None,
+        refresh_margin: float = 60.0,
+        retry_after: float = 300.0,
+    ) -> None:
+        self.model = model or settings.LLM_MODEL
+        self.ttl_seconds = ttl_seconds or settings.LLM_CONTEXT_CACHE_TTL_SECONDS
+        self.refresh_margin = min(refresh_margin, self.ttl_seconds / 2)
+        self.retry_after = retry_after
+        self._client = client
+        self._lock = asyncio.Lock()
+        self._name: Optional[str] = None
+        self._version: Optional[str] = None
+        self._expires_at = 0.0
+        self._disabled_until = 0.0
+
+    @property
+    def client(self) -> Any:
+        """Cliente da API de cache do Gemini, criado no primeiro uso."""
+        if self._client is None:
+            from google.ai.generativelanguage_v1beta import CacheServiceAsyncClient
+
+            self._client = CacheServiceAsyncClient(client_options={"api_key": settings.GOOGLE_API_KEY})
+        return self._client
+
+    async def name_for(self, text: str, version: str) -> Optional[str]:
+        """
+        Nome do conteúdo em cache para o prefixo, criando-o se necessário.
+
+        Args:
+            text (str): Texto do prefixo fixo.
+            version (str): Versão (hash) do prefixo.
+
+        Returns:
+            Optional[str]: `cachedContents/...` ou None se o cache estiver indisponível.
+        """
+        now = time.monotonic()
+        if self._version == version and now < self._expires_at - self.refresh_margin:
+            return self._name
+        if now < self._disabled_until:
+            return None
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._version == version and now < self._expires_at - self.refresh_margin:
+                return self._name
+            from google.ai.generativelanguage_v1beta import CachedContent, Content, Part
+
+            try:
+                cached = await self.client.create_cached_content(
+                    cached_content=CachedContent(
+                        model=f"models/{self.model}",
+                        system_instruction=Content(parts=[Part(text=text)]),
+                        ttl=timedelta(seconds=self.ttl_seconds),
+                    )
+                )
+            except Exception as e:
+                logger.warning("Cache de contexto do Gemini indisponível: {}", e)
+                self._name, self._version = None, None
+                self._disabled_until = now + self.retry_after
+                return None
+
+            self._name, self._version = cached.name, version
+            self._expires_at = now + self.ttl_seconds
+            return self._name
+
+
+def load_fake_script(path: str) -> Dict[str, Any]:
+    """
+    Carrega o roteiro do LLM simulado a partir de um arquivo JSON.
+
+    O arquivo pode conter uma lista de respostas de diálogo ou um objeto
+    `{"dialog": [...], "extraction": {...}}`.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {"script": data}
+    return {"script": data.get("dialog"), "extraction_reply": data.get("extraction")}
+
+
+def build_fake_backend() -> FakeChatModel:
+    """Instancia o LLM simulado com base nas configurações da aplicação."""
+    script_kwargs = load_fake_script(settings.FAKE_LLM_SCRIPT_PATH) if settings.FAKE_LLM_SCRIPT_PATH else {}
+    return FakeChatModel(
+        latency_ms=settings.FAKE_LLM_LATENCY_MS,
+        latency_jitter_ms=settings.FAKE_LLM_LATENCY_JITTER_MS,
+        latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+        failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+        seed=settings.FAKE_LLM_SEED,
+        **script_kwargs,
+    )
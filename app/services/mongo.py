@@ -0,0 +1,154 @@
+"""
+Cliente MongoDB compartilhado – ClinicAI
+----------------------------------------
+Um único `AsyncIOMotorClient` por processo (`get_mongo_client`), com o pool
+de conexões configurado em `settings`:
+
+- Tamanho do pool (`MONGO_MAX_POOL_SIZE`, `MONGO_MIN_POOL_SIZE`), tempo
+  ocioso (`MONGO_MAX_IDLE_TIME_MS`) e timeouts de seleção de servidor, de
+  socket e de espera por conexão livre (`MONGO_*_TIMEOUT_MS`).
+- Write concern por collection (`write_concern_for`) e read preference das
+  consultas da equipe (`query_read_preference`), aplicados pelo
+  `PersistenceService`.
+- Métricas do pool (`PoolMetricsListener`): tempo de espera por uma conexão
+  (`clinicai_mongo_pool_wait_seconds`) e conexões abertas e em uso por
+  servidor, para dimensionar o pool à concorrência de turnos.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern, monitoring
+from pymongo.read_preferences import ReadPreference
+
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+
+MONGO_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "clinicai_mongo_pool_wait_seconds",
+    "Espera por uma conexão livre no pool do MongoDB.",
+    ("outcome",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    span="mongo.pool.checkout",
+)
+MONGO_POOL_CONNECTIONS = REGISTRY.gauge(
+    "clinicai_mongo_pool_connections",
+    "Conexões do pool do MongoDB por servidor (open = abertas, in_use = emprestadas).",
+    ("address", "state"),
+)
+
+READ_PREFERENCES: Dict[str, Any] = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def _address(address: Any) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Observa os eventos do pool de conexões do driver.
+
+    Os eventos são emitidos nas threads do driver; as métricas são seguras
+    para uso concorrente. A espera é o `duration` informado pelo driver no
+    empréstimo da conexão (ou na falha, rotulada pelo motivo).
+    """
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        MONGO_POOL_WAIT_SECONDS.observe(event.duration or 0.0, outcome="ok")
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event.address), state="in_use")
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        MONGO_POOL_WAIT_SECONDS.observe(event.duration or 0.0, outcome=event.reason)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event.address), state="in_use")
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event.address), state="open")
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event.address), state="open")
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        pass
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        pass
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+
+def _optional_ms(value: int) -> Optional[int]:
+    """Converte os timeouts com 0 = sem limite para o `None` do driver."""
+    return value or None
+
+
+def client_options() -> Dict[str, Any]:
+    """
+    Opções do cliente Motor a partir de `settings` (pool, timeouts e, com
+    `METRICS_ENABLED`, o listener de métricas do pool).
+    """
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": _optional_ms(settings.MONGO_MAX_IDLE_TIME_MS),
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": _optional_ms(settings.MONGO_SOCKET_TIMEOUT_MS),
+        "waitQueueTimeoutMS": _optional_ms(settings.MONGO_WAIT_QUEUE_TIMEOUT_MS),
+    }
+    if settings.METRICS_ENABLED:
+        options["event_listeners"] = [PoolMetricsListener()]
+    return options
+
+
+def build_mongo_client(uri: Optional[str] = None, **overrides: Any) -> AsyncIOMotorClient:
+    """
+    Cria um cliente Motor com as opções de `client_options`.
+
+    Args:
+        uri (Optional[str]): URI de conexão (padrão: `MONGO_URI`).
+        **overrides: Opções do driver que substituem as configuradas.
+    """
+    return AsyncIOMotorClient(uri or settings.MONGO_URI, **{**client_options(), **overrides})
+
+
+@lru_cache
+def get_mongo_client() -> AsyncIOMotorClient:
+    """
+    Retorna o cliente compartilhado do processo: todos os serviços usam o
+    mesmo pool de conexões.
+    """
+    return build_mongo_client()
+
+
+def write_concern_for(value: str) -> WriteConcern:
+    """
+    Converte o `w` configurado ("1", "2", "majority"...) em `WriteConcern`.
+    """
+    value = value.strip()
+    w: Union[int, str] = int(value) if value.isdigit() else value
+    return WriteConcern(w=w)
+
+
+def query_read_preference() -> Any:
+    """Read preference das consultas da equipe (`MONGO_QUERY_READ_PREFERENCE`)."""
+    return READ_PREFERENCES[settings.MONGO_QUERY_READ_PREFERENCE]
@@ -1,8 +1,97 @@
-from datetime import datetime
-from typing import Any, Dict, Optional, List
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, NamedTuple, Optional, List, Sequence, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReadPreference
 from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.mongo import get_mongo_client, query_read_preference, write_concern_for
+from app.services.triage_parser import TRIAGE_FIELDS
+from app.services.urgency import queue_fields
 from app.settings import settings
+from app.utils.metrics import MONGO_OPERATION_SECONDS, timed
+from app.utils.pagination import build_projection, encode_cursor, keyset_filter
+
+
+MESSAGE_FIELDS = ("conversation_id", "user_id", "channel", "user_message", "agent_message", "timestamp")
+TRIAGE_DOC_FIELDS = (
+    "conversation_id", "channel", "created_at", "usage", "data",
+    "queue_status", "urgency_score", "urgency_keywords",
+    *(f"data.{name}" for name in TRIAGE_FIELDS),
+)
+TRIAGE_FIELD_ALIASES = {name: f"data.{name}" for name in TRIAGE_FIELDS}
+
+# Ordem ESR (igualdade, ordenação, intervalo): a chave de ordenação
+# `(data, _id)` vem antes dos filtros por intervalo, para que o planner
+# percorra o índice na ordem da página em vez de ordenar em memória.
+INDEXES: Dict[str, Sequence[Sequence[Tuple[str, int]]]] = {
+    "messages": (
+        [("conversation_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        [("timestamp", DESCENDING), ("_id", DESCENDING)],
+        [("channel", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        [("closes_session", ASCENDING), ("timestamp", ASCENDING)],
+    ),
+    "triages": (
+        [("conversation_id", ASCENDING)],
+        [("created_at", DESCENDING), ("_id", DESCENDING), ("data.intensidade", DESCENDING)],
+        [("channel", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        [("queue_status", ASCENDING), ("priority_key", DESCENDING)],
+    ),
+}
+
+USER = "user"
+AGENT = "agent"
+
+
+class Turn(NamedTuple):
+    """
+    Fala da conversa no formato compacto usado pelo grafo de triagem.
+
+    Attributes:
+        role (str): `USER` (paciente) ou `AGENT`.
+        text (str): Texto da fala.
+    """
+    role: str
+    text: str
+
+
+def turns_from_docs(docs: Iterable[Dict[str, Any]]) -> List[Turn]:
+    """
+    Converte registros de turno (`user_message` + `agent_message`) em falas.
+
+    Turnos ainda sem resposta geram apenas a fala do paciente.
+    """
+    turns: List[Turn] = []
+    for doc in docs:
+        if doc.get("user_message"):
+            turns.append(Turn(USER, doc["user_message"]))
+        if doc.get("agent_message"):
+            turns.append(Turn(AGENT, doc["agent_message"]))
+    return turns
+
+
+# Collections cujos documentos expiram em `expires_at` (índice TTL).
+TTL_COLLECTIONS = ("messages", "conversations_archive", "graph_checkpoints")
+
+
+def expires_at_for(channel: Optional[str], timestamp: datetime) -> datetime:
+    """
+    Data de expiração de um registro conforme a política de retenção do canal.
+
+    Args:
+        channel (Optional[str]): Canal de origem ("whatsapp" ou "web").
+        timestamp (datetime): Momento de criação do registro.
+    """
+    days = settings.RETENTION_DAYS_WHATSAPP if channel == "whatsapp" else settings.RETENTION_DAYS_WEB
+    return timestamp + timedelta(days=days)
+
+
+def _range(lower: Any = None, upper: Any = None) -> Optional[Dict[str, Any]]:
+    """Filtro de intervalo fechado (`$gte`/`$lte`) ou None se não houver limites."""
+    bounds = {}
+    if lower is not None:
+        bounds["$gte"] = lower
+    if upper is not None:
+        bounds["$lte"] = upper
+    return bounds or None
 
 
 class PersistenceService:
@@ -10,25 +99,108 @@ class PersistenceService:
     Serviço responsável pela persistência de dados no MongoDB.
 
     Estrutura:
-        - Collection `messages`: histórico detalhado das interações
-          entre usuário e agente (user_message + agent_message).
+        - Collection `messages`: histórico detalhado das interações,
+          um documento por turno (user_message + agent_message), com
+          `expires_at` definido pela política de retenção do canal.
         - Collection `triages`: resumo final estruturado da triagem,
           armazenado ao término da coleta de informações.
+
+    Cada collection usa o seu write concern (`MONGO_MESSAGES_WRITE_CONCERN`,
+    `MONGO_TRIAGES_WRITE_CONCERN`); as consultas da equipe passam por
+    `for_queries` e seguem `MONGO_QUERY_READ_PREFERENCE`.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None) -> None:
         """
         Inicializa a conexão com o MongoDB utilizando variáveis de ambiente
         definidas em `settings`. Se não configurado, usa valores padrão.
+
+        Args:
+            client (Optional[AsyncIOMotorClient]): Cliente já construído
+                (ex.: `mongomock_motor` em testes e benchmarks); padrão: o
+                cliente compartilhado do processo (`get_mongo_client`).
         """
-        self.client = AsyncIOMotorClient(settings.MONGO_URI)
+        self.client = client or get_mongo_client()
         self.db = self.client[settings.MONGO_DB]
-        self.messages = self.db["messages"]
-        self.triages = self.db["triages"]
+        self.messages = self.db.get_collection(
+            "messages", write_concern=write_concern_for(settings.MONGO_MESSAGES_WRITE_CONCERN)
+        )
+        self.triages = self.db.get_collection(
+            "triages", write_concern=write_concern_for(settings.MONGO_TRIAGES_WRITE_CONCERN)
+        )
+        self.query_read_preference = query_read_preference()
+        self._query_collections: Dict[int, Tuple[Any, Any]] = {}
+
+    def for_queries(self, collection: Any) -> Any:
+        """
+        Versão da collection para as consultas da equipe (listagens,
+        histórico paginado, replay), com `MONGO_QUERY_READ_PREFERENCE`.
+
+        Essas leituras toleram o atraso de replicação e podem sair do
+        primário; o caminho da conversa (histórico do turno, checkpoints,
+        fila de triagens) continua lendo do primário.
+        """
+        if self.query_read_preference == ReadPreference.PRIMARY:
+            return collection
+        cached = self._query_collections.get(id(collection))
+        if cached is None or cached[0] is not collection:
+            reader = collection.database.get_collection(
+                collection.name, read_preference=self.query_read_preference
+            )
+            cached = self._query_collections[id(collection)] = (collection, reader)
+        return cached[1]
+
+    async def ensure_indexes(self) -> None:
+        """
+        Cria (idempotentemente) os índices que sustentam o histórico por
+        conversa, as listagens paginadas por `(data, _id)` e a expiração
+        (TTL) dos registros pela política de retenção.
+        """
+        for name, indexes in INDEXES.items():
+            collection = self.db[name]
+            for keys in indexes:
+                with timed(MONGO_OPERATION_SECONDS, collection=name, operation="create_index"):
+                    await collection.create_index(list(keys))
+        for name in TTL_COLLECTIONS:
+            with timed(MONGO_OPERATION_SECONDS, collection=name, operation="create_index"):
+                await self.db[name].create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    async def _keyset_page(
+        self,
+        collection,
+        query: Dict[str, Any],
+        sort_field: str,
+        limit: int,
+        cursor: Optional[str],
+        projection: Optional[Dict[str, int]],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Busca uma página ordenada de forma decrescente por `(sort_field, _id)`.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: (documentos, cursor da
+            próxima página ou None se esta for a última).
+        """
+        after = keyset_filter(sort_field, cursor)
+        if after:
+            query = {"$and": [query, after]} if query else after
+        found = (
+            collection.find(query, projection)
+            .sort([(sort_field, DESCENDING), ("_id", DESCENDING)])
+            .limit(limit + 1)
+        )
+        with timed(MONGO_OPERATION_SECONDS, collection=collection.name, operation="find_page"):
+            docs = await found.to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1][sort_field], docs[-1]["_id"])
+        return docs, next_cursor
 
     async def save_message(self, chat_request: ChatRequest, chat_response: ChatResponse) -> str:
         """
-        Salva uma interação (mensagem do usuário + resposta do agente).
+        Salva uma interação completa (mensagem do usuário + resposta do agente).
 
         Args:
             chat_request (ChatRequest): Mensagem enviada pelo usuário.
@@ -37,16 +209,63 @@ class PersistenceService:
         Returns:
             str: ID do documento persistido.
         """
+        message_id = await self.save_user_message(chat_request)
+        await self.save_agent_reply(message_id, chat_response)
+        return str(message_id)
+
+    async def save_user_message(self, chat_request: ChatRequest, message_id: Any = None) -> Any:
+        """
+        Registra a mensagem do usuário, abrindo o documento do turno.
+
+        A resposta do agente é gravada depois no mesmo documento
+        (ver `save_agent_reply`).
+
+        Args:
+            chat_request (ChatRequest): Mensagem enviada pelo usuário.
+            message_id (Any): `_id` já reservado para o turno (gerado pelo
+                banco se omitido).
+
+        Returns:
+            Any: `_id` do documento do turno.
+        """
+        timestamp = datetime.utcnow()
         doc = {
             "conversation_id": chat_request.conversation_id,
             "user_id": chat_request.user_id,
             "channel": chat_request.channel,
             "user_message": chat_request.message,
+            "timestamp": timestamp,
+            "expires_at": expires_at_for(chat_request.channel, timestamp),
+        }
+        if message_id is not None:
+            doc["_id"] = message_id
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="insert_one"):
+            result = await self.messages.insert_one(doc)
+        return result.inserted_id
+
+    async def save_agent_reply(
+        self,
+        message_id: Any,
+        chat_response: ChatResponse,
+        closes_session: bool = False,
+    ) -> None:
+        """
+        Grava a resposta do agente no documento do turno.
+
+        Args:
+            message_id (Any): ID devolvido por `save_user_message`.
+            chat_response (ChatResponse): Resposta gerada pelo agente.
+            closes_session (bool): Se a resposta encerra a sessão (triagem
+                registrada ou emergência), marcando-a para compactação.
+        """
+        update: Dict[str, Any] = {
             "agent_message": chat_response.response,
-            "timestamp": datetime.utcnow(),
+            "replied_at": chat_response.timestamp,
         }
-        result = await self.messages.insert_one(doc)
-        return str(result.inserted_id)
+        if closes_session:
+            update["closes_session"] = True
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="update_one"):
+            await self.messages.update_one({"_id": message_id}, {"$set": update})
 
     async def get_conversation(self, conversation_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """
@@ -64,26 +283,78 @@ class PersistenceService:
             .sort("timestamp", 1)
             .limit(limit)
         )
-        return await cursor.to_list(length=limit)
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="find"):
+            return await cursor.to_list(length=limit)
 
-    async def save_triage(self, conversation_id: str, triage_data: Dict[str, Any]) -> str:
+    async def get_turns(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        exclude_id: Any = None,
+    ) -> List[Turn]:
         """
-        Salva o resumo estruturado da triagem (já consolidado).
+        Recupera o histórico de uma conversa já no formato compacto do grafo.
+
+        Lê apenas os textos de cada turno (projeção no banco), sem `_id`,
+        identificadores, canal e datas.
+
+        Args:
+            conversation_id (str): Identificador único da conversa.
+            limit (int): Número máximo de turnos (registros) a ler.
+            exclude_id (Any): `_id` do turno em andamento, deixado de fora
+                mesmo que a leitura corra em paralelo com a sua gravação.
+
+        Returns:
+            List[Turn]: Falas do paciente e do agente, em ordem.
+        """
+        query: Dict[str, Any] = {"conversation_id": conversation_id}
+        if exclude_id is not None:
+            query["_id"] = {"$ne": exclude_id}
+        cursor = (
+            self.messages.find(
+                query,
+                {"_id": 0, "user_message": 1, "agent_message": 1},
+            )
+            .sort("timestamp", 1)
+            .limit(limit)
+        )
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="find"):
+            return turns_from_docs(await cursor.to_list(length=limit))
+
+    async def save_triage(
+        self,
+        conversation_id: str,
+        triage_data: Dict[str, Any],
+        usage: Optional[Dict[str, Any]] = None,
+        channel: Optional[str] = None,
+    ) -> str:
+        """
+        Salva o resumo estruturado da triagem (já consolidado), já com a
+        pontuação de urgência que a posiciona na fila da equipe médica.
 
         Args:
             conversation_id (str): Identificador único da conversa.
             triage_data (Dict[str, Any]): Dados estruturados da triagem,
                                           conforme extração pelo agente.
+            usage (Optional[Dict[str, Any]]): Tokens e custo do LLM acumulados
+                                              na conversa (ver `UsageTracker`).
+            channel (Optional[str]): Canal de origem da conversa.
 
         Returns:
             str: ID do documento persistido.
         """
+        created_at = datetime.utcnow()
         doc = {
             "conversation_id": conversation_id,
+            "channel": channel,
             "data": triage_data,
-            "created_at": datetime.utcnow(),
+            "created_at": created_at,
+            **queue_fields(triage_data, created_at),
         }
-        result = await self.triages.insert_one(doc)
+        if usage:
+            doc["usage"] = usage
+        with timed(MONGO_OPERATION_SECONDS, collection="triages", operation="insert_one"):
+            result = await self.triages.insert_one(doc)
         return str(result.inserted_id)
 
     async def get_triage(self, conversation_id: str) -> Optional[Dict[str, Any]]:
@@ -96,4 +367,91 @@ class PersistenceService:
         Returns:
             Optional[Dict[str, Any]]: Documento da triagem, se existir.
         """
-        return await self.triages.find_one({"conversation_id": conversation_id})
+        with timed(MONGO_OPERATION_SECONDS, collection="triages", operation="find_one"):
+            return await self.triages.find_one({"conversation_id": conversation_id})
+
+    async def list_triages(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        min_intensity: Optional[int] = None,
+        max_intensity: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        channel: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Lista triagens (mais recentes primeiro) com paginação por cursor.
+
+        Args:
+            limit (int): Tamanho da página.
+            cursor (Optional[str]): Cursor devolvido pela página anterior.
+            min_intensity (Optional[int]): Intensidade mínima.
+            max_intensity (Optional[int]): Intensidade máxima.
+            since (Optional[datetime]): Criadas a partir desta data.
+            until (Optional[datetime]): Criadas até esta data.
+            channel (Optional[str]): Canal de origem.
+            fields (Optional[Sequence[str]]): Campos a projetar (ex.: "intensidade").
+
+        Raises:
+            ValueError: Se o cursor ou algum campo for inválido.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Página e próximo cursor.
+        """
+        query: Dict[str, Any] = {}
+        if channel:
+            query["channel"] = channel
+        intensity = _range(min_intensity, max_intensity)
+        if intensity:
+            query["data.intensidade"] = intensity
+        created = _range(since, until)
+        if created:
+            query["created_at"] = created
+        projection = build_projection(fields, TRIAGE_DOC_FIELDS, "created_at", TRIAGE_FIELD_ALIASES)
+        return await self._keyset_page(
+            self.for_queries(self.triages), query, "created_at", limit, cursor, projection
+        )
+
+    async def list_messages(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        channel: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Lista mensagens (mais recentes primeiro) com paginação por cursor,
+        opcionalmente restritas a uma conversa.
+
+        Args:
+            limit (int): Tamanho da página.
+            cursor (Optional[str]): Cursor devolvido pela página anterior.
+            conversation_id (Optional[str]): Conversa específica.
+            since (Optional[datetime]): Mensagens a partir desta data.
+            until (Optional[datetime]): Mensagens até esta data.
+            channel (Optional[str]): Canal de origem.
+            fields (Optional[Sequence[str]]): Campos a projetar.
+
+        Raises:
+            ValueError: Se o cursor ou algum campo for inválido.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: Página e próximo cursor.
+        """
+        query: Dict[str, Any] = {}
+        if conversation_id:
+            query["conversation_id"] = conversation_id
+        if channel:
+            query["channel"] = channel
+        timestamp = _range(since, until)
+        if timestamp:
+            query["timestamp"] = timestamp
+        projection = build_projection(fields, MESSAGE_FIELDS, "timestamp")
+        return await self._keyset_page(
+            self.for_queries(self.messages), query, "timestamp", limit, cursor, projection
+        )
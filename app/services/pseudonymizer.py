@@ -0,0 +1,175 @@
+"""
+Pseudonimização de telefones – ClinicAI
+---------------------------------------
+Esquema único para transformar o número do WhatsApp no identificador
+gravado como `conversation_id`/`user_id`: HMAC-SHA256 (`Hasher`) com
+`HASH_SALT` como chave.
+
+Remetentes frequentes têm o hash guardado em um LRU limitado
+(`PSEUDONYM_CACHE_SIZE`), evitando recalcular o HMAC a cada mensagem.
+
+O esquema anterior (`sha256(numero + HASH_SALT)`) não é compatível. Como
+hashes não são reversíveis, a migração recebe a lista de números conhecidos
+(ex.: exportação de contatos) e regrava, em lotes, os registros de cada um:
+
+    python -m app.services.pseudonymizer --numbers contatos.txt --dry-run
+    python -m app.services.pseudonymizer --numbers contatos.txt
+"""
+
+import argparse
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pymongo import UpdateMany
+
+from app.services.persistence import PersistenceService
+from app.settings import settings
+from app.utils.hashing import Hasher
+from app.utils.metrics import MONGO_OPERATION_SECONDS, REGISTRY, timed
+
+
+PSEUDONYM_CACHE_TOTAL = REGISTRY.counter(
+    "clinicai_pseudonym_cache_total", "Consultas ao cache de pseudônimos.", ("result",)
+)
+
+PSEUDONYMIZED_COLLECTIONS = ("messages", "triages", "conversations_archive")
+PSEUDONYMIZED_FIELDS = ("conversation_id", "user_id")
+
+
+def normalize_number(number: str) -> str:
+    """Remove espaços e o `+` inicial do número (formato `wa_id`)."""
+    return number.strip().lstrip("+")
+
+
+def legacy_hash(number: str, salt: Optional[str] = None) -> str:
+    """
+    Hash do esquema anterior do webhook, usado apenas na migração.
+
+    Returns:
+        str: `sha256(numero + HASH_SALT)` em hexadecimal.
+    """
+    salt = settings.HASH_SALT if salt is None else salt
+    return hashlib.sha256(f"{number}{salt}".encode()).hexdigest()
+
+
+class Pseudonymizer:
+    """
+    Converte números de telefone em pseudônimos estáveis, com cache LRU.
+    """
+
+    def __init__(self, hasher: Optional[Hasher] = None, maxsize: Optional[int] = None) -> None:
+        self.hasher = hasher or Hasher(settings.HASH_SALT)
+        self.maxsize = maxsize or settings.PSEUDONYM_CACHE_SIZE
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def pseudonymize(self, number: str) -> str:
+        """
+        Pseudônimo do número.
+
+        Args:
+            number (str): Número do WhatsApp (ex.: campo `from` do webhook).
+
+        Returns:
+            str: HMAC-SHA256 hexadecimal do número normalizado.
+        """
+        key = normalize_number(number)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            PSEUDONYM_CACHE_TOTAL.inc(result="hit")
+            return cached
+
+        PSEUDONYM_CACHE_TOTAL.inc(result="miss")
+        value = self.hasher.hash_value(key)
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+@lru_cache
+def get_pseudonymizer() -> Pseudonymizer:
+    """Retorna o pseudonimizador compartilhado do processo."""
+    return Pseudonymizer()
+
+
+def _batches(values: Iterable[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for value in values:
+        batch.append(value)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def rehash_legacy_records(
+    numbers: Iterable[str],
+    persistence: Optional[PersistenceService] = None,
+    pseudonymizer: Optional[Pseudonymizer] = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    legacy_salt: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Regrava os identificadores do esquema anterior com o pseudônimo atual.
+
+    Para cada lote de números, calcula o par (hash anterior → pseudônimo) e
+    aplica um único `bulk_write` não ordenado por collection.
+
+    Args:
+        numbers (Iterable[str]): Números de telefone conhecidos.
+        persistence (Optional[PersistenceService]): Acesso ao MongoDB.
+        pseudonymizer (Optional[Pseudonymizer]): Esquema atual.
+        batch_size (int): Números por lote.
+        dry_run (bool): Apenas conta os documentos que seriam alterados.
+        legacy_salt (Optional[str]): Salt do esquema anterior (padrão: `HASH_SALT`).
+
+    Returns:
+        Dict[str, int]: Documentos alterados (ou a alterar) por collection.
+    """
+    persistence = persistence or PersistenceService()
+    pseudonymizer = pseudonymizer or get_pseudonymizer()
+    totals = {name: 0 for name in PSEUDONYMIZED_COLLECTIONS}
+
+    for batch in _batches((n for n in map(normalize_number, numbers) if n), batch_size):
+        mapping = {legacy_hash(number, legacy_salt): pseudonymizer.pseudonymize(number) for number in batch}
+        for name in PSEUDONYMIZED_COLLECTIONS:
+            collection = persistence.db[name]
+            if dry_run:
+                totals[name] += await collection.count_documents(
+                    {"$or": [{field: {"$in": list(mapping)}} for field in PSEUDONYMIZED_FIELDS]}
+                )
+                continue
+            operations = [
+                UpdateMany({field: old}, {"$set": {field: new}})
+                for old, new in mapping.items()
+                for field in PSEUDONYMIZED_FIELDS
+            ]
+            with timed(MONGO_OPERATION_SECONDS, collection=name, operation="bulk_write"):
+                result = await collection.bulk_write(operations, ordered=False)
+            totals[name] += result.modified_count
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migra registros para o pseudônimo HMAC dos telefones.")
+    parser.add_argument("--numbers", required=True, help="Arquivo com um número de telefone por linha")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Apenas conta os documentos afetados")
+    args = parser.parse_args(argv)
+
+    with open(args.numbers, encoding="utf-8") as numbers:
+        result = asyncio.run(rehash_legacy_records(numbers, batch_size=args.batch_size, dry_run=args.dry_run))
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,579 @@
+"""
+Replay offline de conversas gravadas – ClinicAI
+-----------------------------------------------
+Reconduz conversas reais pelo `TriageAgent` para medir o efeito de uma
+mudança no prompt do sistema (`prompts/system_triage.txt`) ou no modelo
+antes de colocá-la em produção.
+
+- Fontes: a collection `messages` (cursor ordenado por conversa e horário)
+  ou um arquivo NDJSON com um documento de `messages` por linha. Linhas com
+  a triagem (`data`, como em `triages`, ou as colunas de `/triages/export`)
+  associam a triagem registrada às sessões encerradas da conversa.
+- Cada conversa é dividida em sessões (encerradas pela triagem registrada
+  ou por emergência); as mensagens gravadas do paciente são reenviadas uma a
+  uma até o agente encerrar a triagem ou elas acabarem. Mensagens com sinais
+  de emergência interrompem a sessão, como no `ChatService`.
+- Um conjunto limitado de workers (`REPLAY_CONCURRENCY`) consome uma fila
+  alimentada pela fonte; o estado do grafo fica em memória (`MemorySaver`)
+  e nada é gravado no banco.
+- LLM: `recorded` devolve as respostas gravadas (linha de base), `fake` usa
+  o simulador local e `configured` usa o backend de `get_llm()` (ex.: Gemini,
+  com `--model`); `--system-prompt` substitui o prompt do sistema.
+
+O relatório traz a taxa de conclusão, a média de turnos por triagem, o
+preenchimento dos campos extraídos e as chamadas, tokens e custo do LLM por
+conversa, ao lado dos números da gravação.
+
+Uso:
+    python -m app.services.replay --llm recorded --limit 500
+    python -m app.services.replay --input conversas.ndjson --llm configured \\
+        --system-prompt prompts/system_triage_v2.txt --json
+"""
+
+import argparse
+import asyncio
+import json
+import pathlib
+import statistics
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langgraph.checkpoint.memory import MemorySaver
+from loguru import logger
+
+from app.agents.graph import TriageAgent
+from app.services.llm import LLMService, build_prompt_prefix, get_llm, load_system_prompt
+from app.services.llm_backends import EXTRACTION_MARKER, ChatBackend, FakeChatModel
+from app.services.persistence import PersistenceService
+from app.services.replies import is_closing_reply, is_emergency_reply
+from app.services.triage_guard import TriageGuard
+from app.services.triage_parser import TRIAGE_FIELDS, filled_fields
+from app.services.usage import estimate_cost, extract_cached_tokens, extract_token_usage
+from app.settings import settings
+
+
+COMPLETED = "completed"
+EMERGENCY = "emergency"
+INCOMPLETE = "incomplete"
+FAILED = "error"
+
+LLM_MODES = ("recorded", "fake", "configured")
+
+_MESSAGE_PROJECTION = {
+    "conversation_id": 1, "channel": 1, "user_message": 1, "agent_message": 1,
+    "timestamp": 1, "closes_session": 1,
+}
+
+
+@dataclass
+class RecordedConversation:
+    """
+    Sessão gravada de uma conversa (até a triagem registrada ou emergência).
+
+    Attributes:
+        conversation_id (str): Conversa de origem.
+        session (int): Índice da sessão dentro da conversa.
+        channel (Optional[str]): Canal da conversa.
+        user_messages (List[str]): Mensagens do paciente, em ordem.
+        agent_replies (List[str]): Respostas gravadas do agente (uma por mensagem).
+        completed (bool): Se a sessão gravada terminou com a triagem registrada.
+        triage (Optional[Dict[str, Any]]): Triagem registrada, se conhecida.
+    """
+    conversation_id: str
+    session: int
+    channel: Optional[str]
+    user_messages: List[str]
+    agent_replies: List[str]
+    completed: bool = False
+    triage: Optional[Dict[str, Any]] = None
+
+    @property
+    def session_id(self) -> str:
+        return f"{self.conversation_id}:{self.session}"
+
+
+def split_sessions(
+    docs: Sequence[Dict[str, Any]],
+    triages: Iterable[Dict[str, Any]] = (),
+) -> List[RecordedConversation]:
+    """
+    Divide os turnos de uma conversa (em ordem cronológica) em sessões.
+
+    Uma sessão termina na resposta que registra a triagem, na orientação de
+    emergência ou em um turno marcado com `closes_session`. As triagens
+    recebidas, em ordem de criação, são associadas às sessões concluídas.
+    Turnos sem mensagem do paciente e registros legados duplicados (mensagem
+    do usuário gravada também como resposta) são ignorados.
+    """
+    pending = list(triages)
+    sessions: List[RecordedConversation] = []
+    users: List[str] = []
+    replies: List[str] = []
+    for doc in docs:
+        user, reply = doc.get("user_message"), doc.get("agent_message") or ""
+        if not user or reply == user:
+            continue
+        users.append(user)
+        replies.append(reply)
+        closing = is_closing_reply(reply)
+        if closing or doc.get("closes_session") or is_emergency_reply(reply):
+            sessions.append(RecordedConversation(
+                conversation_id=doc["conversation_id"],
+                session=len(sessions),
+                channel=doc.get("channel"),
+                user_messages=users,
+                agent_replies=replies,
+                completed=closing,
+                triage=pending.pop(0) if closing and pending else None,
+            ))
+            users, replies = [], []
+    if users:
+        sessions.append(RecordedConversation(
+            conversation_id=docs[-1]["conversation_id"],
+            session=len(sessions),
+            channel=docs[-1].get("channel"),
+            user_messages=users,
+            agent_replies=replies,
+        ))
+    return sessions
+
+
+def _triage_from_doc(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Triagem de uma linha NDJSON (`data` de `triages` ou colunas da exportação)."""
+    if isinstance(doc.get("data"), dict):
+        return doc["data"]
+    if "user_message" not in doc and any(name in doc for name in TRIAGE_FIELDS):
+        return {name: doc[name] for name in TRIAGE_FIELDS if name in doc}
+    return None
+
+
+def load_ndjson_sessions(path: pathlib.Path) -> List[RecordedConversation]:
+    """
+    Lê as sessões gravadas de um arquivo NDJSON.
+
+    Args:
+        path (pathlib.Path): Documentos de `messages` (e, opcionalmente,
+            triagens), um por linha, em qualquer ordem.
+
+    Returns:
+        List[RecordedConversation]: Sessões por conversa, em ordem cronológica.
+    """
+    messages: Dict[str, List[Dict[str, Any]]] = {}
+    triages: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            conversation_id = doc.get("conversation_id")
+            if not conversation_id:
+                continue
+            triage = _triage_from_doc(doc)
+            if triage is not None:
+                triages.setdefault(conversation_id, []).append({**doc, "data": triage})
+            else:
+                messages.setdefault(conversation_id, []).append(doc)
+
+    sessions: List[RecordedConversation] = []
+    for conversation_id, docs in messages.items():
+        docs.sort(key=lambda d: str(d.get("timestamp") or ""))
+        recorded = sorted(triages.get(conversation_id, ()), key=lambda d: str(d.get("created_at") or ""))
+        sessions.extend(split_sessions(docs, [t["data"] for t in recorded]))
+    return sessions
+
+
+async def iter_mongo_sessions(
+    persistence: PersistenceService,
+    since: Optional[datetime] = None,
+) -> AsyncIterator[RecordedConversation]:
+    """
+    Itera as sessões gravadas em `messages`, uma conversa por vez.
+
+    O cursor segue o índice `(conversation_id, timestamp)` em lotes de
+    `EXPORT_BATCH_SIZE`; só os turnos da conversa corrente ficam em memória.
+    As triagens de cada conversa são lidas de `triages`.
+
+    Args:
+        persistence (PersistenceService): Acesso ao MongoDB.
+        since (Optional[datetime]): Considera apenas turnos a partir desta data.
+    """
+    query = {"timestamp": {"$gte": since}} if since else {}
+    triages = persistence.for_queries(persistence.triages)
+    cursor = (
+        persistence.for_queries(persistence.messages).find(query, _MESSAGE_PROJECTION)
+        .sort([("conversation_id", 1), ("timestamp", 1)])
+        .batch_size(settings.EXPORT_BATCH_SIZE)
+    )
+
+    async def flush(docs: List[Dict[str, Any]]) -> List[RecordedConversation]:
+        found = await (
+            triages.find({"conversation_id": docs[0]["conversation_id"]}, {"data": 1})
+            .sort("created_at", 1)
+            .to_list(length=None)
+        )
+        return split_sessions(docs, [t.get("data") or {} for t in found])
+
+    docs: List[Dict[str, Any]] = []
+    async for doc in cursor:
+        if docs and doc.get("conversation_id") != docs[0].get("conversation_id"):
+            for session in await flush(docs):
+                yield session
+            docs = []
+        docs.append(doc)
+    if docs:
+        for session in await flush(docs):
+            yield session
+
+
+@dataclass
+class ReplayContext:
+    """Sessão em reprocessamento no worker corrente e o uso do LLM nela."""
+    recording: RecordedConversation
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+_current: ContextVar[Optional[ReplayContext]] = ContextVar("replay_session", default=None)
+
+
+class RecordedChatModel:
+    """
+    Backend que devolve as respostas gravadas da sessão em reprocessamento.
+
+    A resposta de cada turno é escolhida pelo número de respostas do agente
+    já presentes no histórico; pedidos de extração (`EXTRACTION_MARKER`)
+    recebem a triagem registrada (ou um JSON vazio).
+    """
+
+    async def ainvoke(self, messages: Sequence[BaseMessage], **kwargs: Any) -> AIMessage:
+        recording = _current.get().recording
+        if messages and EXTRACTION_MARKER in str(messages[-1].content):
+            reply = json.dumps(recording.triage or {}, ensure_ascii=False)
+        else:
+            turn = sum(1 for m in messages if isinstance(m, AIMessage))
+            replies = recording.agent_replies
+            reply = replies[min(turn, len(replies) - 1)] if replies else ""
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(reply) // 4
+        return AIMessage(
+            content=reply,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+
+class MeteredBackend:
+    """
+    Envolve o backend contabilizando chamadas, tokens e custo na sessão do
+    worker corrente (inclusive turnos que não chegam a registrar a triagem).
+    """
+
+    def __init__(self, backend: ChatBackend) -> None:
+        self.backend = backend
+
+    async def ainvoke(self, messages: Sequence[BaseMessage], **kwargs: Any) -> AIMessage:
+        response = await self.backend.ainvoke(messages, **kwargs)
+        context = _current.get()
+        if context is not None:
+            input_tokens, output_tokens = extract_token_usage(response)
+            context.calls += 1
+            context.input_tokens += input_tokens
+            context.output_tokens += output_tokens
+            context.cost_usd += estimate_cost(input_tokens, output_tokens, extract_cached_tokens(response))
+        return response
+
+
+class TriageRecorder:
+    """Substitui a persistência do agente, guardando as triagens em memória."""
+
+    def __init__(self) -> None:
+        self.triages: Dict[str, Dict[str, Any]] = {}
+
+    async def save_triage(self, conversation_id: str, triage_data: Dict[str, Any], **kwargs: Any) -> None:
+        self.triages[conversation_id] = triage_data
+
+
+@dataclass
+class ReplayResult:
+    """Resultado do reprocessamento de uma sessão."""
+    session_id: str
+    outcome: str
+    turns: int
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    fields: List[str]
+    recorded_turns: int
+    recorded_completed: bool
+    recorded_fields: List[str]
+    error: Optional[str] = None
+
+
+@dataclass
+class ReplayReport:
+    """
+    Resumo do replay, com os números equivalentes da gravação (`recorded_*`).
+
+    `avg_turns_per_triage` e `field_completeness` consideram apenas as
+    sessões concluídas; os valores por conversa consideram todas.
+    """
+    prompt_version: str
+    conversations: int
+    completed: int
+    emergencies: int
+    incomplete: int
+    errors: int
+    completion_rate: float
+    avg_turns_per_triage: float
+    field_completeness: float
+    field_fill_rate: Dict[str, float]
+    llm_calls_per_conversation: float
+    tokens_per_conversation: float
+    cost_per_conversation_usd: float
+    recorded_completion_rate: float
+    recorded_avg_turns_per_triage: float
+    recorded_field_completeness: float
+    elapsed_seconds: float = 0.0
+    failures: List[Dict[str, str]] = field(default_factory=list)
+
+
+def _mean(values: Sequence[float]) -> float:
+    return round(statistics.fmean(values), 4) if values else 0.0
+
+
+def summarize(results: Sequence[ReplayResult], prompt_version: str = "") -> ReplayReport:
+    """Agrega os resultados das sessões no relatório do replay."""
+    total = len(results)
+    completed = [r for r in results if r.outcome == COMPLETED]
+    recorded = [r for r in results if r.recorded_completed]
+    recorded_with_triage = [r for r in recorded if r.recorded_fields]
+    return ReplayReport(
+        prompt_version=prompt_version,
+        conversations=total,
+        completed=len(completed),
+        emergencies=sum(r.outcome == EMERGENCY for r in results),
+        incomplete=sum(r.outcome == INCOMPLETE for r in results),
+        errors=sum(r.outcome == FAILED for r in results),
+        completion_rate=round(len(completed) / total, 4) if total else 0.0,
+        avg_turns_per_triage=_mean([r.turns for r in completed]),
+        field_completeness=_mean([len(r.fields) / len(TRIAGE_FIELDS) for r in completed]),
+        field_fill_rate={
+            name: _mean([name in r.fields for r in completed]) for name in TRIAGE_FIELDS
+        },
+        llm_calls_per_conversation=_mean([r.llm_calls for r in results]),
+        tokens_per_conversation=_mean([r.input_tokens + r.output_tokens for r in results]),
+        cost_per_conversation_usd=round(statistics.fmean([r.cost_usd for r in results]), 8) if results else 0.0,
+        recorded_completion_rate=round(len(recorded) / total, 4) if total else 0.0,
+        recorded_avg_turns_per_triage=_mean([r.recorded_turns for r in recorded]),
+        recorded_field_completeness=_mean(
+            [len(r.recorded_fields) / len(TRIAGE_FIELDS) for r in recorded_with_triage]
+        ),
+        failures=[{"session_id": r.session_id, "error": r.error or ""} for r in results if r.error],
+    )
+
+
+async def _aiter(source: Iterable[RecordedConversation]) -> AsyncIterator[RecordedConversation]:
+    for item in source:
+        yield item
+
+
+class ReplayEngine:
+    """
+    Reconduz sessões gravadas pelo `TriageAgent` com um conjunto limitado
+    de workers, sem tocar no banco.
+    """
+
+    def __init__(
+        self,
+        backend: ChatBackend,
+        system_prompt: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        guard: Optional[TriageGuard] = None,
+    ) -> None:
+        """
+        Args:
+            backend (ChatBackend): Backend do LLM (ver `build_backend`).
+            system_prompt (Optional[str]): Prompt do sistema avaliado
+                (padrão: o prompt atual).
+            concurrency (Optional[int]): Número de workers (padrão: `REPLAY_CONCURRENCY`).
+            guard (Optional[TriageGuard]): Detector de emergência.
+        """
+        self.llm = LLMService(
+            client=MeteredBackend(backend),
+            prompt_prefix=build_prompt_prefix(system_prompt) if system_prompt is not None else None,
+        )
+        if isinstance(backend, (RecordedChatModel, FakeChatModel)):
+            # Backends locais (gravado, simulador) não usam o cache do Gemini.
+            self.llm.context_cache = None
+        self.recorder = TriageRecorder()
+        self.agent = TriageAgent(llm=self.llm, persistence=self.recorder, checkpointer=MemorySaver())
+        self.guard = guard or TriageGuard()
+        self.concurrency = concurrency or settings.REPLAY_CONCURRENCY
+
+    async def replay_session(self, recording: RecordedConversation) -> ReplayResult:
+        """
+        Reenvia as mensagens gravadas do paciente até o agente registrar a
+        triagem, surgir uma emergência ou as mensagens acabarem.
+        """
+        context = ReplayContext(recording)
+        token = _current.set(context)
+        thread_id = f"replay:{recording.session_id}"
+        outcome, turns, error = INCOMPLETE, 0, None
+        try:
+            for message in recording.user_messages:
+                if self.guard.is_emergency(message):
+                    outcome = EMERGENCY
+                    break
+                turns += 1
+                state = await self.agent.run({
+                    "conversation_id": thread_id,
+                    "channel": recording.channel,
+                    "user_message": message,
+                })
+                if is_closing_reply(state.get("agent_message", "")):
+                    outcome = COMPLETED
+                    break
+        except Exception as exc:
+            outcome, error = FAILED, f"{type(exc).__name__}: {exc}"
+            logger.warning("Falha no replay de {}: {}", recording.session_id, error)
+        finally:
+            _current.reset(token)
+            self.llm.usage.pop(thread_id)
+            await self.agent.reset(thread_id)
+
+        triage = self.recorder.triages.pop(thread_id, {})
+        return ReplayResult(
+            session_id=recording.session_id,
+            outcome=outcome,
+            turns=turns,
+            llm_calls=context.calls,
+            input_tokens=context.input_tokens,
+            output_tokens=context.output_tokens,
+            cost_usd=context.cost_usd,
+            fields=filled_fields(triage),
+            recorded_turns=len(recording.user_messages),
+            recorded_completed=recording.completed,
+            recorded_fields=filled_fields(recording.triage or {}),
+            error=error,
+        )
+
+    async def run(
+        self,
+        sessions: Union[Iterable[RecordedConversation], AsyncIterator[RecordedConversation]],
+        limit: Optional[int] = None,
+    ) -> List[ReplayResult]:
+        """
+        Reprocessa as sessões com `concurrency` workers.
+
+        A fila entre a fonte e os workers é limitada, de modo que a leitura
+        do banco acompanha o ritmo do reprocessamento.
+
+        Args:
+            sessions: Sessões gravadas (iterável síncrono ou assíncrono).
+            limit (Optional[int]): Número máximo de sessões reprocessadas.
+
+        Returns:
+            List[ReplayResult]: Resultados, na ordem de conclusão.
+        """
+        source = sessions if hasattr(sessions, "__aiter__") else _aiter(sessions)
+        queue: "asyncio.Queue[Optional[RecordedConversation]]" = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: List[ReplayResult] = []
+
+        async def produce() -> None:
+            count = 0
+            try:
+                async for recording in source:
+                    if limit is not None and count >= limit:
+                        break
+                    await queue.put(recording)
+                    count += 1
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def work() -> None:
+            while (recording := await queue.get()) is not None:
+                results.append(await self.replay_session(recording))
+
+        await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+        return results
+
+
+def build_backend(mode: str) -> ChatBackend:
+    """
+    Backend do LLM para o replay: `recorded`, `fake` ou `configured`.
+    """
+    if mode == "recorded":
+        return RecordedChatModel()
+    if mode == "fake":
+        return FakeChatModel()
+    return get_llm()
+
+
+def format_report(report: ReplayReport) -> str:
+    """Relatório em texto, com os números da gravação entre parênteses."""
+    fill = ", ".join(f"{name} {rate:.0%}" for name, rate in report.field_fill_rate.items())
+    return "\n".join([
+        f"Prompt {report.prompt_version}: {report.conversations} sessões em {report.elapsed_seconds:.1f}s "
+        f"({report.completed} concluídas, {report.emergencies} emergências, "
+        f"{report.incomplete} incompletas, {report.errors} erros)",
+        f"  taxa de conclusão      {report.completion_rate:6.1%} (gravação {report.recorded_completion_rate:.1%})",
+        f"  turnos por triagem     {report.avg_turns_per_triage:6.2f} (gravação {report.recorded_avg_turns_per_triage:.2f})",
+        f"  campos preenchidos     {report.field_completeness:6.1%} (gravação {report.recorded_field_completeness:.1%})",
+        f"    {fill}",
+        f"  chamadas LLM/conversa  {report.llm_calls_per_conversation:6.2f}",
+        f"  tokens/conversa        {report.tokens_per_conversation:8.0f}",
+        f"  custo/conversa (USD)   {report.cost_per_conversation_usd:.6f}",
+    ])
+
+
+async def run_replay(args: argparse.Namespace) -> ReplayReport:
+    if args.model:
+        settings.LLM_MODEL = args.model
+    system_prompt = load_system_prompt(args.system_prompt) if args.system_prompt else None
+    engine = ReplayEngine(build_backend(args.llm), system_prompt=system_prompt, concurrency=args.concurrency)
+
+    if args.input:
+        sessions: Any = load_ndjson_sessions(args.input)
+    else:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        sessions = iter_mongo_sessions(PersistenceService(), since)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await engine.run(sessions, limit=args.limit)
+    report = summarize(results, engine.llm.prompt_prefix.version)
+    report.elapsed_seconds = round(loop.time() - start, 3)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Reprocessa conversas gravadas pelo agente de triagem.")
+    parser.add_argument("--input", type=pathlib.Path, help="Arquivo NDJSON (padrão: collection `messages`)")
+    parser.add_argument("--since", help="Apenas turnos a partir desta data (ISO 8601; fonte MongoDB)")
+    parser.add_argument("--limit", type=int, default=None, help="Número máximo de sessões")
+    parser.add_argument("--llm", choices=LLM_MODES, default="recorded")
+    parser.add_argument("--model", help="Modelo do backend configurado (padrão: LLM_MODEL)")
+    parser.add_argument("--system-prompt", type=pathlib.Path, help="Prompt do sistema a avaliar")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Emite o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_replay(args))
+    if args.json:
+        print(json.dumps(asdict(report), ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
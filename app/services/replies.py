@@ -0,0 +1,154 @@
+"""
+Registro de respostas fixas pré-renderizadas – ClinicAI
+-------------------------------------------------------
+As respostas que não passam pelo LLM (emergência, encerramento, erro,
+espera e alta demanda) são serializadas uma única vez, na importação do
+módulo, em fragmentos JSON prontos para envio:
+
+- WhatsApp: corpo da Graph API, faltando apenas o destinatário.
+- Web: corpo de `ChatResponse`, faltando apenas a conversa e o horário.
+
+Os caminhos rápidos (guard de emergência, encerramento, sobrecarga)
+concatenam esses bytes em vez de construir e validar modelos Pydantic a
+cada mensagem, e todos usam o mesmo texto.
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.constants.emergencies import EMERGENCY_MARKERS, EMERGENCY_MESSAGE
+from app.constants.replies import (
+    CLOSING_MARKER,
+    CLOSING_MESSAGE,
+    ERROR_MESSAGE,
+    OVERLOAD_MESSAGE,
+    WAITING_MESSAGE,
+)
+from app.schemas.chat import ChatResponse
+
+
+DEFAULT_LOCALE = "pt-BR"
+
+EMERGENCY = "emergency"
+CLOSING = "closing"
+ERROR = "error"
+WAITING = "waiting"
+OVERLOAD = "overload"
+
+TEMPLATES: Dict[str, Dict[str, str]] = {
+    DEFAULT_LOCALE: {
+        EMERGENCY: EMERGENCY_MESSAGE,
+        CLOSING: CLOSING_MESSAGE,
+        ERROR: ERROR_MESSAGE,
+        WAITING: WAITING_MESSAGE,
+        OVERLOAD: OVERLOAD_MESSAGE,
+    },
+}
+
+WHATSAPP_PREFIX = b'{"messaging_product":"whatsapp","to":'
+
+
+def _json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass(frozen=True)
+class RenderedReply:
+    """
+    Resposta fixa com os fragmentos JSON já serializados.
+
+    Attributes:
+        name (str): Nome do modelo (ex.: "emergency").
+        locale (str): Idioma.
+        text (str): Texto da resposta.
+        closes_session (bool): Se a resposta encerra a conversa.
+    """
+
+    name: str
+    locale: str
+    text: str
+    closes_session: bool = False
+    _whatsapp_suffix: bytes = field(init=False, repr=False)
+    _web_body: bytes = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        body = _json(self.text)
+        object.__setattr__(self, "_whatsapp_suffix", b',"type":"text","text":{"body":' + body + b"}}")
+        object.__setattr__(self, "_web_body", b',"response":' + body + b',"timestamp":')
+
+    def whatsapp_payload(self, to: str) -> bytes:
+        """
+        Corpo pronto para a Graph API.
+
+        Args:
+            to (str): Número do destinatário.
+
+        Returns:
+            bytes: JSON equivalente a `WhatsAppSendMessage(to=to, text={"body": text})`.
+        """
+        return WHATSAPP_PREFIX + _json(to) + self._whatsapp_suffix
+
+    def web_payload(self, conversation_id: Optional[str], timestamp: datetime) -> bytes:
+        """
+        Corpo pronto para `POST /chat/`.
+
+        Returns:
+            bytes: JSON equivalente ao `ChatResponse` serializado pela API.
+        """
+        return (
+            b'{"conversation_id":' + _json(conversation_id)
+            + self._web_body + _json(timestamp.isoformat()) + b"}"
+        )
+
+    def chat_response(self, conversation_id: Optional[str], timestamp: Optional[datetime] = None) -> ChatResponse:
+        """Monta o `ChatResponse` da resposta sem revalidar os campos."""
+        return ChatResponse.model_construct(
+            conversation_id=conversation_id,
+            response=self.text,
+            timestamp=timestamp or datetime.utcnow(),
+        )
+
+
+class ReplyRegistry:
+    """
+    Índice das respostas fixas por nome/idioma e por texto.
+    """
+
+    def __init__(self, templates: Dict[str, Dict[str, str]], closing: Iterable[str] = (EMERGENCY, CLOSING)) -> None:
+        closing = set(closing)
+        self._by_name: Dict[Tuple[str, str], RenderedReply] = {}
+        self._by_text: Dict[str, RenderedReply] = {}
+        for locale, replies in templates.items():
+            for name, text in replies.items():
+                reply = RenderedReply(name, locale, text, closes_session=name in closing)
+                self._by_name[(name, locale)] = reply
+                self._by_text[text] = reply
+
+    def get(self, name: str, locale: str = DEFAULT_LOCALE) -> RenderedReply:
+        """
+        Raises:
+            KeyError: Se o modelo não existir para o idioma.
+        """
+        return self._by_name[(name, locale)]
+
+    def match(self, text: Optional[str]) -> Optional[RenderedReply]:
+        """Resposta fixa cujo texto é exatamente `text`, se houver."""
+        if text is None:
+            return None
+        return self._by_text.get(text)
+
+
+def is_emergency_reply(text: str) -> bool:
+    """Se a resposta contém a orientação de emergência (redação atual ou anterior)."""
+    lower_text = text.lower()
+    return any(marker in lower_text for marker in EMERGENCY_MARKERS)
+
+
+def is_closing_reply(text: str) -> bool:
+    """Se a resposta encerra a triagem com o registro dos dados."""
+    return CLOSING_MARKER in text.lower()
+
+
+REPLIES = ReplyRegistry(TEMPLATES)
@@ -0,0 +1,241 @@
+"""
+Retenção e compactação do histórico de conversas – ClinicAI
+-----------------------------------------------------------
+Manutenção periódica da collection `messages`:
+
+- Compactação: sessões encerradas (triagem registrada ou emergência) há mais
+  de `RETENTION_COMPACT_AFTER_HOURS` viram um único documento em
+  `conversations_archive`, e seus turnos são removidos de `messages`.
+- Retenção por canal: todo registro recebe `expires_at` conforme
+  `RETENTION_DAYS_WHATSAPP` / `RETENTION_DAYS_WEB` e é apagado pelo índice TTL
+  do MongoDB. `purge_expired` faz o mesmo em lotes, para ambientes sem o
+  monitor de TTL (ex.: `mongomock_motor`).
+- Throttling: o trabalho é feito em lotes de `RETENTION_BATCH_SIZE` com pausa
+  de `RETENTION_BATCH_PAUSE_SECONDS` entre eles, para não competir com o
+  tráfego das conversas.
+
+Uso:
+    python -m app.services.retention            # uma execução
+    python -m app.services.retention --dry-run  # apenas conta o que seria feito
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from pymongo import ASCENDING
+
+from app.services.persistence import PersistenceService, expires_at_for
+from app.settings import settings
+from app.utils.metrics import MONGO_OPERATION_SECONDS, REGISTRY, timed
+
+
+RETENTION_SESSIONS_TOTAL = REGISTRY.counter(
+    "clinicai_retention_sessions_compacted_total", "Sessões encerradas compactadas no arquivo."
+)
+RETENTION_DELETED_TOTAL = REGISTRY.counter(
+    "clinicai_retention_documents_deleted_total",
+    "Documentos removidos pela manutenção do histórico.",
+    ("collection", "reason"),
+)
+
+
+def compact_session(turns: List[Dict[str, Any]], closing: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Monta o documento de arquivo de uma sessão encerrada.
+
+    Registros legados em que a mensagem do usuário foi gravada também como
+    resposta do agente (duplicata) são descartados.
+
+    Args:
+        turns (List[Dict[str, Any]]): Turnos da sessão, em ordem cronológica.
+        closing (Dict[str, Any]): Turno que encerrou a sessão.
+
+    Returns:
+        Dict[str, Any]: Documento para `conversations_archive`.
+    """
+    compacted = [
+        {"user": t.get("user_message"), "agent": t.get("agent_message"), "at": t["timestamp"]}
+        for t in turns
+        if t.get("agent_message") != t.get("user_message")
+    ]
+    closed_at = closing["timestamp"]
+    return {
+        "_id": f"{closing['conversation_id']}:{closing['_id']}",
+        "conversation_id": closing["conversation_id"],
+        "user_id": closing.get("user_id"),
+        "channel": closing.get("channel"),
+        "started_at": turns[0]["timestamp"] if turns else closed_at,
+        "closed_at": closed_at,
+        "turns": compacted,
+        "archived_at": datetime.utcnow(),
+        "expires_at": expires_at_for(closing.get("channel"), closed_at),
+    }
+
+
+class RetentionService:
+    """
+    Compacta sessões encerradas e aplica a retenção do histórico em lotes.
+    """
+
+    def __init__(
+        self,
+        persistence: Optional[PersistenceService] = None,
+        batch_size: Optional[int] = None,
+        batch_pause: Optional[float] = None,
+    ) -> None:
+        self.persistence = persistence or PersistenceService()
+        self.archive = self.persistence.db["conversations_archive"]
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        self.batch_pause = settings.RETENTION_BATCH_PAUSE_SECONDS if batch_pause is None else batch_pause
+
+    async def _throttle(self) -> None:
+        if self.batch_pause:
+            await asyncio.sleep(self.batch_pause)
+
+    async def compact_closed_sessions(
+        self,
+        older_than: Optional[timedelta] = None,
+        max_batches: Optional[int] = None,
+        dry_run: bool = False,
+    ) -> int:
+        """
+        Arquiva as sessões encerradas há mais de `older_than`.
+
+        Cada sessão compreende os turnos da conversa até o turno de
+        encerramento, inclusive. O arquivo é gravado (idempotente, por
+        `replace_one` com upsert) antes da remoção dos turnos, de modo que
+        uma interrupção nunca perde histórico.
+
+        Args:
+            older_than (Optional[timedelta]): Idade mínima do encerramento.
+            max_batches (Optional[int]): Limite de lotes nesta execução.
+            dry_run (bool): Apenas conta as sessões elegíveis.
+
+        Returns:
+            int: Número de sessões compactadas (ou elegíveis, em `dry_run`).
+        """
+        if older_than is None:
+            older_than = timedelta(hours=settings.RETENTION_COMPACT_AFTER_HOURS)
+        cutoff = datetime.utcnow() - older_than
+        query = {"closes_session": True, "timestamp": {"$lt": cutoff}}
+        if dry_run:
+            return await self.persistence.messages.count_documents(query)
+
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            cursor = (
+                self.persistence.messages.find(query)
+                .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+                .limit(self.batch_size)
+            )
+            with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="find_closed"):
+                closings = await cursor.to_list(length=self.batch_size)
+            if not closings:
+                break
+
+            for closing in closings:
+                await self._compact_one(closing)
+            total += len(closings)
+            batches += 1
+            RETENTION_SESSIONS_TOTAL.inc(len(closings))
+            if len(closings) < self.batch_size:
+                break
+            await self._throttle()
+        return total
+
+    async def _compact_one(self, closing: Dict[str, Any]) -> None:
+        """Arquiva e remove os turnos de uma sessão encerrada."""
+        session_query = {
+            "conversation_id": closing["conversation_id"],
+            "timestamp": {"$lte": closing["timestamp"]},
+        }
+        turns = await (
+            self.persistence.messages.find(session_query)
+            .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+            .to_list(length=None)
+        )
+        archived = compact_session(turns, closing)
+        with timed(MONGO_OPERATION_SECONDS, collection="conversations_archive", operation="replace_one"):
+            await self.archive.replace_one({"_id": archived["_id"]}, archived, upsert=True)
+        ids = [t["_id"] for t in turns] or [closing["_id"]]
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="delete_many"):
+            result = await self.persistence.messages.delete_many({"_id": {"$in": ids}})
+        RETENTION_DELETED_TOTAL.inc(result.deleted_count, collection="messages", reason="compacted")
+
+    async def purge_expired(self, max_batches: Optional[int] = None, dry_run: bool = False) -> int:
+        """
+        Remove, em lotes, registros com `expires_at` vencido em `messages`
+        e `conversations_archive`.
+
+        Returns:
+            int: Número de documentos removidos (ou vencidos, em `dry_run`).
+        """
+        now = datetime.utcnow()
+        total = 0
+        for collection in (self.persistence.messages, self.archive):
+            query = {"expires_at": {"$lte": now}}
+            if dry_run:
+                total += await collection.count_documents(query)
+                continue
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                expired = await collection.find(query, {"_id": 1}).limit(self.batch_size).to_list(
+                    length=self.batch_size
+                )
+                if not expired:
+                    break
+                with timed(MONGO_OPERATION_SECONDS, collection=collection.name, operation="delete_many"):
+                    result = await collection.delete_many({"_id": {"$in": [d["_id"] for d in expired]}})
+                total += result.deleted_count
+                batches += 1
+                RETENTION_DELETED_TOTAL.inc(result.deleted_count, collection=collection.name, reason="expired")
+                if len(expired) < self.batch_size:
+                    break
+                await self._throttle()
+        return total
+
+    async def run_once(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Executa um ciclo completo de manutenção.
+
+        Returns:
+            Dict[str, int]: Sessões compactadas e documentos expirados removidos.
+        """
+        compacted = await self.compact_closed_sessions(dry_run=dry_run)
+        purged = await self.purge_expired(dry_run=dry_run)
+        return {"compacted_sessions": compacted, "purged_documents": purged}
+
+    async def run_forever(self, interval: Optional[float] = None) -> None:
+        """
+        Laço da manutenção em segundo plano (uma execução a cada `interval`
+        segundos); falhas são registradas e não interrompem o laço.
+        """
+        interval = interval or settings.RETENTION_INTERVAL_SECONDS
+        while True:
+            try:
+                result = await self.run_once()
+                logger.info("Manutenção do histórico concluída: {}", result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Falha na manutenção do histórico: {}", e)
+            await asyncio.sleep(interval)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compacta sessões encerradas e aplica a retenção do histórico.")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas conta o que seria processado")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    service = RetentionService(batch_size=args.batch_size)
+    result = asyncio.run(service.run_once(dry_run=args.dry_run))
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
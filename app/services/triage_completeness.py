@@ -0,0 +1,166 @@
+"""
+Acompanhamento do preenchimento da triagem – ClinicAI
+-----------------------------------------------------
+Decide, sem chamar o LLM, quando a conversa já tem o necessário para
+registrar a triagem:
+
+- Resumo (recap): o prompt do sistema pede ao agente um resumo com todos os
+  campos ("Queixa principal: ...; sintomas: ...; intensidade: 7/10; ...")
+  antes da confirmação do paciente. `parse_recap` lê esse resumo e devolve
+  a triagem já coagida ao schema; `latest_recap` procura o último resumo nas
+  falas do agente (o estado vem do próprio contexto da conversa, inclusive
+  em conversas semeadas a partir do histórico).
+- Campos exigidos (`TRIAGE_REQUIRED_FIELDS`): com todos preenchidos no
+  resumo e a confirmação do paciente ("sim", "ok", "correto"...), a
+  triagem é registrada direto do resumo, sem a resposta de encerramento nem
+  a extração pelo LLM.
+- Orçamento de turnos (`TRIAGE_MAX_TURNS`): atingido o limite de mensagens
+  do paciente, a conversa segue direto para o registro pela extração, que
+  inclui a última mensagem do paciente.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.constants.intents import INTENTS
+from app.services.persistence import AGENT, USER, Turn
+from app.services.triage_parser import TRIAGE_FIELDS, coerce_triage
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+
+TRIAGE_FINALIZATION_TOTAL = REGISTRY.counter(
+    "clinicai_triage_finalization_total",
+    "Triagens encerradas por caminho (confirmed, closing_recap, closing_extract, turn_budget).",
+    ("reason",),
+)
+
+RECAP_LABELS = {
+    "queixa principal": "queixa_principal",
+    "sintomas": "sintomas",
+    "início/duração": "duracao_frequencia",
+    "inicio/duracao": "duracao_frequencia",
+    "duração": "duracao_frequencia",
+    "intensidade": "intensidade",
+    "histórico": "historico",
+    "historico": "historico",
+    "medidas já tomadas": "medidas_tomadas",
+    "medidas tomadas": "medidas_tomadas",
+}
+
+# Textos que o prompt manda exibir no resumo quando o campo não foi informado,
+# e as negativas curtas com que o agente repete a resposta do paciente.
+RECAP_PLACEHOLDERS = frozenset({
+    "nenhuma queixa registrada",
+    "nenhum sintoma informado",
+    "não informado",
+    "nenhum histórico informado",
+    "nenhuma medida tomada",
+    "nenhum",
+    "nenhuma",
+    "nada",
+    "não",
+    "nao",
+})
+
+_RECAP_MARKER = "queixa principal"
+_RECAP_FIELD = re.compile(
+    r"(?P<label>" + "|".join(sorted(map(re.escape, RECAP_LABELS), key=len, reverse=True)) + r")"
+    r"\s*:\s*(?P<value>[^;\n]*)",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"\w+")
+_CONFIRMATIONS = frozenset(INTENTS["CONFIRMATION"])
+_NEGATIONS = frozenset(INTENTS["NEGATION"])
+# Palavras que acompanham a confirmação sem acrescentar informação ("tá tudo certo").
+_CONFIRMATION_FILLERS = frozenset({
+    "está", "esta", "tá", "ta", "tudo", "é", "e", "pode", "ser", "registrar", "confirmado", "perfeito",
+})
+
+
+def required_fields() -> List[str]:
+    """Campos exigidos para encerrar pelo resumo (`TRIAGE_REQUIRED_FIELDS`)."""
+    names = [name.strip() for name in settings.TRIAGE_REQUIRED_FIELDS.split(",")]
+    return [name for name in names if name in TRIAGE_FIELDS]
+
+
+def parse_recap(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê o resumo da triagem de uma resposta do agente.
+
+    Args:
+        text (str): Resposta do agente.
+
+    Returns:
+        Optional[Dict[str, Any]]: Triagem coagida ao schema (campos não
+        informados ficam vazios), ou None se a resposta não for um resumo
+        com todos os campos.
+    """
+    if _RECAP_MARKER not in text.lower():
+        return None
+    raw: Dict[str, Any] = {}
+    for match in _RECAP_FIELD.finditer(text):
+        name = RECAP_LABELS[match.group("label").lower()]
+        value = match.group("value").strip().rstrip(".").strip()
+        if value.lower().split(" (")[0] in RECAP_PLACEHOLDERS:
+            value = ""
+        raw.setdefault(name, value)
+    if len(raw) < len(TRIAGE_FIELDS):
+        return None
+    triage, _, _ = coerce_triage(raw)
+    return triage
+
+
+def latest_recap(turns: Sequence[Turn]) -> Optional[Dict[str, Any]]:
+    """Triagem do último resumo feito pelo agente na conversa, se houver."""
+    for turn in reversed(turns):
+        if turn.role == AGENT:
+            recap = parse_recap(turn.text)
+            if recap is not None:
+                return recap
+    return None
+
+
+def missing_fields(triage: Optional[Dict[str, Any]], required: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Campos exigidos ainda vazios (texto vazio ou intensidade 0).
+
+    Args:
+        triage (Optional[Dict[str, Any]]): Triagem conhecida até aqui.
+        required (Optional[Sequence[str]]): Campos exigidos (padrão: `required_fields()`).
+    """
+    triage = triage or {}
+    return [name for name in (required or required_fields()) if not triage.get(name)]
+
+
+def is_complete(triage: Optional[Dict[str, Any]]) -> bool:
+    """Se a triagem existe e tem todos os campos exigidos."""
+    return triage is not None and not missing_fields(triage)
+
+
+def is_confirmation(text: str) -> bool:
+    """
+    Se a mensagem do paciente confirma o resumo ("sim", "ok, correto"...):
+    todas as palavras são confirmações ou complementos sem conteúdo, e ao
+    menos uma é confirmação. Qualquer outra palavra ("sim, tenho febre
+    também", "ok, mas dor 9") pode corrigir o resumo e vai ao LLM.
+    """
+    words = _WORD.findall(text.lower())
+    return (
+        any(word in _CONFIRMATIONS for word in words)
+        and all(word in _CONFIRMATIONS or word in _CONFIRMATION_FILLERS for word in words)
+        and not _NEGATIONS.intersection(words)
+    )
+
+
+def patient_turns(turns: Sequence[Turn]) -> int:
+    """Mensagens do paciente no contexto da conversa."""
+    return sum(1 for turn in turns if turn.role == USER)
+
+
+def turn_budget_reached(turns: Sequence[Turn], max_turns: Optional[int] = None) -> bool:
+    """
+    Se a conversa já usou o orçamento de turnos (`TRIAGE_MAX_TURNS`; 0 desativa).
+    """
+    max_turns = settings.TRIAGE_MAX_TURNS if max_turns is None else max_turns
+    return bool(max_turns) and patient_turns(turns) >= max_turns
@@ -0,0 +1,304 @@
+"""
+Feed em tempo real de novas triagens – ClinicAI
+-----------------------------------------------
+Um único observador por processo acompanha a collection `triages` e
+distribui cada nova triagem a todos os clientes conectados (WebSocket/SSE).
+
+- Fonte: change stream do MongoDB (requer replica set). Se indisponível
+  (mongod standalone, `mongomock_motor`) ou com `FEED_MODE=poll`, faz
+  polling por `created_at` a cada `FEED_POLL_INTERVAL_SECONDS`. O
+  `created_at` vem do relógio da aplicação, e uma triagem pode ser gravada
+  depois de outra mais recente: cada polling revisita a janela de
+  `FEED_POLL_LOOKBACK_SECONDS` antes da triagem mais recente já vista e
+  descarta, pelo `_id`, as já publicadas.
+- Distribuição: o evento é serializado uma única vez e colocado, sem
+  bloquear, na fila limitada (`FEED_QUEUE_SIZE`) de cada cliente.
+- Consumidores lentos: quando a fila de um cliente enche, ele é desconectado
+  em vez de atrasar o observador e os demais clientes.
+- O observador só roda enquanto houver clientes inscritos.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from loguru import logger
+from pymongo import ASCENDING, DESCENDING
+
+from app.services.persistence import PersistenceService
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+
+FEED_SUBSCRIBERS = REGISTRY.gauge(
+    "clinicai_feed_subscribers", "Clientes conectados ao feed de triagens."
+)
+FEED_EVENTS_TOTAL = REGISTRY.counter(
+    "clinicai_feed_events_total", "Triagens publicadas no feed.", ("source",)
+)
+FEED_DROPPED_TOTAL = REGISTRY.counter(
+    "clinicai_feed_dropped_subscribers_total", "Clientes desconectados por não acompanharem o feed."
+)
+
+
+def triage_event(doc: Dict[str, Any]) -> str:
+    """
+    Serializa o resumo de uma triagem publicado no feed.
+
+    Returns:
+        str: Evento JSON (compartilhado por todos os clientes).
+    """
+    data = doc.get("data") or {}
+    created_at = doc.get("created_at")
+    return json.dumps({
+        "id": str(doc.get("_id")),
+        "conversation_id": doc.get("conversation_id"),
+        "channel": doc.get("channel"),
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        "queixa_principal": data.get("queixa_principal", ""),
+        "intensidade": data.get("intensidade", 0),
+        "urgency_score": doc.get("urgency_score"),
+    }, ensure_ascii=False)
+
+
+class Subscription:
+    """
+    Inscrição de um cliente no feed, com fila limitada própria.
+
+    Iterar a inscrição devolve os eventos até que ela seja encerrada
+    (pelo cliente ou por ter ficado para trás).
+    """
+
+    def __init__(self, feed: "TriageFeed", maxsize: int) -> None:
+        self.feed = feed
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def offer(self, event: str) -> bool:
+        """Entrega um evento sem bloquear; False se a fila estiver cheia."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self) -> None:
+        """Descarta eventos pendentes e sinaliza o fim da inscrição."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Aguarda o próximo evento.
+
+        Raises:
+            asyncio.TimeoutError: Se nenhum evento chegar em `timeout` segundos.
+
+        Returns:
+            Optional[str]: Evento ou None quando a inscrição foi encerrada.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        while True:
+            event = await self.queue.get()
+            if event is None:
+                return
+            yield event
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.feed.unsubscribe(self)
+
+
+class TriageFeed:
+    """
+    Observador compartilhado da collection `triages` com fan-out para clientes.
+    """
+
+    def __init__(
+        self,
+        persistence: Optional[PersistenceService] = None,
+        queue_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        mode: Optional[str] = None,
+        lookback: Optional[float] = None,
+    ) -> None:
+        self.persistence = persistence or PersistenceService()
+        self.queue_size = queue_size or settings.FEED_QUEUE_SIZE
+        self.poll_interval = poll_interval if poll_interval is not None else settings.FEED_POLL_INTERVAL_SECONDS
+        self.mode = mode or settings.FEED_MODE
+        self.lookback = timedelta(
+            seconds=lookback if lookback is not None else settings.FEED_POLL_LOOKBACK_SECONDS
+        )
+        self.subscribers: Set[Subscription] = set()
+        self.source: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._watermark: Optional[datetime] = None
+        self._seen: Dict[Any, datetime] = {}
+
+    async def subscribe(self) -> Subscription:
+        """
+        Inscreve um cliente, iniciando o observador se for o primeiro.
+
+        Aguarda o observador estar pronto, de modo que nenhuma triagem
+        criada após o retorno deixe de ser entregue.
+        """
+        subscription = Subscription(self, self.queue_size)
+        self.subscribers.add(subscription)
+        FEED_SUBSCRIBERS.set(len(self.subscribers))
+        if self._task is None or self._task.done():
+            self._ready.clear()
+            self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove o cliente e encerra o observador se não restar nenhum."""
+        self.subscribers.discard(subscription)
+        FEED_SUBSCRIBERS.set(len(self.subscribers))
+        if not self.subscribers:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Interrompe o observador e encerra todas as inscrições."""
+        for subscription in list(self.subscribers):
+            subscription.close()
+        self.subscribers.clear()
+        FEED_SUBSCRIBERS.set(0)
+        self._watermark = None
+        self._seen.clear()
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def publish(self, doc: Dict[str, Any], source: str = "direct") -> None:
+        """
+        Distribui uma triagem a todos os clientes, desconectando os que
+        estiverem com a fila cheia.
+        """
+        if "created_at" in doc and "_id" in doc:
+            self._remember(doc)
+        FEED_EVENTS_TOTAL.inc(source=source)
+        event = triage_event(doc)
+        for subscription in list(self.subscribers):
+            if not subscription.offer(event):
+                subscription.dropped = True
+                self.subscribers.discard(subscription)
+                subscription.close()
+                FEED_DROPPED_TOTAL.inc()
+                logger.warning("Cliente do feed de triagens desconectado por lentidão.")
+        FEED_SUBSCRIBERS.set(len(self.subscribers))
+
+    async def _run(self) -> None:
+        """
+        Executa o change stream ou, na sua falta, o polling. Se o observador
+        falhar, as inscrições são encerradas para que os clientes reconectem.
+        """
+        try:
+            await self._init_watermark()
+            if self.mode != "poll":
+                try:
+                    await self._watch_change_stream()
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.mode == "change_stream":
+                        raise
+                    logger.info("Change stream indisponível ({}); usando polling.", e)
+            await self._poll()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Feed de triagens interrompido: {}", e)
+            for subscription in list(self.subscribers):
+                subscription.close()
+            self.subscribers.clear()
+            FEED_SUBSCRIBERS.set(0)
+        finally:
+            self._ready.set()
+
+    def _remember(self, doc: Dict[str, Any]) -> None:
+        """Marca a triagem como publicada e avança a marca d'água."""
+        self._seen[doc["_id"]] = doc["created_at"]
+        if self._watermark is None or doc["created_at"] > self._watermark:
+            self._watermark = doc["created_at"]
+
+    async def _init_watermark(self) -> None:
+        """
+        Parte da triagem mais recente já existente (só novas serão
+        publicadas), marcando como vistas as da janela de revisita.
+        """
+        if self._watermark is not None:
+            return
+        latest = await self.persistence.triages.find_one(
+            {}, {"created_at": 1}, sort=[("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        if latest is None:
+            return
+        self._watermark = latest["created_at"]
+        recent = self.persistence.triages.find(
+            {"created_at": {"$gte": self._watermark - self.lookback}}, {"created_at": 1}
+        )
+        async for doc in recent:
+            self._remember(doc)
+
+    async def _watch_change_stream(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self.persistence.triages.watch(pipeline) as stream:
+            self.source = "change_stream"
+            self._ready.set()
+            async for change in stream:
+                self.publish(change["fullDocument"], source="change_stream")
+
+    async def _poll(self) -> None:
+        self.source = "poll"
+        self._ready.set()
+        while True:
+            query: Dict[str, Any] = {}
+            if self._watermark is not None:
+                query = {"created_at": {"$gte": self._watermark - self.lookback}}
+            cursor = self.persistence.triages.find(query).sort(
+                [("created_at", ASCENDING), ("_id", ASCENDING)]
+            )
+            async for doc in cursor:
+                if doc["_id"] not in self._seen:
+                    self.publish(doc, source="poll")
+            if self._watermark is not None:
+                cutoff = self._watermark - self.lookback
+                self._seen = {key: created_at for key, created_at in self._seen.items() if created_at >= cutoff}
+            await asyncio.sleep(self.poll_interval)
+
+
+async def sse_events(subscription: Subscription, heartbeat: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Formata uma inscrição como Server-Sent Events, com keep-alive periódico.
+
+    Encerra a inscrição ao terminar (inclusive se o cliente desconectar).
+    """
+    heartbeat = heartbeat or settings.FEED_HEARTBEAT_SECONDS
+    async with subscription:
+        while True:
+            try:
+                event = await subscription.get(timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                if subscription.dropped:
+                    yield "event: dropped\ndata: {}\n\n"
+                return
+            yield f"event: triage\ndata: {event}\n\n"
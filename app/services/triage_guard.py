@@ -3,6 +3,8 @@ Serviço para identificar possíveis emergências nas mensagens recebidas.
 Baseado nas constantes definidas em app/constants/emergencies.py.
 """
 
+from typing import List
+
 from app.constants.emergencies import EMERGENCY_KEYWORDS, EMERGENCY_MESSAGE
 
 
@@ -29,6 +31,19 @@ class TriageGuard:
         lower_text = user_message.lower()
         return any(keyword in lower_text for keyword in self.keywords)
 
+    def matched_keywords(self, text: str) -> List[str]:
+        """
+        Lista as palavras-chave de emergência presentes no texto.
+
+        Args:
+            text (str): Texto a ser verificado.
+
+        Returns:
+            List[str]: Palavras-chave encontradas (na ordem de `EMERGENCY_KEYWORDS`).
+        """
+        lower_text = text.lower()
+        return [keyword for keyword in self.keywords if keyword in lower_text]
+
     def get_alert_message(self) -> str:
         """
         Retorna a mensagem padrão a ser enviada em caso de emergência.
@@ -0,0 +1,372 @@
+"""
+Extração robusta da triagem – ClinicAI
+--------------------------------------
+Converte a resposta bruta do LLM no dicionário da `Triage` sem exigir
+uma nova chamada ao modelo quando o JSON vem imperfeito.
+
+Etapas (cada uma só roda se a anterior falhar):
+    1. Localiza o primeiro objeto JSON balanceado em uma única passada
+       (ignorando cercas de markdown e prosa ao redor).
+    2. `json.loads` direto no trecho encontrado.
+    3. Reparo dos defeitos comuns de LLM em uma única passada: aspas simples,
+       vírgulas finais, chaves sem aspas, literais Python (None/True/False)
+       e objetos truncados.
+    4. Recuperação campo a campo por expressão regular.
+
+Por fim, os valores são coagidos ao schema (`null` → padrão, intensidade
+"7/10" → 7, listas → texto) e o resultado informa quais campos foram
+recuperados e quais reparos foram necessários.
+"""
+
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.metrics import REGISTRY
+
+
+TEXT_FIELDS = (
+    "queixa_principal",
+    "sintomas",
+    "duracao_frequencia",
+    "historico",
+    "medidas_tomadas",
+)
+TRIAGE_FIELDS = TEXT_FIELDS[:3] + ("intensidade",) + TEXT_FIELDS[3:]
+
+FIELD_ALIASES = {
+    "main_complaint": "queixa_principal",
+    "queixa": "queixa_principal",
+    "symptoms": "sintomas",
+    "duracao": "duracao_frequencia",
+    "duração": "duracao_frequencia",
+    "duration": "duracao_frequencia",
+    "frequency": "duracao_frequencia",
+    "intensity": "intensidade",
+    "history": "historico",
+    "histórico": "historico",
+    "measures_taken": "medidas_tomadas",
+}
+
+TRIAGE_EXTRACTION_TOTAL = REGISTRY.counter(
+    "clinicai_triage_extraction_total",
+    "Extrações de triagem por resultado (clean, repaired, empty).",
+    ("outcome",),
+)
+
+_LITERALS = {"None": "null", "True": "true", "False": "false", "null": "null", "true": "true", "false": "false"}
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+_JSON_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_VALUE_END = ",}]\n"
+_FIELD_PATTERN = re.compile(
+    r"""["']?(?P<key>[A-Za-zÀ-ú_]+)["']?\s*:\s*(?:"(?P<dq>(?:[^"\\]|\\.)*)"|'(?P<sq>(?:[^'\\]|\\.)*)'"""
+    r"""|(?P<num>-?\d+(?:[.,]\d+)?)(?=\s*(?:[,}\]\n]|$))|(?P<bare>[^,{}\[\]\n"']+))"""
+)
+
+
+@dataclass
+class TriageExtraction:
+    """Resultado da extração: triagem coagida, campos recuperados e reparos aplicados."""
+
+    triage: Dict[str, Any] = field(default_factory=dict)
+    recovered: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def outcome(self) -> str:
+        """`clean`, `repaired` ou `empty`."""
+        if not self.recovered:
+            return "empty"
+        return "repaired" if self.repairs else "clean"
+
+
+def find_json_object(text: str) -> Optional[Tuple[int, int, bool]]:
+    """
+    Localiza o primeiro objeto JSON balanceado em uma única passada.
+
+    Strings (aspas simples ou duplas) e escapes são respeitados, de modo que
+    chaves dentro de textos não alteram a profundidade.
+
+    Returns:
+        Optional[Tuple[int, int, bool]]: (início, fim exclusivo, completo)
+        ou None se não houver `{`. Se o objeto estiver truncado, o fim é o
+        final do texto e `completo` é False.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    quote = ""
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = ""
+        elif ch == '"' or ch == "'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1, True
+    return start, len(text), False
+
+
+def repair_json(fragment: str) -> Tuple[str, List[str]]:
+    """
+    Corrige defeitos comuns de JSON gerado por LLM em uma única passada.
+
+    Returns:
+        Tuple[str, List[str]]: (JSON reparado, nomes dos reparos aplicados).
+    """
+    out: List[str] = []
+    repairs: List[str] = []
+    stack: List[str] = []
+    i = 0
+    n = len(fragment)
+
+    def note(name: str) -> None:
+        if name not in repairs:
+            repairs.append(name)
+
+    def after_colon() -> bool:
+        k = len(out) - 1
+        while k >= 0 and out[k].isspace():
+            k -= 1
+        return k >= 0 and out[k] == ":"
+
+    while i < n:
+        ch = fragment[i]
+
+        if ch not in "\"'{[" and not ch.isspace() and after_colon():
+            # Valor sem aspas: vai até o próximo `,`, `}`, `]` ou quebra de
+            # linha, para que "dor de cabeça" vire uma única string.
+            j = i
+            while j < n and fragment[j] not in _VALUE_END:
+                j += 1
+            value = fragment[i:j].rstrip()
+            if _JSON_NUMBER.fullmatch(value):
+                out.append(value)
+            elif value in _LITERALS:
+                if value != _LITERALS[value]:
+                    note("python_literals")
+                out.append(_LITERALS[value])
+            else:
+                out.append(json.dumps(value, ensure_ascii=False))
+                note("bare_words")
+            i += len(value)
+            continue
+
+        if ch == '"' or ch == "'":
+            if ch == "'":
+                note("single_quotes")
+            j = i + 1
+            buf: List[str] = []
+            while j < n and fragment[j] != ch:
+                c = fragment[j]
+                if c == "\\" and j + 1 < n:
+                    nxt = fragment[j + 1]
+                    buf.append(nxt if (ch == "'" and nxt == "'") else c + nxt)
+                    j += 2
+                    continue
+                if c == '"':
+                    buf.append('\\"')
+                elif c == "\n":
+                    buf.append("\\n")
+                    note("raw_newline")
+                else:
+                    buf.append(c)
+                j += 1
+            if j >= n:
+                note("unterminated_string")
+            out.append('"' + "".join(buf) + '"')
+            i = j + 1
+            continue
+
+        if ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                note("trailing_comma")
+            if stack:
+                stack.pop()
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (fragment[j].isalnum() or fragment[j] in "_-"):
+                j += 1
+            word = fragment[i:j]
+            k = j
+            while k < n and fragment[k].isspace():
+                k += 1
+            if k < n and fragment[k] == ":":
+                out.append(f'"{word}"')
+                note("unquoted_keys")
+            elif word in _LITERALS:
+                if word != _LITERALS[word]:
+                    note("python_literals")
+                out.append(_LITERALS[word])
+            else:
+                out.append(f'"{word}"')
+                note("bare_words")
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if stack:
+        while out and (out[-1].isspace() or out[-1] in ",:"):
+            out.pop()
+        out.extend(reversed(stack))
+        note("truncated")
+
+    return "".join(out), repairs
+
+
+def _salvage_fields(fragment: str) -> Dict[str, Any]:
+    """Recupera pares chave/valor individualmente quando o objeto é irrecuperável."""
+    data: Dict[str, Any] = {}
+    for match in _FIELD_PATTERN.finditer(fragment):
+        key = match.group("key")
+        if match.group("num") is not None:
+            data.setdefault(key, match.group("num"))
+        elif match.group("bare") is not None:
+            value = match.group("bare").strip()
+            if value:
+                data.setdefault(key, value)
+        else:
+            value = match.group("dq") if match.group("dq") is not None else match.group("sq")
+            data.setdefault(key, value.replace('\\"', '"').replace("\\n", "\n"))
+    return data
+
+
+def coerce_intensity(value: Any) -> Optional[int]:
+    """
+    Converte a intensidade (int, float, "7", "7/10", "nota 8") para 0–10;
+    valores não finitos (NaN, infinito) viram None.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = _NUMBER.search(str(value))
+        if match is None:
+            return None
+        number = float(match.group(0).replace(",", "."))
+    if not math.isfinite(number):
+        return None
+    return int(min(max(round(number), 0), 10))
+
+
+def _coerce_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_coerce_text(v) for v in value if v not in (None, ""))
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_coerce_text(v)}" for k, v in value.items())
+    return str(value).strip()
+
+
+def coerce_triage(data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    """
+    Adapta um dicionário arbitrário ao schema da `Triage`.
+
+    Returns:
+        Tuple: (triagem, campos recuperados, coerções aplicadas).
+    """
+    normalized: Dict[str, Any] = {}
+    for key, value in data.items():
+        name = FIELD_ALIASES.get(str(key).strip().lower(), str(key).strip().lower())
+        if name in normalized and name == "duracao_frequencia" and value:
+            normalized[name] = f"{_coerce_text(normalized[name])}; {_coerce_text(value)}".strip("; ")
+            continue
+        normalized.setdefault(name, value)
+
+    triage: Dict[str, Any] = {}
+    recovered: List[str] = []
+    coercions: List[str] = []
+    for name in TEXT_FIELDS:
+        if name not in normalized:
+            continue
+        raw = normalized[name]
+        text = _coerce_text(raw)
+        if raw is not None and not isinstance(raw, str):
+            coercions.append(f"coerced:{name}")
+        triage[name] = text
+        if text:
+            recovered.append(name)
+
+    if "intensidade" in normalized:
+        raw = normalized["intensidade"]
+        intensity = coerce_intensity(raw)
+        if not isinstance(raw, int) or isinstance(raw, bool) or intensity != raw:
+            coercions.append("coerced:intensidade")
+        triage["intensidade"] = intensity if intensity is not None else 0
+        if intensity:
+            recovered.append("intensidade")
+
+    recovered.sort(key=TRIAGE_FIELDS.index)
+    return triage, recovered, coercions
+
+
+def filled_fields(triage: Dict[str, Any]) -> List[str]:
+    """
+    Campos da triagem preenchidos (texto não vazio, intensidade acima de 0),
+    na ordem de `TRIAGE_FIELDS`.
+    """
+    return [name for name in TRIAGE_FIELDS if triage.get(name)]
+
+
+def parse_triage(text: str) -> TriageExtraction:
+    """
+    Extrai a triagem de uma resposta do LLM.
+
+    Args:
+        text (str): Resposta bruta (pode conter markdown, prosa, JSON imperfeito).
+
+    Returns:
+        TriageExtraction: Triagem coagida ao schema, campos recuperados e reparos.
+    """
+    if not text:
+        return TriageExtraction()
+
+    span = find_json_object(text)
+    if span is None:
+        data = _salvage_fields(text)
+        repairs = ["salvaged_fields"] if data else []
+    else:
+        start, end, complete = span
+        fragment = text[start:end]
+        repairs = []
+        try:
+            data = json.loads(fragment) if complete else None
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            repaired, repairs = repair_json(fragment)
+            try:
+                data = json.loads(repaired)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                data = _salvage_fields(fragment)
+                repairs = repairs + ["salvaged_fields"]
+
+    triage, recovered, coercions = coerce_triage(data)
+    return TriageExtraction(triage=triage, recovered=recovered, repairs=repairs + coercions)
@@ -0,0 +1,113 @@
+"""
+Fila de triagens por urgência clínica – ClinicAI
+------------------------------------------------
+Ordena o trabalho da equipe médica pela urgência de cada triagem
+(ver `app.services.urgency` para a pontuação e o envelhecimento).
+
+A própria collection `triages` funciona como fila: os campos de fila são
+gravados por `save_triage` e o índice `(queue_status, priority_key)` permite
+retirar a triagem mais urgente com um único `find_one_and_update` atômico
+(O(log n)), seguro com vários profissionais puxando da fila ao mesmo tempo.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING, ReturnDocument
+
+from app.services.persistence import PersistenceService
+from app.services.urgency import PENDING, effective_priority
+from app.utils.metrics import MONGO_OPERATION_SECONDS, timed
+
+
+CLAIMED = "claimed"
+DONE = "done"
+
+
+class TriageQueue:
+    """
+    Operações da fila de urgência sobre a collection `triages`.
+    """
+
+    def __init__(self, persistence: Optional[PersistenceService] = None) -> None:
+        self.persistence = persistence or PersistenceService()
+
+    @property
+    def triages(self):
+        return self.persistence.triages
+
+    async def pending(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Lista as próximas triagens pendentes, da mais urgente à menos urgente.
+        """
+        cursor = (
+            self.triages.find({"queue_status": PENDING})
+            .sort("priority_key", DESCENDING)
+            .limit(limit)
+        )
+        with timed(MONGO_OPERATION_SECONDS, collection="triages", operation="find_queue"):
+            docs = await cursor.to_list(length=limit)
+        now = datetime.utcnow()
+        for doc in docs:
+            doc["effective_priority"] = round(effective_priority(doc, now), 3)
+        return docs
+
+    async def claim(self, staff_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retira atomicamente a triagem pendente mais urgente.
+
+        Args:
+            staff_id (str): Profissional que assume o atendimento.
+
+        Returns:
+            Optional[Dict[str, Any]]: Triagem assumida ou None se a fila estiver vazia.
+        """
+        with timed(MONGO_OPERATION_SECONDS, collection="triages", operation="claim"):
+            return await self.triages.find_one_and_update(
+                {"queue_status": PENDING},
+                {"$set": {
+                    "queue_status": CLAIMED,
+                    "claimed_by": staff_id,
+                    "claimed_at": datetime.utcnow(),
+                }},
+                sort=[("priority_key", DESCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+
+    async def _transition(self, triage_id: str, update: Dict[str, Any], staff_id: Optional[str]) -> bool:
+        try:
+            oid = ObjectId(triage_id)
+        except (InvalidId, TypeError):
+            return False
+        query: Dict[str, Any] = {"_id": oid, "queue_status": CLAIMED}
+        if staff_id:
+            query["claimed_by"] = staff_id
+        with timed(MONGO_OPERATION_SECONDS, collection="triages", operation="update_one"):
+            result = await self.triages.update_one(query, update)
+        return result.modified_count == 1
+
+    async def complete(self, triage_id: str, staff_id: Optional[str] = None) -> bool:
+        """
+        Marca uma triagem assumida como concluída.
+
+        Returns:
+            bool: False se a triagem não existir ou não estiver assumida
+                  (pelo profissional informado, quando houver).
+        """
+        return await self._transition(
+            triage_id,
+            {"$set": {"queue_status": DONE, "completed_at": datetime.utcnow()}},
+            staff_id,
+        )
+
+    async def release(self, triage_id: str, staff_id: Optional[str] = None) -> bool:
+        """
+        Devolve uma triagem assumida à fila, mantendo sua prioridade original.
+        """
+        return await self._transition(
+            triage_id,
+            {"$set": {"queue_status": PENDING}, "$unset": {"claimed_by": "", "claimed_at": ""}},
+            staff_id,
+        )
@@ -0,0 +1,74 @@
+"""
+Pontuação de urgência clínica das triagens – ClinicAI
+-----------------------------------------------------
+Pontuação (calculada ao salvar a triagem):
+    score = intensidade × 10 + palavras-chave de emergência × 30 (até 3)
+
+Tempo de espera: a prioridade efetiva cresce `TRIAGE_QUEUE_AGING_PER_MINUTE`
+pontos por minuto de espera. Como todas as triagens envelhecem no mesmo
+ritmo, a ordem entre elas não muda com o tempo e pode ser gravada uma única
+vez como `priority_key = score − taxa × minutos_desde_epoch(created_at)`.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.services.triage_guard import TriageGuard
+from app.settings import settings
+
+
+INTENSITY_WEIGHT = 10
+KEYWORD_WEIGHT = 30
+MAX_KEYWORD_HITS = 3
+
+PENDING = "pending"
+
+_EPOCH = datetime(1970, 1, 1)
+_guard = TriageGuard()
+
+
+def urgency_score(triage_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula a urgência clínica de uma triagem.
+
+    Args:
+        triage_data (Dict[str, Any]): Dados estruturados da triagem.
+
+    Returns:
+        Dict[str, Any]: `score` e as palavras-chave de emergência encontradas.
+    """
+    text = " ".join(
+        str(triage_data.get(name) or "")
+        for name in ("queixa_principal", "sintomas", "historico")
+    )
+    keywords = _guard.matched_keywords(text)
+    intensity = int(triage_data.get("intensidade") or 0)
+    score = intensity * INTENSITY_WEIGHT + min(len(keywords), MAX_KEYWORD_HITS) * KEYWORD_WEIGHT
+    return {"score": score, "keywords": keywords}
+
+
+def priority_key(score: float, created_at: datetime, aging_per_minute: Optional[float] = None) -> float:
+    """
+    Chave de ordenação que incorpora o envelhecimento pelo tempo de espera.
+    """
+    rate = settings.TRIAGE_QUEUE_AGING_PER_MINUTE if aging_per_minute is None else aging_per_minute
+    return score - rate * (created_at - _EPOCH).total_seconds() / 60.0
+
+
+def effective_priority(doc: Dict[str, Any], now: Optional[datetime] = None) -> float:
+    """Prioridade atual (score + envelhecimento) de uma triagem da fila."""
+    minutes = ((now or datetime.utcnow()) - _EPOCH).total_seconds() / 60.0
+    return doc["priority_key"] + settings.TRIAGE_QUEUE_AGING_PER_MINUTE * minutes
+
+
+def queue_fields(triage_data: Dict[str, Any], created_at: datetime) -> Dict[str, Any]:
+    """
+    Campos de fila gravados junto com a triagem em `save_triage`.
+    """
+    urgency = urgency_score(triage_data)
+    return {
+        "queue_status": PENDING,
+        "urgency_score": urgency["score"],
+        "urgency_keywords": urgency["keywords"],
+        "priority_key": priority_key(urgency["score"], created_at),
+    }
@@ -0,0 +1,163 @@
+"""
+Contabilização de tokens e custo do LLM – ClinicAI
+--------------------------------------------------
+Agrega o uso de tokens de cada resposta do LLM por conversa, por nó do
+grafo e por versão do prompt. O resumo de cada conversa é persistido junto
+com a triagem e os totais são expostos em `/metrics`.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.settings import settings
+from app.utils.metrics import REGISTRY
+
+
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "clinicai_llm_tokens_total",
+    "Tokens consumidos pelo LLM.",
+    ("node", "prompt_version", "kind"),
+)
+LLM_CALLS_TOTAL = REGISTRY.counter(
+    "clinicai_llm_calls_total", "Chamadas ao LLM.", ("node", "prompt_version")
+)
+LLM_COST_USD_TOTAL = REGISTRY.counter(
+    "clinicai_llm_cost_usd_total", "Custo estimado do LLM em dólares.", ("node", "prompt_version")
+)
+
+
+def extract_token_usage(response: Any) -> Tuple[int, int]:
+    """
+    Lê o uso de tokens de uma resposta do LLM.
+
+    Usa `usage_metadata` (padrão LangChain) e, na ausência dele, os metadados
+    brutos do Gemini (`prompt_token_count` / `candidates_token_count`).
+
+    Returns:
+        Tuple[int, int]: (tokens de entrada, tokens de saída).
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+
+    metadata = (getattr(response, "response_metadata", None) or {}).get("usage_metadata") or {}
+    return (
+        int(metadata.get("prompt_token_count", 0)),
+        int(metadata.get("candidates_token_count", 0)),
+    )
+
+
+def extract_cached_tokens(response: Any) -> int:
+    """
+    Lê quantos tokens de entrada vieram do cache de contexto do provedor.
+
+    Usa `usage_metadata.input_token_details.cache_read` (padrão LangChain) e,
+    na ausência dele, `cached_content_token_count` do Gemini.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int((usage.get("input_token_details") or {}).get("cache_read", 0) or 0)
+
+    metadata = (getattr(response, "response_metadata", None) or {}).get("usage_metadata") or {}
+    return int(metadata.get("cached_content_token_count", 0))
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Custo estimado em dólares segundo os preços configurados em `settings`.
+
+    Os `cached_tokens` fazem parte de `input_tokens` e são cobrados pelo
+    preço de leitura do cache.
+    """
+    return (
+        (input_tokens - cached_tokens) * settings.LLM_INPUT_COST_PER_1K_TOKENS
+        + cached_tokens * settings.LLM_CACHED_INPUT_COST_PER_1K_TOKENS
+        + output_tokens * settings.LLM_OUTPUT_COST_PER_1K_TOKENS
+    ) / 1000.0
+
+
+class UsageTracker:
+    """
+    Acumula o uso de tokens por conversa (e por nó dentro dela).
+
+    Mantém no máximo `max_conversations` conversas abertas; as mais antigas
+    são descartadas para limitar a memória.
+    """
+
+    def __init__(self, max_conversations: Optional[int] = None) -> None:
+        self.max_conversations = max_conversations or settings.USAGE_MAX_TRACKED_CONVERSATIONS
+        self._conversations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def record(
+        self,
+        conversation_id: Optional[str],
+        node: str,
+        prompt_version: str,
+        input_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+    ) -> None:
+        """
+        Registra o uso de uma chamada ao LLM.
+
+        Args:
+            conversation_id (Optional[str]): Conversa associada (se houver).
+            node (str): Nó do grafo que fez a chamada.
+            prompt_version (str): Versão do prompt de sistema utilizado.
+            input_tokens (int): Tokens de entrada (prompt).
+            output_tokens (int): Tokens de saída (resposta).
+            cached_tokens (int): Parte dos tokens de entrada lida do cache
+                de contexto do provedor.
+        """
+        cost = estimate_cost(input_tokens, output_tokens, cached_tokens)
+        LLM_CALLS_TOTAL.inc(node=node, prompt_version=prompt_version)
+        LLM_TOKENS_TOTAL.inc(input_tokens, node=node, prompt_version=prompt_version, kind="input")
+        LLM_TOKENS_TOTAL.inc(output_tokens, node=node, prompt_version=prompt_version, kind="output")
+        if cached_tokens:
+            LLM_TOKENS_TOTAL.inc(cached_tokens, node=node, prompt_version=prompt_version, kind="cached_input")
+        LLM_COST_USD_TOTAL.inc(cost, node=node, prompt_version=prompt_version)
+
+        if not conversation_id:
+            return
+
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            entry = self._conversations[conversation_id] = {
+                "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "calls": 0, "cost_usd": 0.0,
+                "prompt_versions": [], "by_node": {},
+            }
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(conversation_id)
+
+        by_node = entry["by_node"].setdefault(
+            node, {"input_tokens": 0, "output_tokens": 0, "calls": 0}
+        )
+        for bucket in (entry, by_node):
+            bucket["input_tokens"] += input_tokens
+            bucket["output_tokens"] += output_tokens
+            bucket["calls"] += 1
+        entry["cached_tokens"] += cached_tokens
+        entry["cost_usd"] += cost
+        if prompt_version not in entry["prompt_versions"]:
+            entry["prompt_versions"].append(prompt_version)
+
+    def summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Resumo acumulado de uma conversa, ou None se não houver registro."""
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            return None
+        return {
+            **entry,
+            "total_tokens": entry["input_tokens"] + entry["output_tokens"],
+            "cost_usd": round(entry["cost_usd"], 8),
+            "by_node": {node: dict(values) for node, values in entry["by_node"].items()},
+            "prompt_versions": list(entry["prompt_versions"]),
+        }
+
+    def pop(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o resumo da conversa e encerra sua contabilização."""
+        summary = self.summary(conversation_id)
+        self._conversations.pop(conversation_id, None)
+        return summary
@@ -1,6 +1,9 @@
 import httpx
+from typing import Optional
 from app.schemas.whatsapp import WhatsAppSendMessage
 from app.settings import settings
+from app.utils.metrics import WHATSAPP_SEND_SECONDS, timed
+from app.utils.tracing import current_traceparent
 
 
 class WhatsAppService:
@@ -10,6 +13,9 @@ class WhatsAppService:
     Este serviço abstrai a comunicação com a API da Meta, permitindo
     o envio de mensagens estruturadas no formato definido pelo schema
     `WhatsAppSendMessage`.
+
+    As conexões HTTP (TLS e keep-alive) são reaproveitadas entre os envios
+    por um único `httpx.AsyncClient`, criado no primeiro envio.
     """
 
     def __init__(self) -> None:
@@ -22,6 +28,24 @@ class WhatsAppService:
                 "Configuração do WhatsApp incompleta: "
                 "verifique WHATSAPP_PHONE_NUMBER_ID e WHATSAPP_ACCESS_TOKEN."
             )
+        self.url = f"{self.base_url}/{self.phone_number_id}/messages"
+        self.headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Content-Type": "application/json",
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Fecha as conexões abertas com a API."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def send_message(self, payload: WhatsAppSendMessage) -> dict:
         """
@@ -37,13 +61,27 @@ class WhatsAppService:
         Raises:
             httpx.HTTPStatusError: Caso a API retorne erro HTTP.
         """
-        url = f"{self.base_url}/{self.phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
+        return await self.send_raw(payload.model_dump_json().encode("utf-8"))
 
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(url, headers=headers, json=payload.dict())
+    async def send_raw(self, body: bytes) -> dict:
+        """
+        Envia um corpo JSON já serializado (ex.: respostas fixas
+        pré-renderizadas em `app.services.replies`).
+
+        Args:
+            body (bytes): JSON no formato de `WhatsAppSendMessage`.
+
+        Returns:
+            dict: Resposta JSON da API do WhatsApp.
+
+        Raises:
+            httpx.HTTPStatusError: Caso a API retorne erro HTTP.
+        """
+        headers = self.headers
+        with timed(WHATSAPP_SEND_SECONDS):
+            traceparent = current_traceparent()
+            if traceparent:
+                headers = {**headers, "traceparent": traceparent}
+            response = await self.client.post(self.url, headers=headers, content=body)
             response.raise_for_status()
             return response.json()
@@ -3,6 +3,8 @@ Configurações globais da aplicação.
 Carregadas a partir de variáveis de ambiente ou do arquivo `.env`.
 """
 
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -16,22 +18,218 @@ class Settings(BaseSettings):
     APP_HOST: str = Field("0.0.0.0", description="Host do servidor FastAPI")
     APP_PORT: int = Field(8000, description="Porta do servidor FastAPI")
     ENV: str = Field("dev", description="Ambiente de execução (dev/staging/prod)")
+    WORKERS: int = Field(
+        1, ge=1, description="Processos da API; acima de 1, sobe o proxy com roteamento fixo por conversa"
+    )
+    WORKER_BASE_PORT: int = Field(8100, description="Porta do primeiro worker (os demais usam as seguintes)")
+    HASH_RING_REPLICAS: int = Field(128, ge=1, description="Nós virtuais por worker no hash consistente")
 
 
     MONGO_URI: str = Field("mongodb://localhost:27017", description="URI de conexão do MongoDB")
     MONGO_DB: str = Field("clinicai", description="Nome do banco de dados MongoDB")
+    MONGO_ENSURE_INDEXES: bool = Field(
+        True, description="Cria os índices das collections na inicialização da API"
+    )
+    MONGO_MAX_POOL_SIZE: int = Field(
+        100, ge=0, description="Conexões simultâneas por servidor no pool do Motor (0 = sem limite)"
+    )
+    MONGO_MIN_POOL_SIZE: int = Field(
+        0, ge=0, description="Conexões mantidas abertas no pool mesmo ociosas"
+    )
+    MONGO_MAX_IDLE_TIME_MS: int = Field(
+        0, ge=0, description="Tempo ocioso (ms) após o qual a conexão é fechada (0 = sem limite)"
+    )
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = Field(
+        5000, ge=1, description="Espera máxima (ms) por um servidor disponível antes de falhar"
+    )
+    MONGO_SOCKET_TIMEOUT_MS: int = Field(
+        0, ge=0, description="Espera máxima (ms) por uma resposta do servidor (0 = sem limite)"
+    )
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = Field(
+        0, ge=0, description="Espera máxima (ms) por uma conexão livre no pool (0 = sem limite)"
+    )
+    MONGO_MESSAGES_WRITE_CONCERN: str = Field(
+        "1", description="Write concern (`w`) da collection messages: número de nós ou majority"
+    )
+    MONGO_TRIAGES_WRITE_CONCERN: str = Field(
+        "majority", description="Write concern (`w`) da collection triages: número de nós ou majority"
+    )
+    MONGO_QUERY_READ_PREFERENCE: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = Field(
+        "secondaryPreferred",
+        description="Read preference das consultas da equipe (listagens e histórico)",
+    )
 
 
     WHATSAPP_PHONE_NUMBER_ID: str = Field(..., description="Phone Number ID do WhatsApp")
     WHATSAPP_VERIFY_TOKEN: str = Field(..., description="Token de verificação do Webhook")
     WHATSAPP_ACCESS_TOKEN: str = Field(..., description="Access Token da API do WhatsApp")
-
-
-    GOOGLE_API_KEY: str = Field(..., description="Chave de API para o Gemini")
+    WHATSAPP_APP_SECRET: Optional[str] = Field(
+        None, description="App Secret do Meta; exige `X-Hub-Signature-256` no webhook (obrigatório fora de dev)"
+    )
+
+
+    GOOGLE_API_KEY: str = Field("", description="Chave de API para o Gemini")
+
+    LLM_BACKEND: Literal["gemini", "fake"] = Field(
+        "gemini", description="Backend do LLM (gemini = API real, fake = simulador local)"
+    )
+    LLM_MODEL: str = Field("gemini-2.5-flash", description="Modelo Gemini utilizado")
+    LLM_TEMPERATURE: float = Field(0.3, description="Temperatura de amostragem do modelo")
+
+    LLM_INPUT_COST_PER_1K_TOKENS: float = Field(
+        0.0003, description="Preço (USD) por 1 mil tokens de entrada, para estimar custo"
+    )
+    LLM_OUTPUT_COST_PER_1K_TOKENS: float = Field(
+        0.0025, description="Preço (USD) por 1 mil tokens de saída, para estimar custo"
+    )
+    LLM_CACHED_INPUT_COST_PER_1K_TOKENS: float = Field(
+        0.000075, description="Preço (USD) por 1 mil tokens de entrada lidos do cache de contexto"
+    )
+    LLM_CONTEXT_CACHE_ENABLED: bool = Field(
+        False, description="Usa o cache explícito de contexto do Gemini para o prefixo fixo do prompt"
+    )
+    LLM_CONTEXT_CACHE_TTL_SECONDS: int = Field(
+        3600, ge=60, description="Validade (s) do prefixo no cache de contexto do Gemini"
+    )
+    USAGE_MAX_TRACKED_CONVERSATIONS: int = Field(
+        10_000, description="Máximo de conversas com uso de tokens acumulado em memória"
+    )
+
+    GRAPH_CHECKPOINTER: Literal["mongo", "memory"] = Field(
+        "mongo", description="Onde o grafo guarda o estado da conversa entre turnos (mongo ou memory)"
+    )
+    GRAPH_CHECKPOINT_CACHE_SIZE: int = Field(
+        10_000, ge=1, description="Conversas com o último checkpoint do grafo mantido em memória"
+    )
+
+    FAKE_LLM_SCRIPT_PATH: Optional[str] = Field(
+        None, description="Arquivo JSON com o roteiro de respostas do LLM simulado"
+    )
+    FAKE_LLM_LATENCY_MS: float = Field(0.0, description="Latência média simulada por chamada (ms)")
+    FAKE_LLM_LATENCY_JITTER_MS: float = Field(
+        0.0, description="Dispersão da latência simulada (ms)"
+    )
+    FAKE_LLM_LATENCY_DISTRIBUTION: Literal["fixed", "uniform", "normal", "exponential"] = Field(
+        "fixed", description="Distribuição da latência simulada"
+    )
+    FAKE_LLM_FAILURE_RATE: float = Field(
+        0.0, ge=0.0, le=1.0, description="Probabilidade de falha injetada por chamada"
+    )
+    FAKE_LLM_SEED: Optional[int] = Field(None, description="Semente para tornar o simulador determinístico")
+
+
+    TRIAGE_MAX_TURNS: int = Field(
+        12, ge=0, le=50,
+        description="Turnos do paciente após os quais a triagem é extraída e registrada (0 = sem limite)",
+    )
+    TRIAGE_REQUIRED_FIELDS: str = Field(
+        "queixa_principal,sintomas,duracao_frequencia,intensidade",
+        description="Campos da triagem (separados por vírgula) exigidos para encerrar pelo resumo confirmado",
+    )
+    TRIAGE_QUEUE_AGING_PER_MINUTE: float = Field(
+        1.0, ge=0.0, description="Pontos de urgência ganhos por minuto de espera na fila"
+    )
+
+    FEED_MODE: Literal["auto", "change_stream", "poll"] = Field(
+        "auto", description="Fonte do feed de triagens (auto = change stream com fallback para polling)"
+    )
+    FEED_POLL_INTERVAL_SECONDS: float = Field(
+        1.0, gt=0, description="Intervalo do polling do feed quando não há change stream"
+    )
+    FEED_POLL_LOOKBACK_SECONDS: float = Field(
+        5.0, ge=0,
+        description="Janela revisitada pelo polling do feed antes da triagem mais recente (gravações fora de ordem)",
+    )
+    FEED_QUEUE_SIZE: int = Field(
+        100, ge=1, description="Eventos pendentes por cliente do feed antes de desconectá-lo"
+    )
+    FEED_HEARTBEAT_SECONDS: float = Field(
+        15.0, gt=0, description="Intervalo de keep-alive do feed SSE/WebSocket sem novos eventos"
+    )
+
+    RETENTION_ENABLED: bool = Field(
+        False, description="Executa a manutenção do histórico em segundo plano na API"
+    )
+    RETENTION_DAYS_WHATSAPP: int = Field(
+        180, ge=1, description="Dias de retenção do histórico de conversas do WhatsApp"
+    )
+    RETENTION_DAYS_WEB: int = Field(90, ge=1, description="Dias de retenção do histórico do chat web")
+    RETENTION_COMPACT_AFTER_HOURS: float = Field(
+        24.0, ge=0, description="Horas após o encerramento para compactar a sessão no arquivo"
+    )
+    RETENTION_BATCH_SIZE: int = Field(100, ge=1, description="Sessões/documentos por lote da manutenção")
+    RETENTION_BATCH_PAUSE_SECONDS: float = Field(
+        0.2, ge=0, description="Pausa entre lotes da manutenção (throttling)"
+    )
+    RETENTION_INTERVAL_SECONDS: float = Field(
+        3600.0, gt=0, description="Intervalo entre execuções da manutenção em segundo plano"
+    )
+
+    ADMISSION_MAX_IN_FLIGHT: int = Field(
+        64, ge=1, description="Turnos processados simultaneamente por processo"
+    )
+    ADMISSION_MAX_WAIT_SECONDS: float = Field(
+        2.0, ge=0, description="Espera média por vaga acima da qual conversas novas são recusadas"
+    )
+    ADMISSION_SESSION_IDLE_SECONDS: float = Field(
+        1800.0, gt=0, description="Inatividade após a qual a conversa deixa de contar como em andamento"
+    )
+
+    EXPORT_BATCH_SIZE: int = Field(
+        1000, ge=1, description="Tamanho do lote do cursor na exportação de triagens"
+    )
+    EXPORT_SETTLE_SECONDS: float = Field(
+        5.0, ge=0, description="Idade mínima (s) das triagens exportadas incrementalmente"
+    )
+    REPLAY_CONCURRENCY: int = Field(
+        8, ge=1, description="Conversas reprocessadas em paralelo pelo replay offline"
+    )
+
+
+    METRICS_ENABLED: bool = Field(
+        True, description="Ativa histogramas de latência e o endpoint /metrics"
+    )
+    METRICS_LOG_LEVEL: str = Field(
+        "TRACE", description="Nível de log das medições de latência (campos estruturados no loguru)"
+    )
+
+
+    LOG_LEVEL: str = Field("INFO", description="Nível mínimo dos logs da aplicação")
+    LOG_FORMAT: Literal["json", "text"] = Field(
+        "json", description="Formato dos logs: JSON (uma linha por registro) ou texto colorido"
+    )
+    LOG_FILE: str = Field(
+        "", description="Arquivo de log com rotação (vazio: apenas stdout)"
+    )
+    LOG_ENQUEUE: bool = Field(
+        True, description="Escreve os logs em uma thread dedicada, fora do loop de eventos"
+    )
+    LOG_SAMPLE_RATE: float = Field(
+        0.1, ge=0.0, le=1.0,
+        description="Fração dos turnos com logs de sucesso registrados (avisos e erros sempre)",
+    )
+
+
+    TRACING_ENABLED: bool = Field(
+        False, description="Ativa o rastreamento (spans) do webhook ao envio da resposta"
+    )
+    TRACING_EXPORTER: Literal["memory", "file"] = Field(
+        "memory", description="Destino dos spans: memória ou arquivo NDJSON"
+    )
+    TRACING_FILE: str = Field("logs/traces.ndjson", description="Arquivo do exportador `file`")
+    TRACING_MAX_SPANS: int = Field(10_000, description="Spans mantidos pelo exportador em memória")
 
 
     APP_SECRET: str = Field(..., description="Segredo usado para criptografia ou JWT")
     HASH_SALT: str = Field(..., description="Salt para hash de identificadores de usuário")
+    STAFF_API_TOKEN: Optional[str] = Field(
+        None, description="Token (Bearer) das rotas da equipe; sem ele, /triages e /conversations recusam tudo"
+    )
+    PSEUDONYM_CACHE_SIZE: int = Field(
+        10_000, ge=1, description="Números de telefone mantidos no cache LRU de pseudônimos"
+    )
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,62 @@
+"""
+Hash consistente para distribuir conversas entre workers.
+
+Cada worker ocupa `replicas` pontos virtuais em um anel de 64 bits; uma
+chave pertence ao primeiro ponto no sentido horário. Adicionar ou remover
+um worker remapeia apenas ~1/N das chaves, preservando a afinidade das
+demais conversas com o worker que guarda seu estado em memória.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Anel de hash consistente com nós virtuais."""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 128) -> None:
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        """Inclui um nó no anel (idempotente)."""
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str) -> None:
+        """Retira um nó do anel."""
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                index = bisect.bisect_left(self._points, point)
+                del self._points[index]
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Nó responsável pela chave.
+
+        Returns:
+            Optional[str]: Nó escolhido, ou None se o anel estiver vazio.
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
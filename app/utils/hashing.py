@@ -45,3 +45,32 @@ class Hasher:
             bool: True se o valor corresponder ao hash.
         """
         return hmac.compare_digest(self.hash_value(value), hashed)
+
+    def sign(self, payload: bytes) -> str:
+        """
+        Calcula o HMAC-SHA256 de um conteúdo bruto.
+
+        Args:
+            payload (bytes): Bytes exatamente como recebidos (ex.: corpo HTTP).
+
+        Returns:
+            str: Representação hexadecimal da assinatura.
+        """
+        return hmac.new(self.salt, payload, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, payload: bytes, signature: str, prefix: str = "sha256=") -> bool:
+        """
+        Verifica uma assinatura no formato do cabeçalho `X-Hub-Signature-256`.
+
+        Args:
+            payload (bytes): Conteúdo bruto assinado.
+            signature (str): Assinatura recebida (ex.: "sha256=<hex>").
+            prefix (str): Prefixo esperado antes do hexadecimal.
+
+        Returns:
+            bool: True se a assinatura corresponder ao conteúdo.
+        """
+        if not signature or not signature.startswith(prefix):
+            return False
+        return hmac.compare_digest(self.sign(payload), signature[len(prefix):])
+
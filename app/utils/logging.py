@@ -1,41 +1,211 @@
+"""
+Logging estruturado – ClinicAI
+------------------------------
+Configuração do loguru para a aplicação:
+
+- Formato JSON (uma linha por registro, via `orjson`) ou texto colorido
+  (`LOG_FORMAT`), com o contexto do turno: conversa (hash curto), canal, nó
+  do grafo e demais campos passados ao logger (ex.: `duration_ms`).
+- Escrita fora do loop de eventos (`LOG_ENQUEUE`): o console usa
+  `BackgroundSink`, que entrega a linha já formatada a uma thread de
+  escrita por uma fila em memória (o `enqueue=True` do loguru serializa o
+  registro inteiro com `pickle`, várias vezes mais caro por registro); o
+  arquivo com rotação, opcional, usa o `enqueue` do próprio loguru.
+- Amostragem do caminho de sucesso: cada turno é sorteado uma vez
+  (`LOG_SAMPLE_RATE`); nos turnos não sorteados, registros abaixo de
+  WARNING são descartados. Avisos e erros são sempre registrados.
+"""
+
+import asyncio
+import hashlib
+import queue
+import random
 import sys
+import threading
+import traceback
+from typing import Any, Dict, Optional, TextIO
+
+import orjson
 from loguru import logger
 
+from app.settings import settings
+from app.utils.metrics import current_node
+
+
+SAMPLED = "sampled"
 
-def configure_logging():
+_WARNING_NO = logger.level("WARNING").no
+_RESERVED_EXTRA = frozenset({SAMPLED, "_json"})
+
+
+def conversation_tag(conversation_id: Optional[str]) -> Optional[str]:
+    """
+    Hash curto e estável da conversa para os logs (não expõe o identificador).
     """
-    Configura o logger global da aplicação.
+    if not conversation_id:
+        return None
+    return hashlib.blake2b(conversation_id.encode("utf-8"), digest_size=6).hexdigest()
 
-    - Saída no stdout (console).
-    - Formato padronizado com nível, horário e mensagem.
-    - Rotação automática de arquivos de log.
+
+def sample_turn(rate: Optional[float] = None) -> bool:
     """
-    logger.remove()
+    Sorteia se os registros de sucesso de um turno serão mantidos.
 
+    Args:
+        rate (Optional[float]): Fração dos turnos mantidos (padrão: `LOG_SAMPLE_RATE`).
+    """
+    rate = settings.LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or random.random() < rate
 
-    logger.add(
-        sys.stdout,
-        colorize=True,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-               "<level>{level: <8}</level> | "
-               "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
-               "<level>{message}</level>",
-        level="DEBUG",
-    )
 
-    logger.add(
-        "logs/clinicai.log",
-        rotation="10 MB",
-        retention="10 days",
-        compression="zip",
-        encoding="utf-8",
-        enqueue=True,
-        level="INFO",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    )
+def _sampling_filter(record: Dict[str, Any]) -> bool:
+    return record["level"].no >= _WARNING_NO or record["extra"].get(SAMPLED, True)
 
-    logger.info("Logger configurado com sucesso.")
 
+def _json_format(record: Dict[str, Any]) -> str:
+    """
+    Serializa o registro em uma linha JSON (guardada em `extra["_json"]`,
+    pois o loguru interpreta chaves no texto devolvido pelo formatador, e
+    reaproveitada pelos demais sinks).
+    """
+    extra = record["extra"]
+    if "_json" in extra:
+        return "{extra[_json]}\n"
+    entry: Dict[str, Any] = {
+        "ts": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    node = current_node.get()
+    if node is not None:
+        entry["node"] = node
+    for key, value in extra.items():
+        if key not in _RESERVED_EXTRA:
+            entry[key] = value
+    if record["exception"] is not None:
+        exc_type, exc, tb = record["exception"]
+        entry["exception"] = "".join(traceback.format_exception(exc_type, exc, tb))
+    extra["_json"] = orjson.dumps(entry, default=str).decode("utf-8")
+    return "{extra[_json]}\n"
 
 
-configure_logging()
+class BackgroundSink:
+    """
+    Sink do loguru que escreve em uma thread dedicada.
+
+    `write` só enfileira a linha formatada (`queue.Queue`, sem
+    serialização); a thread grava e descarrega o stream em lotes e marca as
+    linhas gravadas com `task_done`, o que permite a `complete` esperar a
+    fila com `join`. Ao remover o sink (`logger.remove`), o loguru chama
+    `stop`, que escreve o que restar.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(str(message))
+
+    def _run(self) -> None:
+        while True:
+            line = self._queue.get()
+            taken = 1
+            try:
+                while line is not None:
+                    self.stream.write(line)
+                    try:
+                        line = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    taken += 1
+                self.stream.flush()
+            except (OSError, ValueError):
+                # Stream fechado ou indisponível: o log nunca derruba a aplicação.
+                pass
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+            if line is None:
+                return
+
+    def stop(self) -> None:
+        """Escreve as linhas pendentes e encerra a thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    async def complete(self) -> None:
+        """
+        Aguarda a escrita das linhas já enfileiradas (`logger.complete()`),
+        em uma thread, sem ocupar o loop de eventos.
+        """
+        if self._thread.is_alive():
+            await asyncio.to_thread(self._queue.join)
+
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
+    "<level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level> | {extra}"
+)
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    file: Optional[str] = None,
+    enqueue: Optional[bool] = None,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """
+    Configura o logger global da aplicação (substitui os sinks existentes).
+
+    Args:
+        level (Optional[str]): Nível mínimo (padrão: `LOG_LEVEL`).
+        fmt (Optional[str]): "json" ou "text" (padrão: `LOG_FORMAT`).
+        file (Optional[str]): Arquivo de log com rotação; vazio desativa
+            (padrão: `LOG_FILE`).
+        enqueue (Optional[bool]): Escrita em thread dedicada (padrão: `LOG_ENQUEUE`).
+        stream (Optional[TextIO]): Destino do console (padrão: stdout).
+    """
+    level = level or settings.LOG_LEVEL
+    fmt = fmt or settings.LOG_FORMAT
+    file = settings.LOG_FILE if file is None else file
+    enqueue = settings.LOG_ENQUEUE if enqueue is None else enqueue
+    json_format = fmt == "json"
+    stream = stream or sys.stdout
+
+    logger.remove()
+    logger.add(
+        BackgroundSink(stream) if enqueue else stream,
+        level=level,
+        format=_json_format if json_format else TEXT_FORMAT,
+        colorize=not json_format and stream.isatty(),
+        filter=_sampling_filter,
+        backtrace=False,
+        diagnose=False,
+    )
+    if file:
+        logger.add(
+            file,
+            level=level,
+            format=_json_format if json_format else TEXT_FORMAT,
+            colorize=False,
+            filter=_sampling_filter,
+            enqueue=enqueue,
+            rotation="10 MB",
+            retention="10 days",
+            compression="zip",
+            encoding="utf-8",
+            backtrace=False,
+            diagnose=False,
+        )
+
+    logger.info("Logger configurado com sucesso.")
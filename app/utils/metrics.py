@@ -0,0 +1,305 @@
+"""
+Métricas da aplicação no formato de exposição do Prometheus.
+
+Implementação enxuta (sem dependências externas) de contadores, gauges e
+histogramas com rótulos, renderizados em texto pelo endpoint `/metrics`.
+
+O utilitário `timed` mede a duração de um trecho do caminho crítico,
+registra o valor no histograma, emite um log estruturado via loguru e,
+com o rastreamento ativo, abre um span (ver `app.utils.tracing`).
+Com métricas e rastreamento desativados, `timed` devolve um objeto nulo
+compartilhado, de modo que a instrumentação não tem custo relevante.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.settings import settings
+from app.utils import tracing
+
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+
+def _escape_label(value: str) -> str:
+    """Escapa `\\`, `"` e quebras de linha, como exige o formato de exposição."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Formata rótulos no padrão `{a="x",b="y"}`, com os valores escapados."""
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """Base comum das métricas: nome, ajuda e rótulos."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Contador monotônico."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Valor que sobe e desce (ex.: requisições em andamento)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histograma cumulativo com buckets fixos."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        span: Optional[str] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.span = span or name
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets, series):
+                cumulative += hits
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_value(series[-1])}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro das métricas expostas em `/metrics`."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        span: Optional[str] = None,
+    ) -> Histogram:
+        """
+        Cria (ou recupera) um histograma.
+
+        Args:
+            span (Optional[str]): Modelo do nome do span aberto por `timed`,
+                formatado com os rótulos (ex.: "mongo.{collection}.{operation}").
+        """
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets, span)
+
+    def render(self) -> str:
+        """Renderiza todas as métricas no formato texto do Prometheus."""
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+GRAPH_NODE_SECONDS = REGISTRY.histogram(
+    "clinicai_graph_node_duration_seconds", "Duração de cada nó do grafo de triagem.", ("node",),
+    span="graph.{node}",
+)
+MONGO_OPERATION_SECONDS = REGISTRY.histogram(
+    "clinicai_mongo_operation_duration_seconds",
+    "Duração das operações no MongoDB.",
+    ("collection", "operation"),
+    span="mongo.{collection}.{operation}",
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "clinicai_llm_call_duration_seconds", "Duração das chamadas ao LLM.", ("node",),
+    span="llm.call",
+)
+WHATSAPP_SEND_SECONDS = REGISTRY.histogram(
+    "clinicai_whatsapp_send_duration_seconds", "Duração dos envios à WhatsApp Cloud API.",
+    span="whatsapp.send",
+)
+HISTORY_LOAD_SECONDS = REGISTRY.histogram(
+    "clinicai_history_load_duration_seconds", "Duração da carga do histórico da conversa.",
+    span="chat.history",
+)
+TURN_PREPARE_SECONDS = REGISTRY.histogram(
+    "clinicai_turn_prepare_duration_seconds",
+    "Espera pela gravação da mensagem e pelo estado da conversa antes do grafo.",
+    span="chat.prepare",
+)
+TURN_SECONDS = REGISTRY.histogram(
+    "clinicai_turn_duration_seconds", "Duração total de um turno da conversa.", ("channel",),
+    span="chat.turn",
+)
+
+
+class _NullTimer:
+    """Temporizador nulo usado quando as métricas estão desativadas."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Mede um trecho e registra no histograma, no log estruturado e no trace."""
+
+    __slots__ = ("histogram", "labels", "record", "scope", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str], record: bool, traced: bool) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.record = record
+        self.scope = (
+            tracing.start_span(histogram.span.format(**labels), **labels) if traced else None
+        )
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        if self.scope is not None:
+            self.scope.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        if self.scope is not None:
+            self.scope.__exit__(exc_type, exc, tb)
+        if not self.record:
+            return
+        self.histogram.observe(elapsed, **self.labels)
+        logger.log(
+            settings.METRICS_LOG_LEVEL,
+            "{metric} {labels} em {duration_ms:.2f} ms",
+            metric=self.histogram.name,
+            labels=self.labels,
+            duration_ms=elapsed * 1000,
+            error=exc_type.__name__ if exc_type else None,
+        )
+
+
+def timed(histogram: Histogram, **labels: str):
+    """
+    Context manager que mede a duração do bloco.
+
+    Exemplo:
+        with timed(MONGO_OPERATION_SECONDS, collection="messages", operation="find"):
+            ...
+
+    Args:
+        histogram (Histogram): Histograma de destino.
+        **labels: Rótulos da série.
+
+    Returns:
+        Um context manager (nulo quando métricas e rastreamento estão desativados).
+    """
+    record = settings.METRICS_ENABLED
+    traced = settings.TRACING_ENABLED
+    if not record and not traced:
+        return _NULL_TIMER
+    return _Timer(histogram, labels, record, traced)
@@ -0,0 +1,105 @@
+"""
+Paginação por cursor (keyset) sobre o MongoDB.
+
+As listagens são ordenadas de forma decrescente pela chave composta
+`(campo de data, _id)`. O cursor opaco devolvido ao cliente codifica a
+chave do último item da página; a página seguinte é obtida com um filtro
+"menor que a chave", servido pelo índice, sem `skip` (custo constante,
+independente da profundidade da página).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginação malformado."""
+
+
+def encode_cursor(sort_value: datetime, doc_id: ObjectId) -> str:
+    """
+    Codifica a chave `(sort_value, _id)` em um cursor opaco (base64 url-safe).
+    """
+    raw = json.dumps([sort_value.isoformat(), str(doc_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decodifica um cursor gerado por `encode_cursor`.
+
+    Raises:
+        InvalidCursorError: Se o cursor for inválido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId) as exc:
+        raise InvalidCursorError("Cursor de paginação inválido.") from exc
+
+
+def keyset_filter(sort_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Filtro que seleciona os documentos após o cursor na ordem decrescente.
+
+    Args:
+        sort_field (str): Campo de data usado na ordenação.
+        cursor (Optional[str]): Cursor da página anterior (None = primeira página).
+
+    Returns:
+        Dict[str, Any]: Filtro MongoDB (vazio na primeira página).
+    """
+    if not cursor:
+        return {}
+    sort_value, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "_id": {"$lt": doc_id}},
+        ]
+    }
+
+
+def build_projection(
+    fields: Optional[Iterable[str]],
+    allowed: Iterable[str],
+    sort_field: str,
+    aliases: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    Monta a projeção com os campos pedidos (o campo de ordenação e `_id`
+    são sempre incluídos, pois compõem o cursor).
+
+    Args:
+        fields (Optional[Iterable[str]]): Campos solicitados (None = documento inteiro).
+        allowed (Iterable[str]): Campos que podem ser projetados.
+        sort_field (str): Campo de ordenação.
+        aliases (Optional[Dict[str, str]]): Nomes curtos aceitos (ex.: "intensidade" → "data.intensidade").
+
+    Raises:
+        ValueError: Se algum campo não for permitido.
+    """
+    if not fields:
+        return None
+    aliases = aliases or {}
+    allowed = set(allowed)
+    projection = {sort_field: 1}
+    for name in fields:
+        path = aliases.get(name, name)
+        if path not in allowed:
+            raise ValueError(f"Campo não permitido na projeção: {name}")
+        projection[path] = 1
+    return projection
+
+
+def serialize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte o `_id` do documento em string para a resposta JSON."""
+    if "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
@@ -0,0 +1,327 @@
+"""
+Rastreamento distribuído no estilo OpenTelemetry.
+
+Cada mensagem recebida (`/chat/` ou `/webhook/whatsapp`) abre um trace raiz;
+os spans filhos (guard, histórico, nós do grafo, chamadas ao LLM, operações
+no MongoDB e envio ao WhatsApp) herdam o contexto via `contextvars`, sem
+precisar repassar objetos entre as camadas.
+
+O contexto é compatível com o cabeçalho W3C `traceparent`, aceito na entrada
+e propagado na chamada à Graph API.
+
+Exportadores:
+    - `memory`: mantém os últimos spans em memória (testes, depuração).
+    - `file`: grava um span por linha (NDJSON) em `TRACING_FILE`, em uma
+      thread dedicada (o fim de um span só o enfileira; serialização e
+      escrita ficam fora do loop de eventos).
+
+Análise rápida de um arquivo exportado:
+    python -m app.utils.tracing logs/traces.ndjson --slowest 10
+"""
+
+import argparse
+import json
+import pathlib
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.settings import settings
+
+
+class Span:
+    """Unidade de trabalho medida dentro de um trace."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "attributes", "status", "error",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else 0.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class InMemorySpanExporter:
+    """Guarda os spans finalizados em memória (limitado a `max_spans`)."""
+
+    def __init__(self, max_spans: int = 10_000) -> None:
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        if trace_id is None:
+            return list(self.spans)
+        return [s for s in self.spans if s.trace_id == trace_id]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+    def shutdown(self) -> None:
+        """Nada a descarregar: os spans ficam em memória."""
+
+
+class FileSpanExporter:
+    """
+    Grava cada span finalizado como uma linha JSON em um arquivo.
+
+    Como o `BackgroundSink` dos logs, `export` só enfileira o span; uma
+    thread dedicada serializa, grava e descarrega o arquivo em lotes.
+    `shutdown` grava o que restar e fecha o arquivo.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _run(self) -> None:
+        while True:
+            span = self._queue.get()
+            try:
+                while span is not None:
+                    self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                    try:
+                        span = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                self._file.flush()
+            except (OSError, ValueError):
+                # Arquivo indisponível: o rastreamento nunca derruba a aplicação.
+                pass
+            if span is None:
+                return
+
+    def shutdown(self) -> None:
+        """Grava os spans pendentes, encerra a thread e fecha o arquivo."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._file.close()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    """Context manager que ativa um span e o exporta ao final."""
+
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span) -> None:
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.span.status = "error"
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        self.tracer.exporter.export(self.span)
+
+
+class _NullScope:
+    """Escopo nulo usado quando o rastreamento está desativado."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class Tracer:
+    """Cria spans encadeados pelo contexto assíncrono corrente."""
+
+    def __init__(self, exporter) -> None:
+        self.exporter = exporter
+
+    def start_span(self, name: str, **attributes: Any) -> _SpanScope:
+        """Abre um span filho do span corrente (ou um novo trace, se não houver)."""
+        parent = _current_span.get()
+        if parent is None:
+            return _SpanScope(self, Span(name, f"{random.getrandbits(128):032x}", None, attributes))
+        return _SpanScope(self, Span(name, parent.trace_id, parent.span_id, attributes))
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> _SpanScope:
+        """
+        Abre o span raiz de uma requisição, continuando o trace do
+        cabeçalho `traceparent` quando ele for válido.
+        """
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is None:
+            span = Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+        else:
+            span = Span(name, remote[0], remote[1], attributes)
+        return _SpanScope(self, span)
+
+
+def parse_traceparent(header: str) -> Optional[Tuple[str, str]]:
+    """
+    Interpreta um cabeçalho W3C `traceparent` (`00-<trace>-<span>-<flags>`).
+
+    Returns:
+        Optional[Tuple[str, str]]: (trace_id, span_id) ou None se inválido.
+    """
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+def build_exporter():
+    """Cria o exportador configurado em `settings.TRACING_EXPORTER`."""
+    if settings.TRACING_EXPORTER == "file":
+        return FileSpanExporter(settings.TRACING_FILE)
+    return InMemorySpanExporter(settings.TRACING_MAX_SPANS)
+
+
+@lru_cache
+def get_tracer() -> Tracer:
+    """Retorna o tracer único da aplicação."""
+    return Tracer(build_exporter())
+
+
+def shutdown_tracer() -> None:
+    """
+    Descarrega e fecha o exportador do tracer, se já criado (encerramento
+    da aplicação); um novo uso cria outro exportador.
+    """
+    if get_tracer.cache_info().currsize:
+        get_tracer().exporter.shutdown()
+        get_tracer.cache_clear()
+
+
+def start_span(name: str, **attributes: Any):
+    """Abre um span filho do contexto atual (nulo se o rastreamento estiver desativado)."""
+    if not settings.TRACING_ENABLED:
+        return _NULL_SCOPE
+    return get_tracer().start_span(name, **attributes)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes: Any):
+    """Abre o span raiz de uma requisição (nulo se o rastreamento estiver desativado)."""
+    if not settings.TRACING_ENABLED:
+        return _NULL_SCOPE
+    return get_tracer().start_trace(name, traceparent, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    """Span ativo no contexto atual, se houver."""
+    return _current_span.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """Cabeçalho `traceparent` do span ativo, para propagação em chamadas de saída."""
+    span = _current_span.get()
+    if span is None:
+        return None
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def slowest_traces(spans: Iterable[Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Agrupa spans exportados por trace e devolve os traces mais lentos,
+    com a duração de cada salto (span filho) ordenada da maior para a menor.
+    """
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        traces.setdefault(span["trace_id"], []).append(span)
+
+    summaries = []
+    for trace_id, items in traces.items():
+        span_ids = {s["span_id"] for s in items}
+        roots = [s for s in items if s["parent_id"] not in span_ids]
+        root = max(roots or items, key=lambda s: s["duration_ms"])
+        hops = sorted(
+            (s for s in items if s is not root),
+            key=lambda s: s["duration_ms"],
+            reverse=True,
+        )
+        summaries.append({
+            "trace_id": trace_id,
+            "name": root["name"],
+            "duration_ms": root["duration_ms"],
+            "attributes": root.get("attributes", {}),
+            "hops": [(s["name"], s["duration_ms"]) for s in hops],
+        })
+    summaries.sort(key=lambda t: t["duration_ms"], reverse=True)
+    return summaries[:limit]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Lista os traces mais lentos de um arquivo NDJSON.")
+    parser.add_argument("path", type=pathlib.Path)
+    parser.add_argument("--slowest", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with open(args.path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+
+    for trace in slowest_traces(spans, args.slowest):
+        print(f"{trace['duration_ms']:10.2f} ms  {trace['name']}  trace={trace['trace_id']}  {trace['attributes']}")
+        for name, duration in trace["hops"][:8]:
+            print(f"{'':14}{duration:10.2f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
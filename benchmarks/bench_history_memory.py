@@ -0,0 +1,156 @@
+"""
+Benchmark de memória do histórico – ClinicAI
+--------------------------------------------
+Mede, com `tracemalloc`, o custo de memória do contexto da conversa passado
+ao grafo em conversas longas, comparando a representação anterior com a
+atual:
+
+- Antes: documentos completos de `messages` decodificados do BSON (`_id`,
+  `user_id`, `channel`, datas), relidos a cada turno, copiados por
+  `{**state}` em cada nó e convertidos com `str()` no prompt de extração.
+- Depois: falas compactas (`Turn`, só papel e texto), acumuladas no
+  checkpoint e transcritas linha a linha no prompt de extração.
+
+Uso:
+    python -m benchmarks.bench_history_memory --turns 50 200 1000
+"""
+
+import os
+
+for _key, _value in {
+    "WHATSAPP_PHONE_NUMBER_ID": "123456789",
+    "WHATSAPP_VERIFY_TOKEN": "bench",
+    "WHATSAPP_ACCESS_TOKEN": "bench",
+    "APP_SECRET": "bench",
+    "HASH_SALT": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import bson
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.agents.graph import add_turns, format_transcript
+from app.services.persistence import AGENT, USER, Turn, turns_from_docs
+
+NODES = 4
+
+
+def build_raw_history(turns: int) -> List[bytes]:
+    """
+    Documentos de turno de uma conversa longa, como gravados em `messages`
+    (codificados em BSON, para decodificação a cada leitura).
+    """
+    start = datetime(2025, 1, 1)
+    raw = []
+    for i in range(turns):
+        timestamp = start + timedelta(minutes=i)
+        raw.append(bson.encode({
+            "_id": bson.ObjectId(),
+            "conversation_id": "5f0c2a0e6b1d4e7a9c3b8d2f1e0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a",
+            "user_id": "5f0c2a0e6b1d4e7a9c3b8d2f1e0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a",
+            "channel": "whatsapp",
+            "user_message": f"Mensagem {i}: a dor de cabeça continua e piora à noite.",
+            "timestamp": timestamp,
+            "expires_at": timestamp + timedelta(days=180),
+            "agent_message": f"Resposta {i}: entendi. Desde quando isso acontece?",
+            "replied_at": timestamp + timedelta(seconds=2),
+        }))
+    return raw
+
+
+def measure(fn: Callable[[], Any]) -> Tuple[int, int, Any]:
+    """
+    Executa `fn` sob `tracemalloc`.
+
+    Returns:
+        Tuple[int, int, Any]: Bytes ainda alocados ao fim, pico e o resultado
+        (mantido vivo para a medição).
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, result
+
+
+def run(turns: int) -> Dict[str, Any]:
+    """
+    Compara as duas representações para uma conversa com `turns` turnos.
+
+    Returns:
+        Dict[str, Any]: Memória retida pelo contexto, pico de um turno de
+        encerramento (leitura, nós e prompt de extração) e tamanho do
+        contexto serializado no checkpoint, antes e depois.
+    """
+    raw = build_raw_history(turns)
+    serde = JsonPlusSerializer()
+
+    def before_context() -> List[Dict[str, Any]]:
+        return [bson.decode(doc) for doc in raw]
+
+    def after_context() -> List[Turn]:
+        return turns_from_docs(
+            {"user_message": doc["user_message"], "agent_message": doc["agent_message"]}
+            for doc in map(bson.decode, raw)
+        )
+
+    before_retained, _, docs = measure(before_context)
+    after_retained, _, context = measure(after_context)
+
+    def before_turn() -> str:
+        state: Dict[str, Any] = {"conversation_context": [bson.decode(doc) for doc in raw]}
+        for node in range(NODES):
+            state = {**state, f"node_{node}": True}
+        return f"Histórico:\n{state['conversation_context']}"
+
+    def after_turn() -> str:
+        state = add_turns(context, [Turn(USER, "Sim"), Turn(AGENT, "Confirma os dados?")])
+        return f"Histórico:\n{format_transcript(state)}"
+
+    _, before_peak, _ = measure(before_turn)
+    _, after_peak, _ = measure(after_turn)
+
+    return {
+        "turns": turns,
+        "retained_before": before_retained,
+        "retained_after": after_retained,
+        "peak_before": before_peak,
+        "peak_after": after_peak,
+        # ObjectId não é serializável no checkpoint; conta-se o `_id` como texto.
+        "checkpoint_before": len(serde.dumps_typed([{**doc, "_id": str(doc["_id"])} for doc in docs])[1]),
+        "checkpoint_after": len(serde.dumps_typed(context)[1]),
+    }
+
+
+def _kib(value: int) -> str:
+    return f"{value / 1024:>9.1f} KiB"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Memória do histórico passado ao grafo.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[50, 200, 1000])
+    args = parser.parse_args(argv)
+
+    for turns in args.turns:
+        row = run(turns)
+        print(f"[{turns} turnos]")
+        for label, key in (
+            ("contexto retido", "retained"),
+            ("pico do turno de encerramento", "peak"),
+            ("contexto no checkpoint", "checkpoint"),
+        ):
+            before, after = row[f"{key}_before"], row[f"{key}_after"]
+            saved = (1 - after / before) * 100 if before else 0.0
+            print(f"  {label:<32} antes {_kib(before)} | depois {_kib(after)} | economia {saved:5.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Benchmark do custo dos logs por turno – ClinicAI
+------------------------------------------------
+Conduz conversas completas pelo `ChatService` (Mongo em memória, LLM
+simulado sem latência) com diferentes configurações de log:
+
+- `json`: configuração de produção (JSON, escrita em thread via
+  `BackgroundSink`, amostragem `--sample-rate`).
+- `json-100%`: idem, registrando todos os turnos.
+- `json-sync`: todos os turnos, com escrita síncrona no loop de eventos.
+- `loguru-enqueue`: todos os turnos, com o `enqueue=True` do loguru
+  (registro serializado com `pickle`), para comparação.
+
+O custo por turno é o tempo gasto dentro das chamadas ao loguru no loop de
+eventos (filtro, formatação JSON e entrega ao sink ou à fila), medido
+diretamente, o que o torna estável mesmo com o ruído do turno completo; a
+diferença de ponta a ponta em relação à execução sem sinks é mostrada como
+referência. Cada modo roda `--repeat` vezes, intercalado com os demais, e
+vale o menor valor. O custo do modo `json` deve ficar abaixo de
+`--budget-us` por turno; à taxa `--rate`, o relatório mostra também a
+fração de um núcleo gasta com logs.
+
+Uso:
+    python -m benchmarks.bench_logging --conversations 25 --repeat 5 --budget-us 100
+"""
+
+import os
+
+for _key, _value in {
+    "WHATSAPP_PHONE_NUMBER_ID": "123456789",
+    "WHATSAPP_VERIFY_TOKEN": "bench",
+    "WHATSAPP_ACCESS_TOKEN": "bench",
+    "APP_SECRET": "bench",
+    "HASH_SALT": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+from loguru import logger
+from loguru._logger import Logger
+from mongomock_motor import AsyncMongoMockClient
+
+from app.agents.graph import TriageAgent
+from app.schemas.chat import ChatRequest
+from app.services.chat_service import ChatService
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+from app.settings import settings
+from app.utils.logging import _json_format, _sampling_filter, configure_logging
+
+from benchmarks.load_test import PATIENT_SCRIPT
+
+MODES = ("sem-log", "json", "json-100%", "json-sync", "loguru-enqueue")
+
+
+class LogCallTimer:
+    """Acumula o tempo gasto dentro de `Logger._log` enquanto instalado."""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self._original = Logger._log
+
+    def __enter__(self) -> "LogCallTimer":
+        original, timer = self._original, self
+
+        def timed_log(logger_self, level, from_decorator, options, message, args, kwargs):
+            # Um frame a mais na pilha: ajusta a profundidade usada pelo loguru
+            # para identificar o chamador.
+            options = (options[0], options[1] + 1, *options[2:])
+            start = time.perf_counter()
+            try:
+                return original(logger_self, level, from_decorator, options, message, args, kwargs)
+            finally:
+                timer.seconds += time.perf_counter() - start
+
+        Logger._log = timed_log
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        Logger._log = self._original
+
+
+def build_service() -> ChatService:
+    """`ChatService` com Mongo em memória e LLM simulado instantâneo."""
+    client = AsyncMongoMockClient()
+    persistence = PersistenceService(client=client)
+    persistence.db = client["clinicai_bench_logging"]
+    persistence.messages = persistence.db["messages"]
+    persistence.triages = persistence.db["triages"]
+    llm = LLMService(client=FakeChatModel())
+    agent = TriageAgent(llm=llm, persistence=persistence, checkpointer=MemorySaver())
+    return ChatService(llm_client=llm, persistence=persistence, triage_agent=agent)
+
+
+def apply_mode(mode: str, sample_rate: float, sink: Any) -> None:
+    """Configura o loguru para o modo medido."""
+    if mode == "sem-log":
+        logger.remove()
+        return
+    settings.LOG_SAMPLE_RATE = sample_rate if mode == "json" else 1.0
+    if mode == "loguru-enqueue":
+        logger.remove()
+        logger.add(sink, level="INFO", format=_json_format, filter=_sampling_filter, enqueue=True)
+        return
+    configure_logging(level="INFO", fmt="json", file="", enqueue=mode != "json-sync", stream=sink)
+
+
+async def drive(conversations: int) -> int:
+    """Conduz `conversations` conversas completas; devolve o número de turnos."""
+    service = build_service()
+    turns = 0
+    for _ in range(conversations):
+        conversation_id = None
+        for text in PATIENT_SCRIPT:
+            response = await service.process_message(
+                ChatRequest(conversation_id=conversation_id, channel="web", message=text)
+            )
+            conversation_id = response.conversation_id
+            turns += 1
+    return turns
+
+
+async def measure(conversations: int, repeat: int, sample_rate: float) -> Dict[str, Dict[str, float]]:
+    """
+    Mede, por modo e pelo menor valor entre as repetições, o tempo por turno
+    (`turn_us`) e o tempo gasto nas chamadas ao loguru por turno (`log_us`).
+    """
+    best = {mode: {"turn_us": float("inf"), "log_us": float("inf")} for mode in MODES}
+    with open(os.devnull, "w") as sink:
+        apply_mode("sem-log", sample_rate, sink)
+        await drive(2)
+        for _ in range(repeat):
+            for mode in MODES:
+                apply_mode(mode, sample_rate, sink)
+                with LogCallTimer() as timer:
+                    start = time.perf_counter()
+                    turns = await drive(conversations)
+                    elapsed = time.perf_counter() - start
+                await logger.complete()
+                best[mode]["turn_us"] = min(best[mode]["turn_us"], elapsed / turns * 1e6)
+                best[mode]["log_us"] = min(best[mode]["log_us"], timer.seconds / turns * 1e6)
+    logger.remove()
+    logger.add(sys.stderr)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Custo dos logs estruturados por turno.")
+    parser.add_argument("--conversations", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sample-rate", type=float, default=settings.LOG_SAMPLE_RATE)
+    parser.add_argument("--budget-us", type=float, default=100.0)
+    parser.add_argument("--rate", type=float, default=50.0, help="Turnos por segundo por processo")
+    args = parser.parse_args(argv)
+
+    best = asyncio.run(measure(args.conversations, args.repeat, args.sample_rate))
+    baseline = best["sem-log"]["turn_us"]
+    print(
+        f"Turno sem sinks: {baseline:.1f} µs "
+        f"({args.conversations * len(PATIENT_SCRIPT)} turnos por execução)"
+    )
+    for mode in MODES[1:]:
+        cost = best[mode]["log_us"]
+        print(
+            f"  {mode:<14} custo nos logs {cost:7.1f} µs/turno "
+            f"({cost * args.rate / 1e4:5.2f}% de um núcleo a {args.rate:g} turnos/s) "
+            f"| ponta a ponta {best[mode]['turn_us'] - baseline:+8.1f} µs/turno"
+        )
+    overhead = best["json"]["log_us"]
+    if overhead > args.budget_us:
+        print(f"ACIMA DO ORÇAMENTO: {overhead:.1f} µs/turno > {args.budget_us:g} µs")
+        return 1
+    print(f"Dentro do orçamento de {args.budget_us:g} µs/turno.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
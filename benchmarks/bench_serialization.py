@@ -0,0 +1,199 @@
+"""
+Microbenchmark de serialização – ClinicAI
+-----------------------------------------
+Mede o custo de CPU por requisição dos caminhos de (de)serialização dos
+endpoints quentes, comparando a implementação anterior com a atual:
+
+- Webhook: `json.loads` + validação completa de `WhatsAppWebhookPayload`
+  versus `validate_json` do modelo enxuto (`WhatsAppInboundPayload`), em
+  lotes do Meta com muitas entradas, contatos, metadados e status.
+- Chat: `jsonable_encoder` + `json.dumps` de `ChatResponse` versus
+  `model_dump_json`.
+- Envio ao WhatsApp: `json.dumps` do dicionário do modelo versus `model_dump_json`
+  e o corpo pré-renderizado das respostas fixas.
+- Respostas JSON: `JSONResponse` versus `ORJSONResponse`.
+- Assinatura do webhook: HMAC seguido de um segundo parse do corpo pelo
+  FastAPI versus HMAC e `validate_json` sobre os mesmos bytes, além do
+  custo adicional da verificação em relação ao webhook sem assinatura.
+
+Uso:
+    python -m benchmarks.bench_serialization --entries 50 --iterations 2000
+"""
+
+import os
+
+for _key, _value in {
+    "WHATSAPP_PHONE_NUMBER_ID": "123456789",
+    "WHATSAPP_VERIFY_TOKEN": "bench",
+    "WHATSAPP_ACCESS_TOKEN": "bench",
+    "APP_SECRET": "bench",
+    "HASH_SALT": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.schemas.chat import ChatResponse
+from app.schemas.whatsapp import WEBHOOK_PAYLOAD_ADAPTER, WhatsAppSendMessage, WhatsAppWebhookPayload
+from app.services.replies import EMERGENCY, REPLIES
+from app.utils.hashing import Hasher
+
+
+def build_webhook_payload(entries: int, messages_per_entry: int = 1) -> bytes:
+    """
+    Monta um lote de eventos do webhook no formato enviado pelo Meta.
+
+    Args:
+        entries (int): Número de entradas no lote.
+        messages_per_entry (int): Mensagens por entrada (cada uma com contato
+            e um evento de status).
+
+    Returns:
+        bytes: Corpo JSON do lote.
+    """
+    entry = []
+    for i in range(entries):
+        messages, contacts, statuses = [], [], []
+        for j in range(messages_per_entry):
+            number = f"55819911{i:03d}{j:02d}"
+            contacts.append({"wa_id": number, "profile": {"name": f"Paciente {i}-{j}"}})
+            messages.append({
+                "from": number, "id": f"wamid.{i}.{j}", "timestamp": "1690000000",
+                "type": "text", "text": {"body": "Estou com dor de cabeça desde ontem à noite."},
+            })
+            statuses.append({
+                "id": f"wamid.out.{i}.{j}", "status": "delivered", "timestamp": "1690000001",
+                "recipient_id": number,
+                "conversation": {"id": f"conv-{i}", "origin": {"type": "service"}},
+                "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+            })
+        entry.append({
+            "id": f"entry-{i}",
+            "changes": [{"field": "messages", "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "5581999999999", "phone_number_id": "123456789"},
+                "contacts": contacts,
+                "messages": messages,
+                "statuses": statuses,
+            }}],
+        })
+    return json.dumps({"object": "whatsapp_business_account", "entry": entry}).encode("utf-8")
+
+
+def cpu_per_call(fn: Callable[[], Any], iterations: int) -> float:
+    """
+    Tempo de CPU médio por chamada, em microssegundos.
+    """
+    fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def run(entries: int, iterations: int) -> List[Dict[str, Any]]:
+    """
+    Executa os pares (anterior, atual) e devolve o custo de cada um.
+
+    Returns:
+        List[Dict[str, Any]]: Linhas com o caso, os custos em µs e a economia.
+    """
+    body = build_webhook_payload(entries)
+    response = ChatResponse(conversation_id="conv-1", response="Desde quando isso começou?")
+    outgoing = WhatsAppSendMessage(to="5581991113682", text={"body": REPLIES.get(EMERGENCY).text})
+    webhook_reply = {"status": "ok", "last_response": response.response}
+    hasher = Hasher("bench-secret")
+    signature = "sha256=" + hasher.sign(body)
+
+    cases = {
+        f"webhook ({entries} entradas, {len(body) // 1024} KiB)": (
+            lambda: WhatsAppWebhookPayload.model_validate(json.loads(body)),
+            lambda: WEBHOOK_PAYLOAD_ADAPTER.validate_json(body),
+        ),
+        "chat: ChatResponse": (
+            lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False).encode("utf-8"),
+            lambda: response.model_dump_json().encode("utf-8"),
+        ),
+        "envio WhatsApp (modelo)": (
+            lambda: json.dumps(outgoing.model_dump()).encode("utf-8"),
+            lambda: outgoing.model_dump_json().encode("utf-8"),
+        ),
+        "envio WhatsApp (resposta fixa)": (
+            lambda: json.dumps(outgoing.model_dump()).encode("utf-8"),
+            lambda: REPLIES.get(EMERGENCY).whatsapp_payload("5581991113682"),
+        ),
+        "webhook assinado": (
+            lambda: hasher.verify_signature(body, signature)
+            and WhatsAppWebhookPayload.model_validate(json.loads(body)),
+            lambda: hasher.verify_signature(body, signature)
+            and WEBHOOK_PAYLOAD_ADAPTER.validate_json(body),
+        ),
+        "resposta do webhook": (
+            lambda: JSONResponse(content=webhook_reply).body,
+            lambda: ORJSONResponse(content=webhook_reply).body,
+        ),
+    }
+
+    rows = []
+    for name, (before, after) in cases.items():
+        before_us = cpu_per_call(before, iterations)
+        after_us = cpu_per_call(after, iterations)
+        rows.append({
+            "case": name,
+            "before_us": round(before_us, 2),
+            "after_us": round(after_us, 2),
+            "saved_pct": round((1 - after_us / before_us) * 100, 1) if before_us else 0.0,
+        })
+    return rows
+
+
+def signature_overhead(entries: int, iterations: int) -> Dict[str, float]:
+    """
+    Custo adicional da verificação do HMAC sobre o parse do webhook.
+
+    Returns:
+        Dict[str, float]: Custos (µs) sem e com assinatura e o acréscimo (%).
+    """
+    body = build_webhook_payload(entries)
+    hasher = Hasher("bench-secret")
+    signature = "sha256=" + hasher.sign(body)
+    unsigned = cpu_per_call(lambda: WEBHOOK_PAYLOAD_ADAPTER.validate_json(body), iterations)
+    signed = cpu_per_call(
+        lambda: hasher.verify_signature(body, signature) and WEBHOOK_PAYLOAD_ADAPTER.validate_json(body),
+        iterations,
+    )
+    return {
+        "unsigned_us": round(unsigned, 2),
+        "signed_us": round(signed, 2),
+        "overhead_pct": round((signed / unsigned - 1) * 100, 1) if unsigned else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Custo de serialização por requisição.")
+    parser.add_argument("--entries", type=int, default=50, help="Entradas no lote do webhook")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    for row in run(args.entries, args.iterations):
+        print(
+            f"{row['case']:<40} antes {row['before_us']:>9.2f} µs | "
+            f"depois {row['after_us']:>9.2f} µs | economia {row['saved_pct']:>5.1f}%"
+        )
+    overhead = signature_overhead(args.entries, args.iterations)
+    print(
+        f"{'custo da assinatura HMAC':<40} sem {overhead['unsigned_us']:>11.2f} µs | "
+        f"com {overhead['signed_us']:>11.2f} µs | acréscimo {overhead['overhead_pct']:>5.1f}%"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Benchmark do caminho crítico do turno – ClinicAI
+------------------------------------------------
+Decompõe a preparação de um turno (do recebimento da mensagem até o início
+do grafo) em conversas existentes, com latência simulada em cada operação
+no MongoDB:
+
+- `checkpoint`: a conversa tem checkpoint no banco, mas não no cache do
+  processo (ex.: após reiniciar) → leitura do checkpoint + gravação da
+  mensagem do usuário.
+- `semente`: a conversa não tem checkpoint → leitura do checkpoint, leitura
+  do histórico e gravação da mensagem.
+
+Para cada cenário, compara a soma das operações (o custo se executadas em
+sequência) com o tempo medido até o grafo, que com a leitura antecipada e a
+gravação em paralelo tende ao máximo entre as duas cadeias.
+
+Uso:
+    python -m benchmarks.bench_turn_pipeline --turns 50 --mongo-latency-ms 5
+"""
+
+import os
+
+for _key, _value in {
+    "WHATSAPP_PHONE_NUMBER_ID": "123456789",
+    "WHATSAPP_VERIFY_TOKEN": "bench",
+    "WHATSAPP_ACCESS_TOKEN": "bench",
+    "APP_SECRET": "bench",
+    "HASH_SALT": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from mongomock_motor import AsyncMongoMockClient
+
+from app.agents.graph import TriageAgent
+from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.chat_service import ChatService
+from app.services.checkpointer import CHECKPOINT_COLLECTION, MongoCheckpointSaver
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+
+DELAYED_OPS = frozenset({"insert_one", "find_one", "update_one", "replace_one", "delete_one"})
+
+Op = Tuple[str, float, float]
+
+
+class DelayedCursor:
+    """Cursor que aplica a latência simulada em `to_list`."""
+
+    def __init__(self, cursor: Any, collection: "DelayedCollection") -> None:
+        self._cursor = cursor
+        self._collection = collection
+
+    def sort(self, *args: Any, **kwargs: Any) -> "DelayedCursor":
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, *args: Any, **kwargs: Any) -> "DelayedCursor":
+        self._cursor = self._cursor.limit(*args, **kwargs)
+        return self
+
+    async def to_list(self, *args: Any, **kwargs: Any) -> List[Any]:
+        return await self._collection.delayed("find", self._cursor.to_list(*args, **kwargs))
+
+
+class DelayedCollection:
+    """
+    Proxy de coleção que atrasa cada operação em `latency` segundos e
+    registra o seu intervalo em `ops`.
+    """
+
+    def __init__(self, collection: Any, latency: float, ops: List[Op]) -> None:
+        self._collection = collection
+        self._latency = latency
+        self._ops = ops
+
+    async def delayed(self, name: str, awaitable: Any) -> Any:
+        start = time.perf_counter()
+        await asyncio.sleep(self._latency)
+        result = await awaitable
+        self._ops.append((f"{self._collection.name}.{name}", start, time.perf_counter()))
+        return result
+
+    def find(self, *args: Any, **kwargs: Any) -> DelayedCursor:
+        return DelayedCursor(self._collection.find(*args, **kwargs), self)
+
+    def __getattr__(self, name: str) -> Any:
+        target = getattr(self._collection, name)
+        if name not in DELAYED_OPS:
+            return target
+
+        def delayed(*args: Any, **kwargs: Any) -> Any:
+            return self.delayed(name, target(*args, **kwargs))
+
+        return delayed
+
+
+def build_service(client: Any, latency: float, ops: List[Op], marks: Dict[str, float]) -> ChatService:
+    """
+    Monta um `ChatService` com cache de checkpoints vazio, Mongo com latência
+    e LLM simulado instantâneo; `marks` recebe o instante de início do grafo.
+    """
+    persistence = PersistenceService(client=client)
+    persistence.db = client["clinicai_bench_pipeline"]
+    persistence.messages = DelayedCollection(persistence.db["messages"], latency, ops)
+    persistence.triages = DelayedCollection(persistence.db["triages"], latency, ops)
+    llm = LLMService(client=FakeChatModel())
+    saver = MongoCheckpointSaver(DelayedCollection(persistence.db[CHECKPOINT_COLLECTION], latency, ops))
+    agent = TriageAgent(llm=llm, persistence=persistence, checkpointer=saver)
+
+    run = agent.run
+
+    async def marked_run(state: Dict[str, Any]) -> Dict[str, Any]:
+        marks[state["conversation_id"]] = time.perf_counter()
+        return await run(state)
+
+    agent.run = marked_run
+    return ChatService(llm_client=llm, persistence=persistence, triage_agent=agent)
+
+
+async def prepare(scenario: str, client: Any, turns: int) -> List[str]:
+    """Cria as conversas existentes do cenário (sem latência)."""
+    ids = [f"{scenario}-{i}" for i in range(turns)]
+    service = build_service(client, 0.0, [], {})
+    for conv_id in ids:
+        if scenario == "checkpoint":
+            await service.process_message(ChatRequest(conversation_id=conv_id, channel="web", message="Olá"))
+        else:
+            message_id = await service.persistence.save_user_message(
+                ChatRequest(conversation_id=conv_id, channel="web", message="Olá")
+            )
+            await service.persistence.save_agent_reply(
+                message_id, ChatResponse(conversation_id=conv_id, response="Como posso ajudar?")
+            )
+    return ids
+
+
+async def run(scenario: str, turns: int, latency_ms: float) -> Dict[str, Any]:
+    """
+    Mede a preparação de `turns` turnos (um por conversa, em sequência).
+
+    Returns:
+        Dict[str, Any]: Operações por turno, soma das operações e tempo
+        medido até o grafo (medianas, em ms).
+    """
+    client = AsyncMongoMockClient()
+    ids = await prepare(scenario, client, turns)
+    ops: List[Op] = []
+    marks: Dict[str, float] = {}
+    service = build_service(client, latency_ms / 1000.0, ops, marks)
+
+    sums, critical, counts = [], [], []
+    for conv_id in ids:
+        ops.clear()
+        start = time.perf_counter()
+        await service.process_message(
+            ChatRequest(conversation_id=conv_id, channel="web", message="Dor de cabeça")
+        )
+        window = [(name, s, e) for name, s, e in ops if s >= start and e <= marks[conv_id]]
+        sums.append(sum(e - s for _, s, e in window) * 1000)
+        critical.append((marks[conv_id] - start) * 1000)
+        counts.append(len(window))
+
+    return {
+        "scenario": scenario,
+        "ops": statistics.median(counts),
+        "sequential_ms": statistics.median(sums),
+        "critical_ms": statistics.median(critical),
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    print(f"Latência por operação no Mongo: {args.mongo_latency_ms} ms ({args.turns} turnos por cenário)")
+    for scenario in ("checkpoint", "semente"):
+        row = await run(scenario, args.turns, args.mongo_latency_ms)
+        saved = (1 - row["critical_ms"] / row["sequential_ms"]) * 100 if row["sequential_ms"] else 0.0
+        print(
+            f"  {scenario:<11} ops até o grafo {row['ops']:>3.0f} | "
+            f"soma (sequencial) {row['sequential_ms']:7.2f} ms | "
+            f"caminho crítico medido {row['critical_ms']:7.2f} ms | economia {saved:5.1f}%"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Caminho crítico da preparação do turno.")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--mongo-latency-ms", type=float, default=5.0)
+    args = parser.parse_args(argv)
+    asyncio.run(_main(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+Benchmark de carga – ClinicAI
+-----------------------------
+Conduz conversas de triagem completas (multi-turno) contra `POST /chat/` e
+`POST /webhook/whatsapp`, inteiramente em processo:
+
+- Cliente ASGI do httpx (sem servidor HTTP).
+- MongoDB em memória (`mongomock_motor`) ou um mongod local (`--mongo-uri`).
+- LLM simulado (`FakeChatModel`) e Graph API simulada (respx), ambos com
+  latência configurável.
+
+Relata vazão, latência p50/p95/p99, operações no Mongo por turno e chamadas
+ao LLM (e tokens estimados) por conversa, e compara com uma baseline armazenada para detectar
+regressões.
+
+Uso:
+    python -m benchmarks.load_test --endpoint chat --conversations 200
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --check
+"""
+
+import os
+
+for _key, _value in {
+    "WHATSAPP_PHONE_NUMBER_ID": "123456789",
+    "WHATSAPP_VERIFY_TOKEN": "bench",
+    "WHATSAPP_ACCESS_TOKEN": "bench",
+    "APP_SECRET": "bench",
+    "HASH_SALT": "bench",
+    "LLM_BACKEND": "fake",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import asyncio
+import json
+import pathlib
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+import respx
+from mongomock_motor import AsyncMongoMockClient
+
+from app.agents.graph import TriageAgent
+from app.main import app
+from app.routes.chat import get_chat_service
+from app.routes.webhook import get_whatsapp_service
+from app.services.chat_service import ChatService
+from app.services.checkpointer import CHECKPOINT_COLLECTION, MongoCheckpointSaver
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.mongo import build_mongo_client
+from app.services.persistence import PersistenceService
+from app.services.whatsapp import WhatsAppService
+from app.settings import settings
+
+
+BASELINE_PATH = pathlib.Path(__file__).with_name("baseline.json")
+ENDPOINTS = ("chat", "webhook")
+
+PATIENT_SCRIPT: List[str] = [
+    "Olá",
+    "Estou com dor de cabeça",
+    "Sinto enjoo também",
+    "Começou ontem e vem e volta",
+    "Uns 7",
+    "Não tenho nenhuma doença",
+    "Não tomei nada",
+    "Sim",
+]
+
+CLOSING_PHRASE = "sua triagem foi registrada"
+
+COUNTED_OPS = frozenset({
+    "insert_one", "insert_many", "find", "find_one", "find_one_and_update",
+    "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "aggregate", "count_documents", "bulk_write",
+})
+
+
+@dataclass
+class LoadTestConfig:
+    """Parâmetros de uma execução do benchmark."""
+
+    endpoint: str = "chat"
+    conversations: int = 50
+    concurrency: int = 10
+    llm_latency_ms: float = 20.0
+    llm_jitter_ms: float = 0.0
+    graph_api_latency_ms: float = 30.0
+    seed: int = 42
+    mongo_uri: Optional[str] = None
+
+
+@dataclass
+class LoadTestReport:
+    """Resultado agregado de uma execução do benchmark."""
+
+    endpoint: str
+    conversations: int
+    completed_conversations: int
+    turns: int
+    errors: int
+    duration_s: float
+    throughput_tps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mongo_ops_per_turn: float
+    llm_calls_per_conversation: float
+    mongo_ops: Dict[str, int] = field(default_factory=dict)
+    tokens_per_conversation: float = 0.0
+    prefix_cache_hit_rate: float = 0.0
+
+
+class CountingCollection:
+    """
+    Proxy de coleção Motor que conta as operações executadas.
+
+    Funciona tanto com `mongomock_motor` quanto com o Motor real.
+    """
+
+    def __init__(self, collection: Any, counts: Dict[str, int]) -> None:
+        self._collection = collection
+        self._counts = counts
+
+    def __getattr__(self, name: str) -> Any:
+        target = getattr(self._collection, name)
+        if name not in COUNTED_OPS:
+            return target
+
+        key = f"{self._collection.name}.{name}"
+
+        def counted(*args: Any, **kwargs: Any) -> Any:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return target(*args, **kwargs)
+
+        return counted
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil pelo método nearest-rank sobre uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def build_chat_service(config: LoadTestConfig, counts: Dict[str, int]) -> tuple:
+    """Monta o `ChatService` com LLM simulado e Mongo instrumentado."""
+    client = build_mongo_client(config.mongo_uri) if config.mongo_uri else AsyncMongoMockClient()
+    persistence = PersistenceService(client=client)
+    persistence.db = client[f"clinicai_bench_{config.endpoint}"]
+    persistence.messages = CountingCollection(persistence.db["messages"], counts)
+    persistence.triages = CountingCollection(persistence.db["triages"], counts)
+
+    fake = FakeChatModel(
+        latency_ms=config.llm_latency_ms,
+        latency_jitter_ms=config.llm_jitter_ms,
+        latency_distribution="uniform" if config.llm_jitter_ms else "fixed",
+        seed=config.seed,
+    )
+    llm_service = LLMService(client=fake)
+    checkpointer = MongoCheckpointSaver(CountingCollection(persistence.db[CHECKPOINT_COLLECTION], counts))
+    agent = TriageAgent(llm=llm_service, persistence=persistence, checkpointer=checkpointer)
+    service = ChatService(llm_client=llm_service, persistence=persistence, triage_agent=agent)
+    return service, fake, client
+
+
+async def _chat_conversation(http: httpx.AsyncClient, index: int, latencies: List[float]) -> tuple:
+    """Conduz uma conversa completa via `POST /chat/`."""
+    conversation_id = None
+    errors = 0
+    closed = False
+    for text in PATIENT_SCRIPT:
+        start = time.perf_counter()
+        response = await http.post("/chat/", json={
+            "conversation_id": conversation_id,
+            "user_id": f"bench-{index}",
+            "channel": "web",
+            "message": text,
+        })
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+            continue
+        body = response.json()
+        conversation_id = body["conversation_id"]
+        closed = CLOSING_PHRASE in body["response"].lower()
+    return errors, closed
+
+
+def _webhook_payload(phone: str, text: str, seq: int) -> Dict[str, Any]:
+    """Monta um payload mínimo de webhook do WhatsApp com uma mensagem."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench_entry",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "5581000000000", "phone_number_id": "123456789"},
+                    "contacts": [{"wa_id": phone, "profile": {"name": "Paciente"}}],
+                    "messages": [{
+                        "from": phone,
+                        "id": f"wamid.{phone}.{seq}",
+                        "timestamp": "1690000000",
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+async def _webhook_conversation(http: httpx.AsyncClient, index: int, latencies: List[float]) -> tuple:
+    """Conduz uma conversa completa via `POST /webhook/whatsapp`."""
+    phone = f"5581{index:09d}"
+    errors = 0
+    closed = False
+    for seq, text in enumerate(PATIENT_SCRIPT):
+        start = time.perf_counter()
+        response = await http.post("/webhook/whatsapp", json=_webhook_payload(phone, text, seq))
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+            continue
+        closed = CLOSING_PHRASE in response.json().get("last_response", "").lower()
+    return errors, closed
+
+
+async def run_load_test(config: LoadTestConfig) -> LoadTestReport:
+    """
+    Executa o benchmark para um endpoint.
+
+    Args:
+        config (LoadTestConfig): Parâmetros da execução.
+
+    Returns:
+        LoadTestReport: Métricas agregadas.
+    """
+    if config.endpoint not in ENDPOINTS:
+        raise ValueError(f"Endpoint inválido: {config.endpoint}")
+
+    counts: Dict[str, int] = {}
+    service, fake, client = build_chat_service(config, counts)
+    if config.mongo_uri:
+        await client.drop_database(f"clinicai_bench_{config.endpoint}")
+
+    app.dependency_overrides[get_chat_service] = lambda: service
+    whatsapp = WhatsAppService()
+    app.dependency_overrides[get_whatsapp_service] = lambda: whatsapp
+
+    async def graph_api(request: httpx.Request) -> httpx.Response:
+        if config.graph_api_latency_ms:
+            await asyncio.sleep(config.graph_api_latency_ms / 1000.0)
+        return httpx.Response(200, json={"messages": [{"id": "wamid.bench"}]})
+
+    drive = _chat_conversation if config.endpoint == "chat" else _webhook_conversation
+    semaphore = asyncio.Semaphore(config.concurrency)
+    latencies: List[float] = []
+
+    async def one(index: int) -> tuple:
+        async with semaphore:
+            return await drive(http, index, latencies)
+
+    try:
+        with respx.mock(assert_all_called=False) as router:
+            router.post(
+                f"https://graph.facebook.com/v22.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+            ).mock(side_effect=graph_api)
+            router.route(host="bench").pass_through()
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+                start = time.perf_counter()
+                results = await asyncio.gather(*(one(i) for i in range(config.conversations)))
+                duration = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.pop(get_chat_service, None)
+        app.dependency_overrides.pop(get_whatsapp_service, None)
+        await whatsapp.aclose()
+
+    turns = len(latencies)
+    ordered = sorted(latencies)
+    return LoadTestReport(
+        endpoint=config.endpoint,
+        conversations=config.conversations,
+        completed_conversations=sum(1 for _, closed in results if closed),
+        turns=turns,
+        errors=sum(errors for errors, _ in results),
+        duration_s=round(duration, 4),
+        throughput_tps=round(turns / duration, 2) if duration else 0.0,
+        mean_ms=round(sum(ordered) / turns * 1000, 3) if turns else 0.0,
+        p50_ms=round(percentile(ordered, 50) * 1000, 3),
+        p95_ms=round(percentile(ordered, 95) * 1000, 3),
+        p99_ms=round(percentile(ordered, 99) * 1000, 3),
+        mongo_ops_per_turn=round(sum(counts.values()) / turns, 3) if turns else 0.0,
+        llm_calls_per_conversation=round(fake.calls / config.conversations, 3),
+        mongo_ops=dict(sorted(counts.items())),
+        tokens_per_conversation=round(
+            (fake.input_tokens + fake.output_tokens) / config.conversations, 1
+        ),
+        prefix_cache_hit_rate=round(
+            fake.prefix_hits / (fake.prefix_hits + fake.prefix_misses), 4
+        ) if fake.prefix_hits + fake.prefix_misses else 0.0,
+    )
+
+
+def compare_to_baseline(
+    report: LoadTestReport, baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """
+    Compara um relatório com a baseline do mesmo endpoint.
+
+    Latência e vazão toleram uma variação relativa (`tolerance`); operações
+    no Mongo e chamadas ao LLM são determinísticas e não podem aumentar. Se
+    diminuírem ou mudarem de operação, a baseline está desatualizada e
+    também é apontada: regenere-a com `--save-baseline` (nunca à mão).
+
+    Returns:
+        List[str]: Descrição das regressões encontradas (vazia se nenhuma).
+    """
+    problems = []
+    for metric in ("p50_ms", "p95_ms", "p99_ms"):
+        limit = baseline[metric] * (1 + tolerance)
+        if getattr(report, metric) > limit:
+            problems.append(f"{metric}: {getattr(report, metric)} > {limit:.3f}")
+    floor = baseline["throughput_tps"] * (1 - tolerance)
+    if report.throughput_tps < floor:
+        problems.append(f"throughput_tps: {report.throughput_tps} < {floor:.2f}")
+    stale = "baseline desatualizada; regenere com --save-baseline"
+    for metric in ("mongo_ops_per_turn", "llm_calls_per_conversation"):
+        if getattr(report, metric) > baseline[metric] + 1e-9:
+            problems.append(f"{metric}: {getattr(report, metric)} > {baseline[metric]}")
+        elif getattr(report, metric) < baseline[metric] - 1e-9:
+            problems.append(f"{metric}: {getattr(report, metric)} < {baseline[metric]} ({stale})")
+    if "mongo_ops" in baseline and report.mongo_ops != baseline["mongo_ops"]:
+        problems.append(f"mongo_ops: {report.mongo_ops} != {baseline['mongo_ops']} ({stale})")
+    if report.errors > baseline.get("errors", 0):
+        problems.append(f"errors: {report.errors} > {baseline.get('errors', 0)}")
+    return problems
+
+
+def _print_report(report: LoadTestReport) -> None:
+    print(
+        f"[{report.endpoint}] {report.conversations} conversas "
+        f"({report.completed_conversations} concluídas), {report.turns} turnos, "
+        f"{report.errors} erros em {report.duration_s:.2f}s\n"
+        f"  vazão: {report.throughput_tps} turnos/s | "
+        f"latência média {report.mean_ms} ms, p50 {report.p50_ms} ms, "
+        f"p95 {report.p95_ms} ms, p99 {report.p99_ms} ms\n"
+        f"  mongo ops/turno: {report.mongo_ops_per_turn} | "
+        f"chamadas LLM/conversa: {report.llm_calls_per_conversation} | "
+        f"tokens/conversa: {report.tokens_per_conversation} | "
+        f"acertos no cache de prefixo: {report.prefix_cache_hit_rate:.1%}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de carga do ClinicAI.")
+    parser.add_argument("--endpoint", choices=(*ENDPOINTS, "all"), default="all")
+    parser.add_argument("--conversations", type=int, default=LoadTestConfig.conversations)
+    parser.add_argument("--concurrency", type=int, default=LoadTestConfig.concurrency)
+    parser.add_argument("--llm-latency-ms", type=float, default=LoadTestConfig.llm_latency_ms)
+    parser.add_argument("--llm-jitter-ms", type=float, default=LoadTestConfig.llm_jitter_ms)
+    parser.add_argument("--graph-api-latency-ms", type=float, default=LoadTestConfig.graph_api_latency_ms)
+    parser.add_argument("--seed", type=int, default=LoadTestConfig.seed)
+    parser.add_argument("--mongo-uri", default=None, help="Usa um mongod real em vez do mongomock.")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Falha se houver regressão em relação à baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        failed = False
+        for endpoint, entry in baseline.items():
+            config = LoadTestConfig(**{**entry["config"], "mongo_uri": args.mongo_uri})
+            report = asyncio.run(run_load_test(config))
+            _print_report(report)
+            problems = compare_to_baseline(report, entry["report"], args.tolerance)
+            for problem in problems:
+                print(f"  REGRESSÃO {problem}")
+            failed = failed or bool(problems)
+        return 1 if failed else 0
+
+    endpoints = ENDPOINTS if args.endpoint == "all" else (args.endpoint,)
+    results = {}
+    for endpoint in endpoints:
+        config = LoadTestConfig(
+            endpoint=endpoint,
+            conversations=args.conversations,
+            concurrency=args.concurrency,
+            llm_latency_ms=args.llm_latency_ms,
+            llm_jitter_ms=args.llm_jitter_ms,
+            graph_api_latency_ms=args.graph_api_latency_ms,
+            seed=args.seed,
+            mongo_uri=args.mongo_uri,
+        )
+        report = asyncio.run(run_load_test(config))
+        _print_report(report)
+        config_dict = asdict(config)
+        config_dict.pop("mongo_uri")
+        results[endpoint] = {"config": config_dict, "report": asdict(report)}
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Baseline salva em {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
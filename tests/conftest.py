@@ -4,8 +4,14 @@ Arquivo de configuração de testes para pytest.
 Define fixtures reutilizáveis para:
 - MongoDB em memória (motor mockado).
 - Mock de chamadas HTTP externas (WhatsApp, Gemini).
+- Token das rotas da equipe.
 """
 
+import os
+
+# Logs da aplicação (configurados no lifespan) apenas no console durante os testes.
+os.environ.setdefault("LOG_FILE", "")
+
 import pytest
 import respx
 from httpx import Response
@@ -40,6 +46,18 @@ def http_mock():
         yield respx_mock
 
 
+@pytest.fixture
+def staff_headers(monkeypatch):
+    """
+    Configura `STAFF_API_TOKEN` e retorna o cabeçalho `Authorization`
+    aceito pelas rotas da equipe.
+    """
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "STAFF_API_TOKEN", "token-equipe")
+    return {"Authorization": "Bearer token-equipe"}
+
+
 @pytest.fixture
 def mock_whatsapp_send(http_mock):
     """
@@ -66,3 +84,35 @@ def mock_gemini_chat(http_mock):
         })
     )
     return http_mock
+
+
+@pytest.fixture
+def chat_service_override(db, monkeypatch):
+    """
+    Substitui o `ChatService` da API por um com MongoDB em memória e LLM
+    simulado, sem criar índices na inicialização.
+    """
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from app.agents.graph import TriageAgent
+    from app.main import app
+    from app.routes.chat import get_chat_service
+    from app.services.chat_service import ChatService
+    from app.services.llm import LLMService
+    from app.services.llm_backends import FakeChatModel
+    from app.services.persistence import PersistenceService
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "MONGO_ENSURE_INDEXES", False)
+    persistence = PersistenceService()
+    persistence.messages = db["messages_api"]
+    persistence.triages = db["triages_api"]
+    llm = LLMService(client=FakeChatModel())
+    service = ChatService(
+        llm_client=llm,
+        persistence=persistence,
+        triage_agent=TriageAgent(llm=llm, persistence=persistence, checkpointer=MemorySaver()),
+    )
+    app.dependency_overrides[get_chat_service] = lambda: service
+    yield service
+    app.dependency_overrides.pop(get_chat_service, None)
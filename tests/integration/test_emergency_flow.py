@@ -16,16 +16,17 @@ client = TestClient(app)
 
 
 @pytest.mark.asyncio
-async def test_webhook_detects_emergency(monkeypatch):
+async def test_webhook_detects_emergency(monkeypatch, chat_service_override):
     """
     Deve identificar uma mensagem de emergência e responder com EMERGENCY_MESSAGE.
     """
 
 
-    async def fake_send_message(payload):
-        return {"messages": [{"id": "wamid.fake"}], "response_text": payload.text["body"]}
+    async def fake_send(self, payload):
+        return {"messages": [{"id": "wamid.fake"}]}
 
-    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_message", fake_send_message)
+    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_message", fake_send)
+    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_raw", fake_send)
 
     payload = {
         "object": "whatsapp_business_account",
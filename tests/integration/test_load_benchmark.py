@@ -0,0 +1,78 @@
+"""
+Teste de fumaça para o benchmark de carga (benchmarks/load_test.py).
+
+Objetivos:
+- Garantir que o harness conduza conversas completas por /chat/ e /webhook/whatsapp.
+- Validar as métricas determinísticas (chamadas ao LLM e operações no Mongo).
+- Confirmar a detecção de regressões e de baselines desatualizadas.
+"""
+
+import pytest
+
+from benchmarks.load_test import LoadTestConfig, compare_to_baseline, run_load_test
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("endpoint", ["chat", "webhook"])
+async def test_load_test_completes_conversations(endpoint):
+    """
+    Todas as conversas devem terminar com a triagem registrada e sem erros.
+    """
+    report = await run_load_test(LoadTestConfig(
+        endpoint=endpoint,
+        conversations=3,
+        concurrency=3,
+        llm_latency_ms=0,
+        graph_api_latency_ms=0,
+    ))
+
+    assert report.errors == 0
+    assert report.completed_conversations == 3
+    assert report.turns == 24
+    assert report.llm_calls_per_conversation == 7
+    assert report.mongo_ops["triages.insert_one"] == 3
+    assert report.p50_ms <= report.p95_ms <= report.p99_ms
+
+
+@pytest.mark.asyncio
+async def test_compare_to_baseline_flags_regressions():
+    """
+    Deve apontar aumento de chamadas ao LLM e de latência além da tolerância.
+    """
+    report = await run_load_test(LoadTestConfig(
+        conversations=1, concurrency=1, llm_latency_ms=0, graph_api_latency_ms=0,
+    ))
+    baseline = {
+        "p50_ms": report.p50_ms, "p95_ms": report.p95_ms, "p99_ms": report.p99_ms,
+        "throughput_tps": report.throughput_tps,
+        "mongo_ops_per_turn": report.mongo_ops_per_turn,
+        "llm_calls_per_conversation": report.llm_calls_per_conversation,
+    }
+    assert compare_to_baseline(report, baseline, tolerance=0.5) == []
+
+    baseline["llm_calls_per_conversation"] = 5
+    baseline["p95_ms"] = report.p95_ms / 10
+    problems = compare_to_baseline(report, baseline, tolerance=0.5)
+    assert any("llm_calls_per_conversation" in p for p in problems)
+    assert any("p95_ms" in p for p in problems)
+
+
+@pytest.mark.asyncio
+async def test_compare_to_baseline_flags_stale_baseline():
+    """
+    Contagens determinísticas abaixo da baseline ou operações diferentes
+    indicam uma baseline que não foi regenerada.
+    """
+    report = await run_load_test(LoadTestConfig(
+        conversations=1, concurrency=1, llm_latency_ms=0, graph_api_latency_ms=0,
+    ))
+    baseline = {
+        "p50_ms": report.p50_ms, "p95_ms": report.p95_ms, "p99_ms": report.p99_ms,
+        "throughput_tps": report.throughput_tps,
+        "mongo_ops_per_turn": report.mongo_ops_per_turn,
+        "llm_calls_per_conversation": report.llm_calls_per_conversation + 2,
+        "mongo_ops": {**report.mongo_ops, "messages.find": 8},
+    }
+    problems = compare_to_baseline(report, baseline, tolerance=0.5)
+    assert any(p.startswith("llm_calls_per_conversation") and "--save-baseline" in p for p in problems)
+    assert any(p.startswith("mongo_ops:") for p in problems)
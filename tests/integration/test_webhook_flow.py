@@ -32,15 +32,16 @@ def test_webhook_verification():
 
 
 @pytest.mark.asyncio
-async def test_webhook_receive_message(monkeypatch):
+async def test_webhook_receive_message(monkeypatch, chat_service_override):
     """
     Deve processar mensagem recebida e enviar resposta simulada ao usuário.
     """
 
-    async def fake_send_message(payload):
+    async def fake_send(self, payload):
         return {"messages": [{"id": "wamid.fake"}]}
 
-    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_message", fake_send_message)
+    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_message", fake_send)
+    monkeypatch.setattr("app.services.whatsapp.WhatsAppService.send_raw", fake_send)
 
     payload = {
         "object": "whatsapp_business_account",
@@ -70,3 +71,21 @@ async def test_webhook_receive_message(monkeypatch):
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "ok"
+
+
+def test_webhook_rejects_invalid_payload(chat_service_override):
+    """
+    Payloads sem os campos lidos pelo webhook devem ser recusados com 422,
+    e campos não lidos (contatos, metadados, status) são ignorados.
+    """
+    assert client.post("/webhook/whatsapp", content=b"{").status_code == 422
+    missing_sender = {"entry": [{"changes": [{"value": {"messages": [{"text": {"body": "Oi"}}]}}]}]}
+    assert client.post("/webhook/whatsapp", json=missing_sender).status_code == 422
+
+    status_only = {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "123456789"},
+        "statuses": [{"id": "wamid.out", "status": "delivered"}],
+    }}]}]}
+    response = client.post("/webhook/whatsapp", json=status_only)
+    assert response.status_code == 200
+    assert response.json() == {"status": "ignored"}
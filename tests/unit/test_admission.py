@@ -0,0 +1,149 @@
+"""
+Testes unitários para o controle de admissão (admission.py).
+
+Objetivos:
+- Recusar conversas novas quando não há vaga, sem recusar as em andamento.
+- Fazer conversas em andamento aguardarem vaga, medindo a espera.
+- Garantir que emergências são respondidas mesmo sob sobrecarga.
+- Reconhecer como em andamento, após reiniciar, conversas com checkpoint.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agents.graph import TriageAgent
+from app.constants.replies import OVERLOAD_MESSAGE
+from app.schemas.chat import ChatRequest
+from app.services.admission import ADMISSION_SHED_TOTAL, AdmissionController
+from app.services.chat_service import ChatService
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+
+
+@pytest.mark.asyncio
+async def test_new_conversations_are_shed_when_full():
+    """
+    Sem vaga livre, conversas novas são recusadas e as em andamento aguardam.
+    """
+    admission = AdmissionController(max_in_flight=1, max_wait=10)
+    release = asyncio.Event()
+    entered = asyncio.Event()
+
+    async def hold(conv_id):
+        async with admission.slot(conv_id) as admitted:
+            entered.set()
+            await release.wait()
+            return admitted
+
+    first = asyncio.create_task(hold("conv-a"))
+    await entered.wait()
+    assert admission.in_flight == 1
+
+    shed_before = ADMISSION_SHED_TOTAL.value(channel="web")
+    async with admission.slot("conv-nova") as admitted:
+        assert admitted is False
+    assert ADMISSION_SHED_TOTAL.value(channel="web") == shed_before + 1
+
+    entered.clear()
+    ongoing = asyncio.create_task(hold("conv-a"))
+    await asyncio.sleep(0.01)
+    assert not entered.is_set()
+
+    release.set()
+    assert await first is True
+    assert await ongoing is True
+    assert admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_high_recent_wait_sheds_only_while_busy():
+    """
+    Espera média alta recusa conversas novas apenas enquanto houver turnos
+    em processamento.
+    """
+    admission = AdmissionController(max_in_flight=4, max_wait=0.5)
+    admission.recent_wait = 1.0
+    async with admission.slot("conv-nova") as admitted:
+        assert admitted is True
+        async with admission.slot("outra") as second:
+            assert second is False
+    assert admission.is_active("conv-nova")
+    admission.forget("conv-nova")
+    assert not admission.is_active("conv-nova")
+
+
+@pytest_asyncio.fixture
+async def service(db):
+    persistence = PersistenceService()
+    persistence.messages = db["messages_admission"]
+    persistence.triages = db["triages_admission"]
+    await persistence.messages.delete_many({})
+    llm = LLMService(client=FakeChatModel())
+    return ChatService(
+        llm_client=llm,
+        persistence=persistence,
+        triage_agent=TriageAgent(llm=llm, persistence=persistence, checkpointer=MemorySaver()),
+        admission=AdmissionController(max_in_flight=1, max_wait=10),
+    )
+
+
+@pytest.mark.asyncio
+async def test_overload_reply_and_emergency_bypass(service):
+    """
+    Sob sobrecarga, conversas novas recebem a resposta de alta demanda sem
+    registrar o turno, mas emergências seguem respondidas e registradas.
+    """
+    async with service.admission.slot("ocupando"):
+        shed = await service.process_message(ChatRequest(channel="web", message="Estou com tosse"))
+        assert shed.response == OVERLOAD_MESSAGE
+        assert shed.conversation_id is None
+        assert await service.persistence.messages.count_documents({}) == 0
+
+        emergency = await service.process_message(
+            ChatRequest(conversation_id="conv-urg", channel="whatsapp", message="Estou com dor no peito")
+        )
+        assert "192" in emergency.response
+        assert "pronto-socorro" in emergency.response
+        assert await service.persistence.messages.count_documents({"conversation_id": "conv-urg"}) == 1
+
+    reply = await service.process_message(ChatRequest(channel="web", message="Estou com tosse"))
+    assert reply.response != OVERLOAD_MESSAGE
+    assert service.admission.is_active(reply.conversation_id)
+
+
+@pytest.mark.asyncio
+async def test_restarted_controller_keeps_conversations_with_checkpoint(service):
+    """
+    Com o registro de sessões vazio (processo reiniciado), uma conversa com
+    checkpoint aguarda vaga em vez de ser recusada; sem checkpoint, é nova.
+    """
+    first = await service.process_message(ChatRequest(channel="web", message="Estou com tosse"))
+    conv_id = first.conversation_id
+    service.admission = AdmissionController(max_in_flight=1, max_wait=10)
+    release = asyncio.Event()
+
+    async def hold():
+        async with service.admission.slot("ocupando"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    unknown = await service.process_message(
+        ChatRequest(conversation_id="conv-sem-estado", channel="web", message="Oi")
+    )
+    assert unknown.response == OVERLOAD_MESSAGE
+
+    ongoing = asyncio.create_task(
+        service.process_message(ChatRequest(conversation_id=conv_id, channel="web", message="Desde ontem"))
+    )
+    await asyncio.sleep(0.01)
+    assert not ongoing.done()
+    release.set()
+    await holder
+    reply = await ongoing
+    assert reply.response != OVERLOAD_MESSAGE
+    assert reply.conversation_id == conv_id
@@ -0,0 +1,236 @@
+"""
+Testes unitários para os checkpoints do grafo de triagem (checkpointer.py).
+
+Objetivos:
+- Acumular os turnos no estado da conversa, com limite e reinício.
+- Gravar um único checkpoint por turno e retomá-lo em outro processo.
+- Semear conversas sem checkpoint com o histórico de `messages` (só a sessão
+  atual, sem o turno em andamento), lido em paralelo com a gravação.
+- Descartar o estado da conversa ao encerrar (triagem ou emergência).
+- Não perder checkpoints ainda não gravados na eviction do cache.
+- Serializar turnos simultâneos da mesma conversa.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.agents.graph import MAX_CONTEXT_TURNS, TriageAgent, add_turns
+from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.chat_service import ChatService
+from app.services.checkpointer import CHECKPOINT_COLLECTION, MongoCheckpointSaver
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import AGENT, USER, PersistenceService, Turn
+from app.services.replies import CLOSING, REPLIES
+
+
+def test_add_turns_appends_trims_and_resets():
+    """
+    O reducer acrescenta turnos, mantém os mais recentes e zera com None.
+    """
+    first = add_turns(None, [Turn(USER, "Oi"), Turn(AGENT, "Olá")])
+    assert first == [("user", "Oi"), ("agent", "Olá")]
+
+    turns = [Turn(USER, str(i)) for i in range(MAX_CONTEXT_TURNS + 5)]
+    trimmed = add_turns(first, turns)
+    assert len(trimmed) == MAX_CONTEXT_TURNS
+    assert trimmed[-1].text == str(MAX_CONTEXT_TURNS + 4)
+
+    assert add_turns(trimmed, None) == []
+
+
+@pytest_asyncio.fixture
+async def persistence(mongo_client):
+    service = PersistenceService(client=mongo_client)
+    service.db = mongo_client["clinicai_checkpoints"]
+    service.messages = service.db["messages"]
+    service.triages = service.db["triages"]
+    for name in ("messages", "triages", CHECKPOINT_COLLECTION):
+        await service.db[name].delete_many({})
+    return service
+
+
+def _service(persistence: PersistenceService) -> ChatService:
+    llm = LLMService(client=FakeChatModel())
+    saver = MongoCheckpointSaver(persistence.db[CHECKPOINT_COLLECTION])
+    agent = TriageAgent(llm=llm, persistence=persistence, checkpointer=saver)
+    return ChatService(llm_client=llm, persistence=persistence, triage_agent=agent)
+
+
+async def _context(service: ChatService, conv_id: str) -> list:
+    saved = await service.triage_agent.checkpointer.aget_tuple(service.triage_agent.thread_config(conv_id))
+    return saved.checkpoint["channel_values"].get("conversation_context", []) if saved else []
+
+
+@pytest.mark.asyncio
+async def test_turns_resume_from_checkpoint(persistence):
+    """
+    Turnos seguidos partem do checkpoint (sem reler `messages`), e um novo
+    processo retoma o mesmo estado a partir do banco.
+    """
+    service = _service(persistence)
+    first = await service.process_message(ChatRequest(channel="web", message="Olá"))
+    conv_id = first.conversation_id
+
+    async def no_history(*args, **kwargs):
+        raise AssertionError("histórico não deveria ser lido")
+
+    service.persistence.get_turns = no_history
+    await service.process_message(ChatRequest(conversation_id=conv_id, channel="web", message="Dor de cabeça"))
+
+    context = await _context(service, conv_id)
+    assert [turn.text for turn in context if turn.role == USER] == ["Olá", "Dor de cabeça"]
+    assert all(isinstance(turn, Turn) for turn in context)
+    assert await persistence.db[CHECKPOINT_COLLECTION].count_documents({}) == 1
+
+    restarted = _service(persistence)
+    assert await _context(restarted, conv_id) == context
+
+
+@pytest.mark.asyncio
+async def test_existing_conversation_is_seeded_from_history(persistence):
+    """
+    Uma conversa com histórico e sem checkpoint é semeada uma única vez.
+    """
+    service = _service(persistence)
+    previous = ChatRequest(conversation_id="conv-antiga", channel="whatsapp", message="Olá")
+    message_id = await persistence.save_user_message(previous)
+    await persistence.save_agent_reply(
+        message_id, ChatResponse(conversation_id="conv-antiga", response="Como posso ajudar?")
+    )
+
+    await service.process_message(
+        ChatRequest(conversation_id="conv-antiga", channel="whatsapp", message="Estou com febre")
+    )
+
+    context = await _context(service, "conv-antiga")
+    assert context[:3] == [
+        Turn(USER, "Olá"), Turn(AGENT, "Como posso ajudar?"), Turn(USER, "Estou com febre"),
+    ]
+    assert context[3].role == AGENT
+
+
+@pytest.mark.asyncio
+async def test_seed_keeps_only_current_session_and_runs_concurrently(persistence):
+    """
+    A semente começa após a última resposta de encerramento, não inclui o
+    turno atual e é lida em paralelo com a gravação da mensagem do usuário.
+    """
+    previous = (
+        ("Olá", "Como posso ajudar?"),
+        ("Sim", REPLIES.get(CLOSING).text),
+        ("Oi de novo", "Pois não?"),
+    )
+    for user, agent in previous:
+        message_id = await persistence.save_user_message(
+            ChatRequest(conversation_id="conv-sessoes", channel="web", message=user)
+        )
+        await persistence.save_agent_reply(
+            message_id, ChatResponse(conversation_id="conv-sessoes", response=agent)
+        )
+
+    service = _service(persistence)
+    events = []
+    save_user_message, get_turns = persistence.save_user_message, persistence.get_turns
+
+    async def slow_save(*args, **kwargs):
+        events.append("save:start")
+        await asyncio.sleep(0.05)
+        result = await save_user_message(*args, **kwargs)
+        events.append("save:end")
+        return result
+
+    async def slow_turns(*args, **kwargs):
+        events.append("history:start")
+        await asyncio.sleep(0.05)
+        result = await get_turns(*args, **kwargs)
+        events.append("history:end")
+        return result
+
+    persistence.save_user_message, persistence.get_turns = slow_save, slow_turns
+    await service.process_message(ChatRequest(conversation_id="conv-sessoes", channel="web", message="Febre"))
+
+    context = await _context(service, "conv-sessoes")
+    assert [turn.text for turn in context[:3]] == ["Oi de novo", "Pois não?", "Febre"]
+    assert events.index("history:start") < events.index("save:end")
+    assert events.index("save:start") < events.index("history:end")
+
+
+@pytest.mark.asyncio
+async def test_emergency_and_closing_reset_state(persistence):
+    """
+    Emergências descartam o checkpoint; o encerramento da triagem zera o contexto.
+    """
+    service = _service(persistence)
+    conv_id = (await service.process_message(ChatRequest(channel="whatsapp", message="Olá"))).conversation_id
+    assert await persistence.db[CHECKPOINT_COLLECTION].count_documents({"_id": conv_id}) == 1
+
+    await service.process_message(
+        ChatRequest(conversation_id=conv_id, channel="whatsapp", message="Estou com dor no peito")
+    )
+    assert await _context(service, conv_id) == []
+    assert await persistence.db[CHECKPOINT_COLLECTION].count_documents({"_id": conv_id}) == 0
+
+    conv_id = None
+    for text in ("Olá", "Dor de cabeça", "Enjoo", "Desde ontem", "7", "Não", "Nada", "Sim"):
+        response = await service.process_message(
+            ChatRequest(conversation_id=conv_id, channel="web", message=text)
+        )
+        conv_id = response.conversation_id or conv_id
+    assert response.conversation_id is None
+    assert await _context(service, conv_id) == []
+    assert await persistence.triages.count_documents({"conversation_id": conv_id}) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_eviction_keeps_unflushed_checkpoints(persistence):
+    """
+    Com o cache cheio de turnos em andamento, os checkpoints não gravados
+    continuam no cache até o `flush`, e só depois são descartados.
+    """
+    saver = MongoCheckpointSaver(persistence.db[CHECKPOINT_COLLECTION], maxsize=1)
+    agent = TriageAgent(llm=LLMService(client=FakeChatModel()), persistence=persistence, checkpointer=saver)
+    for conv_id in ("conv-a", "conv-b"):
+        await agent.graph.ainvoke(
+            {"conversation_id": conv_id, "channel": "web", "user_message": "Olá"},
+            config=agent.thread_config(conv_id),
+        )
+    assert len(saver._cache) == 2
+
+    await saver.flush("conv-a")
+    await saver.flush("conv-b")
+    assert await persistence.db[CHECKPOINT_COLLECTION].count_documents({}) == 2
+    assert list(saver._cache) == [("conv-b", "")]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_of_a_conversation_are_serialized(persistence):
+    """
+    Dois turnos simultâneos da mesma conversa rodam um após o outro: o
+    segundo parte do checkpoint do primeiro e nenhum turno se perde.
+    """
+    service = _service(persistence)
+    conv_id = (await service.process_message(ChatRequest(channel="web", message="Olá"))).conversation_id
+    active = peak = 0
+    get_reply = service.llm_client.get_reply
+
+    async def slow_reply(*args, **kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return await get_reply(*args, **kwargs)
+
+    service.llm_client.get_reply = slow_reply
+    await asyncio.gather(*(
+        service.process_message(ChatRequest(conversation_id=conv_id, channel="web", message=text))
+        for text in ("Dor de cabeça", "Enjoo")
+    ))
+
+    context = await _context(_service(persistence), conv_id)
+    assert sorted(turn.text for turn in context if turn.role == USER) == ["Dor de cabeça", "Enjoo", "Olá"]
+    assert peak == 1
+    assert not service.triage_agent._locks
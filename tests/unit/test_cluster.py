@@ -0,0 +1,250 @@
+"""
+Testes unitários para o modo multi-worker (hash_ring.py e cluster.py).
+
+Objetivos:
+- Garantir que o hash consistente distribui as chaves e remapeia pouco.
+- Extrair a chave de afinidade do chat e do webhook do WhatsApp.
+- Encaminhar todos os turnos de uma conversa ao mesmo worker.
+- Marcar as conversas criadas no proxy como novas, sem aceitar marcas forjadas.
+- Encerrar os workers sem bloquear o event loop.
+- Expor no proxy as métricas de todos os workers, rotuladas por worker.
+"""
+
+import asyncio
+import json
+import sys
+from collections import Counter
+
+import pytest
+from httpx import ASGITransport, AsyncClient, ConnectError, Response
+
+from app.cluster import (
+    NEW_CONVERSATION_HEADER, StickyProxy, Supervisor, create_proxy_app, is_new_conversation,
+    merge_metrics, new_conversation_token, routing_key,
+)
+from app.main import app as worker_app
+from app.schemas.chat import ChatRequest
+from app.utils.hash_ring import HashRing
+
+
+WORKERS = ["http://127.0.0.1:8100", "http://127.0.0.1:8101", "http://127.0.0.1:8102"]
+
+
+def _webhook_body(sender: str) -> bytes:
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [
+            {"from": sender, "id": "wamid", "type": "text", "text": {"body": "Oi"}}
+        ]}}]}],
+    }).encode()
+
+
+def test_hash_ring_distribution_and_stability():
+    """
+    As chaves devem se espalhar entre os nós, e adicionar um nó deve mover
+    apenas as chaves que passam a pertencer a ele.
+    """
+    ring = HashRing(["a", "b", "c"])
+    keys = [f"conv-{i}" for i in range(3000)]
+    before = {k: ring.get(k) for k in keys}
+
+    counts = Counter(before.values())
+    assert set(counts) == {"a", "b", "c"}
+    assert min(counts.values()) > 700
+
+    ring.add("d")
+    moved = [k for k in keys if ring.get(k) != before[k]]
+    assert all(ring.get(k) == "d" for k in moved)
+    assert len(moved) < len(keys) / 2
+
+    ring.remove("d")
+    assert {k: ring.get(k) for k in keys} == before
+    assert HashRing().get("x") is None
+
+
+def test_routing_key_for_chat_and_webhook():
+    """
+    O chat usa o `conversation_id` (gerado no proxy se ausente) e o webhook
+    usa o telefone do remetente, sem alterar o corpo.
+    """
+    key, body, new_id = routing_key("POST", "/chat/", b'{"conversation_id": "c1", "message": "Oi"}')
+    assert key == "conv:c1" and new_id is None
+    assert json.loads(body)["conversation_id"] == "c1"
+
+    key, body, new_id = routing_key("POST", "/chat/", b'{"message": "Oi"}')
+    assert new_id == json.loads(body)["conversation_id"]
+    assert key == f"conv:{new_id}"
+
+    webhook = _webhook_body("5511999999999")
+    assert routing_key("POST", "/webhook/whatsapp", webhook) == ("wa:5511999999999", webhook, None)
+
+    assert routing_key("POST", "/webhook/whatsapp", b'{"entry": []}')[0] is None
+    assert routing_key("POST", "/chat/", b"not json")[0] is None
+    assert routing_key("GET", "/triages", b"")[0] is None
+
+
+@pytest.mark.asyncio
+async def test_proxy_keeps_conversation_on_same_worker(http_mock):
+    """
+    Todos os turnos de uma conversa devem chegar ao mesmo worker, com o
+    corpo, a query e o status repassados.
+    """
+    routes = {
+        url: http_mock.post(f"{url}/chat/").mock(return_value=Response(200, json={"worker": url}))
+        for url in WORKERS
+    }
+    proxy = StickyProxy(WORKERS)
+    app = create_proxy_app(proxy)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.post("/chat/?debug=1", json={"message": "Oi", "channel": "web"})
+        worker = first.json()["worker"]
+        sent = routes[worker].calls.last.request
+        conv_id = json.loads(sent.content)["conversation_id"]
+        assert is_new_conversation(conv_id, sent.headers[NEW_CONVERSATION_HEADER])
+
+        for _ in range(5):
+            response = await client.post(
+                "/chat/",
+                json={"conversation_id": conv_id, "message": "Febre"},
+                headers={NEW_CONVERSATION_HEADER: new_conversation_token(conv_id)},
+            )
+            assert response.status_code == 200
+            assert response.json()["worker"] == worker
+            assert NEW_CONVERSATION_HEADER not in routes[worker].calls.last.request.headers
+
+    assert routes[worker].calls[0].request.url.params["debug"] == "1"
+    assert routes[worker].call_count == 6
+    assert sum(r.call_count for r in routes.values()) == 6
+
+
+@pytest.mark.asyncio
+async def test_proxy_reports_unavailable_worker(http_mock):
+    """
+    Falha de conexão com o worker deve virar 502, sem derrubar o proxy.
+    """
+    http_mock.get(url__startswith="http://127.0.0.1").mock(side_effect=ConnectError("down"))
+    app = create_proxy_app(StickyProxy(WORKERS))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/health")
+    assert response.status_code == 502
+
+
+WORKER_METRICS = (
+    "# HELP clinicai_turns_total Turnos.\n"
+    "# TYPE clinicai_turns_total counter\n"
+    'clinicai_turns_total{channel="web"} 3\n'
+    "# HELP clinicai_turn_seconds Duração.\n"
+    "# TYPE clinicai_turn_seconds histogram\n"
+    'clinicai_turn_seconds_bucket{le="+Inf"} 3\n'
+    "clinicai_turn_seconds_sum 0.5\n"
+    "clinicai_turn_seconds_count 3\n"
+)
+
+
+def test_merge_metrics_labels_each_worker():
+    """
+    Cada métrica aparece uma vez, com as amostras de todos os workers
+    contíguas e distinguidas pelo rótulo `worker`.
+    """
+    merged = merge_metrics([("w0", WORKER_METRICS), ("w1", WORKER_METRICS)]).splitlines()
+
+    assert merged.count("# TYPE clinicai_turns_total counter") == 1
+    assert merged[2:4] == [
+        'clinicai_turns_total{worker="w0",channel="web"} 3',
+        'clinicai_turns_total{worker="w1",channel="web"} 3',
+    ]
+    assert 'clinicai_turn_seconds_bucket{worker="w1",le="+Inf"} 3' in merged
+    assert 'clinicai_turn_seconds_count{worker="w0"} 3' in merged
+    assert merged.index('clinicai_turn_seconds_sum{worker="w1"} 0.5') > merged.index("# TYPE clinicai_turn_seconds histogram")
+    assert merge_metrics([(None, WORKER_METRICS)]).splitlines()[2] == 'clinicai_turns_total{channel="web"} 3'
+
+
+@pytest.mark.asyncio
+async def test_proxy_aggregates_worker_metrics(http_mock):
+    """
+    `/metrics` no proxy coleta todos os workers (sem rodízio) e marca os
+    que não responderam.
+    """
+    for url in WORKERS[:2]:
+        http_mock.get(f"{url}/metrics").mock(return_value=Response(200, text=WORKER_METRICS))
+    http_mock.get(f"{WORKERS[2]}/metrics").mock(side_effect=ConnectError("down"))
+    app = create_proxy_app(StickyProxy(WORKERS))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        for _ in range(2):
+            response = await client.get("/metrics")
+
+    body = response.text
+    assert response.status_code == 200
+    for url in WORKERS[:2]:
+        assert f'clinicai_turns_total{{worker="{url}",channel="web"}} 3' in body
+        assert f'clinicai_worker_up{{worker="{url}"}} 1' in body
+    assert f'clinicai_worker_up{{worker="{WORKERS[2]}"}} 0' in body
+
+
+def test_supervisor_worker_commands():
+    """
+    Cada worker deve subir em sua porta, e só o primeiro roda a retenção.
+    """
+    supervisor = Supervisor(workers=2, base_port=9100)
+    assert supervisor.urls == ["http://127.0.0.1:9100", "http://127.0.0.1:9101"]
+    assert supervisor.command(1)[-3:] == ["--port", "9101", "--no-access-log"]
+    assert supervisor.environment(0).get("RETENTION_ENABLED") != "false"
+    assert supervisor.environment(1)["RETENTION_ENABLED"] == "false"
+    assert supervisor.environment(1)["WORKERS"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_worker_starts_thread_for_marked_conversation(chat_service_override, monkeypatch):
+    """
+    O worker trata como nova (sem buscar checkpoint) apenas a conversa com a
+    marca assinada pelo proxy.
+    """
+    started = []
+    monkeypatch.setattr(chat_service_override.triage_agent, "start_thread", started.append)
+
+    async with AsyncClient(transport=ASGITransport(app=worker_app), base_url="http://test") as client:
+        marked = await client.post(
+            "/chat/",
+            json={"conversation_id": "conv-proxy", "message": "Oi", "channel": "web"},
+            headers={NEW_CONVERSATION_HEADER: new_conversation_token("conv-proxy")},
+        )
+        forged = await client.post(
+            "/chat/",
+            json={"conversation_id": "conv-alheia", "message": "Oi", "channel": "web"},
+            headers={NEW_CONVERSATION_HEADER: new_conversation_token("outra")},
+        )
+
+    assert marked.json()["conversation_id"] == "conv-proxy"
+    assert forged.status_code == 200
+    assert started == ["conv-proxy"]
+
+
+@pytest.mark.asyncio
+async def test_supervisor_astop_does_not_block_loop(monkeypatch):
+    """
+    O encerramento espera os workers em uma thread: o event loop continua
+    livre enquanto um worker que ignora o SIGTERM não é morto.
+    """
+    stubborn = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"
+    supervisor = Supervisor(workers=1, base_port=9200)
+    monkeypatch.setattr(supervisor, "command", lambda index: [sys.executable, "-c", stubborn])
+    supervisor.start()
+    process = supervisor.processes[0]
+    await asyncio.sleep(0.3)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await supervisor.astop(timeout=0.2)
+    ticker.cancel()
+
+    assert process.poll() is not None
+    assert not supervisor.processes
+    assert ticks > 0
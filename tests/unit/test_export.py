@@ -0,0 +1,186 @@
+"""
+Testes unitários para a exportação em lote das triagens (export.py).
+
+Objetivos:
+- Achatar documentos de triagem em linhas de exportação.
+- Iterar a collection em lotes e respeitar a marca d'água `(created_at, _id)`,
+  sem pular triagens com o mesmo `created_at` nem gravações recentes.
+- Garantir que o endpoint `/triages/export` transmita NDJSON, continue do
+  cursor `(since, after_id)` sem repetir linhas e gere Parquet.
+"""
+
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.routes.triages import get_persistence_service
+from app.services.export import (
+    EXPORT_COLUMNS, TriageExporter, flatten_triage, read_watermark, write_watermark,
+)
+from app.services.persistence import PersistenceService
+
+
+BASE = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest_asyncio.fixture
+async def persistence(db):
+    service = PersistenceService()
+    service.triages = db["triages_export"]
+    await service.triages.delete_many({})
+    await service.triages.insert_many([
+        {
+            "conversation_id": f"conv-{i}",
+            "data": {"queixa_principal": f"Queixa {i}", "intensidade": i},
+            "usage": {"input_tokens": 10 * i, "output_tokens": i, "cost_usd": 0.001},
+            "created_at": BASE + timedelta(minutes=i),
+        }
+        for i in range(5)
+    ])
+    return service
+
+
+def test_flatten_triage_fills_missing_columns():
+    """
+    Campos ausentes devem receber valores padrão e o uso deve ser achatado.
+    """
+    row = flatten_triage({"conversation_id": "c", "created_at": BASE, "data": {"sintomas": "tosse"}})
+    assert tuple(row) == EXPORT_COLUMNS
+    assert row["sintomas"] == "tosse"
+    assert row["intensidade"] == 0
+    assert row["input_tokens"] == 0
+
+
+@pytest.mark.asyncio
+async def test_iter_batches_respects_batch_size_and_watermark(persistence):
+    """
+    A exportação deve vir em lotes ordenados e atualizar a marca d'água.
+    """
+    exporter = TriageExporter(persistence, batch_size=2)
+    batches = [batch async for batch in exporter.iter_batches()]
+
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert [row["conversation_id"] for b in batches for row in b] == [f"conv-{i}" for i in range(5)]
+    assert exporter.watermark == BASE + timedelta(minutes=4)
+    last = await persistence.triages.find_one({"conversation_id": "conv-4"})
+    assert exporter.watermark_id == last["_id"]
+
+
+@pytest.mark.asyncio
+async def test_incremental_export_since_watermark(persistence):
+    """
+    Só a data é inclusiva; com o `_id` da marca, apenas triagens posteriores
+    são exportadas.
+    """
+    exporter = TriageExporter(persistence, batch_size=10)
+    output = io.BytesIO()
+    total = await exporter.write_ndjson(output, since=BASE + timedelta(minutes=2))
+
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert total == 3
+    assert [line["conversation_id"] for line in lines] == ["conv-2", "conv-3", "conv-4"]
+    assert lines[1]["created_at"] == (BASE + timedelta(minutes=3)).isoformat()
+
+    again = await TriageExporter(persistence).write_ndjson(
+        io.BytesIO(), since=exporter.watermark, after_id=exporter.watermark_id
+    )
+    assert again == 0
+
+
+@pytest.mark.asyncio
+async def test_watermark_keeps_ties_and_recent_triages(persistence, tmp_path):
+    """
+    Triagens com o mesmo `created_at` da marca não são puladas, e as que
+    ainda estão na janela de acomodação ficam para a próxima exportação.
+    """
+    exporter = TriageExporter(persistence, batch_size=2)
+    first = [row async for batch in exporter.iter_batches() for row in batch]
+    assert len(first) == 5
+
+    watermark_file = tmp_path / ".watermark"
+    write_watermark(watermark_file, exporter.watermark, exporter.watermark_id)
+    since, after_id = read_watermark(watermark_file)
+    assert (since, after_id) == (exporter.watermark, exporter.watermark_id)
+
+    await persistence.triages.insert_many([
+        {"conversation_id": "conv-tie", "data": {}, "created_at": since},
+        {"conversation_id": "conv-recent", "data": {}, "created_at": datetime.utcnow()},
+    ])
+    rows = [row async for batch in exporter.iter_batches(since, after_id) for row in batch]
+    assert [row["conversation_id"] for row in rows] == ["conv-tie"]
+
+    immediate = TriageExporter(persistence, settle_seconds=0)
+    batches = immediate.iter_batches(exporter.watermark, exporter.watermark_id)
+    rows = [row async for batch in batches for row in batch]
+    assert [row["conversation_id"] for row in rows] == ["conv-recent"]
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_streams_ndjson(persistence, staff_headers):
+    """
+    O endpoint deve transmitir uma triagem por linha.
+    """
+    app.dependency_overrides[get_persistence_service] = lambda: persistence
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test", headers=staff_headers) as client:
+            response = await client.get("/triages/export", params={"batch_size": 2})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 5
+    assert rows[4]["intensidade"] == 4
+
+
+async def _export(persistence, staff_headers, **params):
+    app.dependency_overrides[get_persistence_service] = lambda: persistence
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test", headers=staff_headers) as client:
+            return await client.get("/triages/export", params=params)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_resumes_after_cursor(persistence, staff_headers):
+    """
+    Com o `created_at` e o `id` da última linha recebida, a próxima chamada
+    começa logo depois dela, mesmo com outra triagem no mesmo instante.
+    """
+    await persistence.triages.insert_one({
+        "conversation_id": "conv-2b", "data": {}, "created_at": BASE + timedelta(minutes=2),
+    })
+    first = [json.loads(line) for line in (await _export(persistence, staff_headers)).text.splitlines()]
+    assert [row["conversation_id"] for row in first] == ["conv-0", "conv-1", "conv-2", "conv-2b", "conv-3", "conv-4"]
+
+    cursor = first[2]
+    response = await _export(persistence, staff_headers, since=cursor["created_at"], after_id=cursor["id"])
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["conversation_id"] for row in rows] == ["conv-2b", "conv-3", "conv-4"]
+
+    invalid = await _export(persistence, staff_headers, after_id=cursor["id"])
+    assert invalid.status_code == 400
+    invalid = await _export(persistence, staff_headers, since=cursor["created_at"], after_id="x")
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_parquet(persistence, staff_headers):
+    """
+    `format=parquet` devolve o arquivo Parquet com as mesmas colunas.
+    """
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = await _export(persistence, staff_headers, format="parquet")
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert tuple(table.column_names) == EXPORT_COLUMNS
+    assert table.num_rows == 5
@@ -0,0 +1,188 @@
+"""
+Testes unitários para os backends de LLM (llm_backends.py).
+
+Objetivos:
+- Garantir que o LLM simulado siga o roteiro de forma determinística por conversa.
+- Validar a resposta de extração em JSON.
+- Confirmar latência e injeção de falhas configuráveis.
+- Verificar a seleção do backend via Settings.
+- Manter o prefixo do prompt estável e usar o cache de contexto do Gemini.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.services import llm
+from app.services.llm_backends import (
+    DEFAULT_EXTRACTION_REPLY,
+    FakeChatModel,
+    FakeLLMError,
+    GeminiContextCache,
+)
+
+
+@pytest.mark.asyncio
+async def test_fake_follows_script_by_turn():
+    """
+    Deve responder conforme o número de respostas do roteiro já presentes no histórico.
+    """
+    fake = FakeChatModel(script=["primeira", "segunda", "final"])
+
+    first = await fake.ainvoke([SystemMessage(content="s"), HumanMessage(content="oi")])
+    assert first.content == "primeira"
+
+    second = await fake.ainvoke([
+        HumanMessage(content="oi"), AIMessage(content="primeira"), HumanMessage(content="dor"),
+    ])
+    assert second.content == "segunda"
+
+    last = await fake.ainvoke([
+        AIMessage(content="primeira"), AIMessage(content="segunda"),
+        AIMessage(content="final"), HumanMessage(content="?"),
+    ])
+    assert last.content == "final"
+    assert fake.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_fake_returns_extraction_json():
+    """
+    Deve devolver o JSON de triagem quando o prompt pedir extração.
+    """
+    fake = FakeChatModel()
+    reply = await fake.ainvoke([HumanMessage(content="Extraia... Responda SOMENTE em JSON.")])
+    assert json.loads(reply.content) == DEFAULT_EXTRACTION_REPLY
+
+
+@pytest.mark.asyncio
+async def test_fake_injects_failures():
+    """
+    Com failure_rate=1 toda chamada deve falhar.
+    """
+    fake = FakeChatModel(failure_rate=1.0, seed=1)
+    with pytest.raises(FakeLLMError):
+        await fake.ainvoke([HumanMessage(content="oi")])
+    assert fake.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_fake_applies_latency():
+    """
+    Deve aguardar a latência configurada antes de responder.
+    """
+    fake = FakeChatModel(latency_ms=30)
+    start = time.perf_counter()
+    await fake.ainvoke([HumanMessage(content="oi")])
+    assert time.perf_counter() - start >= 0.025
+
+
+def test_latency_distributions_are_seeded():
+    """
+    A mesma semente deve produzir a mesma sequência de latências.
+    """
+    a = FakeChatModel(latency_ms=100, latency_jitter_ms=50, latency_distribution="uniform", seed=7)
+    b = FakeChatModel(latency_ms=100, latency_jitter_ms=50, latency_distribution="uniform", seed=7)
+    samples = [a._sample_latency() for _ in range(5)]
+    assert samples == [b._sample_latency() for _ in range(5)]
+    assert all(0.05 <= s <= 0.15 for s in samples)
+
+
+def test_get_llm_selects_fake_backend(monkeypatch):
+    """
+    `get_llm` deve retornar o simulador quando LLM_BACKEND=fake.
+    """
+    monkeypatch.setattr(llm.settings, "LLM_BACKEND", "fake")
+    assert isinstance(llm.get_llm(), FakeChatModel)
+
+
+def test_get_llm_requires_api_key_for_gemini(monkeypatch):
+    """
+    Deve levantar ValueError se o Gemini for escolhido sem GOOGLE_API_KEY.
+    """
+    monkeypatch.setattr(llm.settings, "LLM_BACKEND", "gemini")
+    monkeypatch.setattr(llm.settings, "GOOGLE_API_KEY", "")
+    with pytest.raises(ValueError):
+        llm.get_llm()
+
+
+@pytest.mark.asyncio
+async def test_prompt_prefix_is_stable_across_calls():
+    """
+    Todas as chamadas devem abrir com o mesmo prefixo: só a primeira falha
+    no cache de prefixo do simulador, e as demais leem seus tokens do cache.
+    """
+    fake = FakeChatModel()
+    service = llm.LLMService(client=fake)
+    await service.get_reply("Olá", session_id="conv-prefix")
+    await service.get_reply("Dor de cabeça", session_id="conv-prefix")
+    await service.get_reply("Desde ontem", session_id="conv-prefix")
+
+    assert fake.prefix_misses == 1
+    assert fake.prefix_hits == 2
+    assert llm.get_prompt_prefix() is llm.get_prompt_prefix()
+    assert service.usage.summary("conv-prefix")["cached_tokens"] == fake.cached_tokens > 0
+
+
+class StubCacheClient:
+    """Cliente da API de cache que registra as criações (ou falha)."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.created = []
+
+    async def create_cached_content(self, cached_content):
+        if self.fail:
+            raise RuntimeError("conteúdo abaixo do mínimo de tokens")
+        self.created.append(cached_content)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+
+@pytest.mark.asyncio
+async def test_context_cache_is_created_once_and_referenced():
+    """
+    O prefixo deve ir ao cache uma única vez por versão, e as chamadas
+    passam a enviar só a conversa, com `cached_content`.
+    """
+    client = StubCacheClient()
+    cache = GeminiContextCache(model="gemini-2.5-flash", ttl_seconds=3600, client=client)
+    fake = FakeChatModel()
+    calls = []
+    original = fake.ainvoke
+
+    async def spy(messages, **kwargs):
+        calls.append((messages, kwargs))
+        return await original(messages, **kwargs)
+
+    fake.ainvoke = spy
+    service = llm.LLMService(client=fake, context_cache=cache)
+    await service.get_reply("Olá")
+    await service.get_reply("Dor de cabeça")
+
+    assert len(client.created) == 1
+    assert client.created[0].model == "models/gemini-2.5-flash"
+    assert all(kwargs == {"cached_content": "cachedContents/1"} for _, kwargs in calls)
+    assert not any(isinstance(m, SystemMessage) for messages, _ in calls for m in messages)
+    assert await cache.name_for("outro prefixo", "v2") == "cachedContents/2"
+
+
+@pytest.mark.asyncio
+async def test_context_cache_failure_falls_back_to_inline_prefix():
+    """
+    Se o cache não puder ser criado, o prefixo segue no corpo da requisição
+    e a criação não é repetida a cada chamada.
+    """
+    client = StubCacheClient(fail=True)
+    cache = GeminiContextCache(model="gemini-2.5-flash", ttl_seconds=3600, client=client)
+    fake = FakeChatModel()
+    service = llm.LLMService(client=fake, context_cache=cache)
+
+    await service.get_reply("Olá")
+    client.fail = False
+    await service.get_reply("Dor de cabeça")
+
+    assert client.created == []
+    assert fake.prefix_misses == 1 and fake.prefix_hits == 1
@@ -0,0 +1,170 @@
+"""
+Testes unitários para os logs estruturados (app/utils/logging.py).
+
+Objetivos:
+- Emitir uma linha JSON por registro com o contexto do turno (conversa, canal, nó).
+- Descartar registros de sucesso dos turnos não sorteados, mantendo avisos e erros.
+- Escrever em uma thread dedicada sem perder registros ao remover o sink.
+- Aguardar em `complete` a escrita das linhas enfileiradas, sem ocupar o loop.
+- Registrar o fim de cada turno do ChatService com a duração e os erros do grafo.
+"""
+
+import asyncio
+import io
+import json
+import sys
+import threading
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from loguru import logger
+
+from app.agents.graph import TriageAgent
+from app.schemas.chat import ChatRequest
+from app.services.chat_service import ChatService
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+from app.utils import logging as app_logging
+from app.utils.logging import SAMPLED, BackgroundSink, configure_logging, conversation_tag
+from app.utils.metrics import current_node
+
+
+@pytest.fixture
+def stream():
+    """Configura os logs em JSON num buffer em memória (escrita síncrona)."""
+    buffer = io.StringIO()
+    configure_logging(level="DEBUG", fmt="json", file="", enqueue=False, stream=buffer)
+    buffer.seek(0)
+    buffer.truncate()
+    yield buffer
+    logger.remove()
+    logger.add(sys.stderr)
+
+
+def _records(buffer: io.StringIO) -> list:
+    return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+
+def _service(persistence: PersistenceService, failure_rate: float = 0.0) -> ChatService:
+    llm = LLMService(client=FakeChatModel(failure_rate=failure_rate))
+    return ChatService(
+        llm_client=llm,
+        persistence=persistence,
+        triage_agent=TriageAgent(llm=llm, persistence=persistence, checkpointer=MemorySaver()),
+    )
+
+
+def test_json_record_carries_turn_context(stream):
+    """
+    Cada registro deve ser uma linha JSON com o contexto e os campos extras.
+    """
+    token = current_node.set("llm_dialog")
+    try:
+        with logger.contextualize(conversation=conversation_tag("conv-1"), channel="web"):
+            logger.info("Chamada {}", "ok", duration_ms=12.5)
+    finally:
+        current_node.reset(token)
+
+    (record,) = _records(stream)
+    assert record["message"] == "Chamada ok"
+    assert record["level"] == "INFO"
+    assert record["conversation"] == conversation_tag("conv-1") != "conv-1"
+    assert record["channel"] == "web"
+    assert record["node"] == "llm_dialog"
+    assert record["duration_ms"] == 12.5
+    assert SAMPLED not in record
+
+
+def test_unsampled_turn_keeps_only_warnings(stream):
+    """
+    Num turno não sorteado, INFO é descartado e WARNING/ERROR são mantidos.
+    """
+    with logger.contextualize(**{SAMPLED: False}):
+        logger.info("sucesso")
+        logger.warning("lento")
+        try:
+            raise ValueError("falhou")
+        except ValueError:
+            logger.exception("erro")
+
+    records = _records(stream)
+    assert [r["message"] for r in records] == ["lento", "erro"]
+    assert "ValueError: falhou" in records[1]["exception"]
+
+
+def test_background_sink_flushes_on_remove():
+    """
+    Com `enqueue`, os registros são escritos pela thread e descarregados
+    quando o sink é removido.
+    """
+    buffer = io.StringIO()
+    configure_logging(level="INFO", fmt="json", file="", enqueue=True, stream=buffer)
+    for i in range(100):
+        logger.info("registro {}", i)
+    logger.remove()
+    logger.add(sys.stderr)
+
+    messages = [json.loads(line)["message"] for line in buffer.getvalue().splitlines()]
+    assert messages[-100:] == [f"registro {i}" for i in range(100)]
+
+
+class _GatedStream(io.StringIO):
+    """Stream cuja escrita fica bloqueada até `gate` ser liberado."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.gate.wait()
+        return super().write(text)
+
+
+@pytest.mark.asyncio
+async def test_background_sink_complete_waits_for_writes():
+    """
+    `complete` só retorna depois que a thread grava as linhas pendentes, e
+    o loop continua livre enquanto espera.
+    """
+    buffer = _GatedStream()
+    sink = BackgroundSink(buffer)
+    for i in range(3):
+        sink.write(f"linha {i}\n")
+
+    completing = asyncio.create_task(sink.complete())
+    await asyncio.sleep(0.05)
+    assert not completing.done()
+    buffer.gate.set()
+    await asyncio.wait_for(completing, timeout=1)
+
+    assert buffer.getvalue() == "linha 0\nlinha 1\nlinha 2\n"
+    sink.stop()
+
+
+@pytest.mark.asyncio
+async def test_chat_service_logs_turns_and_graph_errors(stream, db, monkeypatch):
+    """
+    O turno termina com um registro de sucesso (com a duração) e erros do
+    grafo são registrados mesmo fora da amostragem.
+    """
+    persistence = PersistenceService()
+    persistence.messages = db["messages_logging"]
+    persistence.triages = db["triages_logging"]
+
+    service = _service(persistence)
+    monkeypatch.setattr(app_logging.settings, "LOG_SAMPLE_RATE", 1.0)
+    response = await service.process_message(ChatRequest(channel="web", message="Olá"))
+    done = [r for r in _records(stream) if r["message"] == "Turno concluído"]
+    assert len(done) == 1
+    assert done[0]["conversation"] == conversation_tag(response.conversation_id)
+    assert done[0]["duration_ms"] > 0 and done[0]["closed"] is False
+
+    stream.seek(0)
+    stream.truncate()
+    monkeypatch.setattr(app_logging.settings, "LOG_SAMPLE_RATE", 0.0)
+    failing = _service(persistence, failure_rate=1.0)
+    await failing.process_message(ChatRequest(channel="web", message="Olá"))
+    records = _records(stream)
+    assert [r["level"] for r in records] == ["ERROR"]
+    assert records[0]["message"].startswith("Erro no grafo de triagem")
@@ -0,0 +1,111 @@
+"""
+Testes unitários para as métricas de latência (utils/metrics.py e rota /metrics).
+
+Objetivos:
+- Validar a renderização de histogramas e contadores no formato do Prometheus
+  (incluindo o escape dos valores de rótulo).
+- Garantir que `timed` não registre nada quando as métricas estão desativadas.
+- Confirmar que cada nó do grafo é medido e que o LLM recebe o nome do nó.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agents.graph import instrumented_node
+from app.main import app
+from app.utils import metrics
+from app.utils.metrics import LLM_CALL_SECONDS, MetricsRegistry, current_node, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Os buckets devem ser cumulativos e incluir soma e contagem.
+    """
+    registry = MetricsRegistry()
+    hist = registry.histogram("test_seconds", "Teste.", ("op",), buckets=(0.1, 1.0))
+    hist.observe(0.05, op="a")
+    hist.observe(0.5, op="a")
+    hist.observe(5.0, op="a")
+
+    text = registry.render()
+    assert 'test_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{op="a",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{op="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{op="a"} 3' in text
+    assert "# TYPE test_seconds histogram" in text
+
+
+def test_counter_and_gauge():
+    """
+    Contadores acumulam e gauges aceitam set/dec.
+    """
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Teste.", ("kind",))
+    counter.inc(kind="x")
+    counter.inc(2, kind="x")
+    gauge = registry.gauge("test_inflight", "Teste.")
+    gauge.set(3)
+    gauge.dec()
+
+    assert counter.value(kind="x") == 3
+    assert gauge.value() == 2
+    assert 'test_total{kind="x"} 3' in registry.render()
+
+
+def test_label_values_are_escaped():
+    """
+    Aspas, barras invertidas e quebras de linha nos rótulos são escapadas.
+    """
+    registry = MetricsRegistry()
+    counter = registry.counter("test_escaped_total", "Teste.", ("reason",))
+    counter.inc(reason='erro "x"\\y\nz')
+
+    assert 'test_escaped_total{reason="erro \\"x\\"\\\\y\\nz"} 1' in registry.render()
+
+
+def test_timed_is_noop_when_disabled(monkeypatch):
+    """
+    Com METRICS_ENABLED=False nenhuma observação deve ser registrada.
+    """
+    registry = MetricsRegistry()
+    hist = registry.histogram("test_disabled_seconds", "Teste.")
+    monkeypatch.setattr(metrics.settings, "METRICS_ENABLED", False)
+    with timed(hist):
+        pass
+    assert hist.count() == 0
+
+    monkeypatch.setattr(metrics.settings, "METRICS_ENABLED", True)
+    with timed(hist):
+        pass
+    assert hist.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_instrumented_node_exposes_node_name():
+    """
+    O nó instrumentado deve expor seu nome via `current_node` e ser medido.
+    """
+    seen = {}
+
+    async def node(state):
+        seen["node"] = current_node.get()
+        with timed(LLM_CALL_SECONDS, node=current_node.get()):
+            pass
+        return state
+
+    before = LLM_CALL_SECONDS.count(node="teste_no")
+    await instrumented_node("teste_no", node)({"x": 1})
+
+    assert seen["node"] == "teste_no"
+    assert current_node.get() is None
+    assert LLM_CALL_SECONDS.count(node="teste_no") == before + 1
+
+
+def test_metrics_endpoint_renders_registry():
+    """
+    GET /metrics deve devolver o texto do Prometheus.
+    """
+    client = TestClient(app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "clinicai_graph_node_duration_seconds" in response.text
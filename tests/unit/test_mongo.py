@@ -0,0 +1,113 @@
+"""
+Testes unitários para o cliente MongoDB compartilhado (app/services/mongo.py).
+
+Objetivos:
+- Montar o cliente com o pool e os timeouts configurados (0 = sem limite).
+- Aplicar o write concern por collection e a read preference das consultas.
+- Registrar a espera por conexão e as conexões em uso a partir dos eventos do pool.
+"""
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import ReadPreference, monitoring
+
+from app.services import mongo
+from app.services.mongo import (
+    MONGO_POOL_CONNECTIONS, MONGO_POOL_WAIT_SECONDS, PoolMetricsListener,
+    build_mongo_client, get_mongo_client, write_concern_for,
+)
+from app.services.persistence import PersistenceService
+
+ADDRESS = ("db.local", 27017)
+
+
+def test_client_uses_configured_pool(monkeypatch):
+    """
+    O cliente recebe o pool, os timeouts (0 vira sem limite) e o listener
+    de métricas; o cliente padrão é compartilhado.
+    """
+    monkeypatch.setattr(mongo.settings, "MONGO_MAX_POOL_SIZE", 40)
+    monkeypatch.setattr(mongo.settings, "MONGO_MIN_POOL_SIZE", 4)
+    monkeypatch.setattr(mongo.settings, "MONGO_MAX_IDLE_TIME_MS", 60_000)
+    monkeypatch.setattr(mongo.settings, "MONGO_SOCKET_TIMEOUT_MS", 0)
+    monkeypatch.setattr(mongo.settings, "MONGO_SERVER_SELECTION_TIMEOUT_MS", 2000)
+
+    client = build_mongo_client("mongodb://localhost:1")
+    pool = client.options.pool_options
+    assert (pool.max_pool_size, pool.min_pool_size, pool.max_idle_time_seconds) == (40, 4, 60)
+    assert pool.socket_timeout is None
+    assert client.options.server_selection_timeout == 2
+    assert any(isinstance(listener, PoolMetricsListener) for listener in client.options.event_listeners)
+    assert get_mongo_client() is get_mongo_client()
+
+
+def test_pool_size_zero_means_unlimited(monkeypatch):
+    """
+    `MONGO_MAX_POOL_SIZE=0` é aceito e repassado ao driver, que o trata
+    como pool sem limite.
+    """
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "0")
+    assert type(mongo.settings)().MONGO_MAX_POOL_SIZE == 0
+
+    monkeypatch.setattr(mongo.settings, "MONGO_MAX_POOL_SIZE", 0)
+    client = build_mongo_client("mongodb://localhost:1")
+    assert client.options.pool_options.max_pool_size == 0
+
+
+def test_write_concern_and_query_read_preference(monkeypatch):
+    """
+    `messages` e `triages` usam os seus write concerns; as consultas da
+    equipe usam a read preference configurada (primary desativa o desvio).
+    """
+    assert write_concern_for("1").document == {"w": 1}
+    assert write_concern_for("majority").document == {"w": "majority"}
+
+    persistence = PersistenceService(client=AsyncMongoMockClient())
+    assert persistence.messages.write_concern.document == {"w": 1}
+    assert persistence.triages.write_concern.document == {"w": "majority"}
+
+    reader = persistence.for_queries(persistence.triages)
+    assert reader.read_preference == ReadPreference.SECONDARY_PREFERRED
+    assert persistence.for_queries(persistence.triages) is reader
+    assert persistence.triages.read_preference == ReadPreference.PRIMARY
+
+    monkeypatch.setattr(mongo.settings, "MONGO_QUERY_READ_PREFERENCE", "primary")
+    primary = PersistenceService(client=AsyncMongoMockClient())
+    assert primary.for_queries(primary.triages) is primary.triages
+
+
+@pytest.mark.asyncio
+async def test_queries_read_through_query_collection():
+    """
+    As listagens leem pela collection de consultas e enxergam o que foi gravado.
+    """
+    persistence = PersistenceService(client=AsyncMongoMockClient())
+    await persistence.save_triage("conv-rp", {"queixa_principal": "Dor", "intensidade": 5}, channel="web")
+
+    docs, _ = await persistence.list_triages(limit=10)
+    assert [d["conversation_id"] for d in docs] == ["conv-rp"]
+
+
+def test_pool_listener_records_wait_and_connections():
+    """
+    Os eventos do pool alimentam o histograma de espera (por resultado) e
+    as conexões abertas e em uso por servidor.
+    """
+    listener = PoolMetricsListener()
+    ok_before = MONGO_POOL_WAIT_SECONDS.count(outcome="ok")
+    timeout_before = MONGO_POOL_WAIT_SECONDS.count(outcome="timeout")
+    address = "db.local:27017"
+
+    listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1, 0.004))
+    assert MONGO_POOL_CONNECTIONS.value(address=address, state="in_use") == 1
+    assert MONGO_POOL_CONNECTIONS.value(address=address, state="open") == 1
+
+    listener.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(ADDRESS, "timeout", 1.5))
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 1))
+    listener.connection_closed(monitoring.ConnectionClosedEvent(ADDRESS, 1, "idle"))
+
+    assert MONGO_POOL_WAIT_SECONDS.count(outcome="ok") == ok_before + 1
+    assert MONGO_POOL_WAIT_SECONDS.count(outcome="timeout") == timeout_before + 1
+    assert MONGO_POOL_CONNECTIONS.value(address=address, state="in_use") == 0
+    assert MONGO_POOL_CONNECTIONS.value(address=address, state="open") == 0
@@ -0,0 +1,157 @@
+"""
+Testes unitários para as listagens paginadas por cursor (pagination.py,
+PersistenceService.list_triages/list_messages e rotas de consulta).
+
+Objetivos:
+- Percorrer todas as páginas sem repetições nem lacunas, inclusive com datas empatadas.
+- Aplicar filtros de intensidade, data e canal, e a projeção de campos.
+- Rejeitar cursores e campos inválidos com 400.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.routes.triages import get_persistence_service
+from app.services.persistence import PersistenceService
+from app.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+BASE = datetime(2025, 3, 1, 8, 0, 0)
+
+
+@pytest_asyncio.fixture
+async def persistence(db):
+    service = PersistenceService()
+    service.db = db
+    service.triages = db["triages_page"]
+    service.messages = db["messages_page"]
+    await service.triages.delete_many({})
+    await service.messages.delete_many({})
+    await service.triages.insert_many([
+        {
+            "conversation_id": f"conv-{i}",
+            "channel": "whatsapp" if i % 2 else "web",
+            "data": {"queixa_principal": f"Queixa {i}", "intensidade": i},
+            # Pares de triagens com o mesmo created_at exercitam o desempate por _id.
+            "created_at": BASE + timedelta(minutes=i // 2),
+        }
+        for i in range(7)
+    ])
+    await service.messages.insert_many([
+        {
+            "conversation_id": "conv-a" if i < 4 else "conv-b",
+            "channel": "web",
+            "user_message": f"msg {i}",
+            "agent_message": f"resp {i}",
+            "timestamp": BASE + timedelta(seconds=i),
+        }
+        for i in range(6)
+    ])
+    return service
+
+
+def test_cursor_roundtrip_and_validation():
+    """
+    O cursor deve codificar a chave (data, _id) e rejeitar conteúdo inválido.
+    """
+    from bson import ObjectId
+
+    oid = ObjectId()
+    assert decode_cursor(encode_cursor(BASE, oid)) == (BASE, oid)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("nao-e-um-cursor")
+
+
+@pytest.mark.asyncio
+async def test_list_triages_walks_all_pages(persistence):
+    """
+    A paginação deve cobrir todas as triagens, em ordem decrescente, sem repetir.
+    """
+    seen, cursor = [], None
+    while True:
+        docs, cursor = await persistence.list_triages(limit=3, cursor=cursor)
+        seen.extend(docs)
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert len({d["_id"] for d in seen}) == 7
+    keys = [(d["created_at"], d["_id"]) for d in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_list_triages_filters_and_projection(persistence):
+    """
+    Filtros de intensidade, canal e data devem ser combinados; a projeção
+    deve trazer apenas os campos pedidos (mais a chave do cursor).
+    """
+    docs, cursor = await persistence.list_triages(
+        min_intensity=2, max_intensity=6, channel="whatsapp",
+        since=BASE + timedelta(minutes=1), fields=["conversation_id", "intensidade"],
+    )
+
+    assert cursor is None
+    assert [d["conversation_id"] for d in docs] == ["conv-5", "conv-3"]
+    assert set(docs[0]) == {"_id", "conversation_id", "created_at", "data"}
+    assert docs[0]["data"] == {"intensidade": 5}
+
+    with pytest.raises(ValueError):
+        await persistence.list_triages(fields=["senha"])
+
+
+@pytest.mark.asyncio
+async def test_list_messages_by_conversation(persistence):
+    """
+    O histórico de uma conversa deve ser paginado do mais recente ao mais antigo.
+    """
+    first, cursor = await persistence.list_messages(limit=3, conversation_id="conv-a")
+    second, last = await persistence.list_messages(limit=3, cursor=cursor, conversation_id="conv-a")
+
+    assert [d["user_message"] for d in first] == ["msg 3", "msg 2", "msg 1"]
+    assert [d["user_message"] for d in second] == ["msg 0"]
+    assert last is None
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes(persistence):
+    """
+    Os índices das listagens devem ser criados de forma idempotente, com a
+    chave de ordenação `(data, _id)` antes dos filtros por intervalo (ESR).
+    """
+    await persistence.ensure_indexes()
+    await persistence.ensure_indexes()
+    triages = [spec["key"] for spec in (await persistence.db["triages"].index_information()).values()]
+    messages = [spec["key"] for spec in (await persistence.db["messages"].index_information()).values()]
+    assert [("created_at", -1), ("_id", -1), ("data.intensidade", -1)] in triages
+    assert not any(key[0][0] == "data.intensidade" for key in triages)
+    assert [("conversation_id", 1), ("timestamp", 1), ("_id", 1)] in messages
+
+
+@pytest.mark.asyncio
+async def test_query_endpoints(persistence, staff_headers):
+    """
+    As rotas devem devolver a página com o próximo cursor e 400 para cursor inválido.
+    """
+    app.dependency_overrides[get_persistence_service] = lambda: persistence
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test", headers=staff_headers) as client:
+            page = await client.get("/triages", params={"limit": 4, "fields": "intensidade"})
+            nxt = await client.get("/triages", params={"limit": 4, "cursor": page.json()["next_cursor"]})
+            messages = await client.get("/conversations/conv-b/messages")
+            invalid = await client.get("/conversations", params={"cursor": "xyz"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert page.status_code == 200
+    assert len(page.json()["items"]) == 4
+    assert isinstance(page.json()["items"][0]["_id"], str)
+    assert len(nxt.json()["items"]) == 3
+    assert nxt.json()["next_cursor"] is None
+    assert [m["user_message"] for m in messages.json()["items"]] == ["msg 5", "msg 4"]
+    assert invalid.status_code == 400
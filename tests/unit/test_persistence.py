@@ -4,11 +4,12 @@ Testes unitários para o serviço de persistência (PersistenceService).
 Objetivos:
 - Verificar se mensagens são salvas e recuperadas corretamente.
 - Validar que triagens estruturadas são persistidas e retornadas.
+- Ler o histórico no formato compacto do grafo (`Turn`).
 """
 
 import pytest
 from datetime import datetime
-from app.services.persistence import PersistenceService
+from app.services.persistence import AGENT, USER, PersistenceService, Turn
 from app.schemas.chat import ChatRequest, ChatResponse
 
 
@@ -69,3 +70,24 @@ async def test_save_and_get_triage(db):
     assert triage is not None
     assert triage["data"]["queixa_principal"] == "Dor abdominal"
     assert triage["data"]["intensidade"] == "7"
+
+
+@pytest.mark.asyncio
+async def test_get_turns_projects_compact_history(db):
+    """
+    O histórico do grafo deve trazer apenas papel e texto de cada fala,
+    incluindo turnos ainda sem resposta.
+    """
+    service = PersistenceService()
+    service.db = db
+    service.messages = db["messages_turns"]
+
+    request = ChatRequest(conversation_id="conv-turns", user_id="u", channel="web", message="Oi")
+    message_id = await service.save_user_message(request)
+    await service.save_agent_reply(message_id, ChatResponse(conversation_id="conv-turns", response="Olá!"))
+    await service.save_user_message(request.model_copy(update={"message": "Estou com febre"}))
+
+    turns = await service.get_turns("conv-turns")
+
+    assert turns == [Turn(USER, "Oi"), Turn(AGENT, "Olá!"), Turn(USER, "Estou com febre")]
+    assert all(type(turn) is Turn for turn in turns)
@@ -0,0 +1,91 @@
+"""
+Testes unitários para a pseudonimização de telefones (pseudonymizer.py).
+
+Objetivos:
+- Garantir pseudônimos estáveis (HMAC) e independentes do formato do número.
+- Validar o limite e a ordem de descarte do cache LRU.
+- Regravar em lote os registros do esquema anterior (e simular com dry-run).
+"""
+
+import pytest
+import pytest_asyncio
+
+from app.services.persistence import PersistenceService
+from app.services.pseudonymizer import (
+    PSEUDONYM_CACHE_TOTAL,
+    Pseudonymizer,
+    legacy_hash,
+    rehash_legacy_records,
+)
+from app.utils.hashing import Hasher
+
+
+NUMBER = "5581991113682"
+
+
+def test_pseudonym_is_stable_hmac():
+    """
+    O pseudônimo deve ser o HMAC do número normalizado, repetível entre instâncias.
+    """
+    hasher = Hasher("salt")
+    pseudonymizer = Pseudonymizer(hasher)
+
+    assert pseudonymizer.pseudonymize(NUMBER) == hasher.hash_value(NUMBER)
+    assert pseudonymizer.pseudonymize(f" +{NUMBER}") == hasher.hash_value(NUMBER)
+    assert Pseudonymizer(Hasher("salt")).pseudonymize(NUMBER) == pseudonymizer.pseudonymize(NUMBER)
+    assert pseudonymizer.pseudonymize(NUMBER) != legacy_hash(NUMBER, "salt")
+
+
+def test_cache_is_bounded_lru():
+    """
+    O cache deve manter no máximo `maxsize` números, descartando o menos recente.
+    """
+    pseudonymizer = Pseudonymizer(Hasher("salt"), maxsize=2)
+    hits = PSEUDONYM_CACHE_TOTAL.value(result="hit")
+
+    pseudonymizer.pseudonymize("1")
+    pseudonymizer.pseudonymize("2")
+    pseudonymizer.pseudonymize("1")
+    pseudonymizer.pseudonymize("3")
+
+    assert len(pseudonymizer) == 2
+    assert list(pseudonymizer._cache) == ["1", "3"]
+    assert PSEUDONYM_CACHE_TOTAL.value(result="hit") == hits + 1
+
+
+@pytest_asyncio.fixture
+async def persistence(mongo_client):
+    service = PersistenceService(client=mongo_client)
+    service.db = mongo_client["clinicai_pseudonyms"]
+    for name in ("messages", "triages", "conversations_archive"):
+        await service.db[name].delete_many({})
+    return service
+
+
+@pytest.mark.asyncio
+async def test_rehash_legacy_records(persistence):
+    """
+    A migração deve trocar o hash anterior pelo pseudônimo em todas as
+    collections, sem tocar registros de outros números.
+    """
+    pseudonymizer = Pseudonymizer(Hasher("salt"))
+    old, new = legacy_hash(NUMBER, "salt"), pseudonymizer.pseudonymize(NUMBER)
+    await persistence.db["messages"].insert_many([
+        {"conversation_id": old, "user_id": old, "user_message": "Oi"},
+        {"conversation_id": old, "user_id": old, "user_message": "Febre"},
+        {"conversation_id": "web-1", "user_id": "u", "user_message": "Oi"},
+    ])
+    await persistence.db["triages"].insert_one({"conversation_id": old, "user_id": old})
+
+    dry = await rehash_legacy_records(
+        [NUMBER, "5581000000000"], persistence, pseudonymizer, batch_size=1, dry_run=True,
+        legacy_salt="salt",
+    )
+    assert dry == {"messages": 2, "triages": 1, "conversations_archive": 0}
+    assert await persistence.db["messages"].count_documents({"conversation_id": old}) == 2
+
+    await rehash_legacy_records([f"+{NUMBER}\n"], persistence, pseudonymizer, legacy_salt="salt")
+
+    assert await persistence.db["messages"].count_documents({"conversation_id": new, "user_id": new}) == 2
+    assert await persistence.db["triages"].count_documents({"user_id": new}) == 1
+    assert await persistence.db["messages"].count_documents({"conversation_id": "web-1"}) == 1
@@ -0,0 +1,149 @@
+"""
+Testes unitários para o replay offline de conversas (app/services/replay.py).
+
+Objetivos:
+- Dividir as conversas gravadas em sessões e associar as triagens registradas.
+- Reproduzir a gravação com o LLM gravado (turnos, chamadas e campos).
+- Ler sessões de NDJSON e avaliar um prompt alternativo com o simulador.
+- Limitar o número de sessões reprocessadas em paralelo.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.services.llm import get_prompt_prefix
+from app.services.llm_backends import DEFAULT_DIALOG_SCRIPT, DEFAULT_EXTRACTION_REPLY, FakeChatModel
+from app.services.persistence import PersistenceService
+from app.services.replay import (
+    COMPLETED, EMERGENCY, INCOMPLETE, RecordedChatModel, ReplayEngine,
+    iter_mongo_sessions, load_ndjson_sessions, split_sessions, summarize,
+)
+from app.services.replies import CLOSING, EMERGENCY as EMERGENCY_REPLY, REPLIES
+
+PATIENT = ["Olá", "Dor de cabeça", "Enjoo", "Desde ontem", "7", "Nenhum", "Nada", "SIM"]
+
+
+def _turns(conversation_id, messages, replies, start=None):
+    start = start or datetime(2025, 1, 1)
+    return [
+        {
+            "conversation_id": conversation_id,
+            "channel": "web",
+            "user_message": user,
+            "agent_message": reply,
+            "timestamp": start + timedelta(seconds=i),
+        }
+        for i, (user, reply) in enumerate(zip(messages, replies))
+    ]
+
+
+def test_split_sessions_at_closing_and_emergency():
+    """
+    Sessões terminam na triagem registrada ou na emergência; a triagem vai
+    para a sessão concluída e duplicatas legadas são ignoradas.
+    """
+    closing = REPLIES.get(CLOSING).text
+    emergency = REPLIES.get(EMERGENCY_REPLY).text
+    docs = _turns(
+        "conv-1",
+        ["Olá", "Olá", "Dor", "Sim", "Dor no peito", "Oi de novo"],
+        ["Como posso ajudar?", "Olá", "Desde quando?", closing, emergency, "Como posso ajudar?"],
+    )
+
+    sessions = split_sessions(docs, [{"queixa_principal": "Dor"}])
+
+    assert [s.session_id for s in sessions] == ["conv-1:0", "conv-1:1", "conv-1:2"]
+    assert sessions[0].user_messages == ["Olá", "Dor", "Sim"]
+    assert sessions[0].completed and sessions[0].triage == {"queixa_principal": "Dor"}
+    assert not sessions[1].completed and sessions[1].triage is None
+    assert sessions[2].user_messages == ["Oi de novo"] and not sessions[2].completed
+
+
+@pytest.mark.asyncio
+async def test_recorded_replay_reproduces_mongo_conversations(db):
+    """
+    Com o LLM gravado, o replay repete a gravação até a triagem; a
+    confirmação do resumo encerra sem chamar o LLM e a triagem vem do
+    resumo, com a mesma completude da gravação (histórico e medidas
+    negativos ficam vazios).
+    """
+    persistence = PersistenceService()
+    persistence.messages = db["messages_replay"]
+    persistence.triages = db["triages_replay"]
+    for i in range(3):
+        await persistence.messages.insert_many(_turns(f"conv-{i}", PATIENT, DEFAULT_DIALOG_SCRIPT))
+        await persistence.triages.insert_one({
+            "conversation_id": f"conv-{i}", "created_at": datetime(2025, 1, 2), "data": DEFAULT_EXTRACTION_REPLY,
+        })
+
+    engine = ReplayEngine(RecordedChatModel(), concurrency=2)
+    results = await engine.run(iter_mongo_sessions(persistence))
+    report = summarize(results, engine.llm.prompt_prefix.version)
+
+    assert report.conversations == report.completed == 3
+    assert report.avg_turns_per_triage == report.recorded_avg_turns_per_triage == len(PATIENT)
+    assert report.llm_calls_per_conversation == len(PATIENT) - 1
+    assert report.recorded_field_completeness == pytest.approx(4 / 6, abs=1e-3)
+    assert report.field_completeness == pytest.approx(4 / 6, abs=1e-3)
+    assert report.prompt_version == get_prompt_prefix().version
+    assert not engine.recorder.triages
+
+
+@pytest.mark.asyncio
+async def test_ndjson_replay_with_alternative_prompt(tmp_path):
+    """
+    Sessões do NDJSON (com a triagem da exportação) são avaliadas com outro
+    prompt: a que acaba antes da triagem fica incompleta e a emergência
+    interrompe a sessão sem chamar o LLM.
+    """
+    closing = REPLIES.get(CLOSING).text
+    lines = [
+        *_turns("conv-a", PATIENT, [*DEFAULT_DIALOG_SCRIPT[:-1], closing]),
+        {"conversation_id": "conv-a", "created_at": "2025-01-02T00:00:00", **DEFAULT_EXTRACTION_REPLY},
+        *_turns("conv-b", ["Olá", "Dor de cabeça"], DEFAULT_DIALOG_SCRIPT),
+        *_turns("conv-c", ["Olá", "Estou com falta de ar"], DEFAULT_DIALOG_SCRIPT),
+    ]
+    path = tmp_path / "conversas.ndjson"
+    path.write_text("\n".join(json.dumps(line, default=str) for line in lines), encoding="utf-8")
+
+    sessions = load_ndjson_sessions(path)
+    assert sessions[0].completed and sessions[0].triage["intensidade"] == 7
+
+    engine = ReplayEngine(FakeChatModel(), system_prompt="Prompt novo", concurrency=3)
+    results = {r.session_id: r for r in await engine.run(sessions)}
+
+    assert results["conv-a:0"].outcome == COMPLETED and results["conv-a:0"].llm_calls == len(PATIENT) - 1
+    assert results["conv-b:0"].outcome == INCOMPLETE and results["conv-b:0"].llm_calls == 2
+    assert results["conv-c:0"].outcome == EMERGENCY and results["conv-c:0"].llm_calls == 1
+    assert engine.llm.prompt_prefix.version != get_prompt_prefix().version
+    assert engine.llm.prompt_prefix.text.startswith("Prompt novo")
+
+
+@pytest.mark.asyncio
+async def test_replay_bounds_concurrency():
+    """
+    No máximo `concurrency` sessões chamam o LLM ao mesmo tempo, e `limit`
+    encerra a leitura da fonte.
+    """
+    class SlowModel(RecordedChatModel):
+        active = peak = 0
+
+        async def ainvoke(self, messages, **kwargs) -> AIMessage:
+            SlowModel.active += 1
+            SlowModel.peak = max(SlowModel.peak, SlowModel.active)
+            await asyncio.sleep(0.001)
+            SlowModel.active -= 1
+            return await super().ainvoke(messages, **kwargs)
+
+    sessions = [
+        split_sessions(_turns(f"conv-{i}", PATIENT, DEFAULT_DIALOG_SCRIPT))[0] for i in range(20)
+    ]
+    engine = ReplayEngine(SlowModel(), concurrency=4)
+    results = await engine.run(iter(sessions), limit=10)
+
+    assert len(results) == 10
+    assert SlowModel.peak == 4
@@ -0,0 +1,105 @@
+"""
+Testes unitários para o registro de respostas fixas (replies.py).
+
+Objetivos:
+- Garantir que os corpos pré-renderizados equivalem aos modelos Pydantic.
+- Manter um único texto de emergência e reconhecer a redação anterior.
+- Enviar respostas fixas do webhook com o corpo pré-renderizado.
+"""
+
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from app.constants.emergencies import EMERGENCY_MESSAGE
+from app.main import app
+from app.routes.chat import get_chat_service
+from app.routes.webhook import get_whatsapp_service
+from app.schemas.chat import ChatResponse
+from app.schemas.whatsapp import WhatsAppSendMessage
+from app.services.llm import build_emergency_prompt
+from app.services.replies import (
+    CLOSING,
+    EMERGENCY,
+    REPLIES,
+    WAITING,
+    is_closing_reply,
+    is_emergency_reply,
+)
+from app.services.triage_guard import TriageGuard
+from app.services.whatsapp import WhatsAppService
+from app.settings import settings
+
+
+def test_prerendered_payloads_match_models():
+    """
+    Os bytes pré-renderizados devem decodificar no mesmo JSON que os modelos.
+    """
+    reply = REPLIES.get(EMERGENCY)
+    sent = json.loads(reply.whatsapp_payload("5581991113682"))
+    model = WhatsAppSendMessage(to="5581991113682", text={"body": reply.text})
+    assert sent == model.model_dump()
+
+    now = datetime(2025, 1, 2, 3, 4, 5, 678901)
+    for conversation_id in (None, "conv-1"):
+        body = json.loads(reply.web_payload(conversation_id, now))
+        expected = ChatResponse(conversation_id=conversation_id, response=reply.text, timestamp=now)
+        assert body == jsonable_encoder(expected)
+
+
+def test_single_emergency_text():
+    """
+    Guard, registro e prompt devem usar o mesmo texto de emergência; a
+    redação anterior continua reconhecida no histórico.
+    """
+    assert REPLIES.get(EMERGENCY).text == EMERGENCY_MESSAGE == TriageGuard().get_alert_message()
+    assert EMERGENCY_MESSAGE in build_emergency_prompt()
+    assert is_emergency_reply(EMERGENCY_MESSAGE)
+    assert is_emergency_reply("Por favor, procure o pronto-socorro mais próximo ou ligue para o 192 imediatamente.")
+    assert is_closing_reply(REPLIES.get(CLOSING).text)
+    assert REPLIES.get(EMERGENCY).closes_session and not REPLIES.get(WAITING).closes_session
+    assert REPLIES.match(EMERGENCY_MESSAGE) is REPLIES.get(EMERGENCY)
+    assert REPLIES.match("Qual a intensidade?") is None
+
+
+class _FixedChat:
+    async def process_message(self, payload, new_conversation=False):
+        return REPLIES.get(EMERGENCY).chat_response(None)
+
+
+def test_routes_send_prerendered_emergency(http_mock, monkeypatch):
+    """
+    O chat e o webhook devem devolver/enviar o corpo pré-renderizado.
+    """
+    monkeypatch.setattr(settings, "MONGO_ENSURE_INDEXES", False)
+    route = http_mock.post("https://graph.facebook.com/v22.0/123456789/messages").mock(
+        return_value=Response(200, json={"messages": [{"id": "wamid.fake"}]})
+    )
+    app.dependency_overrides[get_chat_service] = _FixedChat
+    app.dependency_overrides[get_whatsapp_service] = WhatsAppService
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "e", "changes": [{"field": "messages", "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"phone_number_id": "123456789"},
+            "messages": [{
+                "from": "5581991113682", "id": "wamid.1", "timestamp": "1690000000",
+                "type": "text", "text": {"body": "dor no peito"},
+            }],
+        }}]}],
+    }
+    try:
+        with TestClient(app) as client:
+            chat = client.post("/chat/", json={"message": "dor no peito", "channel": "web"})
+            webhook = client.post("/webhook/whatsapp", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert chat.status_code == 200
+    assert chat.json()["response"] == EMERGENCY_MESSAGE
+    assert chat.json()["conversation_id"] is None
+    assert webhook.json()["last_response"] == EMERGENCY_MESSAGE
+    assert route.calls.last.request.content == REPLIES.get(EMERGENCY).whatsapp_payload("5581991113682")
@@ -0,0 +1,122 @@
+"""
+Testes unitários para a retenção e compactação do histórico (retention.py).
+
+Objetivos:
+- Garantir um único registro por turno (sem duplicar o texto do usuário).
+- Compactar sessões encerradas em um documento de arquivo.
+- Aplicar a retenção por canal (`expires_at`) e remover registros vencidos.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from app.schemas.chat import ChatRequest, ChatResponse
+from app.services.persistence import PersistenceService, expires_at_for
+from app.services.retention import RetentionService
+from app.settings import settings
+
+
+@pytest_asyncio.fixture
+async def persistence(mongo_client):
+    service = PersistenceService(client=mongo_client)
+    service.db = mongo_client["clinicai_retention"]
+    service.messages = service.db["messages"]
+    await service.messages.delete_many({})
+    await service.db["conversations_archive"].delete_many({})
+    return service
+
+
+async def _turn(persistence, conv, text, reply, closes=False, channel="web"):
+    request = ChatRequest(conversation_id=conv, user_id="u", channel=channel, message=text)
+    message_id = await persistence.save_user_message(request)
+    await persistence.save_agent_reply(
+        message_id, ChatResponse(conversation_id=conv, response=reply), closes_session=closes
+    )
+    return message_id
+
+
+def test_expires_at_follows_channel_policy():
+    """
+    A expiração deve seguir os dias de retenção configurados por canal.
+    """
+    now = datetime(2025, 1, 1)
+    assert expires_at_for("whatsapp", now) == now + timedelta(days=settings.RETENTION_DAYS_WHATSAPP)
+    assert expires_at_for("web", now) == now + timedelta(days=settings.RETENTION_DAYS_WEB)
+
+
+@pytest.mark.asyncio
+async def test_turn_is_stored_once(persistence):
+    """
+    Cada turno deve gerar um único documento com a mensagem e a resposta.
+    """
+    await _turn(persistence, "conv-1", "Estou com febre", "Desde quando?")
+    docs = await persistence.messages.find({"conversation_id": "conv-1"}).to_list(length=None)
+
+    assert len(docs) == 1
+    assert docs[0]["user_message"] == "Estou com febre"
+    assert docs[0]["agent_message"] == "Desde quando?"
+    assert "closes_session" not in docs[0]
+    assert docs[0]["expires_at"] > docs[0]["timestamp"]
+
+
+@pytest.mark.asyncio
+async def test_compact_closed_sessions(persistence):
+    """
+    Sessões encerradas devem virar um documento de arquivo e sair de `messages`;
+    sessões em andamento permanecem intactas.
+    """
+    await persistence.messages.insert_one({
+        "conversation_id": "conv-a", "user_message": "Oi", "agent_message": "Oi",
+        "timestamp": datetime.utcnow(),
+    })
+    await _turn(persistence, "conv-a", "Oi", "Olá! Qual o motivo do contato?")
+    await _turn(persistence, "conv-a", "Sim", "Sua triagem foi registrada.", closes=True, channel="whatsapp")
+    await _turn(persistence, "conv-b", "Tosse", "Há quanto tempo?")
+
+    # BSON guarda datas em milissegundos: um corte "agora" pode coincidir com
+    # o encerramento, então a janela inclui o último segundo.
+    just_closed = timedelta(seconds=-1)
+    retention = RetentionService(persistence, batch_size=1, batch_pause=0)
+    assert await retention.compact_closed_sessions(older_than=just_closed, dry_run=True) == 1
+    assert await retention.compact_closed_sessions(older_than=just_closed) == 1
+    assert await retention.compact_closed_sessions(older_than=just_closed) == 0
+
+    archived = await retention.archive.find_one({"conversation_id": "conv-a"})
+    assert [t["agent"] for t in archived["turns"]] == [
+        "Olá! Qual o motivo do contato?", "Sua triagem foi registrada.",
+    ]
+    assert archived["channel"] == "whatsapp"
+    assert archived["expires_at"] == expires_at_for("whatsapp", archived["closed_at"])
+    remaining = await persistence.messages.find({}).to_list(length=None)
+    assert [d["conversation_id"] for d in remaining] == ["conv-b"]
+
+
+@pytest.mark.asyncio
+async def test_recent_sessions_are_not_compacted(persistence):
+    """
+    Sessões encerradas recentemente devem aguardar o prazo de compactação.
+    """
+    await _turn(persistence, "conv-c", "Sim", "Sua triagem foi registrada.", closes=True)
+    retention = RetentionService(persistence, batch_pause=0)
+    assert await retention.compact_closed_sessions(older_than=timedelta(hours=1)) == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_in_batches(persistence):
+    """
+    Registros vencidos devem ser removidos em lotes, preservando os demais.
+    """
+    past = datetime.utcnow() - timedelta(days=1)
+    await persistence.messages.insert_many([
+        {"conversation_id": f"old-{i}", "timestamp": past, "expires_at": past} for i in range(5)
+    ])
+    await _turn(persistence, "conv-new", "Oi", "Olá")
+
+    retention = RetentionService(persistence, batch_size=2, batch_pause=0)
+    result = await retention.run_once()
+
+    assert result == {"compacted_sessions": 0, "purged_documents": 5}
+    remaining = await persistence.messages.find({}).to_list(length=None)
+    assert [d["conversation_id"] for d in remaining] == ["conv-new"]
@@ -0,0 +1,93 @@
+"""
+Testes unitários para a autenticação das rotas da equipe (routes/auth.py).
+
+Objetivos:
+- Recusar com 401 as chamadas sem token, com token inválido ou sem
+  `STAFF_API_TOKEN` configurado, em todas as rotas de triagens e conversas.
+- Aceitar o token no cabeçalho `Authorization` e em `access_token`.
+- Recusar o WebSocket do feed sem token.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
+from mongomock_motor import AsyncMongoMockClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.routes.auth import STAFF_AUTH_REJECTED_TOTAL
+from app.routes.triages import get_persistence_service
+from app.services.persistence import PersistenceService
+from app.settings import settings
+
+STAFF_ROUTES = [
+    ("GET", "/triages"),
+    ("GET", "/triages/export"),
+    ("GET", "/triages/queue"),
+    ("POST", "/triages/queue/claim"),
+    ("GET", "/triages/stream"),
+    ("GET", "/conversations"),
+    ("GET", "/conversations/conv-1/messages"),
+]
+
+
+@pytest.fixture
+def persistence_override():
+    persistence = PersistenceService(client=AsyncMongoMockClient())
+    app.dependency_overrides[get_persistence_service] = lambda: persistence
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method, path", STAFF_ROUTES)
+async def test_staff_routes_require_token(method, path, staff_headers, persistence_override):
+    """
+    Sem token ou com token inválido, as rotas da equipe respondem 401.
+    """
+    missing_before = STAFF_AUTH_REJECTED_TOTAL.value(reason="missing")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anonymous = await client.request(method, path, json={"staff_id": "dra-ana"})
+        wrong = await client.request(
+            method, path, json={"staff_id": "dra-ana"}, headers={"Authorization": "Bearer outro"}
+        )
+
+    assert anonymous.status_code == wrong.status_code == 401
+    assert anonymous.headers["www-authenticate"] == "Bearer"
+    assert STAFF_AUTH_REJECTED_TOTAL.value(reason="missing") == missing_before + 1
+
+
+@pytest.mark.asyncio
+async def test_token_in_header_or_query(staff_headers, persistence_override):
+    """
+    O token é aceito no cabeçalho e, para SSE/WebSocket do navegador, em `access_token`.
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        by_header = await client.get("/triages", headers=staff_headers)
+        by_query = await client.get("/conversations", params={"access_token": "token-equipe"})
+
+    assert by_header.status_code == by_query.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_unconfigured_token_rejects_everything(monkeypatch, persistence_override):
+    """
+    Sem `STAFF_API_TOKEN`, nenhuma chamada é aceita.
+    """
+    monkeypatch.setattr(settings, "STAFF_API_TOKEN", None)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/triages", headers={"Authorization": "Bearer qualquer"})
+
+    assert response.status_code == 401
+
+
+def test_websocket_requires_token(monkeypatch, staff_headers):
+    """
+    O WebSocket do feed é recusado (1008) antes de aceitar a conexão.
+    """
+    monkeypatch.setattr(settings, "MONGO_ENSURE_INDEXES", False)
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/triages/ws"):
+                pass
+    assert exc.value.code == 1008
@@ -0,0 +1,168 @@
+"""
+Testes unitários para o rastreamento (utils/tracing.py).
+
+Objetivos:
+- Validar a leitura do cabeçalho W3C `traceparent`.
+- Garantir o encadeamento pai/filho dos spans pelo contexto assíncrono.
+- Confirmar que um webhook gera um único trace do recebimento ao envio,
+  propagando o `traceparent` para a Graph API.
+- Gravar os spans do exportador `file` fora do loop, sem perdê-los no encerramento.
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from mongomock_motor import AsyncMongoMockClient
+
+from app.agents.graph import TriageAgent
+from app.main import app
+from app.routes.chat import get_chat_service
+from app.routes.webhook import get_whatsapp_service
+from app.services.chat_service import ChatService
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+from app.services.whatsapp import WhatsAppService
+from app.utils import tracing
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """
+    Ativa o rastreamento com exportador em memória.
+    """
+    memory = tracing.InMemorySpanExporter()
+    monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "build_exporter", lambda: memory)
+    tracing.get_tracer.cache_clear()
+    yield memory
+    tracing.get_tracer.cache_clear()
+
+
+def test_parse_traceparent():
+    """
+    Deve aceitar cabeçalhos válidos e rejeitar malformados.
+    """
+    header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert tracing.parse_traceparent(header) == (
+        "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    )
+    assert tracing.parse_traceparent("00-xyz-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+
+
+def test_nested_spans_share_trace(exporter):
+    """
+    Spans abertos dentro de outro devem herdar trace_id e apontar o pai.
+    """
+    with tracing.start_trace("raiz") as root:
+        with tracing.start_span("filho") as child:
+            assert tracing.current_traceparent() == f"00-{root.trace_id}-{child.span_id}-01"
+    assert tracing.current_span() is None
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert spans["filho"].parent_id == spans["raiz"].span_id
+    assert spans["filho"].trace_id == spans["raiz"].trace_id
+
+
+def test_disabled_tracing_is_noop(monkeypatch):
+    """
+    Sem rastreamento ativo nada deve ser criado.
+    """
+    monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", False)
+    with tracing.start_trace("raiz") as span:
+        assert span is None
+    assert tracing.current_traceparent() is None
+
+
+def test_webhook_produces_single_trace(exporter, http_mock, db):
+    """
+    Uma mensagem no webhook deve gerar um trace com guard, histórico,
+    nós do grafo, LLM, Mongo e envio ao WhatsApp.
+    """
+    persistence = PersistenceService(client=AsyncMongoMockClient())
+    persistence.messages = db["messages_trace"]
+    persistence.triages = db["triages_trace"]
+    llm_service = LLMService(client=FakeChatModel())
+    service = ChatService(
+        llm_client=llm_service,
+        persistence=persistence,
+        triage_agent=TriageAgent(llm=llm_service, persistence=persistence),
+    )
+    app.dependency_overrides[get_chat_service] = lambda: service
+    app.dependency_overrides[get_whatsapp_service] = WhatsAppService
+    route = http_mock.post("https://graph.facebook.com/v22.0/123456789/messages").mock(
+        return_value=Response(200, json={"messages": [{"id": "wamid.fake"}]})
+    )
+
+    incoming = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "e", "changes": [{"field": "messages", "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"phone_number_id": "123456789"},
+            "messages": [{
+                "from": "5581991113682", "id": "wamid.1", "timestamp": "1690000000",
+                "type": "text", "text": {"body": "Olá"},
+            }],
+        }}]}],
+    }
+    try:
+        response = TestClient(app).post(
+            "/webhook/whatsapp", json=payload, headers={"traceparent": incoming}
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    spans = exporter.get_finished_spans("4bf92f3577b34da6a3ce929d0e0e4736")
+    names = {s.name for s in spans}
+    assert {
+        "POST /webhook/whatsapp", "chat.turn", "guard.check", "chat.history",
+        "graph.llm_dialog", "llm.call", "mongo.messages.insert_one", "whatsapp.send",
+    } <= names
+
+    by_name = {s.name: s for s in spans}
+    assert by_name["llm.call"].parent_id == by_name["graph.llm_dialog"].span_id
+    sent = route.calls.last.request.headers["traceparent"]
+    assert sent.split("-")[1] == "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.mark.asyncio
+async def test_file_exporter_writes_off_the_loop(tmp_path, monkeypatch):
+    """
+    O fim do span só enfileira: a escrita acontece na thread do exportador,
+    e o encerramento grava os spans pendentes.
+    """
+    path = tmp_path / "traces.ndjson"
+    monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing.settings, "TRACING_EXPORTER", "file")
+    monkeypatch.setattr(tracing.settings, "TRACING_FILE", str(path))
+    tracing.get_tracer.cache_clear()
+    exporter = tracing.get_tracer().exporter
+    writers = []
+    write = exporter._file.write
+
+    def record_thread(text):
+        writers.append(threading.current_thread().name)
+        return write(text)
+
+    monkeypatch.setattr(exporter._file, "write", record_thread)
+
+    async def turn(i):
+        with tracing.start_trace("turno", conversation=str(i)):
+            with tracing.start_span("llm"):
+                await asyncio.sleep(0)
+
+    await asyncio.gather(*(turn(i) for i in range(20)))
+    tracing.shutdown_tracer()
+
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(spans) == 40
+    assert {s["name"] for s in spans} == {"turno", "llm"}
+    assert set(writers) == {"span-writer"}
+    assert exporter._file.closed
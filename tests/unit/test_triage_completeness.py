@@ -0,0 +1,173 @@
+"""
+Testes unitários para o encerramento antecipado da triagem
+(app/services/triage_completeness.py e rotas do grafo).
+
+Objetivos:
+- Ler o resumo do agente (inline ou em linhas) e os textos de campo não informado.
+- Reconhecer a confirmação do paciente sem aceitar negações ou correções.
+- Registrar a triagem do resumo confirmado sem chamar o LLM.
+- Dispensar a extração quando o LLM encerra após um resumo completo.
+- Encerrar pela extração quando o orçamento de turnos se esgota, mesmo com
+  um resumo completo, sem perder a última mensagem do paciente.
+"""
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agents.graph import TriageAgent
+from app.services import triage_completeness
+from app.services.llm import LLMService
+from app.services.llm_backends import DEFAULT_DIALOG_SCRIPT, DEFAULT_EXTRACTION_REPLY, FakeChatModel
+from app.services.persistence import AGENT, USER, PersistenceService, Turn
+from app.services.replies import is_closing_reply
+from app.services.triage_completeness import (
+    is_complete, is_confirmation, latest_recap, missing_fields, parse_recap, turn_budget_reached,
+)
+
+PATIENT = ["Olá", "Dor de cabeça", "Enjoo", "Desde ontem", "7", "Nenhum", "Nada", "SIM"]
+
+MULTILINE_RECAP = (
+    "Entendi.\n"
+    "Queixa principal: dor de cabeça.\n"
+    "Sintomas: enjoo.\n"
+    "Início/duração: desde ontem.\n"
+    "Intensidade: 0/10 (não informado).\n"
+    "Histórico: nenhum histórico informado.\n"
+    "Medidas já tomadas: nenhuma.\n"
+    "Responda apenas com SIM para confirmar ou NÃO para corrigir."
+)
+
+
+def test_parse_recap_inline_and_multiline():
+    """
+    O resumo vira a triagem coagida; textos de campo não informado e
+    negativas curtas ("nenhum", "nada") ficam vazios.
+    """
+    assert parse_recap(DEFAULT_DIALOG_SCRIPT[6]) == {
+        "queixa_principal": "dor de cabeça",
+        "sintomas": "enjoo",
+        "duracao_frequencia": "desde ontem",
+        "intensidade": 7,
+        "historico": "",
+        "medidas_tomadas": "",
+    }
+    recap = parse_recap(MULTILINE_RECAP)
+    assert recap["intensidade"] == 0 and recap["historico"] == ""
+    assert missing_fields(recap) == ["intensidade"] and not is_complete(recap)
+    assert parse_recap("Qual a sua queixa principal: dor ou febre?") is None
+    assert latest_recap([Turn(AGENT, DEFAULT_DIALOG_SCRIPT[6]), Turn(USER, "NÃO"), Turn(AGENT, "O que mudar?")])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("SIM", True),
+    ("Sim, está correto.", True),
+    ("ok", True),
+    ("Não", False),
+    ("sim, mas não é desde ontem", False),
+    ("sim e também tenho febre desde anteontem", False),
+    ("ok, mas dor 9", False),
+    ("sim, tenho febre também", False),
+    ("sim nao", False),
+    ("Tá tudo certo, pode registrar", True),
+    ("Desde ontem", False),
+])
+def test_is_confirmation(text, expected):
+    """
+    Só contam mensagens formadas apenas por confirmações e complementos,
+    sem negação nem informação nova.
+    """
+    assert is_confirmation(text) is expected
+
+
+def test_turn_budget_counts_patient_turns(monkeypatch):
+    """
+    O orçamento conta as mensagens do paciente; 0 desativa o limite.
+    """
+    turns = [Turn(USER, "a"), Turn(AGENT, "b"), Turn(USER, "c"), Turn(AGENT, "d")]
+    assert turn_budget_reached(turns, max_turns=2)
+    assert not turn_budget_reached(turns, max_turns=3)
+    monkeypatch.setattr(triage_completeness.settings, "TRIAGE_MAX_TURNS", 0)
+    assert not turn_budget_reached(turns * 50)
+
+
+async def _converse(db, fake, messages, name):
+    persistence = PersistenceService()
+    persistence.messages = db[f"messages_{name}"]
+    persistence.triages = db[f"triages_{name}"]
+    agent = TriageAgent(llm=LLMService(client=fake), persistence=persistence, checkpointer=MemorySaver())
+    state = {}
+    for message in messages:
+        state = await agent.run({"conversation_id": name, "channel": "web", "user_message": message})
+    return state, await persistence.get_triage(name)
+
+
+@pytest.mark.asyncio
+async def test_confirmed_recap_finalizes_without_llm(db):
+    """
+    A confirmação do resumo completo registra a triagem do resumo sem a
+    resposta de encerramento nem a extração pelo LLM.
+    """
+    fake = FakeChatModel()
+    state, triage = await _converse(db, fake, PATIENT, "confirmed")
+
+    assert is_closing_reply(state["agent_message"])
+    assert fake.calls == len(PATIENT) - 1
+    assert triage["data"]["historico"] == "" and triage["data"]["intensidade"] == 7
+    assert triage["usage"]["calls"] == len(PATIENT) - 1
+
+
+@pytest.mark.asyncio
+async def test_llm_closing_after_recap_skips_extraction(db):
+    """
+    Se o LLM encerra após um resumo completo (resposta não reconhecida como
+    confirmação), a triagem vem do resumo, sem a chamada de extração.
+    """
+    fake = FakeChatModel()
+    messages = [*PATIENT[:-1], "pode registrar assim mesmo, obrigado"]
+    state, triage = await _converse(db, fake, messages, "closing_recap")
+
+    assert is_closing_reply(state["agent_message"])
+    assert fake.calls == len(messages)
+    assert triage["data"]["medidas_tomadas"] == ""
+
+
+@pytest.mark.asyncio
+async def test_incomplete_recap_and_turn_budget(db, monkeypatch):
+    """
+    Um resumo sem campo exigido não encerra na confirmação; esgotado o
+    orçamento, a próxima mensagem vai direto para a extração.
+    """
+    monkeypatch.setattr(triage_completeness.settings, "TRIAGE_MAX_TURNS", 3)
+    fake = FakeChatModel(script=["Qual o motivo do contato?", MULTILINE_RECAP, "Pode detalhar?"])
+    state, triage = await _converse(db, fake, ["Olá", "Dor de cabeça", "SIM"], "budget")
+    assert fake.calls == 3 and not is_closing_reply(state["agent_message"]) and triage is None
+
+    state, triage = await _converse(db, fake, ["Olá", "Dor de cabeça", "SIM", "Nota 7"], "budget_end")
+    assert is_closing_reply(state["agent_message"])
+    assert fake.calls == 3 + 3 + 1
+    assert triage["data"]["intensidade"] == DEFAULT_EXTRACTION_REPLY["intensidade"]
+
+
+@pytest.mark.asyncio
+async def test_turn_budget_after_complete_recap_uses_extraction(db, monkeypatch):
+    """
+    Esgotado o orçamento logo após um resumo completo, a última mensagem
+    (ex.: uma correção) vai à extração em vez de ser ignorada pelo resumo.
+    """
+    monkeypatch.setattr(triage_completeness.settings, "TRIAGE_MAX_TURNS", len(PATIENT) - 1)
+    fake = FakeChatModel(extraction_reply={**DEFAULT_EXTRACTION_REPLY, "intensidade": 9})
+    prompts = []
+    ainvoke = fake.ainvoke
+
+    async def recording_ainvoke(messages, **kwargs):
+        prompts.append(str(messages[-1].content))
+        return await ainvoke(messages, **kwargs)
+
+    fake.ainvoke = recording_ainvoke
+    messages = [*PATIENT[:-1], "na verdade a dor é 9"]
+    state, triage = await _converse(db, fake, messages, "budget_recap")
+
+    assert is_closing_reply(state["agent_message"])
+    assert fake.calls == len(messages)
+    assert "Última mensagem:\nna verdade a dor é 9" in prompts[-1]
+    assert triage["data"]["intensidade"] == 9
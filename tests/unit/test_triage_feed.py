@@ -0,0 +1,149 @@
+"""
+Testes unitários para o feed em tempo real de triagens (triage_feed.py).
+
+Objetivos:
+- Publicar apenas triagens novas, via polling quando não há change stream.
+- Não perder triagens gravadas fora da ordem de `created_at` nem repeti-las.
+- Distribuir cada evento a todos os clientes com um único observador.
+- Desconectar consumidores lentos sem afetar os demais.
+- Formatar eventos SSE e entregar eventos pelo WebSocket.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes.triages import get_triage_feed
+from app.services.persistence import PersistenceService
+from app.services.triage_feed import TriageFeed, sse_events
+from app.settings import settings
+
+
+@pytest_asyncio.fixture
+async def persistence(db):
+    service = PersistenceService()
+    service.triages = db["triages_feed"]
+    await service.triages.delete_many({})
+    return service
+
+
+def _doc(name: str) -> dict:
+    return {
+        "_id": ObjectId(),
+        "conversation_id": name,
+        "created_at": datetime.utcnow(),
+        "data": {"queixa_principal": "Febre", "intensidade": 5},
+        "urgency_score": 50,
+    }
+
+
+@pytest.mark.asyncio
+async def test_feed_polls_new_triages_and_fans_out(persistence):
+    """
+    Sem change stream, o feed deve usar polling, ignorar triagens antigas e
+    entregar as novas a todos os clientes.
+    """
+    await persistence.save_triage("antiga", {"queixa_principal": "Tosse", "intensidade": 2})
+    feed = TriageFeed(persistence, poll_interval=0.01)
+
+    first = await feed.subscribe()
+    second = await feed.subscribe()
+    assert feed.source == "poll"
+
+    await persistence.save_triage("nova", {"queixa_principal": "Dor no peito", "intensidade": 9})
+    events = [json.loads(await sub.get(timeout=1)) for sub in (first, second)]
+
+    assert [e["conversation_id"] for e in events] == ["nova", "nova"]
+    assert events[0]["urgency_score"] == 120
+    assert first.queue.empty()
+
+    await feed.unsubscribe(first)
+    assert feed._task is not None
+    await feed.unsubscribe(second)
+    assert feed._task is None
+
+
+@pytest.mark.asyncio
+async def test_poll_delivers_out_of_order_triages_once(persistence):
+    """
+    Uma triagem com `created_at` anterior à última publicada, gravada
+    depois dela, ainda é entregue (dentro da janela), sem repetir as demais.
+    """
+    feed = TriageFeed(persistence, poll_interval=0.01, lookback=5)
+    subscription = await feed.subscribe()
+
+    later = _doc("depois")
+    earlier = {**_doc("antes"), "created_at": later["created_at"] - timedelta(seconds=2)}
+    await persistence.triages.insert_one(later)
+    assert json.loads(await subscription.get(timeout=1))["conversation_id"] == "depois"
+    await persistence.triages.insert_one(earlier)
+    assert json.loads(await subscription.get(timeout=1))["conversation_id"] == "antes"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await subscription.get(timeout=0.1)
+    await feed.unsubscribe(subscription)
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_dropped(persistence):
+    """
+    Um cliente com a fila cheia deve ser desconectado sem bloquear os demais.
+    """
+    feed = TriageFeed(persistence, queue_size=2, poll_interval=60)
+    slow = await feed.subscribe()
+    fast = await feed.subscribe()
+
+    received = []
+    for i in range(3):
+        feed.publish(_doc(f"conv-{i}"))
+        received.append(json.loads(await fast.get(timeout=1))["conversation_id"])
+
+    assert received == ["conv-0", "conv-1", "conv-2"]
+    assert slow.dropped
+    assert slow not in feed.subscribers
+    assert await slow.get(timeout=1) is None
+    assert fast in feed.subscribers
+    await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_sse_events_format_and_keepalive(persistence):
+    """
+    O SSE deve emitir keep-alive sem eventos e `event: triage` a cada triagem.
+    """
+    feed = TriageFeed(persistence, poll_interval=60)
+    stream = sse_events(await feed.subscribe(), heartbeat=0.01)
+
+    assert await stream.__anext__() == ": keep-alive\n\n"
+    feed.publish(_doc("conv-sse"))
+    chunk = await stream.__anext__()
+    assert chunk.startswith("event: triage\ndata: ")
+    assert json.loads(chunk.split("data: ", 1)[1])["conversation_id"] == "conv-sse"
+
+    await stream.aclose()
+    assert not feed.subscribers
+    assert feed._task is None
+
+
+def test_websocket_delivers_events(persistence, monkeypatch, staff_headers):
+    """
+    O WebSocket deve repassar cada triagem publicada como JSON.
+    """
+    monkeypatch.setattr(settings, "MONGO_ENSURE_INDEXES", False)
+    feed = TriageFeed(persistence, poll_interval=60)
+    app.dependency_overrides[get_triage_feed] = lambda: feed
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/triages/ws", headers=staff_headers) as ws:
+                while not feed.subscribers:
+                    client.portal.call(asyncio.sleep, 0.01)
+                client.portal.call(feed.publish, _doc("conv-ws"))
+                assert ws.receive_json()["conversation_id"] == "conv-ws"
+    finally:
+        app.dependency_overrides.clear()
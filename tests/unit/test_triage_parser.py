@@ -0,0 +1,224 @@
+"""
+Testes unitários para a extração robusta da triagem (triage_parser.py).
+
+Objetivos:
+- Localizar o objeto JSON em meio a markdown e prosa, respeitando strings.
+- Reparar defeitos comuns (aspas simples, vírgulas finais, literais Python, truncamento).
+- Preservar valores sem aspas com várias palavras, no reparo e no salvamento.
+- Coagir valores ao schema da triagem e informar os campos recuperados.
+- Ignorar intensidades não finitas (NaN, infinito) sem derrubar o turno.
+- Garantir que o nó de extração do grafo use o parser.
+"""
+
+import pytest
+
+from app.agents.graph import TriageAgent
+from app.services.llm import LLMService
+from app.services.llm_backends import DEFAULT_DIALOG_SCRIPT, FakeChatModel
+from app.services.persistence import PersistenceService
+from app.services.triage_parser import (
+    coerce_intensity,
+    find_json_object,
+    parse_triage,
+    repair_json,
+)
+
+
+def test_find_json_object_ignores_braces_inside_strings():
+    """
+    Chaves dentro de strings não devem alterar o balanceamento.
+    """
+    text = 'Segue:\n```json\n{"sintomas": "dor {forte}", "x": {"y": 1}}\n```'
+    start, end, complete = find_json_object(text)
+    assert complete
+    assert text[start:end] == '{"sintomas": "dor {forte}", "x": {"y": 1}}'
+
+
+def test_find_json_object_reports_truncation():
+    """
+    Um objeto sem fechamento deve ser devolvido como incompleto.
+    """
+    assert find_json_object("sem json") is None
+    start, end, complete = find_json_object('{"a": "b"')
+    assert (start, end, complete) == (0, 9, False)
+
+
+def test_clean_json_is_parsed_without_repairs():
+    """
+    JSON válido deve passar pelo caminho rápido, sem reparos.
+    """
+    result = parse_triage(
+        '{"queixa_principal": "Dor de cabeça", "sintomas": "Enjoo", "duracao_frequencia": "",'
+        ' "intensidade": 7, "historico": "", "medidas_tomadas": ""}'
+    )
+    assert result.outcome == "clean"
+    assert result.repairs == []
+    assert result.recovered == ["queixa_principal", "sintomas", "intensidade"]
+    assert result.triage["intensidade"] == 7
+
+
+def test_repair_json_fixes_common_llm_mistakes():
+    """
+    Aspas simples, vírgulas finais, chaves sem aspas e literais Python devem ser corrigidos.
+    """
+    repaired, repairs = repair_json("{'sintomas': 'dor \"forte\"', historico: None, 'ok': True,}")
+    assert repaired == '{"sintomas": "dor \\"forte\\"", "historico": null, "ok": true}'
+    assert {"single_quotes", "unquoted_keys", "python_literals", "trailing_comma"} <= set(repairs)
+
+
+def test_unquoted_multi_word_values_are_kept():
+    """
+    Valores sem aspas com várias palavras viram uma única string, até a
+    próxima vírgula ou chave de fechamento.
+    """
+    result = parse_triage(
+        '{queixa_principal: dor de cabeça, sintomas: enjoo e "tontura", '
+        'duracao_frequencia: 3 dias, intensidade: 7, historico: None}'
+    )
+    assert result.triage == {
+        "queixa_principal": "dor de cabeça",
+        "sintomas": 'enjoo e "tontura"',
+        "duracao_frequencia": "3 dias",
+        "historico": "",
+        "intensidade": 7,
+    }
+    assert "bare_words" in result.repairs
+
+    truncated = parse_triage("{queixa_principal: dor de cab")
+    assert truncated.triage["queixa_principal"] == "dor de cab"
+
+
+def test_truncated_object_is_closed():
+    """
+    Respostas cortadas devem ter strings e objetos fechados.
+    """
+    result = parse_triage('```json\n{"queixa_principal": "Febre", "sintomas": "calafrios')
+    assert result.triage["queixa_principal"] == "Febre"
+    assert result.triage["sintomas"] == "calafrios"
+    assert "truncated" in result.repairs
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        (7, 7), (7.6, 8), ("7/10", 7), ("nota 8", 8), ("6,5", 6), (15, 10), (-2, 0),
+        ("alta", None), (None, None), (float("nan"), None), (float("inf"), None),
+    ],
+)
+def test_coerce_intensity(raw, expected):
+    """
+    A intensidade deve ser convertida e limitada à escala 0–10.
+    """
+    assert coerce_intensity(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [
+    '{"queixa_principal": "Dor", "intensidade": NaN}',
+    '{"queixa_principal": "Dor", "intensidade": 1e309}',
+])
+def test_non_finite_intensity_is_ignored(raw):
+    """
+    NaN e números que estouram o float não derrubam a extração: a
+    intensidade fica no padrão e os demais campos são aproveitados.
+    """
+    result = parse_triage(raw)
+    assert result.triage == {"queixa_principal": "Dor", "intensidade": 0}
+    assert result.recovered == ["queixa_principal"]
+
+
+def test_aliases_and_type_coercion():
+    """
+    Chaves em inglês, listas e nulos devem ser adaptados ao schema.
+    """
+    result = parse_triage(
+        '{"main_complaint": "Tosse", "symptoms": ["febre", "coriza"], '
+        '"intensity": "6/10", "history": null}'
+    )
+    assert result.triage == {
+        "queixa_principal": "Tosse",
+        "sintomas": "febre, coriza",
+        "historico": "",
+        "intensidade": 6,
+    }
+    assert result.recovered == ["queixa_principal", "sintomas", "intensidade"]
+    assert "coerced:intensidade" in result.repairs
+
+
+def test_unrecoverable_object_salvages_fields():
+    """
+    Mesmo sem JSON reparável, os pares chave/valor legíveis devem ser recuperados.
+    """
+    result = parse_triage('{"queixa_principal": "Dor nas costas" "intensidade": 5 ]]')
+    assert result.triage["queixa_principal"] == "Dor nas costas"
+    assert result.triage["intensidade"] == 5
+    assert "salvaged_fields" in result.repairs
+
+    result = parse_triage("{queixa_principal: dor de cabeça, intensidade: 7/10 ]]")
+    assert result.triage["queixa_principal"] == "dor de cabeça"
+    assert result.triage["intensidade"] == 7
+    assert "salvaged_fields" in result.repairs
+
+
+def test_empty_reply_yields_empty_triage():
+    """
+    Respostas sem informação devem resultar em triagem vazia.
+    """
+    assert parse_triage("").outcome == "empty"
+    assert parse_triage("Não consegui extrair.").triage == {}
+
+
+@pytest.mark.asyncio
+async def test_graph_extracts_imperfect_json(mongo_client):
+    """
+    O nó de extração deve aproveitar um JSON imperfeito sem nova chamada ao LLM.
+    """
+    fake = FakeChatModel(script=DEFAULT_DIALOG_SCRIPT[-1:])
+    fake.extraction_reply = "```json\n{'queixa_principal': 'Dor', 'intensidade': '8/10',}\n```"
+    persistence = PersistenceService(client=mongo_client)
+    agent = TriageAgent(llm=LLMService(client=fake), persistence=persistence)
+
+    state = await agent.graph.ainvoke(
+        {
+            "conversation_id": "conv-parser",
+            "user_message": "Sim",
+            "conversation_context": [],
+            "agent_message": "",
+            "internal_reply": "",
+            "triage": {},
+        },
+        config=agent.thread_config("conv-parser"),
+    )
+
+    assert state["agent_message"].startswith("Obrigado")
+    assert fake.calls == 2
+    saved = await persistence.triages.find_one({"conversation_id": "conv-parser"})
+    assert saved["data"] == {"queixa_principal": "Dor", "intensidade": 8}
+
+
+@pytest.mark.asyncio
+async def test_extraction_failure_does_not_break_the_turn(mongo_client, monkeypatch):
+    """
+    Uma falha inesperada do parser resulta em triagem vazia, sem derrubar o turno.
+    """
+    def broken(raw):
+        raise ValueError("resposta inválida")
+
+    monkeypatch.setattr("app.agents.graph.parse_triage", broken)
+    fake = FakeChatModel(script=DEFAULT_DIALOG_SCRIPT[-1:])
+    persistence = PersistenceService(client=mongo_client)
+    agent = TriageAgent(llm=LLMService(client=fake), persistence=persistence)
+
+    state = await agent.graph.ainvoke(
+        {
+            "conversation_id": "conv-parser-error",
+            "user_message": "Sim",
+            "conversation_context": [],
+            "agent_message": "",
+            "internal_reply": "",
+            "triage": {},
+        },
+        config=agent.thread_config("conv-parser-error"),
+    )
+
+    assert state["triage"] == {}
+    assert await persistence.triages.find_one({"conversation_id": "conv-parser-error"}) is None
@@ -0,0 +1,121 @@
+"""
+Testes unitários para a fila de triagens por urgência (urgency.py e triage_queue.py).
+
+Objetivos:
+- Pontuar triagens por intensidade e palavras-chave de emergência.
+- Envelhecer a prioridade com o tempo de espera sem reordenar a fila.
+- Assumir, concluir e devolver triagens de forma atômica.
+- Garantir que save_triage posicione a triagem na fila.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.routes.triages import get_persistence_service
+from app.services.persistence import PersistenceService
+from app.services.triage_queue import TriageQueue
+from app.services.urgency import priority_key, urgency_score
+
+
+@pytest_asyncio.fixture
+async def persistence(db):
+    service = PersistenceService()
+    service.triages = db["triages_queue"]
+    await service.triages.delete_many({})
+    return service
+
+
+def test_urgency_score_combines_intensity_and_keywords():
+    """
+    Intensidade e sinais de emergência devem compor a pontuação.
+    """
+    mild = urgency_score({"queixa_principal": "Dor de cabeça", "intensidade": 4})
+    severe = urgency_score({"queixa_principal": "Dor no peito", "sintomas": "falta de ar", "intensidade": 6})
+
+    assert mild == {"score": 40, "keywords": []}
+    assert severe["keywords"] == ["dor no peito", "falta de ar"]
+    assert severe["score"] == 60 + 2 * 30
+
+
+def test_priority_key_ages_with_waiting_time():
+    """
+    Uma triagem menos grave que espera o bastante deve passar à frente.
+    """
+    now = datetime(2025, 1, 1, 12, 0)
+    waiting = priority_key(70, now - timedelta(minutes=40), aging_per_minute=1.0)
+    arriving = priority_key(100, now, aging_per_minute=1.0)
+    assert waiting > arriving
+
+
+@pytest.mark.asyncio
+async def test_save_triage_enqueues_and_claim_order(persistence):
+    """
+    Triagens salvas devem entrar na fila e ser assumidas da mais urgente à menos.
+    """
+    await persistence.save_triage("leve", {"queixa_principal": "Coriza", "intensidade": 2})
+    await persistence.save_triage("grave", {"queixa_principal": "Dor no peito", "intensidade": 9})
+    await persistence.save_triage("media", {"queixa_principal": "Febre", "intensidade": 6})
+
+    queue = TriageQueue(persistence)
+    pending = await queue.pending()
+    assert [d["conversation_id"] for d in pending] == ["grave", "media", "leve"]
+    assert pending[0]["urgency_keywords"] == ["dor no peito"]
+
+    first = await queue.claim("dra-ana")
+    second = await queue.claim("dr-bruno")
+    assert (first["conversation_id"], first["claimed_by"]) == ("grave", "dra-ana")
+    assert second["conversation_id"] == "media"
+    assert [d["conversation_id"] for d in await queue.pending()] == ["leve"]
+
+
+@pytest.mark.asyncio
+async def test_complete_and_release(persistence):
+    """
+    Apenas quem assumiu pode concluir; triagens devolvidas voltam à fila.
+    """
+    await persistence.save_triage("conv-1", {"queixa_principal": "Tosse", "intensidade": 3})
+    queue = TriageQueue(persistence)
+    claimed = await queue.claim("dra-ana")
+    triage_id = str(claimed["_id"])
+
+    assert not await queue.complete(triage_id, "outro")
+    assert await queue.release(triage_id, "dra-ana")
+    assert (await queue.claim("dr-bruno"))["conversation_id"] == "conv-1"
+    assert await queue.complete(triage_id, "dr-bruno")
+    assert not await queue.complete(triage_id, "dr-bruno")
+    assert await queue.claim("dra-ana") is None
+    assert not await queue.complete("invalido")
+
+
+@pytest.mark.asyncio
+async def test_queue_endpoints(persistence, staff_headers):
+    """
+    As rotas devem expor a fila, o claim (204 se vazia) e a conclusão.
+    """
+    await persistence.save_triage("conv-q", {"queixa_principal": "Desmaio", "intensidade": 8})
+    app.dependency_overrides[get_persistence_service] = lambda: persistence
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test", headers=staff_headers) as client:
+            listed = await client.get("/triages/queue")
+            claimed = await client.post("/triages/queue/claim", json={"staff_id": "dra-ana"})
+            empty = await client.post("/triages/queue/claim", json={"staff_id": "dra-ana"})
+            done = await client.post(
+                f"/triages/queue/{claimed.json()['_id']}/complete", json={"staff_id": "dra-ana"}
+            )
+            again = await client.post(
+                f"/triages/queue/{claimed.json()['_id']}/complete", json={"staff_id": "dra-ana"}
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert listed.json()["items"][0]["urgency_score"] == 110
+    assert "effective_priority" in listed.json()["items"][0]
+    assert claimed.json()["conversation_id"] == "conv-q"
+    assert empty.status_code == 204
+    assert done.json() == {"status": "done"}
+    assert again.status_code == 404
@@ -0,0 +1,159 @@
+"""
+Testes unitários para a contabilização de tokens (usage.py).
+
+Objetivos:
+- Ler o uso de tokens dos metadados do LangChain e do Gemini.
+- Agregar tokens por conversa, nó e versão do prompt.
+- Cobrar os tokens lidos do cache de contexto pelo preço reduzido.
+- Garantir que o LLMService registre o uso e que a triagem o persista.
+- Descartar o uso da sessão encerrada por emergência.
+"""
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agents.graph import TriageAgent
+from app.schemas.chat import ChatRequest
+from app.services import usage as usage_module
+from app.services.chat_service import ChatService
+from app.services.llm import LLMService
+from app.services.llm_backends import FakeChatModel
+from app.services.persistence import PersistenceService
+from app.services.usage import (
+    LLM_TOKENS_TOTAL,
+    UsageTracker,
+    estimate_cost,
+    extract_cached_tokens,
+    extract_token_usage,
+)
+
+
+def test_extract_token_usage_sources():
+    """
+    Deve ler `usage_metadata` e, na falta dele, os metadados do Gemini.
+    """
+    langchain = AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 10, "output_tokens": 3, "total_tokens": 13},
+    )
+    gemini = AIMessage(
+        content="ok",
+        response_metadata={"usage_metadata": {"prompt_token_count": 7, "candidates_token_count": 2}},
+    )
+    assert extract_token_usage(langchain) == (10, 3)
+    assert extract_token_usage(gemini) == (7, 2)
+    assert extract_token_usage(AIMessage(content="ok")) == (0, 0)
+
+
+def test_cached_tokens_are_read_and_billed(monkeypatch):
+    """
+    Tokens lidos do cache devem vir dos metadados e custar o preço de cache.
+    """
+    langchain = AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": 100, "output_tokens": 10, "total_tokens": 110,
+            "input_token_details": {"cache_read": 80},
+        },
+    )
+    gemini = AIMessage(
+        content="ok",
+        response_metadata={"usage_metadata": {"prompt_token_count": 7, "cached_content_token_count": 5}},
+    )
+    assert extract_cached_tokens(langchain) == 80
+    assert extract_cached_tokens(gemini) == 5
+    assert extract_cached_tokens(AIMessage(content="ok")) == 0
+
+    monkeypatch.setattr(usage_module.settings, "LLM_INPUT_COST_PER_1K_TOKENS", 1.0)
+    monkeypatch.setattr(usage_module.settings, "LLM_CACHED_INPUT_COST_PER_1K_TOKENS", 0.25)
+    monkeypatch.setattr(usage_module.settings, "LLM_OUTPUT_COST_PER_1K_TOKENS", 0.0)
+    assert estimate_cost(1000, 0, cached_tokens=800) == pytest.approx(0.2 + 0.2)
+
+
+def test_tracker_aggregates_by_node_and_version(monkeypatch):
+    """
+    O resumo deve somar tokens por nó, listar versões e calcular custo.
+    """
+    monkeypatch.setattr(usage_module.settings, "LLM_INPUT_COST_PER_1K_TOKENS", 1.0)
+    monkeypatch.setattr(usage_module.settings, "LLM_OUTPUT_COST_PER_1K_TOKENS", 2.0)
+    tracker = UsageTracker()
+    tracker.record("c1", "llm_dialog", "v1", 1000, 100)
+    tracker.record("c1", "llm_dialog", "v1", 1000, 100)
+    tracker.record("c1", "llm_extract", "v2", 500, 50)
+
+    summary = tracker.pop("c1")
+    assert summary["input_tokens"] == 2500
+    assert summary["total_tokens"] == 2750
+    assert summary["calls"] == 3
+    assert summary["by_node"]["llm_dialog"]["calls"] == 2
+    assert summary["prompt_versions"] == ["v1", "v2"]
+    assert summary["cost_usd"] == pytest.approx(2.5 + 0.5)
+    assert tracker.summary("c1") is None
+
+
+def test_tracker_is_bounded():
+    """
+    Conversas mais antigas devem ser descartadas além do limite.
+    """
+    tracker = UsageTracker(max_conversations=2)
+    for conv in ("a", "b", "c"):
+        tracker.record(conv, "n", "v", 1, 1)
+    assert tracker.summary("a") is None
+    assert tracker.summary("c") is not None
+
+
+@pytest.mark.asyncio
+async def test_llm_service_records_usage():
+    """
+    Cada chamada ao LLM deve acumular tokens na conversa e nas métricas.
+    """
+    service = LLMService(client=FakeChatModel())
+    before = sum(LLM_TOKENS_TOTAL._values.values())
+    await service.get_reply("Olá", session_id="conv-usage")
+    await service.get_reply("Estou com dor", session_id="conv-usage")
+
+    summary = service.usage.summary("conv-usage")
+    assert summary["calls"] == 2
+    assert summary["input_tokens"] > 0
+    assert summary["by_node"]["direct"]["calls"] == 2
+    assert len(summary["prompt_versions"]) == 1
+    assert sum(LLM_TOKENS_TOTAL._values.values()) > before
+
+
+@pytest.mark.asyncio
+async def test_save_triage_persists_usage(db):
+    """
+    O uso de tokens deve ser salvo junto com a triagem.
+    """
+    service = PersistenceService()
+    service.triages = db["triages_usage"]
+    await service.save_triage("conv-u", {"queixa_principal": "Dor"}, usage={"total_tokens": 42})
+
+    doc = await service.get_triage("conv-u")
+    assert doc["usage"] == {"total_tokens": 42}
+
+
+@pytest.mark.asyncio
+async def test_emergency_discards_session_usage(db):
+    """
+    A emergência detectada pelo guard encerra a sessão e descarta o uso
+    acumulado, que não passa para a próxima triagem da conversa.
+    """
+    persistence = PersistenceService()
+    persistence.messages = db["messages_usage_emergency"]
+    persistence.triages = db["triages_usage_emergency"]
+    llm = LLMService(client=FakeChatModel())
+    service = ChatService(
+        llm_client=llm,
+        persistence=persistence,
+        triage_agent=TriageAgent(llm=llm, persistence=persistence, checkpointer=MemorySaver()),
+    )
+
+    first = await service.process_message(ChatRequest(channel="web", message="Olá"))
+    assert llm.usage.summary(first.conversation_id)["calls"] == 1
+
+    await service.process_message(
+        ChatRequest(conversation_id=first.conversation_id, channel="web", message="Estou com dor no peito")
+    )
+    assert llm.usage.summary(first.conversation_id) is None
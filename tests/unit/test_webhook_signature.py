@@ -0,0 +1,104 @@
+"""
+Testes unitários para a verificação da assinatura do webhook.
+
+Objetivos:
+- Validar o HMAC-SHA256 no formato `X-Hub-Signature-256` (Hasher).
+- Recusar chamadas sem assinatura ou com assinatura inválida antes do parse.
+- Processar normalmente as chamadas assinadas.
+- Recusar a inicialização fora de `ENV=dev` sem o App Secret.
+"""
+
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes.webhook import check_signature_secret, get_signature_hasher, get_whatsapp_service
+from app.settings import settings
+from app.utils.hashing import Hasher
+
+
+SECRET = "app-secret"
+
+
+def _signature(body: bytes, secret: str = SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_hasher_verifies_meta_signature():
+    """
+    A assinatura deve conferir apenas para o mesmo corpo e segredo.
+    """
+    hasher = Hasher(SECRET)
+    body = b'{"object":"whatsapp_business_account"}'
+
+    assert hasher.verify_signature(body, _signature(body))
+    assert not hasher.verify_signature(body + b" ", _signature(body))
+    assert not hasher.verify_signature(body, _signature(body, "outro"))
+    assert not hasher.verify_signature(body, hasher.sign(body))
+    assert not hasher.verify_signature(body, "")
+
+
+class _Sender:
+    async def send_message(self, payload):
+        return {}
+
+    async def send_raw(self, body):
+        return {}
+
+
+@pytest.fixture
+def client(chat_service_override):
+    app.dependency_overrides[get_signature_hasher] = lambda: Hasher(SECRET)
+    app.dependency_overrides[get_whatsapp_service] = _Sender
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        app.dependency_overrides.pop(get_signature_hasher, None)
+        app.dependency_overrides.pop(get_whatsapp_service, None)
+
+
+def test_webhook_requires_valid_signature(client):
+    """
+    Chamadas sem assinatura ou com assinatura inválida recebem 401, mesmo
+    com corpo malformado (a verificação vem antes da validação).
+    """
+    body = json.dumps({"entry": [{"changes": [{"value": {"messages": [
+        {"from": "5581991113682", "text": {"body": "Oi"}}
+    ]}}]}]}).encode()
+    headers = {"Content-Type": "application/json"}
+
+    assert client.post("/webhook/whatsapp", content=body, headers=headers).status_code == 401
+    invalid = {**headers, "X-Hub-Signature-256": _signature(b"outro corpo")}
+    assert client.post("/webhook/whatsapp", content=body, headers=invalid).status_code == 401
+    assert client.post("/webhook/whatsapp", content=b"{", headers=invalid).status_code == 401
+
+    signed = {**headers, "X-Hub-Signature-256": _signature(body)}
+    response = client.post("/webhook/whatsapp", content=body, headers=signed)
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+    malformed = {**headers, "X-Hub-Signature-256": _signature(b"{")}
+    assert client.post("/webhook/whatsapp", content=b"{", headers=malformed).status_code == 422
+
+
+def test_missing_secret_blocks_startup_outside_dev(monkeypatch):
+    """
+    Sem `WHATSAPP_APP_SECRET`, a aplicação só sobe com `ENV=dev`.
+    """
+    monkeypatch.setattr(settings, "MONGO_ENSURE_INDEXES", False)
+    monkeypatch.setattr(settings, "WHATSAPP_APP_SECRET", None)
+    monkeypatch.setattr(settings, "ENV", "dev")
+    check_signature_secret()
+
+    monkeypatch.setattr(settings, "ENV", "prod")
+    with pytest.raises(RuntimeError, match="WHATSAPP_APP_SECRET"):
+        with TestClient(app):
+            pass
+
+    monkeypatch.setattr(settings, "WHATSAPP_APP_SECRET", SECRET)
+    check_signature_secret()
@@ -6,6 +6,7 @@ Objetivos:
 - Validar que erros de rede ou credenciais incorretas levantam exceções.
 """
 
+import json
 import os
 import pytest
 import respx
@@ -13,6 +14,7 @@ from httpx import Response, RequestError
 
 from app.services.whatsapp import WhatsAppService
 from app.schemas.whatsapp import WhatsAppSendMessage
+from app.settings import settings
 
 
 @pytest.mark.asyncio
@@ -61,10 +63,39 @@ async def test_send_message_raises_on_error(monkeypatch):
 
 def test_init_without_env(monkeypatch):
     """
-    Deve levantar ValueError se env vars obrigatórias não estiverem definidas.
+    Deve levantar ValueError se as credenciais obrigatórias não estiverem
+    definidas (o serviço lê o `settings` já carregado, não o ambiente).
     """
-    monkeypatch.delenv("WHATSAPP_PHONE_NUMBER_ID", raising=False)
-    monkeypatch.delenv("WHATSAPP_ACCESS_TOKEN", raising=False)
+    monkeypatch.setattr(settings, "WHATSAPP_PHONE_NUMBER_ID", "")
+    with pytest.raises(ValueError):
+        WhatsAppService()
 
+    monkeypatch.setattr(settings, "WHATSAPP_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setattr(settings, "WHATSAPP_ACCESS_TOKEN", "")
     with pytest.raises(ValueError):
         WhatsAppService()
+
+
+@pytest.mark.asyncio
+async def test_send_reuses_http_client():
+    """
+    Envios consecutivos devem reaproveitar o mesmo cliente HTTP, e o corpo
+    enviado deve ser o JSON do modelo.
+    """
+    service = WhatsAppService()
+    payload = WhatsAppSendMessage(to="5581991113682", text={"body": "Olá"})
+
+    with respx.mock(assert_all_called=True) as http_mock:
+        route = http_mock.post("https://graph.facebook.com/v22.0/123456789/messages").mock(
+            return_value=Response(200, json={"messages": [{"id": "wamid.fake"}]})
+        )
+        await service.send_message(payload)
+        client = service.client
+        await service.send_raw(b'{"to":"1"}')
+
+        assert service.client is client
+        assert json.loads(route.calls[0].request.content) == payload.model_dump()
+        assert route.calls[1].request.content == b'{"to":"1"}'
+
+    await service.aclose()
+    assert service._client is None